@@ -0,0 +1,217 @@
+import json
+import click
+from frappe.commands import pass_context, get_site
+
+@click.command("rebuild-tax-rollup")
+@click.option("--company", help="Only rebuild the rollup of this company")
+@pass_context
+def rebuild_tax_rollup(context, company=None):
+    """Recompute the monthly GL tax rollup from GL Entry"""
+    import frappe
+    from pajak_indonesia.pelaporan.rollup import rebuild_rollup
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        count = rebuild_rollup(company)
+        frappe.db.commit()
+        click.echo(f"Rebuilt {count} tax rollup rows")
+    finally:
+        frappe.destroy()
+
+@click.command("verify-tax-rollup")
+@click.option("--company", help="Only verify the rollup of this company")
+@pass_context
+def verify_tax_rollup(context, company=None):
+    """Diff the monthly GL tax rollup against GL Entry"""
+    import frappe
+    from pajak_indonesia.pelaporan.rollup import verify_rollup
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        differences = verify_rollup(company)
+    finally:
+        frappe.destroy()
+
+    if not differences:
+        click.echo("Tax rollup matches GL Entry")
+        return
+
+    click.echo(json.dumps(differences, indent=2, default=str))
+    raise SystemExit(1)
+
+@click.command("tax-index-report")
+@click.option("--company", help="Company used as query parameter")
+@click.option("--fix", is_flag=True, default=False, help="Create missing managed indexes first")
+@pass_context
+def tax_index_report(context, company=None, fix=False):
+    """Report missing and unused tax indexes using EXPLAIN on the app's hot queries"""
+    import frappe
+    from pajak_indonesia.setup.indexes import ensure_indexes, get_index_report
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        if fix:
+            for index in ensure_indexes():
+                click.echo(f"Created {index}")
+        report = get_index_report(company)
+    finally:
+        frappe.destroy()
+
+    click.echo(json.dumps(report, indent=2, default=str))
+    if report["missing"] or report["full_scans"]:
+        raise SystemExit(1)
+
+@click.command("requeue-tax-events")
+@click.option("--event", "events", multiple=True, help="Only requeue these dead events")
+@pass_context
+def requeue_tax_events(context, events=None):
+    """Put dead tax events of the outbox back in the queue"""
+    import frappe
+    from pajak_indonesia.outbox import requeue_events, get_outbox_status
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        frappe.set_user("Administrator")
+        count = requeue_events(list(events) or None)
+        frappe.db.commit()
+        status = get_outbox_status()
+    finally:
+        frappe.destroy()
+
+    click.echo(f"Requeued {count} tax events")
+    click.echo(json.dumps(status, indent=2))
+
+@click.command("backfill-tax-tags")
+@click.option("--company", help="Only backfill GL Entries of this company")
+@click.option("--chunk-size", type=int, default=5000, help="GL Entries per chunk and transaction")
+@click.option("--rows-per-second", type=int, default=20000, help="Scan rate limit, 0 for no limit")
+@click.option("--reset", is_flag=True, default=False, help="Start over instead of resuming from the checkpoint")
+@pass_context
+def backfill_tax_tags(context, company=None, chunk_size=5000, rows_per_second=20000, reset=False):
+    """Tag historical GL Entries with tax_type and update the tax rollup"""
+    import frappe
+    from pajak_indonesia.pelaporan.backfill import backfill_gl_tax_tags
+
+    def report(stats):
+        click.echo(f"{stats['company']}: scanned {stats['scanned']}, tagged {stats['tagged']}")
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        results = backfill_gl_tax_tags(company, chunk_size, rows_per_second, reset, report)
+    finally:
+        frappe.destroy()
+
+    click.echo(json.dumps(results, indent=2))
+
+@click.command("generate-tax-filings")
+@click.option("--company", "companies", multiple=True, help="Company to file for, repeatable, defaults to every company")
+@click.option("--period", "periods", multiple=True, required=True, help="Tax period as YYYY-MM, repeatable")
+@click.option("--tax-type", "pajak_types", multiple=True, required=True,
+              type=click.Choice(["PPN", "PPh 21", "PPh 23", "PPh 26"]), help="Tax type, repeatable")
+@click.option("--workers", type=int, default=4, help="Maximum number of concurrent worker processes")
+@pass_context
+def generate_tax_filings(context, companies=None, periods=None, pajak_types=None, workers=4):
+    """Generate Tax Filing Summaries for every company x period x tax type"""
+    import frappe
+    from pajak_indonesia.pelaporan.bulk_filing import build_filing_matrix, prefetch_account_maps, run_locally
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        companies = list(companies) or frappe.get_all("Company", pluck="name", order_by="name")
+        combinations = build_filing_matrix(companies, list(periods), list(pajak_types))
+        prefetch_account_maps(companies)
+        click.echo(f"Generating {len(combinations)} tax filings with up to {workers} workers")
+        report = run_locally(site, combinations, workers)
+    finally:
+        frappe.destroy()
+
+    click.echo(json.dumps(report, indent=2, default=str))
+    if report["failed"]:
+        raise SystemExit(1)
+
+@click.command("reconcile-taxes")
+@click.option("--company", help="Reconcile every period of this company only")
+@click.option("--full", is_flag=True, default=False, help="Reconcile every period, not only the changed ones")
+@pass_context
+def reconcile_taxes(context, company=None, full=False):
+    """Reconcile GL, tax documents and filings per period, printing the result counts"""
+    import frappe
+    from pajak_indonesia.pelaporan.reconciliation import reconcile_all, reconcile_company
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        if company:
+            report = reconcile_company(company)
+            frappe.db.commit()
+        else:
+            report = reconcile_all(full=full)
+    finally:
+        frappe.destroy()
+
+    click.echo(json.dumps(report, indent=2))
+    if report.get("Mismatch") or report.get("results", {}).get("Mismatch"):
+        raise SystemExit(1)
+
+@click.command("tax-benchmark")
+@click.option("--companies", type=int, default=1, help="Synthetic companies to seed")
+@click.option("--scale", type=int, default=10000, help="Sales Invoices per company, other DocTypes follow from it")
+@click.option("--repeat", type=int, default=3, help="Runs per case")
+@click.option("--sample", type=int, default=100, help="Documents per run for per-document cases")
+@click.option("--case", "cases", multiple=True, help="Only run this case, repeatable")
+@click.option("--no-seed", is_flag=True, default=False, help="Time the already seeded dataset")
+@click.option("--output", help="Write the JSON report to this file")
+@click.option("--compare", "baseline", type=click.Path(exists=True), help="Compare with an earlier JSON report")
+@click.option("--threshold", type=float, default=0.2, help="Relative slowdown reported as a regression")
+@click.option("--purge", is_flag=True, default=False, help="Delete the seeded dataset afterwards")
+@pass_context
+def tax_benchmark(context, companies=1, scale=10000, repeat=3, sample=100, cases=None, no_seed=False,
+                  output=None, baseline=None, threshold=0.2, purge=False):
+    """Seed synthetic tax data and time the tax pipeline, printing a JSON report"""
+    import frappe
+    from pajak_indonesia.benchmarks.suite import run, compare
+    from pajak_indonesia.benchmarks.synthetic import SyntheticDataset
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        frappe.set_user("Administrator")
+        report = run(companies=companies, scale=scale, repeat=repeat, sample=sample,
+                     seed=not no_seed, cases=list(cases) or None, output=output)
+        if purge:
+            SyntheticDataset(companies=companies, scale=scale).purge()
+    finally:
+        frappe.destroy()
+
+    click.echo(json.dumps(report, indent=2, default=str))
+    if baseline:
+        with open(baseline) as f:
+            comparison = compare(json.load(f), report, threshold)
+        click.echo(json.dumps(comparison, indent=2))
+        if comparison["regressions"]:
+            raise SystemExit(1)
+
+commands = [
+    rebuild_tax_rollup,
+    verify_tax_rollup,
+    tax_index_report,
+    requeue_tax_events,
+    backfill_tax_tags,
+    generate_tax_filings,
+    reconcile_taxes,
+    tax_benchmark
+]
@@ -28,6 +28,7 @@ modules = {
 # Setup and installation
 # ----------------------
 after_install = "pajak_indonesia.setup.custom_fields.after_install"
+after_migrate = "pajak_indonesia.setup.indexes.after_migrate"
 
 # Document hooks and events
 # ------------------------
@@ -35,13 +36,24 @@ doc_events = {
     "Sales Invoice": {
         "on_submit": [
             "pajak_indonesia.efaktur.utils.create_document",
-            "pajak_indonesia.pelaporan.utils.auto_tag_gl_entry"
+            "pajak_indonesia.pelaporan.report_cache.invalidate_document_period"
         ],
-        "on_cancel": "pajak_indonesia.efaktur.utils.cancel_efaktur"
+        "on_cancel": [
+            "pajak_indonesia.efaktur.utils.cancel_efaktur",
+            "pajak_indonesia.pelaporan.report_cache.invalidate_document_period"
+        ]
     },
     "Purchase Invoice": {
-        "on_submit": "pajak_indonesia.ebupot.utils.create_document_if_pph",
-        "on_cancel": "pajak_indonesia.ebupot.utils.cancel_ebupot"
+        "on_submit": [
+            "pajak_indonesia.ebupot.utils.create_document_if_pph",
+            "pajak_indonesia.pelaporan.report_cache.invalidate_document_period",
+            "pajak_indonesia.spt.running_totals.update_running_totals"
+        ],
+        "on_cancel": [
+            "pajak_indonesia.ebupot.utils.cancel_ebupot",
+            "pajak_indonesia.pelaporan.report_cache.invalidate_document_period",
+            "pajak_indonesia.spt.running_totals.update_running_totals"
+        ]
     },
     "Payment Entry": {
         "validate": "pajak_indonesia.ebupot.utils.link_deduction_to_bupot",
@@ -51,10 +63,95 @@ doc_events = {
     "GL Entry": {
         "before_insert": "pajak_indonesia.pelaporan.utils.tag_ppn_out_gl",
         "autoname": "pajak_indonesia.pelaporan.utils.gl_entry_naming_override",
-        "after_insert": "pajak_indonesia.pelaporan.utils.auto_tag_gl_entry"
+        "after_insert": [
+            "pajak_indonesia.pelaporan.utils.auto_tag_gl_entry",
+            "pajak_indonesia.pelaporan.report_cache.invalidate_document_period"
+        ]
+    },
+    "Efaktur Document": {
+        "on_submit": [
+            "pajak_indonesia.pelaporan.report_cache.invalidate_document_period",
+            "pajak_indonesia.spt.running_totals.update_running_totals"
+        ],
+        "on_update_after_submit": "pajak_indonesia.pelaporan.report_cache.invalidate_document_period",
+        "on_cancel": [
+            "pajak_indonesia.pelaporan.report_cache.invalidate_document_period",
+            "pajak_indonesia.spt.running_totals.update_running_totals"
+        ]
+    },
+    "Ebupot Document": {
+        "on_submit": [
+            "pajak_indonesia.pelaporan.report_cache.invalidate_document_period",
+            "pajak_indonesia.spt.running_totals.update_running_totals"
+        ],
+        "on_update_after_submit": "pajak_indonesia.pelaporan.report_cache.invalidate_document_period",
+        "on_cancel": [
+            "pajak_indonesia.pelaporan.report_cache.invalidate_document_period",
+            "pajak_indonesia.spt.running_totals.update_running_totals"
+        ]
+    },
+    "Salary Slip": {
+        "on_submit": [
+            "pajak_indonesia.pelaporan.report_cache.invalidate_document_period",
+            "pajak_indonesia.spt.running_totals.update_running_totals"
+        ],
+        "on_cancel": [
+            "pajak_indonesia.pelaporan.report_cache.invalidate_document_period",
+            "pajak_indonesia.spt.running_totals.update_running_totals"
+        ]
+    },
+    "Tax Filing Summary": {
+        "on_update": "pajak_indonesia.pelaporan.report_cache.invalidate_document_period",
+        "on_submit": "pajak_indonesia.pelaporan.report_cache.invalidate_document_period",
+        "on_cancel": "pajak_indonesia.pelaporan.report_cache.invalidate_document_period",
+        "on_trash": "pajak_indonesia.pelaporan.report_cache.invalidate_document_period"
+    },
+    "Account": {
+        "on_update": "pajak_indonesia.tax_accounts.invalidate_tax_account_cache",
+        "after_rename": "pajak_indonesia.tax_accounts.invalidate_tax_account_cache",
+        "on_trash": "pajak_indonesia.tax_accounts.invalidate_tax_account_cache"
+    },
+    "Tax Category": {
+        "on_update": "pajak_indonesia.tax_accounts.invalidate_tax_account_cache",
+        "on_trash": "pajak_indonesia.tax_accounts.invalidate_tax_account_cache"
+    },
+    "Customer": {
+        "on_update": "pajak_indonesia.party_profile.invalidate_party_profile",
+        "after_rename": "pajak_indonesia.party_profile.invalidate_party_profile",
+        "on_trash": "pajak_indonesia.party_profile.invalidate_party_profile"
+    },
+    "Supplier": {
+        "on_update": "pajak_indonesia.party_profile.invalidate_party_profile",
+        "after_rename": "pajak_indonesia.party_profile.invalidate_party_profile",
+        "on_trash": "pajak_indonesia.party_profile.invalidate_party_profile"
+    },
+    "Address": {
+        "on_update": "pajak_indonesia.party_profile.invalidate_party_profile",
+        "on_trash": "pajak_indonesia.party_profile.invalidate_party_profile"
     }
 }
 
+# Request and Job Events
+# ----------------------
+
+# Record faktur numbers of blocks reserved by a transaction left open as unused
+after_request = ["pajak_indonesia.efaktur.nomor_faktur.release_held_blocks"]
+after_job = ["pajak_indonesia.efaktur.nomor_faktur.release_held_blocks"]
+
+# Scheduled Tasks
+# ---------------
+scheduler_events = {
+    "cron": {
+        # Hand recorded tax events to workers when the outbox is enabled
+        "* * * * *": ["pajak_indonesia.outbox.enqueue_outbox_batches"]
+    },
+    # Issue the faktur numbers of expired worker leases again
+    "hourly": ["pajak_indonesia.efaktur.nomor_faktur.reclaim_expired_leases"],
+    # Reconcile GL, tax documents and filings of the periods changed that day
+    "daily_long": ["pajak_indonesia.pelaporan.reconciliation.run_nightly_reconciliation"],
+    "weekly_long": ["pajak_indonesia.pelaporan.reconciliation.run_full_reconciliation"]
+}
+
 
 
 # UI and list view customizations
@@ -192,11 +289,9 @@ workspace_info = {
     "Pajak Indonesia": {
         "category": "Modules",
         "color": "#3498db",
-        "icon": "octicon octicon-file-directory",
         "icon": "tax",
         "type": "module",
         "link": "Pajak Indonesia",
-        "label": "Pajak Indonesia"
         "label": _("Pajak Indonesia")
     }
 }
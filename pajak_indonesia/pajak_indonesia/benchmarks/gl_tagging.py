@@ -0,0 +1,95 @@
+from typing import Dict, Any, List
+from contextlib import contextmanager
+import time
+import frappe
+from frappe.utils import nowdate
+from pajak_indonesia.tax_accounts import get_ppn_account
+
+APP_HOOK_PREFIX = "pajak_indonesia."
+
+def run(company: str, lines: int = 10000, repeat: int = 3) -> Dict[str, Any]:
+    """
+    Time posting a large Journal Entry with and without the app's GL Entry hooks.
+
+    Half of the lines credit the PPN Output account, so every second GL
+    Entry is tagged and counted in the rollup. Each posting is rolled back:
+
+        bench --site test execute pajak_indonesia.benchmarks.gl_tagging.run \
+            --kwargs "{'company': '_Test Company IDN'}"
+
+    Args:
+        company: Company with a PPN Output account
+        lines: Journal Entry lines per posting
+        repeat: Postings per variant, the fastest one is reported
+
+    Returns:
+        dict: Seconds per posting with and without the hooks, and the overhead
+    """
+    accounts = get_benchmark_accounts(company)
+    result = {"lines": lines}
+
+    for variant, hooks_enabled in (("without_app", False), ("with_app", True)):
+        timings = []
+        for _run in range(repeat):
+            with gl_entry_hooks(hooks_enabled):
+                timings.append(time_journal_entry(company, accounts, lines))
+        result[f"{variant}_seconds"] = round(min(timings), 3)
+
+    result["overhead_seconds"] = round(result["with_app_seconds"] - result["without_app_seconds"], 3)
+    result["overhead_per_line_ms"] = round(result["overhead_seconds"] * 1000 / lines, 4)
+    return result
+
+def time_journal_entry(company: str, accounts: List[str], lines: int) -> float:
+    """Submit one Journal Entry and roll it back, returning the submit time"""
+    ppn_account, balancing_account = accounts
+    je = frappe.new_doc("Journal Entry")
+    je.update({
+        "company": company,
+        "posting_date": nowdate(),
+        "voucher_type": "Journal Entry",
+        "user_remark": "GL tagging benchmark"
+    })
+    for i in range(lines // 2):
+        je.append("accounts", {"account": balancing_account, "debit_in_account_currency": 11 + i % 7})
+        je.append("accounts", {"account": ppn_account, "credit_in_account_currency": 11 + i % 7})
+
+    try:
+        je.insert()
+        started = time.perf_counter()
+        je.submit()
+        return time.perf_counter() - started
+    finally:
+        frappe.db.rollback()
+        frappe.local.pajak_gl_taggers = {}
+
+def get_benchmark_accounts(company: str) -> List[str]:
+    """PPN Output account and a balance sheet account without party requirements"""
+    ppn_account = get_ppn_account(company, "Output")
+    if not ppn_account:
+        frappe.throw(f"No PPN Output account found for {company}")
+
+    balancing_account = frappe.db.get_value(
+        "Company", company, "default_cash_account"
+    ) or frappe.db.get_value(
+        "Account", {"company": company, "account_type": "Cash", "is_group": 0}, "name"
+    )
+    if not balancing_account:
+        frappe.throw(f"No cash account found for {company}")
+
+    return [ppn_account, balancing_account]
+
+@contextmanager
+def gl_entry_hooks(enabled: bool):
+    """Temporarily remove the app's GL Entry doc_events for this request"""
+    doc_hooks = frappe.get_doc_hooks()
+    original = doc_hooks.get("GL Entry")
+    if not enabled and original:
+        doc_hooks["GL Entry"] = {
+            event: [method for method in methods if not method.startswith(APP_HOOK_PREFIX)]
+            for event, methods in original.items()
+        }
+    try:
+        yield
+    finally:
+        if original is not None:
+            doc_hooks["GL Entry"] = original
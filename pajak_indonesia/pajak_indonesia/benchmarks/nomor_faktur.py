@@ -0,0 +1,87 @@
+from typing import Dict, Any, List
+import multiprocessing
+import time
+import frappe
+
+def run(site: str, company: str, workers: int = 16, allocations: int = 200,
+        block_size: int = 0) -> Dict[str, Any]:
+    """
+    Allocate nomor faktur from many processes at once and check for duplicates.
+
+    Each worker commits after every allocation and then runs the
+    after_request hook, the same as one Sales Invoice submit per request.
+    Held blocks stay with the worker between allocations, as they do in
+    production, and are released when the worker ends. Run against a test site with enough
+    free numbers in its NSFP ranges:
+
+        bench --site test execute pajak_indonesia.benchmarks.nomor_faktur.run \
+            --kwargs "{'site': 'test', 'company': '_Test Company IDN'}"
+
+    Args:
+        site: Site name, each worker connects to it on its own
+        company: Company with an active Efaktur Config
+        workers: Number of parallel worker processes
+        allocations: Numbers allocated by each worker
+        block_size: Per-process block size, defaults to Efaktur Config.block_size
+
+    Returns:
+        dict: Throughput, latency percentiles and duplicate count
+    """
+    started = time.perf_counter()
+    with multiprocessing.get_context("spawn").Pool(workers) as pool:
+        results = pool.starmap(
+            _allocate_worker,
+            [(site, company, allocations, block_size)] * workers
+        )
+    elapsed = time.perf_counter() - started
+
+    numbers = [number for result in results for number in result["numbers"]]
+    latencies = sorted(latency for result in results for latency in result["latencies"])
+    duplicates = len(numbers) - len(set(numbers))
+
+    return {
+        "workers": workers,
+        "allocations": len(numbers),
+        "duplicates": duplicates,
+        "exhausted": sum(result["exhausted"] for result in results),
+        "seconds": round(elapsed, 3),
+        "per_second": round(len(numbers) / elapsed, 1) if elapsed else 0,
+        "p50_ms": _percentile(latencies, 50),
+        "p95_ms": _percentile(latencies, 95),
+        "p99_ms": _percentile(latencies, 99)
+    }
+
+def _allocate_worker(site: str, company: str, allocations: int, block_size: int) -> Dict[str, Any]:
+    """Allocate numbers in a fresh process, then hand back the unused block"""
+    from pajak_indonesia.efaktur.nomor_faktur import NomorFakturAllocator, release_held_blocks
+
+    frappe.init(site=site)
+    frappe.connect()
+    numbers = []
+    latencies = []
+    exhausted = 0
+    try:
+        for _i in range(allocations):
+            started = time.perf_counter()
+            allocated = NomorFakturAllocator.allocate(company, block_size=block_size)
+            frappe.db.commit()
+            release_held_blocks()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+            if not allocated:
+                exhausted += 1
+                break
+            numbers.extend(allocated)
+
+        NomorFakturAllocator.release_process_blocks("Benchmark")
+        frappe.db.commit()
+    finally:
+        frappe.destroy()
+
+    return {"numbers": numbers, "latencies": latencies, "exhausted": exhausted}
+
+def _percentile(values: List[float], percent: int) -> float:
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(percent / 100.0 * (len(values) - 1))))
+    return round(values[index], 3)
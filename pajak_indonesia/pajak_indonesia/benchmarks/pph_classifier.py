@@ -0,0 +1,113 @@
+from typing import Dict, Any, List, Optional
+import random
+import time
+import frappe
+from pajak_indonesia.ebupot.classifier import PPhTaxClassifier
+
+DEFAULT_ROWS = 100000
+ROWS_PER_INVOICE = 4
+
+DESCRIPTIONS = (
+    "PPh 23 Jasa Teknik", "Withholding tax services", "PPh 26 Royalty", "PPN Masukan 11%",
+    "Biaya materai", "Discount", None, "Ongkos kirim"
+)
+
+def run(company: Optional[str] = None, rows: int = DEFAULT_ROWS, repeat: int = 3,
+        seed: int = 42) -> Dict[str, Any]:
+    """
+    Time PPh classification of synthetic Purchase Taxes and Charges rows.
+
+    Compares the classifier's single pass over all rows with the former
+    per-row substring checks. No documents are written:
+
+        bench --site test execute pajak_indonesia.benchmarks.pph_classifier.run \
+            --kwargs "{'company': '_Test Company IDN'}"
+
+    Args:
+        company: Optional company whose rules and PPh accounts are used,
+            synthetic accounts and the default rules otherwise
+        rows: Tax rows to classify
+        repeat: Runs per variant, the fastest one is reported
+        seed: Random seed of the synthetic rows
+
+    Returns:
+        dict: Seconds and rows per second per variant, and whether both agree
+    """
+    if company:
+        classifier = PPhTaxClassifier.load(company)
+    else:
+        classifier = PPhTaxClassifier({"PPh 23 - BENCH": "23", "PPh 26 - BENCH": "26"})
+
+    accounts = {pph_type: account for account, pph_type in reversed(list(classifier.account_types.items()))}
+    tax_rows, base_net_totals = make_rows(rows, accounts, seed)
+
+    result = {"rows": len(tax_rows)}
+    outputs = {}
+    for variant, classify in (
+        ("substring", lambda: classify_by_substring(tax_rows, base_net_totals, accounts)),
+        ("classifier", lambda: classifier.classify_rows(tax_rows, base_net_totals))
+    ):
+        timings = []
+        for _run in range(repeat):
+            started = time.perf_counter()
+            outputs[variant] = classify()
+            timings.append(time.perf_counter() - started)
+        elapsed = min(timings)
+        result[f"{variant}_seconds"] = round(elapsed, 4)
+        result[f"{variant}_rows_per_second"] = round(len(tax_rows) / elapsed, 1) if elapsed else 0
+
+    result["speedup"] = round(result["substring_seconds"] / result["classifier_seconds"], 2) \
+        if result["classifier_seconds"] else None
+    # Configured rules may classify more rows than the fixed substrings
+    result["same_result"] = outputs["substring"] == outputs["classifier"]
+    return result
+
+def make_rows(rows: int, accounts: Dict[str, str], seed: int):
+    """Deducted and added tax rows spread over invoices, a quarter on PPh accounts"""
+    rng = random.Random(seed)
+    other_accounts = ["PPN Masukan - BENCH", "Biaya Lain - BENCH"]
+    pph_accounts = [accounts[pph_type] for pph_type in ("23", "26") if accounts.get(pph_type)]
+
+    tax_rows = []
+    base_net_totals = {}
+    for i in range(rows):
+        parent = f"BENCH-PINV-{i // ROWS_PER_INVOICE:08d}"
+        if parent not in base_net_totals:
+            base_net_totals[parent] = rng.randrange(1, 1000) * 100000.0
+        on_pph_account = pph_accounts and i % 4 == 0
+        tax_rows.append(frappe._dict({
+            "parent": parent,
+            "account_head": rng.choice(pph_accounts) if on_pph_account else rng.choice(other_accounts),
+            "description": rng.choice(DESCRIPTIONS),
+            "tax_amount": rng.choice((-1, -1, 1)) * rng.randrange(1, 100) * 1000.0
+        }))
+    return tax_rows, base_net_totals
+
+def classify_by_substring(tax_rows: List[Dict[str, Any]], base_net_totals: Dict[str, float],
+                          accounts: Dict[str, str]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """Reference implementation: the per-row checks get_pph_taxes used to run"""
+    result = {}
+    for tax in tax_rows:
+        tax_amount = tax.tax_amount
+        base_amount = base_net_totals[tax.parent]
+        if tax_amount >= 0:
+            continue
+        description = (tax.description or "").lower()
+        if accounts.get("23") and tax.account_head == accounts["23"]:
+            pph_type, default_description = "23", "PPh 23"
+        elif accounts.get("26") and tax.account_head == accounts["26"]:
+            pph_type, default_description = "26", "PPh 26"
+        elif "pph 23" in description or "withholding" in description:
+            pph_type, default_description = "23", None
+        elif "pph 26" in description:
+            pph_type, default_description = "26", None
+        else:
+            continue
+        result.setdefault(tax.parent, {})[pph_type] = {
+            "account": tax.account_head,
+            "rate": abs(tax_amount * 100 / base_amount) if base_amount else 0,
+            "amount": abs(tax_amount),
+            "base_amount": base_amount,
+            "description": tax.description or default_description
+        }
+    return result
@@ -0,0 +1,350 @@
+from typing import Dict, Any, List, Callable, Optional
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import frappe
+from frappe.utils import now, flt, cint
+from pajak_indonesia.benchmarks.synthetic import SyntheticDataset, DEFAULT_SCALE
+from pajak_indonesia.tax_accounts import get_pph_account
+
+DEFAULT_REPEAT = 3
+DEFAULT_SAMPLE = 100
+DEFAULT_THRESHOLD = 0.2
+PAJAK_TYPES = ("PPN", "PPh 21", "PPh 23", "PPh 26")
+
+class Timer:
+    """Accumulates the time spent inside `with timer:` blocks of one run"""
+
+    def __init__(self):
+        self.elapsed = 0.0
+        self.items = 0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed += time.perf_counter() - self.started
+
+def run(companies: int = 1, scale: int = DEFAULT_SCALE, repeat: int = DEFAULT_REPEAT,
+        sample: int = DEFAULT_SAMPLE, prefix: str = "BENCH", seed: bool = True,
+        cases: Optional[List[str]] = None, output: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Seed a synthetic dataset and time the hot entry points of the tax pipeline.
+
+    Every case runs `repeat` times and is rolled back after each run, so
+    the seeded data stays the same between cases and between runs with
+    the same scale. Run against a test site:
+
+        bench --site test execute pajak_indonesia.benchmarks.suite.run \
+            --kwargs "{'scale': 100000, 'output': '/tmp/pajak-bench.json'}"
+
+    Args:
+        companies: Synthetic companies to seed
+        scale: Sales Invoices per company, see SyntheticDataset
+        repeat: Runs per case, min/median/max are reported
+        sample: Documents per run for the per-document entry points
+        prefix: Dataset prefix, reusing one skips seeding what exists
+        seed: Seed the dataset before timing
+        cases: Optional subset of CASES to run
+        output: Optional path to write the JSON result to
+
+    Returns:
+        dict: meta (scale, versions, ...) and results per case
+    """
+    dataset = SyntheticDataset(prefix=prefix, companies=companies, scale=scale)
+    seeded = {}
+    if seed:
+        started = time.perf_counter()
+        seeded = dataset.seed()
+        seeded["seconds"] = round(time.perf_counter() - started, 3)
+
+    company = dataset.companies[0]
+    context = frappe._dict({"company": company, "year": str(dataset.year), "sample": cint(sample)})
+
+    results = {}
+    for name, case in CASES.items():
+        if cases and name not in cases:
+            continue
+        results[name] = time_case(case, context, repeat)
+
+    report = {
+        "meta": get_meta(dataset, repeat, sample, seeded.get("rows")),
+        "results": results
+    }
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2, default=str, sort_keys=True)
+
+    return report
+
+def time_case(case: Callable[[Timer, Dict[str, Any]], None], context: Dict[str, Any],
+              repeat: int) -> Dict[str, Any]:
+    """Run one case `repeat` times, rolling back after each run"""
+    timings = []
+    items = 0
+    frappe.flags.mute_messages = True
+    try:
+        for _run in range(max(cint(repeat), 1)):
+            timer = Timer()
+            try:
+                case(timer, context)
+            except Exception as e:
+                return {"error": str(e)}
+            finally:
+                frappe.db.rollback()
+                frappe.local.pajak_gl_taggers = {}
+            timings.append(timer.elapsed)
+            items = timer.items
+    finally:
+        frappe.flags.mute_messages = False
+
+    return {
+        "runs": len(timings),
+        "items": items,
+        "min_seconds": round(min(timings), 4),
+        "median_seconds": round(statistics.median(timings), 4),
+        "max_seconds": round(max(timings), 4),
+        "per_item_ms": round(min(timings) * 1000 / items, 3) if items else None
+    }
+
+def case_create_efaktur(timer: Timer, context: Dict[str, Any]) -> None:
+    """Sales Invoice submit hook on invoices without an e-Faktur"""
+    from pajak_indonesia.efaktur.utils import create_document
+
+    names = frappe.get_all(
+        "Sales Invoice",
+        filters={"company": context.company, "docstatus": 1, "has_generated_efaktur": 0},
+        order_by="name asc", limit_page_length=context.sample, pluck="name"
+    )
+    docs = [frappe.get_doc("Sales Invoice", name) for name in names]
+    with timer:
+        for doc in docs:
+            create_document(doc, "on_submit")
+    timer.items = len(docs)
+
+def case_create_ebupot(timer: Timer, context: Dict[str, Any]) -> None:
+    """Purchase Invoice submit hook on PPh invoices without an E-Bupot"""
+    from pajak_indonesia.ebupot.utils import create_document_if_pph
+
+    docs = [frappe.get_doc("Purchase Invoice", name) for name in get_pph_invoices(context, with_ebupot=False)]
+    with timer:
+        for doc in docs:
+            create_document_if_pph(doc, "on_submit")
+    timer.items = len(docs)
+    assert_ebupots_created([doc.name for doc in docs])
+
+def case_bulk_ebupot(timer: Timer, context: Dict[str, Any]) -> None:
+    """Body of the bulk E-Bupot chunk job on the invoices of the per-document case"""
+    from pajak_indonesia.ebupot.bulk import make_ebupot_documents_bulk
+
+    names = get_pph_invoices(context, with_ebupot=False)
+    with timer:
+        make_ebupot_documents_bulk(context.company, names)
+    timer.items = len(names)
+    assert_ebupots_created(names)
+
+def case_link_deduction(timer: Timer, context: Dict[str, Any]) -> None:
+    """Payment Entry validate hook matching PPh deductions to existing E-Bupots"""
+    from pajak_indonesia.ebupot.utils import link_deduction_to_bupot
+
+    pph_account = get_pph_account(context.company, "23")
+    payments = []
+    for ebupot in frappe.get_all(
+        "Ebupot Document",
+        filters={"company": context.company, "docstatus": 1, "reference_doctype": "Purchase Invoice"},
+        fields=["supplier", "tandatangan_date", "pph_dipotong", "reference_name"],
+        order_by="name asc", limit_page_length=context.sample
+    ):
+        payment = frappe.new_doc("Payment Entry")
+        payment.update({
+            "payment_type": "Pay",
+            "company": context.company,
+            "party_type": "Supplier",
+            "party": ebupot.supplier,
+            "posting_date": ebupot.tandatangan_date,
+            "reference_no": ebupot.reference_name
+        })
+        payment.append("references", {
+            "reference_doctype": "Purchase Invoice",
+            "reference_name": ebupot.reference_name
+        })
+        payment.append("deductions", {"account": pph_account, "amount": flt(ebupot.pph_dipotong)})
+        payments.append(payment)
+
+    with timer:
+        for payment in payments:
+            link_deduction_to_bupot(payment, "validate")
+    timer.items = len(payments)
+
+def case_reporting_cold(timer: Timer, context: Dict[str, Any]) -> None:
+    """Pelaporan Pajak data of every tax type with an empty reporting cache"""
+    from pajak_indonesia.pelaporan.report_cache import ReportingCache
+
+    ReportingCache.clear(context.company)
+    time_reporting_data(timer, context)
+
+def case_reporting_warm(timer: Timer, context: Dict[str, Any]) -> None:
+    """Pelaporan Pajak data of every tax type served from the reporting cache"""
+    time_reporting_data(Timer(), context)
+    time_reporting_data(timer, context)
+
+def time_reporting_data(timer: Timer, context: Dict[str, Any]) -> None:
+    from pajak_indonesia.pelaporan.page.pelaporan_pajak.pelaporan_pajak import get_tax_reporting_data
+
+    with timer:
+        for pajak_type in PAJAK_TYPES:
+            get_tax_reporting_data(context.year, "01", pajak_type, context.company)
+    timer.items = len(PAJAK_TYPES)
+
+def case_generate_filing(timer: Timer, context: Dict[str, Any]) -> None:
+    """Body of the generate_tax_filing job for every tax type of one period"""
+    from pajak_indonesia.pelaporan.page.pelaporan_pajak.pelaporan_pajak import make_tax_filing
+
+    with timer:
+        for pajak_type in PAJAK_TYPES:
+            make_tax_filing(context.year, "01", pajak_type, context.company)
+    timer.items = len(PAJAK_TYPES)
+
+def case_dashboard(timer: Timer, context: Dict[str, Any]) -> None:
+    """Charts and number cards of the tax dashboard"""
+    from pajak_indonesia.pelaporan.dashboard.dashboard_pajak.dashboard_pajak import get_dashboard_data
+
+    with timer:
+        get_dashboard_data({"company": context.company, "year": context.year})
+    timer.items = 1
+
+def case_reconcile(timer: Timer, context: Dict[str, Any]) -> None:
+    """Full reconciliation of every period of the company"""
+    from pajak_indonesia.pelaporan.reconciliation import reconcile_company
+
+    with timer:
+        counts = reconcile_company(context.company)
+    timer.items = sum(counts.values())
+
+def case_export(export_type: str) -> Callable[[Timer, Dict[str, Any]], None]:
+    def case(timer: Timer, context: Dict[str, Any]) -> None:
+        from pajak_indonesia.pelaporan.export import EXPORTERS
+
+        exporter = EXPORTERS[export_type](frappe._dict({"company": context.company, "year": context.year}))
+        with timer:
+            result = exporter.run()
+        timer.items = result["exported"]
+
+        # The File is rolled back with the run, the file on disk is not
+        path = frappe.get_site_path("private", "files", result["filename"])
+        if os.path.exists(path):
+            os.remove(path)
+
+    case.__doc__ = f"Full-year {export_type} export"
+    return case
+
+def get_pph_invoices(context: Dict[str, Any], with_ebupot: bool) -> List[str]:
+    """Seeded Purchase Invoices with a PPh row, with or without an E-Bupot"""
+    return frappe.db.sql_list(f"""
+        SELECT pi.name
+        FROM `tabPurchase Invoice` pi
+        WHERE pi.company = %(company)s AND pi.docstatus = 1
+        AND EXISTS (
+            SELECT 1 FROM `tabPurchase Taxes and Charges` tax
+            WHERE tax.parent = pi.name AND tax.parenttype = 'Purchase Invoice'
+            AND tax.tax_amount < 0
+        )
+        AND {'' if with_ebupot else 'NOT'} EXISTS (
+            SELECT 1 FROM `tabEbupot Document` eb
+            WHERE eb.reference_doctype = 'Purchase Invoice' AND eb.reference_name = pi.name
+        )
+        ORDER BY pi.name
+        LIMIT %(limit)s
+    """, {"company": context.company, "limit": context.sample})
+
+def assert_ebupots_created(invoices: List[str]) -> None:
+    """Fail the case unless every invoice got its E-Bupot, so skips are not timed as creation"""
+    created = set(frappe.get_all(
+        "Ebupot Document",
+        filters={"reference_doctype": "Purchase Invoice", "reference_name": ["in", invoices]},
+        pluck="reference_name"
+    )) if invoices else set()
+    if not invoices or len(created) < len(invoices):
+        raise AssertionError(f"E-Bupots created for {len(created)} of {len(invoices)} PPh invoices")
+
+CASES = {
+    "efaktur.create_document": case_create_efaktur,
+    "ebupot.create_document_if_pph": case_create_ebupot,
+    "ebupot.make_ebupot_documents_bulk": case_bulk_ebupot,
+    "ebupot.link_deduction_to_bupot": case_link_deduction,
+    "pelaporan.get_tax_reporting_data.cold": case_reporting_cold,
+    "pelaporan.get_tax_reporting_data.warm": case_reporting_warm,
+    "pelaporan.generate_tax_filing": case_generate_filing,
+    "pelaporan.reconcile_company": case_reconcile,
+    "dashboard.get_dashboard_data": case_dashboard,
+    "export.efaktur_csv": case_export("efaktur"),
+    "export.ebupot_csv": case_export("ebupot"),
+    "export.ebupot_coretax": case_export("ebupot_coretax")
+}
+
+def get_meta(dataset: SyntheticDataset, repeat: int, sample: int,
+             rows: Optional[Dict[str, int]]) -> Dict[str, Any]:
+    """Run context stored next to the results, so two reports can be compared fairly"""
+    return {
+        "timestamp": now(),
+        "site": frappe.local.site,
+        "companies": dataset.company_count,
+        "scale": dataset.scale,
+        "repeat": repeat,
+        "sample": sample,
+        "seeded_rows": rows,
+        "app_commit": get_app_commit(),
+        "frappe_version": frappe.__version__,
+        "python": platform.python_version(),
+        "db_version": frappe.db.sql("SELECT VERSION()")[0][0]
+    }
+
+def get_app_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=frappe.get_app_path("pajak_indonesia"),
+            stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except Exception:
+        return None
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any],
+            threshold: float = DEFAULT_THRESHOLD) -> Dict[str, Any]:
+    """
+    Compare two benchmark reports case by case on their fastest run.
+
+    Args:
+        baseline: Earlier report
+        current: New report
+        threshold: Relative slowdown that counts as a regression, 0.2 = 20%
+
+    Returns:
+        dict: Per case baseline, current and change, plus the regressed cases
+    """
+    cases = {}
+    regressions = []
+    for name, result in current["results"].items():
+        before = baseline["results"].get(name) or {}
+        if "min_seconds" not in result or "min_seconds" not in before:
+            cases[name] = {"baseline": before.get("min_seconds"), "current": result.get("min_seconds")}
+            continue
+
+        change = (result["min_seconds"] - before["min_seconds"]) / before["min_seconds"] if before["min_seconds"] else 0
+        cases[name] = {
+            "baseline": before["min_seconds"],
+            "current": result["min_seconds"],
+            "change": round(change, 4)
+        }
+        if change > threshold:
+            regressions.append(name)
+
+    mismatched = [
+        key for key in ("scale", "companies", "sample")
+        if baseline["meta"].get(key) != current["meta"].get(key)
+    ]
+    return {"cases": cases, "regressions": regressions, "mismatched_meta": mismatched}
@@ -0,0 +1,439 @@
+from typing import Dict, Any, List, Iterator, Optional
+import random
+import frappe
+from frappe.utils import now, add_days, getdate, cint, flt
+from pajak_indonesia.tax_accounts import TaxAccountResolver
+from pajak_indonesia.pelaporan.rollup import rebuild_rollup
+from pajak_indonesia.spt.running_totals import rebuild_running_totals
+
+DEFAULT_SCALE = 10000
+CHUNK_SIZE = 10000
+PPN_RATE = 11
+PPH_23_RATE = 2
+
+# Tax accounts created under the company's Duties and Taxes group
+TAX_ACCOUNTS = {
+    "ppn_output": "PPN Output",
+    "ppn_input": "PPN Input",
+    "pph_21": "PPh 21 Payable",
+    "pph_23": "PPh 23 Payable"
+}
+
+class SyntheticDataset:
+    """
+    Seeds synthetic tax data for the benchmark suite.
+
+    `scale` is the number of Sales Invoices per company, the other
+    DocTypes follow from RATIOS, so scale=1000000 with three companies
+    writes about ten million rows including child rows and GL Entries.
+    Companies, customers and suppliers are regular documents; invoices,
+    their child rows, GL Entries and Salary Slips are bulk inserted as
+    submitted rows without running controllers and committed per chunk.
+    Every seeded name starts with the dataset prefix, so purge() removes
+    exactly what was seeded.
+    """
+
+    RATIOS = {
+        "Customer": 0.01,
+        "Supplier": 0.005,
+        "Purchase Invoice": 0.5,
+        "Salary Slip": 0.1
+    }
+
+    def __init__(self, prefix: str = "BENCH", companies: int = 1, scale: int = DEFAULT_SCALE,
+                 year: int = 2000, seed: int = 42):
+        self.prefix = prefix
+        self.company_count = max(cint(companies), 1)
+        self.scale = max(cint(scale), 1)
+        self.year = cint(year)
+        self.random = random.Random(seed)
+        self.companies = [f"{prefix} Company {i + 1}" for i in range(self.company_count)]
+
+    def count(self, doctype: str) -> int:
+        return max(int(self.scale * self.RATIOS.get(doctype, 1)), 1)
+
+    def seed(self) -> Dict[str, Any]:
+        """
+        Seed every company of the dataset.
+
+        Returns:
+            dict: Companies, their tax accounts and rows written per DocType
+        """
+        rows = {}
+        accounts = {}
+        for company in self.companies:
+            accounts[company] = self.ensure_company(company)
+            customers = self.ensure_parties(company, "Customer")
+            suppliers = self.ensure_parties(company, "Supplier")
+
+            for written in (
+                self.insert_sales_invoices(company, accounts[company], customers),
+                self.insert_purchase_invoices(company, accounts[company], suppliers),
+                {"Salary Slip": self.insert_salary_slips(company)}
+            ):
+                for doctype, count in written.items():
+                    rows[doctype] = rows.get(doctype, 0) + count
+
+            # Derived data is rebuilt the same way production data would be
+            rebuild_rollup(company)
+            rebuild_running_totals(company)
+            frappe.db.commit()
+
+        return {"companies": self.companies, "accounts": accounts, "rows": rows}
+
+    def purge(self) -> None:
+        """Delete every row seeded with the dataset prefix"""
+        pattern = f"{self.prefix}-%"
+        for parent, children in (
+            ("Sales Invoice", ("Sales Invoice Item", "Sales Taxes and Charges")),
+            ("Purchase Invoice", ("Purchase Invoice Item", "Purchase Taxes and Charges"))
+        ):
+            for child in children:
+                frappe.db.sql(f"DELETE FROM `tab{child}` WHERE parent LIKE %s", pattern)
+            frappe.db.sql(f"DELETE FROM `tab{parent}` WHERE name LIKE %s", pattern)
+
+        frappe.db.sql("DELETE FROM `tabEfaktur Document Item` WHERE parent LIKE %s", pattern)
+        frappe.db.sql("DELETE FROM `tabGL Entry` WHERE name LIKE %s", pattern)
+        frappe.db.sql("DELETE FROM `tabSalary Slip` WHERE name LIKE %s", pattern)
+        for doctype in ("Efaktur Document", "Ebupot Document", "Tax Filing Summary"):
+            frappe.db.delete(doctype, {"company": ["in", self.companies]})
+
+        for company in self.companies:
+            rebuild_rollup(company)
+            rebuild_running_totals(company)
+        frappe.db.commit()
+
+    def ensure_company(self, company: str) -> Dict[str, str]:
+        """Create the company and its tax accounts, returns the accounts by role"""
+        if not frappe.db.exists("Company", company):
+            frappe.get_doc({
+                "doctype": "Company",
+                "company_name": company,
+                "abbr": self.get_abbr(company),
+                "default_currency": "IDR",
+                "country": "Indonesia",
+                "create_chart_of_accounts_based_on": "Standard Template",
+                "chart_of_accounts": "Standard"
+            }).insert(ignore_permissions=True)
+
+        abbr = frappe.get_cached_value("Company", company, "abbr")
+        tax_group = frappe.db.get_value(
+            "Account", {"company": company, "is_group": 1, "account_type": "Tax"}, "name"
+        ) or frappe.db.get_value(
+            "Account", {"company": company, "is_group": 1, "root_type": "Liability"}, "name"
+        )
+
+        accounts = {}
+        for role, account_name in TAX_ACCOUNTS.items():
+            name = f"{account_name} - {abbr}"
+            if not frappe.db.exists("Account", name):
+                frappe.get_doc({
+                    "doctype": "Account",
+                    "account_name": account_name,
+                    "parent_account": tax_group,
+                    "company": company,
+                    "account_type": "Tax",
+                    "root_type": "Asset" if role == "ppn_input" else "Liability"
+                }).insert(ignore_permissions=True)
+            accounts[role] = name
+
+        for role, account_type, root_type in (
+            ("receivable", "Receivable", "Asset"),
+            ("payable", "Payable", "Liability"),
+            ("income", "Income Account", "Income"),
+            ("expense", "Expense Account", "Expense")
+        ):
+            accounts[role] = frappe.db.get_value(
+                "Account",
+                {"company": company, "is_group": 0, "account_type": account_type},
+                "name"
+            ) or frappe.db.get_value(
+                "Account",
+                {"company": company, "is_group": 0, "root_type": root_type},
+                "name"
+            )
+
+        if not frappe.db.exists("Efaktur Config", {"company": company}):
+            frappe.get_doc({
+                "doctype": "Efaktur Config",
+                "company": company,
+                "is_active": 1,
+                "ranges": [{
+                    "prefix": "010.000-00",
+                    "range_start": 1,
+                    "range_end": 99999999,
+                    "next_number": 1,
+                    "is_active": 1
+                }]
+            }).insert(ignore_permissions=True)
+
+        TaxAccountResolver.invalidate(company)
+        frappe.db.commit()
+        return accounts
+
+    def ensure_parties(self, company: str, doctype: str) -> List[str]:
+        """Create the synthetic customers or suppliers of a company"""
+        abbr = frappe.get_cached_value("Company", company, "abbr")
+        names = [f"{self.prefix} {doctype} {abbr} {i:06d}" for i in range(self.count(doctype))]
+        existing = set(frappe.get_all(doctype, filters={"name": ["in", names]}, pluck="name"))
+
+        group_field, group_doctype = (
+            ("customer_group", "Customer Group") if doctype == "Customer" else ("supplier_group", "Supplier Group")
+        )
+        group = frappe.db.get_value(group_doctype, {"is_group": 0}, "name")
+        name_field = frappe.scrub(doctype) + "_name"
+
+        for name in names:
+            if name in existing:
+                continue
+            party = frappe.get_doc({
+                "doctype": doctype,
+                name_field: name,
+                group_field: group,
+                "tax_id": self.npwp()
+            })
+            if doctype == "Customer":
+                party.territory = frappe.db.get_value("Territory", {"is_group": 0}, "name")
+            party.flags.ignore_mandatory = True
+            party.insert(ignore_permissions=True, set_name=name)
+
+        frappe.db.commit()
+        return names
+
+    def insert_sales_invoices(self, company: str, accounts: Dict[str, str],
+                              customers: List[str]) -> Dict[str, int]:
+        """Bulk insert submitted Sales Invoices with a PPN Output row and their GL Entries"""
+        abbr = frappe.get_cached_value("Company", company, "abbr")
+        rows = {"Sales Invoice": [], "Sales Invoice Item": [], "Sales Taxes and Charges": [], "GL Entry": [],
+                "Efaktur Document": [], "Efaktur Document Item": []}
+        written = dict.fromkeys(rows, 0)
+
+        for i in range(self.count("Sales Invoice")):
+            name = f"{self.prefix}-SI-{abbr}-{i:08d}"
+            posting_date = self.posting_date(i)
+            customer = customers[i % len(customers)]
+            net = flt(self.random.randrange(100, 100000) * 1000)
+            ppn = flt(round(net * PPN_RATE / 100))
+
+            rows["Sales Invoice"].append(self.submitted(name, {
+                "company": company, "customer": customer, "customer_name": customer,
+                "posting_date": posting_date, "due_date": posting_date, "currency": "IDR",
+                "conversion_rate": 1, "debit_to": accounts["receivable"],
+                "net_total": net, "base_net_total": net, "total_taxes_and_charges": ppn,
+                "base_total_taxes_and_charges": ppn, "grand_total": net + ppn,
+                "base_grand_total": net + ppn, "outstanding_amount": net + ppn, "status": "Unpaid",
+                # Every second invoice already has its e-Faktur, the rest are left to the benchmarks
+                "has_generated_efaktur": 0 if i % 2 else 1
+            }))
+            if not i % 2:
+                self.add_efaktur(rows, company, name, customer, posting_date, net, ppn)
+            rows["Sales Invoice Item"].append(self.child(f"{name}-1", name, "Sales Invoice", "items", {
+                "item_name": "Benchmark Item", "description": "Benchmark Item", "qty": 1, "uom": "Nos",
+                "conversion_factor": 1, "rate": net, "amount": net, "base_rate": net,
+                "base_amount": net, "net_amount": net, "base_net_amount": net,
+                "income_account": accounts["income"]
+            }))
+            rows["Sales Taxes and Charges"].append(self.child(f"{name}-T1", name, "Sales Invoice", "taxes", {
+                "charge_type": "On Net Total", "account_head": accounts["ppn_output"], "description": "PPN",
+                "rate": PPN_RATE, "tax_amount": ppn, "base_tax_amount": ppn,
+                "total": net + ppn, "base_total": net + ppn
+            }))
+            rows["GL Entry"].extend([
+                self.gl_entry(f"{name}-G1", company, posting_date, accounts["receivable"],
+                              "Sales Invoice", name, debit=net + ppn),
+                self.gl_entry(f"{name}-G2", company, posting_date, accounts["income"],
+                              "Sales Invoice", name, credit=net),
+                self.gl_entry(f"{name}-G3", company, posting_date, accounts["ppn_output"],
+                              "Sales Invoice", name, credit=ppn, tax_type="PPN_OUT")
+            ])
+            self.flush(rows, written)
+
+        self.flush(rows, written, force=True)
+        return written
+
+    def insert_purchase_invoices(self, company: str, accounts: Dict[str, str],
+                                 suppliers: List[str]) -> Dict[str, int]:
+        """Bulk insert submitted Purchase Invoices with PPN Input and, every second one, PPh 23"""
+        abbr = frappe.get_cached_value("Company", company, "abbr")
+        rows = {"Purchase Invoice": [], "Purchase Invoice Item": [], "Purchase Taxes and Charges": [], "GL Entry": [],
+                "Ebupot Document": []}
+        written = dict.fromkeys(rows, 0)
+
+        for i in range(self.count("Purchase Invoice")):
+            name = f"{self.prefix}-PI-{abbr}-{i:08d}"
+            posting_date = self.posting_date(i)
+            supplier = suppliers[i % len(suppliers)]
+            net = flt(self.random.randrange(100, 50000) * 1000)
+            ppn = flt(round(net * PPN_RATE / 100))
+            pph = flt(round(net * PPH_23_RATE / 100)) if i % 2 else 0
+
+            rows["Purchase Invoice"].append(self.submitted(name, {
+                "company": company, "supplier": supplier, "supplier_name": supplier,
+                "bill_no": name, "posting_date": posting_date, "due_date": posting_date,
+                "currency": "IDR", "conversion_rate": 1, "credit_to": accounts["payable"],
+                "net_total": net, "base_net_total": net, "total_taxes_and_charges": ppn - pph,
+                "base_total_taxes_and_charges": ppn - pph, "grand_total": net + ppn - pph,
+                "base_grand_total": net + ppn - pph, "outstanding_amount": net + ppn - pph,
+                "status": "Unpaid"
+            }))
+            rows["Purchase Invoice Item"].append(self.child(f"{name}-1", name, "Purchase Invoice", "items", {
+                "item_name": "Benchmark Item", "description": "Benchmark Item", "qty": 1, "uom": "Nos",
+                "conversion_factor": 1, "rate": net, "amount": net, "base_rate": net,
+                "base_amount": net, "net_amount": net, "base_net_amount": net,
+                "expense_account": accounts["expense"]
+            }))
+            rows["Purchase Taxes and Charges"].append(self.child(f"{name}-T1", name, "Purchase Invoice", "taxes", {
+                "charge_type": "On Net Total", "category": "Total", "add_deduct_tax": "Add",
+                "account_head": accounts["ppn_input"], "description": "PPN", "rate": PPN_RATE,
+                "tax_amount": ppn, "base_tax_amount": ppn, "total": net + ppn, "base_total": net + ppn
+            }))
+            rows["GL Entry"].extend([
+                self.gl_entry(f"{name}-G1", company, posting_date, accounts["expense"],
+                              "Purchase Invoice", name, debit=net),
+                self.gl_entry(f"{name}-G2", company, posting_date, accounts["ppn_input"],
+                              "Purchase Invoice", name, debit=ppn, tax_type="PPN_IN"),
+                self.gl_entry(f"{name}-G3", company, posting_date, accounts["payable"],
+                              "Purchase Invoice", name, credit=net + ppn - pph)
+            ])
+            if pph:
+                rows["Purchase Taxes and Charges"].append(self.child(f"{name}-T2", name, "Purchase Invoice", "taxes", {
+                    "idx": 2, "charge_type": "On Net Total", "category": "Total", "add_deduct_tax": "Deduct",
+                    "account_head": accounts["pph_23"], "description": "PPh 23", "rate": PPH_23_RATE,
+                    # Withholding rows are recognized by their negative amount
+                    "tax_amount": -pph, "base_tax_amount": -pph, "total": net + ppn - pph,
+                    "base_total": net + ppn - pph
+                }))
+                rows["GL Entry"].append(
+                    self.gl_entry(f"{name}-G4", company, posting_date, accounts["pph_23"],
+                                  "Purchase Invoice", name, credit=pph, tax_type="PPH_23")
+                )
+                # Half of the PPh invoices already have their E-Bupot
+                if i % 4 == 1:
+                    self.add_ebupot(rows, company, name, supplier, posting_date, net, pph)
+            self.flush(rows, written)
+
+        self.flush(rows, written, force=True)
+        return written
+
+    def insert_salary_slips(self, company: str) -> int:
+        """Bulk insert submitted Salary Slips with PPh 21"""
+        abbr = frappe.get_cached_value("Company", company, "abbr")
+        rows = {"Salary Slip": []}
+        written = {"Salary Slip": 0}
+
+        for i in range(self.count("Salary Slip")):
+            posting_date = self.posting_date(i)
+            gross = flt(self.random.randrange(5000, 50000) * 1000)
+            tax = flt(round(gross * 0.05))
+            rows["Salary Slip"].append(self.submitted(f"{self.prefix}-SS-{abbr}-{i:08d}", {
+                "company": company, "employee": f"{self.prefix}-EMP-{i % 1000:04d}",
+                "employee_name": f"Benchmark Employee {i % 1000}", "posting_date": posting_date,
+                "start_date": posting_date.replace(day=1), "end_date": posting_date,
+                "currency": "IDR", "gross_pay": gross, "base_gross_pay": gross,
+                "total_tax_deducted": tax, "net_pay": gross - tax, "base_net_pay": gross - tax,
+                "status": "Submitted"
+            }))
+            self.flush(rows, written)
+
+        self.flush(rows, written, force=True)
+        return written["Salary Slip"]
+
+    def add_efaktur(self, rows: Dict[str, List[Dict[str, Any]]], company: str, invoice: str,
+                    customer: str, posting_date, dpp: float, ppn: float) -> None:
+        name = f"{invoice}-EF"
+        rows["Efaktur Document"].append(self.submitted(name, {
+            "company": company, "kode_jenis_transaksi": "01", "fg_pengganti": "0",
+            "nomor_faktur": f"{self.prefix}-{invoice[-8:]}", "masa_pajak": posting_date.strftime("%m"),
+            "tahun_pajak": str(posting_date.year), "tanggal_faktur": posting_date, "npwp": self.npwp(),
+            "nama": customer, "alamat_lengkap": "Indonesia", "jumlah_dpp": dpp, "jumlah_ppn": ppn,
+            "jumlah_ppnbm": 0, "fg_uang_muka": "0", "reference_doctype": "Sales Invoice",
+            "reference_name": invoice, "status": "Submitted"
+        }))
+        rows["Efaktur Document Item"].append(self.child(f"{name}-1", name, "Efaktur Document", "items", {
+            "nama_barang": "Benchmark Item", "harga_satuan": dpp, "jumlah_barang": 1, "harga_total": dpp,
+            "diskon": 0, "dpp": dpp, "ppn": ppn, "tarif_ppnbm": 0, "ppnbm": 0
+        }))
+
+    def add_ebupot(self, rows: Dict[str, List[Dict[str, Any]]], company: str, invoice: str,
+                   supplier: str, posting_date, bruto: float, pph: float) -> None:
+        rows["Ebupot Document"].append(self.submitted(f"{invoice}-EB", {
+            "company": company, "jenis_pajak": "23", "jenis_daftar": "0 - Normal",
+            "masa_pajak": posting_date.strftime("%m"), "tahun_pajak": str(posting_date.year),
+            "tandatangan_date": posting_date, "npwp_pemotong": "000000000000000",
+            "nama_pemotong": company, "alamat_pemotong": "Indonesia", "npwp_terpotong": self.npwp(),
+            "nama_terpotong": supplier, "supplier": supplier, "alamat_terpotong": "Indonesia",
+            "reference_doctype": "Purchase Invoice", "reference_name": invoice,
+            "penghasilan_bruto": bruto, "tarif": PPH_23_RATE, "pph_dipotong": pph, "status": "Submitted"
+        }))
+
+    def flush(self, rows: Dict[str, List[Dict[str, Any]]], written: Dict[str, int], force: bool = False) -> None:
+        """Bulk insert and commit the buffered rows once a chunk is full"""
+        if not force and max(len(buffered) for buffered in rows.values()) < CHUNK_SIZE:
+            return
+
+        for doctype, buffered in rows.items():
+            if buffered:
+                insert_rows(doctype, buffered)
+                written[doctype] += len(buffered)
+                buffered.clear()
+        frappe.db.commit()
+
+    def posting_date(self, i: int):
+        """Spread documents evenly over the months of the dataset year"""
+        return add_days(getdate(f"{self.year}-{i % 12 + 1:02d}-01"), i % 28)
+
+    def npwp(self) -> str:
+        return "".join(str(self.random.randrange(10)) for _i in range(15))
+
+    def submitted(self, name: str, values: Dict[str, Any]) -> Dict[str, Any]:
+        timestamp = now()
+        return dict(values, name=name, creation=timestamp, modified=timestamp,
+                    owner="Administrator", modified_by="Administrator", docstatus=1)
+
+    def child(self, name: str, parent: str, parenttype: str, parentfield: str,
+              values: Dict[str, Any]) -> Dict[str, Any]:
+        return dict({"idx": 1}, **self.submitted(name, dict(
+            values, parent=parent, parenttype=parenttype, parentfield=parentfield
+        )))
+
+    def gl_entry(self, name: str, company: str, posting_date, account: str, voucher_type: str,
+                 voucher_no: str, debit: float = 0, credit: float = 0,
+                 tax_type: Optional[str] = None) -> Dict[str, Any]:
+        values = {
+            "company": company, "posting_date": posting_date, "account": account,
+            "voucher_type": voucher_type, "voucher_no": voucher_no,
+            "debit": debit, "credit": credit,
+            "debit_in_account_currency": debit, "credit_in_account_currency": credit,
+            "account_currency": "IDR", "is_cancelled": 0,
+            "fiscal_year": str(getdate(posting_date).year),
+            # Same columns on every row, bulk_insert takes the fields of the first one
+            "tax_type": tax_type,
+            "tax_source_type": voucher_type if tax_type else None,
+            "tax_source": voucher_no if tax_type else None
+        }
+        return self.submitted(name, values)
+
+    @staticmethod
+    def get_abbr(company: str) -> str:
+        return "".join(word[0] for word in company.split()[:-1]).upper() + company.split()[-1]
+
+def insert_rows(doctype: str, rows: List[Dict[str, Any]]) -> None:
+    """Bulk insert dict rows, keeping only columns the site's table has"""
+    columns = set(frappe.db.get_table_columns(doctype))
+    fields = [field for field in rows[0] if field in columns]
+    frappe.db.bulk_insert(
+        doctype,
+        fields=fields,
+        values=[tuple(row.get(field) for field in fields) for row in rows],
+        chunk_size=CHUNK_SIZE
+    )
+
+def iter_names(doctype: str, company: str, limit: int) -> Iterator[str]:
+    """Names of seeded submitted documents of a company, oldest first"""
+    yield from frappe.get_all(
+        doctype,
+        filters={"company": company, "docstatus": 1},
+        order_by="name asc",
+        limit_page_length=limit,
+        pluck="name"
+    )
@@ -0,0 +1,85 @@
+from typing import Dict, Any, List
+import time
+import frappe
+from frappe.utils import now, nowdate
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+
+def run(company: str, sizes: List[int] = DEFAULT_SIZES) -> List[Dict[str, Any]]:
+    """
+    Time Tax Filing Summary validation, submit and cancel for large PPN filings.
+
+    Synthetic submitted Efaktur Documents are bulk inserted as source
+    documents. Everything is rolled back at the end, so the benchmark can
+    run on a copy of a production site:
+
+        bench --site test execute pajak_indonesia.benchmarks.tax_filing.run \
+            --kwargs "{'company': '_Test Company IDN'}"
+
+    Args:
+        company: Company of the synthetic documents
+        sizes: Source row counts to measure
+
+    Returns:
+        list: One dict per size with seconds and rows per second of each phase
+    """
+    results = []
+    try:
+        names = make_efaktur_documents(company, max(sizes))
+
+        for size in sizes:
+            filing = frappe.new_doc("Tax Filing Summary")
+            filing.update({
+                "company": company,
+                "posting_date": nowdate(),
+                "jenis_pelaporan": "SPT Masa PPN",
+                "masa_pajak": "01",
+                "tahun_pajak": "2000",
+                "tanggal_pelaporan": nowdate()
+            })
+            for name in names[:size]:
+                filing.append("source_documents", {
+                    "document_type": "Efaktur Document",
+                    "document_name": name
+                })
+
+            result = {"source_rows": size}
+            for phase, method in (
+                ("validate", filing.update_document_details),
+                ("submit", filing.on_submit),
+                ("cancel", filing.on_cancel)
+            ):
+                started = time.perf_counter()
+                method()
+                elapsed = time.perf_counter() - started
+                result[f"{phase}_seconds"] = round(elapsed, 3)
+                result[f"{phase}_rows_per_second"] = round(size / elapsed, 1) if elapsed else 0
+
+            results.append(result)
+    finally:
+        frappe.db.rollback()
+
+    return results
+
+def make_efaktur_documents(company: str, count: int) -> List[str]:
+    """Bulk insert submitted Efaktur Documents without running controllers"""
+    timestamp = now()
+    prefix = f"BENCH-{frappe.generate_hash(length=6)}"
+    names = [f"{prefix}-{i:07d}" for i in range(count)]
+
+    frappe.db.bulk_insert(
+        "Efaktur Document",
+        fields=["name", "creation", "modified", "owner", "modified_by", "docstatus",
+                "company", "kode_jenis_transaksi", "fg_pengganti", "nomor_faktur",
+                "masa_pajak", "tahun_pajak", "tanggal_faktur", "npwp", "nama",
+                "jumlah_dpp", "jumlah_ppn", "status"],
+        values=[
+            (name, timestamp, timestamp, "Administrator", "Administrator", 1,
+             company, "01", "0", name, "01", "2000", "2000-01-01", "000000000000000",
+             "Benchmark", 1000000, 110000, "Submitted")
+            for name in names
+        ],
+        chunk_size=10000
+    )
+
+    return names
@@ -0,0 +1,316 @@
+from typing import Optional, List, Dict, Any, Tuple
+from collections import defaultdict
+import frappe
+from frappe import _
+from frappe.model.naming import parse_naming_series
+from frappe.utils import cint, now
+from pajak_indonesia.jobs import BulkJobProgress, chunk_list
+from pajak_indonesia.ebupot.utils import build_ebupot_document, get_company_address
+from pajak_indonesia.ebupot.classifier import PPhTaxClassifier
+from pajak_indonesia.party_profile import get_party_profiles
+from pajak_indonesia.profiling import profiled
+
+DEFAULT_CHUNK_SIZE = 500
+INSERT_BATCH_SIZE = 200
+NAMING_SERIES = "BP.YY.MM.####"
+
+@frappe.whitelist()
+@profiled
+def enqueue_bulk_ebupot(company: str, from_date: Optional[str] = None, to_date: Optional[str] = None,
+                        invoices: Optional[Any] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Enqueue E-Bupot creation for a backlog of submitted Purchase Invoices.
+
+    Pairs with the `defer_ebupot_on_import` site config, which leaves
+    imported invoices to this job instead of the on_submit hook.
+
+    Args:
+        company: Company name
+        from_date: Optional start of the posting date range
+        to_date: Optional end of the posting date range
+        invoices: Optional list (or JSON list) of Purchase Invoice names
+        chunk_size: Number of invoices handled by one background job
+
+    Returns:
+        dict: batch_id to poll with get_bulk_ebupot_status, plus totals
+    """
+    frappe.only_for(["System Manager", "Accounts Manager", "Tax Manager"])
+
+    if not (invoices or (from_date and to_date)):
+        frappe.throw(_("Either a date range or a list of invoices is required"))
+
+    if isinstance(invoices, str):
+        invoices = frappe.parse_json(invoices)
+
+    pending = get_pending_invoices(company, from_date, to_date, invoices)
+    chunks = chunk_list(pending, cint(chunk_size) or DEFAULT_CHUNK_SIZE)
+
+    progress = BulkJobProgress("ebupot")
+    progress.start(len(pending), len(chunks))
+
+    for chunk in chunks:
+        frappe.enqueue(
+            "pajak_indonesia.ebupot.bulk.process_ebupot_chunk",
+            queue="long",
+            timeout=3600,
+            company=company,
+            invoices=chunk,
+            batch_id=progress.batch_id
+        )
+
+    return {
+        "batch_id": progress.batch_id,
+        "total": len(pending),
+        "chunks": len(chunks)
+    }
+
+@frappe.whitelist()
+@profiled
+def get_bulk_ebupot_status(batch_id: str) -> Dict[str, Any]:
+    """Get progress and per-invoice failures of a bulk E-Bupot batch"""
+    return BulkJobProgress("ebupot", batch_id).get_status()
+
+def get_pending_invoices(company: str, from_date: Optional[str], to_date: Optional[str],
+                         invoices: Optional[List[str]]) -> List[str]:
+    """
+    Get submitted Purchase Invoices with a deducted tax row and no E-Bupot yet.
+
+    One anti-join against Ebupot Document replaces the existence check the
+    on_submit hook runs per invoice. Deducted rows that turn out not to be
+    PPh are reported by the chunk job.
+    """
+    conditions = []
+    values = {"company": company}
+
+    if invoices:
+        conditions.append("AND pi.name IN %(invoices)s")
+        values["invoices"] = tuple(invoices)
+    if from_date and to_date:
+        conditions.append("AND pi.posting_date BETWEEN %(from_date)s AND %(to_date)s")
+        values.update({"from_date": from_date, "to_date": to_date})
+
+    return frappe.db.sql_list(f"""
+        SELECT pi.name
+        FROM `tabPurchase Invoice` pi
+        WHERE pi.company = %(company)s AND pi.docstatus = 1
+        {" ".join(conditions)}
+        AND EXISTS (
+            SELECT 1 FROM `tabPurchase Taxes and Charges` tax
+            WHERE tax.parent = pi.name AND tax.parenttype = 'Purchase Invoice'
+            AND tax.tax_amount < 0
+        )
+        AND NOT EXISTS (
+            SELECT 1 FROM `tabEbupot Document` eb
+            WHERE eb.reference_doctype = 'Purchase Invoice' AND eb.reference_name = pi.name
+        )
+        ORDER BY pi.posting_date ASC, pi.name ASC
+    """, values)
+
+def process_ebupot_chunk(company: str, invoices: List[str], batch_id: str) -> Dict[str, Any]:
+    """
+    Create E-Bupot documents for one chunk of Purchase Invoices.
+
+    Args:
+        company: Company name
+        invoices: Purchase Invoice names of this chunk
+        batch_id: Bulk batch the chunk belongs to
+
+    Returns:
+        dict: Batch progress after this chunk
+    """
+    progress = BulkJobProgress("ebupot", batch_id)
+    created, failures = make_ebupot_documents_bulk(company, invoices)
+    frappe.db.commit()
+
+    if failures:
+        frappe.log_error(
+            message="\n".join(f"{f['name']}: {f['error']}" for f in failures),
+            title="Bulk E-Bupot Creation Error"
+        )
+
+    return progress.record_chunk(len(created), failures)
+
+def make_ebupot_documents_bulk(company: str, invoices: List[str]) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Create the E-Bupot documents of many Purchase Invoices, does not commit.
+
+    Invoices, items and PPh rows are prefetched with one query per
+    table, supplier profiles from the party profile cache. The documents are validated one
+    by one, named from one reserved block of the naming series and
+    written with multi-row inserts.
+
+    Returns:
+        tuple: Invoices that got their E-Bupots, and one
+            {"name": ..., "error": ...} per skipped invoice
+    """
+    context = EbupotBatchContext(company, invoices).load()
+    failures = []
+    documents = []
+    created = []
+
+    for name in invoices:
+        if name not in context.invoices:
+            failures.append({"name": name, "error": _("Invoice is not pending E-Bupot creation")})
+        elif not context.pph_taxes.get(name):
+            failures.append({"name": name, "error": _("No PPh 23 or PPh 26 tax found in invoice")})
+        else:
+            try:
+                invoice_documents = [context.build_document(name, pph_type) for pph_type in context.pph_taxes[name]]
+                for ebupot in invoice_documents:
+                    ebupot.validate()
+            except Exception as e:
+                failures.append({"name": name, "error": str(e)})
+            else:
+                documents.extend(invoice_documents)
+                created.append(name)
+
+    insert_documents(documents)
+    return created, failures
+
+def insert_documents(documents: List[Any], batch_size: int = INSERT_BATCH_SIZE) -> None:
+    """Name validated E-Bupots from one series block and insert them with their items"""
+    if not documents:
+        return
+
+    names = reserve_names(NAMING_SERIES, len(documents))
+    timestamp = now()
+    parents, children = [], []
+    for ebupot, name in zip(documents, names):
+        ebupot.update({
+            "name": name,
+            "naming_series": NAMING_SERIES,
+            "owner": frappe.session.user,
+            "modified_by": frappe.session.user,
+            "creation": timestamp,
+            "modified": timestamp,
+            "docstatus": 0
+        })
+        parents.append(ebupot.get_valid_dict(convert_dates_to_str=True))
+        for idx, item in enumerate(ebupot.items, 1):
+            item.update({
+                "name": frappe.generate_hash(length=10),
+                "parent": name,
+                "parenttype": ebupot.doctype,
+                "parentfield": "items",
+                "idx": idx,
+                "owner": ebupot.owner,
+                "modified_by": ebupot.modified_by,
+                "creation": timestamp,
+                "modified": timestamp,
+                "docstatus": 0
+            })
+            children.append(item.get_valid_dict(convert_dates_to_str=True))
+
+    insert_rows("Ebupot Document", parents, batch_size)
+    insert_rows("Ebupot Document Item", children, batch_size)
+
+def insert_rows(doctype: str, rows: List[Dict[str, Any]], batch_size: int) -> None:
+    fields = list(rows[0])
+    frappe.db.bulk_insert(
+        doctype,
+        fields=fields,
+        values=[tuple(row.get(field) for field in fields) for row in rows],
+        chunk_size=batch_size
+    )
+
+def reserve_names(naming_series: str, count: int) -> List[str]:
+    """
+    Reserve `count` consecutive names of a naming series in one update.
+
+    The Series row stays locked for the rest of the transaction, so
+    concurrent chunks and single inserts never receive the same names.
+    """
+    prefix_parts, _sep, hashes = naming_series.rpartition(".")
+    prefix = parse_naming_series(prefix_parts)
+    digits = len(hashes)
+
+    current = frappe.db.sql("SELECT `current` FROM `tabSeries` WHERE `name` = %s FOR UPDATE", prefix)
+    if current and current[0][0] is not None:
+        start = cint(current[0][0])
+        frappe.db.sql("UPDATE `tabSeries` SET `current` = `current` + %s WHERE `name` = %s", (count, prefix))
+    else:
+        start = 0
+        frappe.db.sql("INSERT INTO `tabSeries` (`name`, `current`) VALUES (%s, %s)", (prefix, count))
+
+    return [f"{prefix}{number:0{digits}d}" for number in range(start + 1, start + count + 1)]
+
+class EbupotBatchContext:
+    """Prefetched invoice, item, PPh and supplier profile data for a chunk of invoices"""
+
+    def __init__(self, company: str, invoice_names: List[str]):
+        self.company = company
+        self.invoice_names = invoice_names
+        self.invoices = {}
+        self.items = defaultdict(list)
+        self.pph_taxes = {}
+        self.suppliers = {}
+        self.npwp_pemotong = None
+        self.alamat_pemotong = None
+
+    def load(self) -> "EbupotBatchContext":
+        """Fetch all data of the chunk with one query per table"""
+        if not self.invoice_names:
+            return self
+
+        for invoice in frappe.db.sql("""
+            SELECT pi.name, pi.company, pi.supplier, pi.supplier_name, pi.posting_date,
+                pi.address_display, pi.base_net_total
+            FROM `tabPurchase Invoice` pi
+            WHERE pi.name IN %(names)s AND pi.company = %(company)s AND pi.docstatus = 1
+            AND NOT EXISTS (
+                SELECT 1 FROM `tabEbupot Document` eb
+                WHERE eb.reference_doctype = 'Purchase Invoice' AND eb.reference_name = pi.name
+            )
+        """, {"names": tuple(self.invoice_names), "company": self.company}, as_dict=1):
+            self.invoices[invoice.name] = invoice
+
+        if not self.invoices:
+            return self
+
+        names = list(self.invoices)
+
+        for item in frappe.get_all(
+            "Purchase Invoice Item",
+            filters={"parent": ["in", names], "parenttype": "Purchase Invoice"},
+            fields=["parent", "item_code", "item_name", "description"],
+            order_by="parent asc, idx asc"
+        ):
+            self.items[item.parent].append(item)
+
+        self.load_pph_taxes(names)
+        self.suppliers = get_party_profiles("Supplier", {invoice.supplier for invoice in self.invoices.values()})
+
+        self.npwp_pemotong = frappe.db.get_value("Company", self.company, "tax_id")
+        self.alamat_pemotong = get_company_address(self.company)
+        return self
+
+    def load_pph_taxes(self, names: List[str]) -> None:
+        """Classify the deducted tax rows of every invoice in one pass"""
+        self.pph_taxes = PPhTaxClassifier.for_company(self.company).classify_rows(
+            frappe.get_all(
+                "Purchase Taxes and Charges",
+                filters={
+                    "parent": ["in", names],
+                    "parenttype": "Purchase Invoice",
+                    "tax_amount": ["<", 0]
+                },
+                fields=["parent", "account_head", "description", "tax_amount"],
+                order_by="parent asc, idx asc"
+            ),
+            {name: invoice.base_net_total for name, invoice in self.invoices.items()}
+        )
+
+    def build_document(self, invoice_name: str, pph_type: str):
+        """Build the unsaved Ebupot Document of one PPh type of a prefetched invoice"""
+        invoice = self.invoices[invoice_name]
+        return build_ebupot_document(
+            invoice,
+            pph_type,
+            self.pph_taxes[invoice_name][pph_type],
+            self.suppliers.get(invoice.supplier) or frappe._dict(),
+            self.items[invoice_name],
+            npwp_pemotong=self.npwp_pemotong,
+            alamat_pemotong=self.alamat_pemotong,
+            alamat_terpotong=invoice.address_display
+                or (self.suppliers.get(invoice.supplier) or {}).get("address") or "Indonesia"
+        )
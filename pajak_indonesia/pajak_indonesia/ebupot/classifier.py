@@ -0,0 +1,156 @@
+from typing import Optional, Dict, Any, List, Tuple, Iterable
+import re
+import frappe
+from frappe.utils import flt
+from pajak_indonesia.tax_accounts import get_pph_account
+
+# Description fallbacks used after the configured rules, in priority order
+DEFAULT_DESCRIPTION_RULES = (
+    ("23", r"pph 23|withholding"),
+    ("26", r"pph 26"),
+)
+
+MAX_CACHED_DESCRIPTIONS = 10000
+
+class PPhTaxClassifier:
+    """
+    Classifies Purchase Taxes and Charges rows as PPh 23 or PPh 26.
+
+    Built once per company: accounts are looked up in a hash map and
+    descriptions are matched with one compiled regex. Every rule is a
+    lookahead alternative anchored at the start of the description, so
+    the first rule in priority order wins, not the leftmost match in the
+    text. Account rules of PPh Classification Rule extend the resolved
+    PPh 23/26 accounts, its description rules come before the defaults.
+    """
+
+    def __init__(self, account_types: Dict[str, str],
+                 description_rules: Iterable[Tuple[str, str]] = DEFAULT_DESCRIPTION_RULES):
+        self.account_types = account_types
+        self.description_types = {}
+        self.group_types = {}
+        alternatives = []
+        for i, (pph_type, pattern) in enumerate(description_rules):
+            self.group_types[f"r{i}"] = pph_type
+            alternatives.append(f"(?=.*?(?:{pattern}))(?P<r{i}>)")
+        self.description_regex = re.compile(
+            "|".join(alternatives), re.IGNORECASE | re.DOTALL
+        ) if alternatives else None
+
+    @classmethod
+    def for_company(cls, company: str) -> "PPhTaxClassifier":
+        """Get the classifier of a company for the current request"""
+        classifiers = getattr(frappe.local, "pajak_pph_classifiers", None)
+        if classifiers is None:
+            classifiers = frappe.local.pajak_pph_classifiers = {}
+
+        classifier = classifiers.get(company)
+        if classifier is None:
+            classifier = classifiers[company] = cls.load(company)
+        return classifier
+
+    @classmethod
+    def load(cls, company: str) -> "PPhTaxClassifier":
+        """Build the classifier of a company from its rules and resolved accounts"""
+        # PPh 23 wins when both types resolve to the same account
+        account_types = {}
+        for pph_type in ("26", "23"):
+            account = get_pph_account(company, pph_type)
+            if account:
+                account_types[account] = pph_type
+
+        description_rules = []
+        for rule in get_classification_rules(company):
+            if rule.account:
+                account_types[rule.account] = rule.pph_type
+            if rule.description_pattern:
+                description_rules.append((rule.pph_type, rule.description_pattern))
+
+        return cls(account_types, description_rules + list(DEFAULT_DESCRIPTION_RULES))
+
+    @staticmethod
+    def invalidate(company: Optional[str] = None) -> None:
+        """Drop cached classifiers after rules or tax accounts change"""
+        classifiers = getattr(frappe.local, "pajak_pph_classifiers", None)
+        if classifiers:
+            if company:
+                classifiers.pop(company, None)
+            else:
+                classifiers.clear()
+
+    def get_type(self, account_head: Optional[str], description: Optional[str]) -> Optional[str]:
+        """PPh type of a tax row by account, then by description, None if neither matches"""
+        pph_type = self.account_types.get(account_head)
+        if pph_type or not description:
+            return pph_type
+
+        # Descriptions repeat across invoices, so each one is matched once
+        try:
+            return self.description_types[description]
+        except KeyError:
+            pass
+
+        match = self.description_regex.match(description) if self.description_regex else None
+        pph_type = self.group_types[match.lastgroup] if match else None
+        if len(self.description_types) < MAX_CACHED_DESCRIPTIONS:
+            self.description_types[description] = pph_type
+        return pph_type
+
+    def classify(self, tax: Any, base_net_total: float) -> Optional[Tuple[str, Dict[str, Any]]]:
+        """
+        Classify one deducted tax row.
+
+        Returns:
+            tuple: (pph_type, tax_details), None if the row is not withholding tax
+        """
+        tax_amount = flt(tax.tax_amount)
+        if tax_amount >= 0:
+            return None
+
+        pph_type = self.get_type(tax.account_head, tax.description)
+        if not pph_type:
+            return None
+
+        base_amount = flt(base_net_total)
+        description = tax.description
+        if not description and tax.account_head in self.account_types:
+            description = f"PPh {pph_type}"
+        return pph_type, {
+            "account": tax.account_head,
+            "rate": abs(tax_amount * 100 / base_amount) if base_amount else 0,
+            "amount": -tax_amount,
+            "base_amount": base_amount,
+            "description": description
+        }
+
+    def classify_rows(self, rows: Iterable[Any],
+                      base_net_totals: Dict[str, float]) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        """
+        Classify the tax rows of many invoices in one pass.
+
+        Args:
+            rows: Tax rows with parent, account_head, description and tax_amount,
+                in idx order per invoice
+            base_net_totals: base_net_total per invoice
+
+        Returns:
+            dict: {invoice: {pph_type: tax_details}}, a later row of the
+                same type replaces an earlier one
+        """
+        result = {}
+        classify = self.classify
+        for tax in rows:
+            classified = classify(tax, base_net_totals.get(tax.parent))
+            if classified:
+                result.setdefault(tax.parent, {})[classified[0]] = classified[1]
+        return result
+
+def get_classification_rules(company: str) -> List[Dict[str, Any]]:
+    """Enabled rules of a company and of all companies, in priority order"""
+    return frappe.get_all(
+        "PPh Classification Rule",
+        filters={"enabled": 1},
+        or_filters=[["company", "=", company], ["company", "is", "not set"]],
+        fields=["pph_type", "account", "description_pattern"],
+        order_by="priority asc, name asc"
+    )
@@ -0,0 +1,33 @@
+import re
+import frappe
+from frappe import _
+from frappe.model.document import Document
+from pajak_indonesia.ebupot.classifier import PPhTaxClassifier
+
+class PPhClassificationRule(Document):
+    def validate(self):
+        if not (self.account or self.description_pattern):
+            frappe.throw(_("Set an Account or a Description Pattern"))
+        self.validate_account()
+        self.validate_description_pattern()
+
+    def validate_account(self):
+        if self.account and self.company:
+            account_company = frappe.db.get_value("Account", self.account, "company")
+            if account_company != self.company:
+                frappe.throw(_("Account {0} does not belong to company {1}").format(
+                    frappe.bold(self.account), frappe.bold(self.company)))
+
+    def validate_description_pattern(self):
+        if not self.description_pattern:
+            return
+        try:
+            re.compile(self.description_pattern)
+        except re.error as e:
+            frappe.throw(_("Invalid Description Pattern: {0}").format(str(e)))
+
+    def on_update(self):
+        PPhTaxClassifier.invalidate()
+
+    def on_trash(self):
+        PPhTaxClassifier.invalidate()
@@ -0,0 +1,134 @@
+from typing import Optional, Dict, Any, List, Tuple
+import frappe
+from frappe.model.document import Document
+from frappe.utils import getdate, flt, add_months, get_first_day, get_last_day
+from pajak_indonesia.party_profile import get_party_profile
+
+AMOUNT_TOLERANCE = 1.0
+MATCH_WINDOW_MONTHS = 3
+EMPTY_NPWP = "000000000000000"
+
+class EbupotMatcher:
+    """
+    Matches the PPh deductions of a supplier Payment Entry to open E-Bupot documents.
+
+    Candidates are loaded once per Payment Entry: E-Bupots of the Purchase
+    Invoices it pays, and unpaid E-Bupots of the supplier (by supplier link
+    or NPWP) signed within the match window around the posting date. They
+    are indexed by rounded PPh amount, so every deduction is resolved with
+    a dictionary lookup and each E-Bupot is used for one deduction only.
+
+    Ties are broken deterministically: invoice references first, then the
+    closest signing date, the smallest amount difference and the name.
+    """
+
+    def __init__(self, payment_entry: Document, candidates: Optional[List[Dict[str, Any]]] = None):
+        self.payment_entry = payment_entry
+        self.posting_date = getdate(payment_entry.posting_date)
+        self.candidates = self.load_candidates() if candidates is None else candidates
+        self.by_amount = self.index_candidates(self.candidates)
+
+    def load_candidates(self) -> List[Dict[str, Any]]:
+        """Load the E-Bupots that can be linked to this Payment Entry"""
+        pe = self.payment_entry
+        references = [
+            ref.reference_name for ref in (pe.get("references") or [])
+            if ref.reference_doctype == "Purchase Invoice"
+        ]
+        npwp = get_party_profile("Supplier", pe.party).npwp
+        values = {
+            "company": pe.company,
+            "supplier": pe.party,
+            "npwp": npwp if npwp and npwp != EMPTY_NPWP else None,
+            "payment_entry": pe.name or "",
+            "references": references or [""],
+            "from_date": get_first_day(add_months(self.posting_date, -MATCH_WINDOW_MONTHS)),
+            "to_date": get_last_day(add_months(self.posting_date, MATCH_WINDOW_MONTHS))
+        }
+
+        fields = """
+            name, pph_dipotong, tandatangan_date, payment_entry,
+            reference_doctype = 'Purchase Invoice' AND reference_name IN %(references)s as is_reference
+        """
+        open_condition = """
+            docstatus = 1
+            AND company = %(company)s
+            AND IFNULL(payment_entry, '') IN ('', %(payment_entry)s)
+        """
+        window_condition = "AND tandatangan_date BETWEEN %(from_date)s AND %(to_date)s"
+
+        # One branch per index, so no branch scans on a LIKE or an OR
+        queries = [f"""
+            SELECT {fields} FROM `tabEbupot Document`
+            WHERE reference_doctype = 'Purchase Invoice' AND reference_name IN %(references)s
+            AND {open_condition}
+        """, f"""
+            SELECT {fields} FROM `tabEbupot Document`
+            WHERE supplier = %(supplier)s {window_condition}
+            AND {open_condition}
+        """]
+        if values["npwp"]:
+            queries.append(f"""
+                SELECT {fields} FROM `tabEbupot Document`
+                WHERE npwp_terpotong = %(npwp)s {window_condition}
+                AND {open_condition}
+            """)
+
+        return frappe.db.sql(" UNION ".join(queries), values, as_dict=1)
+
+    @staticmethod
+    def index_candidates(candidates: List[Dict[str, Any]]) -> Dict[int, List[Dict[str, Any]]]:
+        """Group candidates by PPh amount rounded to whole rupiah"""
+        by_amount = {}
+        for candidate in candidates:
+            by_amount.setdefault(round(flt(candidate.pph_dipotong)), []).append(candidate)
+        return by_amount
+
+    def match(self, deductions: List[Document]) -> List[Tuple[Document, str]]:
+        """
+        Resolve deductions to E-Bupot documents in one pass.
+
+        Args:
+            deductions: PPh deduction rows of the Payment Entry, in order
+
+        Returns:
+            list: (deduction row, E-Bupot name) of the deductions that matched
+        """
+        # E-Bupots that rows already point to are not matched again
+        used = {d.get("ebupot_document") for d in deductions if d.get("ebupot_document")}
+        matches = []
+
+        for deduction in deductions:
+            if deduction.get("ebupot_document"):
+                continue
+
+            best = self.find_best(flt(deduction.amount), used)
+            if best:
+                used.add(best.name)
+                matches.append((deduction, best.name))
+
+        return matches
+
+    def find_best(self, amount: float, used: set) -> Optional[Dict[str, Any]]:
+        """Best unused candidate within the amount tolerance"""
+        key = round(amount)
+        candidates = [
+            candidate
+            for bucket in (key - 1, key, key + 1)
+            for candidate in self.by_amount.get(bucket, [])
+            if candidate.name not in used
+            and abs(flt(candidate.pph_dipotong) - amount) < AMOUNT_TOLERANCE
+        ]
+        if not candidates:
+            return None
+
+        return min(candidates, key=lambda candidate: self.rank(candidate, amount))
+
+    def rank(self, candidate: Dict[str, Any], amount: float) -> Tuple:
+        signed = getdate(candidate.tandatangan_date) if candidate.tandatangan_date else None
+        return (
+            0 if candidate.is_reference else 1,
+            abs((signed - self.posting_date).days) if signed else float("inf"),
+            abs(flt(candidate.pph_dipotong) - amount),
+            candidate.name
+        )
@@ -0,0 +1,49 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from pajak_indonesia.ebupot.matching import EbupotMatcher
+
+def candidate(name, amount, date, is_reference=0):
+    return frappe._dict({
+        "name": name,
+        "pph_dipotong": amount,
+        "tandatangan_date": date,
+        "payment_entry": None,
+        "is_reference": is_reference
+    })
+
+class TestEbupotMatching(FrappeTestCase):
+    def setUp(self):
+        """Payment Entry in March 2024 with two PPh deductions"""
+        self.payment_entry = frappe._dict({"posting_date": "2024-03-15"})
+        self.deductions = [
+            frappe._dict({"name": "row-1", "amount": 200000}),
+            frappe._dict({"name": "row-2", "amount": 200000.4})
+        ]
+
+    def test_each_ebupot_is_matched_once(self):
+        """Deductions with the same amount get different E-Bupots, closest date first"""
+        matcher = EbupotMatcher(self.payment_entry, candidates=[
+            candidate("EBUPOT-0002", 200000, "2024-01-10"),
+            candidate("EBUPOT-0001", 199999.5, "2024-03-14"),
+            candidate("EBUPOT-0003", 150000, "2024-03-15")
+        ])
+        matches = [(d.name, ebupot) for d, ebupot in matcher.match(self.deductions)]
+        self.assertEqual(matches, [("row-1", "EBUPOT-0001"), ("row-2", "EBUPOT-0002")])
+
+    def test_invoice_reference_wins_ties(self):
+        """E-Bupots of the paid invoices are preferred, then the name breaks ties"""
+        matcher = EbupotMatcher(self.payment_entry, candidates=[
+            candidate("EBUPOT-0005", 200000, "2024-03-15"),
+            candidate("EBUPOT-0004", 200000, "2024-03-15"),
+            candidate("EBUPOT-0006", 200000, "2024-01-01", is_reference=1)
+        ])
+        matches = [ebupot for _d, ebupot in matcher.match(self.deductions)]
+        self.assertEqual(matches, ["EBUPOT-0006", "EBUPOT-0004"])
+
+    def test_already_linked_ebupot_is_skipped(self):
+        """An E-Bupot set on a deduction row is not matched to another row"""
+        self.deductions[0].ebupot_document = "EBUPOT-0007"
+        matcher = EbupotMatcher(self.payment_entry, candidates=[
+            candidate("EBUPOT-0007", 200000, "2024-03-15")
+        ])
+        self.assertEqual(matcher.match(self.deductions), [])
@@ -0,0 +1,59 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from pajak_indonesia.party_profile import PartyProfileCache, get_party_profile, get_party_profiles
+
+class TestPartyProfile(FrappeTestCase):
+    def setUp(self):
+        PartyProfileCache.clear()
+        self.supplier = self.make_supplier("_Test Pajak Profile Supplier", "012345678901234")
+
+    def make_supplier(self, name, tax_id):
+        if frappe.db.exists("Supplier", name):
+            frappe.db.set_value("Supplier", name, "tax_id", tax_id)
+            return frappe.get_doc("Supplier", name)
+        return frappe.get_doc({
+            "doctype": "Supplier",
+            "supplier_name": name,
+            "supplier_group": frappe.db.get_value("Supplier Group", {"is_group": 0}, "name"),
+            "tax_id": tax_id
+        }).insert()
+
+    def test_profile_is_cached_until_the_party_changes(self):
+        profile = get_party_profile("Supplier", self.supplier.name)
+        self.assertEqual(profile.npwp, "012345678901234")
+        self.assertEqual(profile.party_name, "_Test Pajak Profile Supplier")
+
+        # Written behind the cache's back: still served from the cache
+        frappe.db.set_value("Supplier", self.supplier.name, "tax_id", "999999999999999")
+        frappe.local.pajak_party_profiles = {}
+        self.assertEqual(get_party_profile("Supplier", self.supplier.name).npwp, "012345678901234")
+
+        self.supplier.reload()
+        self.supplier.tax_id = "111111111111111"
+        self.supplier.save()
+        self.assertEqual(get_party_profile("Supplier", self.supplier.name).npwp, "111111111111111")
+
+    def test_address_save_invalidates_linked_parties(self):
+        self.assertIsNone(get_party_profile("Supplier", self.supplier.name).address)
+
+        address = frappe.get_doc({
+            "doctype": "Address",
+            "address_title": self.supplier.name,
+            "address_type": "Billing",
+            "address_line1": "Jl. Sudirman 1",
+            "city": "Jakarta",
+            "country": "Indonesia",
+            "links": [{"link_doctype": "Supplier", "link_name": self.supplier.name}]
+        }).insert()
+
+        profile = get_party_profile("Supplier", self.supplier.name)
+        self.assertIn("Jl. Sudirman 1", profile.address)
+        self.assertEqual(profile.country, "Indonesia")
+
+        address.address_line1 = "Jl. Thamrin 2"
+        address.save()
+        self.assertIn("Jl. Thamrin 2", get_party_profile("Supplier", self.supplier.name).address)
+
+    def test_bulk_lookup_skips_unknown_parties(self):
+        profiles = get_party_profiles("Supplier", [self.supplier.name, "_Test Missing Supplier", None])
+        self.assertEqual(list(profiles), [self.supplier.name])
@@ -0,0 +1,61 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from pajak_indonesia.ebupot.classifier import PPhTaxClassifier, DEFAULT_DESCRIPTION_RULES
+
+def tax(account_head, tax_amount, description=None, parent="PINV-0001"):
+    return frappe._dict({
+        "parent": parent,
+        "account_head": account_head,
+        "tax_amount": tax_amount,
+        "description": description
+    })
+
+class TestPPhTaxClassifier(FrappeTestCase):
+    """Classification shared by the on_submit hook and the bulk E-Bupot job"""
+
+    def setUp(self):
+        self.classifier = PPhTaxClassifier({"PPh 23 - TC": "23", "PPh 26 - TC": "26"})
+
+    def classify(self, row):
+        return self.classifier.classify(row, 1000000)
+
+    def test_pph_accounts(self):
+        pph_type, details = self.classify(tax("PPh 23 - TC", -20000))
+        self.assertEqual(pph_type, "23")
+        self.assertEqual(details["rate"], 2)
+        self.assertEqual(details["amount"], 20000)
+        self.assertEqual(details["base_amount"], 1000000)
+        self.assertEqual(details["description"], "PPh 23")
+
+        pph_type, details = self.classify(tax("PPh 26 - TC", -200000, "Dividend"))
+        self.assertEqual(pph_type, "26")
+        self.assertEqual(details["rate"], 20)
+        self.assertEqual(details["description"], "Dividend")
+
+    def test_description_fallback(self):
+        self.assertEqual(self.classify(tax("Other - TC", -20000, "Withholding tax"))[0], "23")
+        self.assertEqual(self.classify(tax("Other - TC", -200000, "PPh 26 royalty"))[0], "26")
+        self.assertIsNone(self.classify(tax("Other - TC", -5000, "Discount")))
+
+    def test_rule_priority_beats_text_position(self):
+        """The first rule that matches wins, wherever its match is in the description"""
+        self.assertEqual(self.classify(tax("Other - TC", -20000, "PPh 26 withholding"))[0], "23")
+
+        classifier = PPhTaxClassifier({}, [("26", r"royalt")] + list(DEFAULT_DESCRIPTION_RULES))
+        self.assertEqual(classifier.get_type("Other - TC", "PPh 23 atas royalti"), "26")
+
+    def test_added_taxes_are_not_withholding(self):
+        self.assertIsNone(self.classify(tax("PPh 23 - TC", 20000)))
+
+    def test_classify_rows(self):
+        """Rows of many invoices in one call, a later row of the same type wins"""
+        result = self.classifier.classify_rows([
+            tax("PPh 23 - TC", -10000, parent="PINV-0001"),
+            tax("Other - TC", -30000, "pph 23 jasa", parent="PINV-0001"),
+            tax("PPh 26 - TC", -100000, parent="PINV-0002"),
+            tax("Other - TC", -5000, "Discount", parent="PINV-0003")
+        ], {"PINV-0001": 1000000, "PINV-0002": 0, "PINV-0003": 100000})
+
+        self.assertEqual(sorted(result), ["PINV-0001", "PINV-0002"])
+        self.assertEqual(result["PINV-0001"]["23"]["amount"], 30000)
+        self.assertEqual(result["PINV-0002"]["26"]["rate"], 0)
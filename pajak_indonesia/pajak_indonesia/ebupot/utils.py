@@ -2,30 +2,28 @@ from typing import Optional, List, Dict, Any
 import frappe
 from frappe import _
 from frappe.model.document import Document
-from frappe.utils import getdate, flt, cstr, add_months
+from frappe.utils import getdate, cstr
+from pajak_indonesia.tax_accounts import is_pph_account
+from pajak_indonesia.ebupot.classifier import PPhTaxClassifier
+from pajak_indonesia.ebupot.matching import EbupotMatcher
+from pajak_indonesia.outbox import is_outbox_enabled, record_event
+from pajak_indonesia.party_profile import get_party_profile
+from pajak_indonesia.profiling import profiled
 
+@profiled
 def create_document_if_pph(doc: Document, method: Optional[str] = None) -> Optional[Document]:
     if not doc.doctype == "Purchase Invoice":
         return None
     if doc.docstatus == 0 or doc.docstatus == 2:
         return None
-    existing_ebupot = frappe.get_all(
-        "Ebupot Document",
-        filters={"reference_doctype": doc.doctype, "reference_name": doc.name},
-        limit=1
-    )
-    if existing_ebupot:
-        frappe.msgprint(_("E-Bupot document already exists for this invoice"))
+    # Leave imported invoices to the bulk E-Bupot job when configured
+    if frappe.flags.in_import and frappe.conf.get("defer_ebupot_on_import"):
         return None
-    pph_taxes = get_pph_taxes(doc)
-    if not pph_taxes:
+    if is_outbox_enabled():
+        record_event("Create E-Bupot", doc)
         return None
     try:
-        created_docs = []
-        for pph_type, tax_details in pph_taxes.items():
-            ebupot_doc = create_ebupot_document(doc, pph_type, tax_details)
-            if ebupot_doc:
-                created_docs.append(ebupot_doc)
+        created_docs = make_ebupot_documents(doc)
         if created_docs:
             msg = _("E-Bupot document(s) created: {0}").format(
                 ", ".join([f'<a href="/app/ebupot-document/{d.name}">{d.name}</a>' for d in created_docs])
@@ -41,123 +39,78 @@ def create_document_if_pph(doc: Document, method: Optional[str] = None) -> Optio
         frappe.msgprint(_("Failed to create E-Bupot document: {0}").format(str(e)))
         return None
 
+def make_ebupot_documents(doc: Document) -> List[Document]:
+    """Create the E-Bupot documents of a submitted Purchase Invoice, raises on failure"""
+    # Concurrent callers for the same invoice wait here until the first one commits
+    frappe.db.get_value(doc.doctype, doc.name, "name", for_update=True)
+    existing_ebupot = frappe.get_all(
+        "Ebupot Document",
+        filters={"reference_doctype": doc.doctype, "reference_name": doc.name},
+        limit=1
+    )
+    if existing_ebupot:
+        frappe.msgprint(_("E-Bupot document already exists for this invoice"))
+        return []
+    created_docs = []
+    for pph_type, tax_details in get_pph_taxes(doc).items():
+        ebupot_doc = create_ebupot_document(doc, pph_type, tax_details)
+        if ebupot_doc:
+            created_docs.append(ebupot_doc)
+    return created_docs
+
 def get_pph_taxes(doc: Document) -> Dict[str, Dict[str, Any]]:
-    result = {}
     if not doc.taxes:
-        return result
-    pph23_account = get_pph_account(doc.company, "23")
-    pph26_account = get_pph_account(doc.company, "26")
-    for tax in doc.taxes:
-        tax_amount = flt(tax.tax_amount)
-        base_amount = flt(doc.base_net_total)
-        if tax_amount >= 0:
-            continue
-        if pph23_account and tax.account_head == pph23_account:
-            tax_rate = abs(flt(tax_amount) * 100 / base_amount) if base_amount else 0
-            result["23"] = {
-                "account": tax.account_head,
-                "rate": tax_rate,
-                "amount": abs(tax_amount),
-                "base_amount": base_amount,
-                "description": tax.description or "PPh 23"
-            }
-        elif pph26_account and tax.account_head == pph26_account:
-            tax_rate = abs(flt(tax_amount) * 100 / base_amount) if base_amount else 0
-            result["26"] = {
-                "account": tax.account_head,
-                "rate": tax_rate,
-                "amount": abs(tax_amount),
-                "base_amount": base_amount,
-                "description": tax.description or "PPh 26"
-            }
-        elif tax.description and ("pph 23" in tax.description.lower() or "withholding" in tax.description.lower()):
-            tax_rate = abs(flt(tax_amount) * 100 / base_amount) if base_amount else 0
-            result["23"] = {
-                "account": tax.account_head,
-                "rate": tax_rate,
-                "amount": abs(tax_amount),
-                "base_amount": base_amount,
-                "description": tax.description
-            }
-        elif tax.description and "pph 26" in tax.description.lower():
-            tax_rate = abs(flt(tax_amount) * 100 / base_amount) if base_amount else 0
-            result["26"] = {
-                "account": tax.account_head,
-                "rate": tax_rate,
-                "amount": abs(tax_amount),
-                "base_amount": base_amount,
-                "description": tax.description
-            }
-    return result
+        return {}
+    classifier = PPhTaxClassifier.for_company(doc.company)
+    return classifier.classify_rows(doc.taxes, {doc.name: doc.base_net_total}).get(doc.name, {})
 
-def get_pph_account(company: str, pph_type: str) -> Optional[str]:
-    tax_category = f"PPh {pph_type}"
-    pph_account = frappe.db.get_value(
-        "Tax Category Account",
-        {"parent": tax_category, "company": company},
-        "account"
+def create_ebupot_document(doc: Document, pph_type: str, tax_details: Dict[str, Any]) -> Optional[Document]:
+    supplier = get_party_profile("Supplier", doc.supplier)
+    ebupot = build_ebupot_document(
+        doc, pph_type, tax_details, supplier, doc.items,
+        npwp_pemotong=frappe.db.get_value("Company", doc.company, "tax_id"),
+        alamat_pemotong=get_company_address(doc.company),
+        alamat_terpotong=doc.address_display or supplier.address or "Indonesia"
     )
-    if not pph_account:
-        search_patterns = [
-            f"%pph%{pph_type}%",
-            f"%withholding%{pph_type}%",
-            f"%pajak%{pph_type}%"
-        ]
-        or_filters = {}
-        for i, pattern in enumerate(search_patterns):
-            or_filters[f"account_name{i}"] = ["like", pattern]
-            or_filters[f"name{i}"] = ["like", pattern]
-        pph_accounts = frappe.get_list(
-            "Account",
-            filters={
-                "company": company,
-                "account_type": ["in", ["Tax", "Liability", "Payable"]],
-                "is_group": 0
-            },
-            or_filters=or_filters,
-            fields=["name"],
-            limit=1
-        )
-        if pph_accounts:
-            pph_account = pph_accounts[0].name
-    return pph_account
+    ebupot.insert()
+    return ebupot
 
-def create_ebupot_document(doc: Document, pph_type: str, tax_details: Dict[str, Any]) -> Optional[Document]:
-    supplier_doc = frappe.get_doc("Supplier", doc.supplier)
-    npwp = supplier_doc.get("tax_id") or "000000000000000"
-    posting_date = getdate(doc.posting_date)
-    masa_pajak = posting_date.strftime("%m")
-    tahun_pajak = posting_date.strftime("%Y")
+def build_ebupot_document(invoice: Any, pph_type: str, tax_details: Dict[str, Any], supplier: Any,
+                          items: List[Any], npwp_pemotong: Optional[str], alamat_pemotong: str,
+                          alamat_terpotong: str) -> Document:
+    """Build the unsaved E-Bupot of one PPh type of a Purchase Invoice from the supplier's tax profile"""
+    posting_date = getdate(invoice.posting_date)
     ebupot = frappe.new_doc("Ebupot Document")
     ebupot.update({
+        "company": invoice.company,
         "jenis_pajak": pph_type,
         "jenis_daftar": "0 - Normal",
-        "masa_pajak": masa_pajak,
-        "tahun_pajak": tahun_pajak,
+        "masa_pajak": posting_date.strftime("%m"),
+        "tahun_pajak": posting_date.strftime("%Y"),
         "tandatangan_date": posting_date,
-        "npwp_pemotong": frappe.db.get_value("Company", doc.company, "tax_id") or "000000000000000",
-        "nama_pemotong": doc.company,
-        "alamat_pemotong": get_company_address(doc.company),
-        "npwp_terpotong": npwp,
-        "nama_terpotong": doc.supplier_name or doc.supplier,
-        "alamat_terpotong": doc.address_display or get_supplier_address(doc.supplier),
-        "tin": "" if pph_type == "23" else (supplier_doc.get("tax_id") or ""),
-        "negara_domisili": "" if pph_type == "23" else (supplier_doc.get("country") or ""),
+        "npwp_pemotong": npwp_pemotong or "000000000000000",
+        "nama_pemotong": invoice.company,
+        "alamat_pemotong": alamat_pemotong,
+        "npwp_terpotong": supplier.get("npwp") or "000000000000000",
+        "nama_terpotong": invoice.supplier_name or invoice.supplier,
+        "supplier": invoice.supplier,
+        "alamat_terpotong": alamat_terpotong,
+        "tin": "" if pph_type == "23" else (supplier.get("npwp") or ""),
+        "negara_domisili": "" if pph_type == "23" else (supplier.get("country") or ""),
         "penghasilan_bruto": tax_details["base_amount"],
         "tarif": tax_details["rate"],
         "pph_dipotong": tax_details["amount"],
         "status": "Draft",
-        "reference_doctype": doc.doctype,
-        "reference_name": doc.name
+        "reference_doctype": "Purchase Invoice",
+        "reference_name": invoice.name
     })
-    add_income_types(ebupot, doc, pph_type, tax_details)
-    ebupot.insert()
+    add_income_types(ebupot, items, pph_type, tax_details)
     return ebupot
 
-def add_income_types(ebupot: Document, doc: Document, pph_type: str, tax_details: Dict[str, Any]) -> None:
+def add_income_types(ebupot: Document, items: List[Any], pph_type: str, tax_details: Dict[str, Any]) -> None:
     default_code = get_default_object_code(pph_type)
-    if len(doc.items) == 1:
-        item = doc.items[0]
+    if len(items) == 1:
+        item = items[0]
         item_description = item.description or item.item_name or item.item_code
         ebupot.append("items", {
             "kode_objek_pajak": default_code,
@@ -167,7 +120,7 @@ def add_income_types(ebupot: Document, doc: Document, pph_type: str, tax_details
             "pph_dipotong": tax_details["amount"]
         })
     else:
-        is_service = any(item.get("is_service_item", 0) for item in doc.items)
+        is_service = any(item.get("is_service_item", 0) for item in items)
         description = "Jasa" if is_service else "Barang"
         if pph_type == "23":
             description += " (PPh 23)"
@@ -193,16 +146,9 @@ def get_company_address(company: str) -> str:
     return address
 
 def get_supplier_address(supplier: str) -> str:
-    address_name = frappe.db.get_value(
-        "Dynamic Link",
-        {"link_doctype": "Supplier", "link_name": supplier, "parenttype": "Address"},
-        "parent"
-    )
-    if address_name:
-        address = frappe.get_doc("Address", address_name)
-        return address.get_display()
-    return "Indonesia"
+    return get_party_profile("Supplier", supplier).address or "Indonesia"
 
+@profiled
 def link_deduction_to_bupot(doc: Document, method: Optional[str] = None) -> None:
     if not doc.doctype == "Payment Entry":
         return
@@ -210,113 +156,50 @@ def link_deduction_to_bupot(doc: Document, method: Optional[str] = None) -> None
         return
     if not doc.deductions or len(doc.deductions) == 0:
         return
-    for deduction in doc.deductions:
-        if deduction.get("ebupot_document"):
-            continue
-        if is_pph_account(deduction.account, doc.company):
-            ebupot_doc = find_matching_ebupot(doc, deduction)
-            if ebupot_doc:
-                deduction.ebupot_document = ebupot_doc.name
-                if doc.docstatus == 1 and not ebupot_doc.payment_entry:
-                    frappe.db.set_value("Ebupot Document", ebupot_doc.name, {
-                        "payment_entry": doc.name,
-                        "payment_date": doc.posting_date,
-                        "status": "Paid"
-                    })
-                    frappe.msgprint(_("Payment linked to E-Bupot document {0}").format(
-                        frappe.bold(ebupot_doc.name)))
-            else:
-                frappe.log_error(
-                    message=f"Could not find matching E-Bupot document for Payment Entry {doc.name}, "
-                            f"Supplier: {doc.party}, Amount: {deduction.amount}",
-                    title="E-Bupot Payment Linking Warning"
-                )
+    if is_outbox_enabled():
+        # Only submitted payments update E-Bupots, so drafts are not queued
+        if doc.docstatus == 1:
+            record_event("Link E-Bupot Payment", doc)
+        return
+    link_payment_to_ebupot(doc)
 
-def is_pph_account(account: str, company: str) -> bool:
-    pph23_account = get_pph_account(company, "23")
-    pph26_account = get_pph_account(company, "26")
-    pph21_account = get_pph_account(company, "21")
-    if account in [pph23_account, pph26_account, pph21_account]:
-        return True
-    account_name = frappe.db.get_value("Account", account, "account_name") or ""
-    lower_name = account_name.lower()
-    pph_keywords = ["pph", "withholding", "pajak penghasilan"]
-    has_pph_keyword = any(keyword in lower_name for keyword in pph_keywords)
-    pph_types = ["23", "26", "21", "pasal 23", "pasal 26", "pasal 21"]
-    has_pph_type = any(pph_type in lower_name for pph_type in pph_types)
-    return has_pph_keyword and has_pph_type
+def link_payment_to_ebupot(doc: Document) -> List[Document]:
+    deductions = [d for d in doc.deductions if is_pph_account(d.account, doc.company)]
+    pending = [d for d in deductions if not d.get("ebupot_document")]
+    if not pending:
+        return []
+    matcher = EbupotMatcher(doc)
+    matches = matcher.match(deductions)
+    candidates = {c.name: c for c in matcher.candidates}
+    for deduction, ebupot_name in matches:
+        deduction.ebupot_document = ebupot_name
+        if doc.docstatus == 1 and not candidates[ebupot_name].payment_entry:
+            frappe.db.set_value("Ebupot Document", ebupot_name, {
+                "payment_entry": doc.name,
+                "payment_date": doc.posting_date,
+                "status": "Paid"
+            })
+            frappe.msgprint(_("Payment linked to E-Bupot document {0}").format(
+                frappe.bold(ebupot_name)))
+    matched = {id(deduction) for deduction, _ebupot_name in matches}
+    for deduction in pending:
+        if id(deduction) not in matched:
+            frappe.log_error(
+                message=f"Could not find matching E-Bupot document for Payment Entry {doc.name}, "
+                        f"Supplier: {doc.party}, Amount: {deduction.amount}",
+                title="E-Bupot Payment Linking Warning"
+            )
+    return [deduction for deduction, _ebupot_name in matches]
+
+def link_submitted_payment(doc: Document) -> None:
+    """Link a submitted Payment Entry to its E-Bupots and save the deduction links"""
+    linked = link_payment_to_ebupot(doc)
+    if linked and frappe.get_meta("Payment Entry Deduction").has_field("ebupot_document"):
+        for deduction in linked:
+            deduction.db_set("ebupot_document", deduction.ebupot_document, update_modified=False)
 
 def find_matching_ebupot(payment_entry: Document, deduction: Dict[str, Any]) -> Optional[Document]:
-    references = []
-    if hasattr(payment_entry, 'references') and payment_entry.references:
-        for ref in payment_entry.references:
-            if ref.reference_doctype == "Purchase Invoice":
-                references.append(ref.reference_name)
-    if references:
-        ebupot_docs = frappe.get_all(
-            "Ebupot Document",
-            filters={
-                "reference_doctype": "Purchase Invoice",
-                "reference_name": ["in", references],
-                "docstatus": 1
-            },
-            fields=["name", "pph_dipotong", "payment_entry"],
-            order_by="modified desc"
-        )
-        if ebupot_docs:
-            for ebupot in ebupot_docs:
-                if abs(flt(ebupot.pph_dipotong) - flt(deduction.amount)) < 1.0:
-                    return frappe.get_doc("Ebupot Document", ebupot.name)
-    supplier = payment_entry.party
-    amount = flt(deduction.amount)
-    posting_date = getdate(payment_entry.posting_date)
-    month = posting_date.strftime("%m")
-    year = posting_date.strftime("%Y")
-    ebupot_docs = frappe.get_all(
-        "Ebupot Document",
-        filters={
-            "nama_terpotong": ["like", f"%{supplier}%"],
-            "masa_pajak": month,
-            "tahun_pajak": year,
-            "docstatus": 1,
-            "payment_entry": ["in", ["", None]]
-        },
-        fields=["name", "pph_dipotong", "npwp_terpotong", "payment_entry"],
-        order_by="modified desc"
-    )
-    for ebupot in ebupot_docs:
-        if abs(flt(ebupot.pph_dipotong) - amount) < 1.0:
-            return frappe.get_doc("Ebupot Document", ebupot.name)
-    date_from = add_months(posting_date, -3)
-    date_to = add_months(posting_date, 3)
-    months_range = []
-    current_date = date_from
-    while current_date <= date_to:
-        months_range.append(current_date.strftime("%m"))
-        current_date = add_months(current_date, 1)
-    years_range = [str(date_from.year), str(posting_date.year)]
-    if date_to.year not in years_range:
-        years_range.append(str(date_to.year))
-    ebupot_docs = frappe.get_all(
-        "Ebupot Document",
-        filters={
-            "nama_terpotong": ["like", f"%{supplier}%"],
-            "masa_pajak": ["in", months_range],
-            "tahun_pajak": ["in", years_range],
-            "docstatus": 1,
-            "payment_entry": ["in", ["", None]]
-        },
-        fields=["name", "pph_dipotong", "npwp_terpotong", "payment_entry"],
-        order_by="modified desc"
-    )
-    for ebupot in ebupot_docs:
-        if abs(flt(ebupot.pph_dipotong) - amount) < 1.0:
-            return frappe.get_doc("Ebupot Document", ebupot.name)
+    matches = EbupotMatcher(payment_entry).match([deduction])
+    if matches:
+        return frappe.get_doc("Ebupot Document", matches[0][1])
     return None
-    pph26_account = get_pph_account(company, "26")
-    pph21_account = get_pph_account(company, "21")
-    if account in [pph23_account, pph26_account, pph21_account]:
-        return True
-    account_name = frappe.db.get_value("Account", account, "account_name") or ""
-    lower_name = account_name.lower()
-    pph_keywords = ["pph", "withholding", "pajak penghasilan"]
@@ -0,0 +1,114 @@
+from typing import Sequence, List, Dict, Any
+import math
+from frappe.utils import flt
+
+PPN_RATE = 11  # percent of DPP
+
+def to_rupiah(value: Any) -> int:
+    """Round an amount to whole rupiah, half away from zero"""
+    value = flt(value)
+    return int(math.copysign(math.floor(abs(value) + 0.5), value))
+
+def allocate(total: int, weights: Sequence[Any]) -> List[int]:
+    """
+    Split a whole-rupiah total over lines in proportion to their weights.
+
+    Shares are computed in integer arithmetic on weights in sen and rounded
+    with the largest-remainder method, so they always add up to the total.
+    Equal remainders go to the earlier line, which keeps the result
+    deterministic.
+
+    Args:
+        total: Amount to split, in rupiah
+        weights: Line weights, e.g. line amounts
+
+    Returns:
+        list: One share per weight, in rupiah
+    """
+    if not weights:
+        return []
+
+    units = [int(round(flt(weight) * 100)) for weight in weights]
+    weight_total = sum(units)
+    if not weight_total:
+        # Nothing to weigh by: split evenly
+        units = [1] * len(units)
+        weight_total = len(units)
+    elif weight_total < 0:
+        units = [-unit for unit in units]
+        weight_total = -weight_total
+
+    products = [total * unit for unit in units]
+    shares = [product // weight_total for product in products]
+
+    leftover = total - sum(shares)
+    if leftover:
+        remainders = sorted(
+            range(len(shares)),
+            key=lambda i: (-(products[i] % weight_total), i)
+        )
+        for i in remainders[:leftover]:
+            shares[i] += 1
+
+    return shares
+
+def calculate_efaktur_amounts(items: Sequence[Any]) -> Dict[str, int]:
+    """
+    Set harga_total, DPP, PPN and PPnBM of e-Faktur lines and return the totals.
+
+    Line DPP is the whole-rupiah line total less discount. PPN and PPnBM are
+    computed once on the document total and allocated back to the lines, so
+    the line amounts reconcile exactly with the totals.
+
+    Args:
+        items: Efaktur Document Item rows with harga_satuan, jumlah_barang,
+            diskon and tarif_ppnbm
+
+    Returns:
+        dict: jumlah_dpp, jumlah_ppn and jumlah_ppnbm
+    """
+    dpp = [
+        to_rupiah(flt(item.harga_satuan) * flt(item.jumlah_barang)) - to_rupiah(item.diskon)
+        for item in items
+    ]
+    jumlah_dpp = sum(dpp)
+    jumlah_ppn = to_rupiah(jumlah_dpp * PPN_RATE / 100)
+
+    ppnbm_exact = [line_dpp * flt(item.tarif_ppnbm) / 100 for item, line_dpp in zip(items, dpp)]
+    jumlah_ppnbm = to_rupiah(sum(ppnbm_exact))
+
+    ppn = allocate(jumlah_ppn, dpp)
+    ppnbm = allocate(jumlah_ppnbm, ppnbm_exact) if jumlah_ppnbm else [0] * len(dpp)
+
+    for item, line_dpp, line_ppn, line_ppnbm in zip(items, dpp, ppn, ppnbm):
+        item.harga_total = line_dpp + to_rupiah(item.diskon)
+        item.dpp = line_dpp
+        item.ppn = line_ppn
+        item.ppnbm = line_ppnbm
+
+    return {
+        "jumlah_dpp": jumlah_dpp,
+        "jumlah_ppn": jumlah_ppn,
+        "jumlah_ppnbm": jumlah_ppnbm
+    }
+
+def sum_efaktur_amounts(items: Sequence[Any]) -> Dict[str, int]:
+    """
+    Total the DPP, PPN and PPnBM of e-Faktur lines that are already allocated.
+
+    Used for documents built from a Sales Invoice, whose lines carry the
+    invoice's own DPP and PPN split.
+
+    Args:
+        items: Efaktur Document Item rows with dpp, ppn and ppnbm
+
+    Returns:
+        dict: jumlah_dpp, jumlah_ppn and jumlah_ppnbm
+    """
+    totals = {"jumlah_dpp": 0, "jumlah_ppn": 0, "jumlah_ppnbm": 0}
+    for item in items:
+        totals["jumlah_dpp"] += to_rupiah(item.dpp)
+        totals["jumlah_ppn"] += to_rupiah(item.ppn)
+        totals["jumlah_ppnbm"] += to_rupiah(item.ppnbm)
+
+    return totals
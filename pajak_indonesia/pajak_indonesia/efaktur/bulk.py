@@ -0,0 +1,235 @@
+from typing import Optional, List, Dict, Any
+from collections import defaultdict
+import frappe
+from frappe import _
+from frappe.utils import cint, flt
+from pajak_indonesia.jobs import BulkJobProgress, chunk_list
+from pajak_indonesia.efaktur.utils import (
+    build_efaktur_document,
+    get_ppn_account,
+    reserve_nomor_faktur_block
+)
+from pajak_indonesia.efaktur.nomor_faktur import NomorFakturAllocator
+from pajak_indonesia.party_profile import get_party_profiles
+from pajak_indonesia.profiling import profiled
+
+DEFAULT_CHUNK_SIZE = 500
+
+@frappe.whitelist()
+@profiled
+def enqueue_bulk_efaktur(company: str, from_date: Optional[str] = None, to_date: Optional[str] = None,
+                         invoices: Optional[Any] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Enqueue e-Faktur generation for a backlog of submitted Sales Invoices.
+
+    Args:
+        company: Company name
+        from_date: Optional start of the posting date range
+        to_date: Optional end of the posting date range
+        invoices: Optional list (or JSON list) of Sales Invoice names
+        chunk_size: Number of invoices handled by one background job
+
+    Returns:
+        dict: batch_id to poll with get_bulk_efaktur_status, plus totals
+    """
+    frappe.only_for(["System Manager", "Accounts Manager", "Tax Manager"])
+
+    if not (invoices or (from_date and to_date)):
+        frappe.throw(_("Either a date range or a list of invoices is required"))
+
+    if isinstance(invoices, str):
+        invoices = frappe.parse_json(invoices)
+
+    pending = get_pending_invoices(company, from_date, to_date, invoices)
+    chunks = chunk_list(pending, cint(chunk_size) or DEFAULT_CHUNK_SIZE)
+
+    progress = BulkJobProgress("efaktur")
+    progress.start(len(pending), len(chunks))
+
+    for chunk in chunks:
+        frappe.enqueue(
+            "pajak_indonesia.efaktur.bulk.process_efaktur_chunk",
+            queue="long",
+            timeout=3600,
+            company=company,
+            invoices=chunk,
+            batch_id=progress.batch_id
+        )
+
+    return {
+        "batch_id": progress.batch_id,
+        "total": len(pending),
+        "chunks": len(chunks)
+    }
+
+@frappe.whitelist()
+@profiled
+def get_bulk_efaktur_status(batch_id: str) -> Dict[str, Any]:
+    """Get progress and per-invoice failures of a bulk e-Faktur batch"""
+    return BulkJobProgress("efaktur", batch_id).get_status()
+
+def get_pending_invoices(company: str, from_date: Optional[str], to_date: Optional[str],
+                         invoices: Optional[List[str]]) -> List[str]:
+    """Get submitted Sales Invoices that do not have an e-Faktur yet"""
+    filters = {
+        "company": company,
+        "docstatus": 1,
+        "has_generated_efaktur": 0
+    }
+
+    if invoices:
+        filters["name"] = ["in", invoices]
+    if from_date and to_date:
+        filters["posting_date"] = ["between", [from_date, to_date]]
+
+    return frappe.get_all(
+        "Sales Invoice",
+        filters=filters,
+        pluck="name",
+        order_by="posting_date asc, name asc"
+    )
+
+def process_efaktur_chunk(company: str, invoices: List[str], batch_id: str) -> Dict[str, Any]:
+    """
+    Create e-Faktur documents for one chunk of Sales Invoices.
+
+    Customers, items and PPN rows of the whole chunk are prefetched in
+    bulk and faktur numbers are reserved as one block. Each invoice is
+    inserted under its own savepoint so one failure does not roll back
+    the rest of the chunk.
+
+    Args:
+        company: Company name
+        invoices: Sales Invoice names of this chunk
+        batch_id: Bulk batch the chunk belongs to
+
+    Returns:
+        dict: Batch progress after this chunk
+    """
+    progress = BulkJobProgress("efaktur", batch_id)
+    context = EfakturBatchContext(company, invoices).load()
+    failures = []
+    created = []
+    unused_numbers = []
+
+    for name in invoices:
+        if name not in context.invoices:
+            failures.append({"name": name, "error": _("Invoice is not pending e-Faktur generation")})
+        elif not context.ppn_amounts.get(name):
+            failures.append({"name": name, "error": _("No PPN tax found in invoice")})
+
+    eligible = [name for name in invoices if name in context.invoices and context.ppn_amounts.get(name)]
+    numbers = reserve_nomor_faktur_block(company, len(eligible))
+
+    for name, nomor_faktur in zip(eligible, numbers):
+        try:
+            frappe.db.savepoint("bulk_efaktur")
+            efaktur = context.build_document(name, nomor_faktur)
+            efaktur.insert()
+            created.append(name)
+        except Exception as e:
+            frappe.db.rollback(save_point="bulk_efaktur")
+            failures.append({"name": name, "nomor_faktur": nomor_faktur, "error": str(e)})
+            unused_numbers.append(nomor_faktur)
+
+    for name in eligible[len(numbers):]:
+        failures.append({"name": name, "error": _("No available faktur number. Please update Efaktur Config.")})
+
+    if unused_numbers:
+        NomorFakturAllocator.release(company, unused_numbers, _("Bulk e-Faktur creation failed"))
+
+    if created:
+        frappe.db.sql("""
+            UPDATE `tabSales Invoice`
+            SET has_generated_efaktur = 1
+            WHERE name IN %s
+        """, (tuple(created),))
+
+    frappe.db.commit()
+
+    if failures:
+        frappe.log_error(
+            message="\n".join(f"{f['name']}: {f['error']}" for f in failures),
+            title="Bulk E-Faktur Creation Error"
+        )
+
+    return progress.record_chunk(len(created), failures)
+
+class EfakturBatchContext:
+    """Prefetched invoice, item, PPN and customer data for a chunk of invoices"""
+
+    def __init__(self, company: str, invoice_names: List[str]):
+        self.company = company
+        self.invoice_names = invoice_names
+        self.invoices = {}
+        self.items = defaultdict(list)
+        self.ppn_amounts = {}
+        self.customers = {}
+
+    def load(self) -> "EfakturBatchContext":
+        """Fetch all data of the chunk with one query per table"""
+        if not self.invoice_names:
+            return self
+
+        for invoice in frappe.get_all(
+            "Sales Invoice",
+            filters={
+                "name": ["in", self.invoice_names],
+                "company": self.company,
+                "docstatus": 1,
+                "has_generated_efaktur": 0
+            },
+            fields=["name", "company", "customer", "customer_name", "posting_date", "address_display",
+                    "base_grand_total", "base_net_total"]
+        ):
+            self.invoices[invoice.name] = invoice
+
+        if not self.invoices:
+            return self
+
+        names = list(self.invoices)
+
+        for item in frappe.get_all(
+            "Sales Invoice Item",
+            filters={"parent": ["in", names], "parenttype": "Sales Invoice"},
+            fields=["parent", "item_code", "item_name", "base_rate", "qty", "base_amount"],
+            order_by="parent asc, idx asc"
+        ):
+            self.items[item.parent].append(item)
+
+        ppn_account = get_ppn_account(self.company)
+        if ppn_account:
+            for tax in frappe.get_all(
+                "Sales Taxes and Charges",
+                filters={
+                    "parent": ["in", names],
+                    "parenttype": "Sales Invoice",
+                    "account_head": ppn_account
+                },
+                fields=["parent", "tax_amount"],
+                order_by="parent asc, idx asc"
+            ):
+                # Keep the first PPN row per invoice, like create_document
+                self.ppn_amounts.setdefault(tax.parent, flt(tax.tax_amount))
+
+        self.customers = get_party_profiles(
+            "Customer", {invoice.customer for invoice in self.invoices.values()}
+        )
+
+        return self
+
+    def build_document(self, invoice_name: str, nomor_faktur: str):
+        """Build the unsaved Efaktur Document of one prefetched invoice"""
+        invoice = self.invoices[invoice_name]
+        customer = self.customers.get(invoice.customer) or frappe._dict()
+        npwp = customer.get("npwp") or "000000000000000"
+        alamat = invoice.address_display or customer.get("address") or "Indonesia"
+
+        return build_efaktur_document(
+            invoice,
+            self.items[invoice_name],
+            self.ppn_amounts[invoice_name],
+            nomor_faktur,
+            npwp,
+            alamat
+        )
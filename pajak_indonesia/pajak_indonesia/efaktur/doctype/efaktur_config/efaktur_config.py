@@ -0,0 +1,50 @@
+import frappe
+from frappe import _
+from frappe.model.document import Document
+from frappe.utils import cint
+
+class EfakturConfig(Document):
+    def validate(self):
+        self.validate_block_size()
+        self.validate_ranges()
+    
+    def validate_block_size(self):
+        if cint(self.block_size) < 1:
+            self.block_size = 1
+    
+    def validate_ranges(self):
+        """Validate NSFP ranges and initialize their next number"""
+        stored = self.get_stored_next_numbers()
+        for row in self.ranges:
+            if cint(row.range_end) < cint(row.range_start):
+                frappe.throw(_("Row {0}: Range End cannot be before Range Start").format(row.idx))
+            
+            if not cint(row.next_number):
+                row.next_number = row.range_start
+            
+            if not (cint(row.range_start) <= cint(row.next_number) <= cint(row.range_end) + 1):
+                frappe.throw(_("Row {0}: Next Number must be within the range").format(row.idx))
+            
+            if cint(row.next_number) < stored.get(row.name, 0):
+                frappe.throw(_(
+                    "Row {0}: Next Number {1} is lower than the stored {2}. Numbers were issued "
+                    "after this form was opened, reload it and save again."
+                ).format(row.idx, row.next_number, stored[row.name]))
+    
+    def get_stored_next_numbers(self):
+        """
+        Next numbers of the saved ranges, locked until the save commits.
+        
+        The allocator advances them with a plain UPDATE that does not touch
+        the config's modified, so a form opened before numbers were issued
+        would otherwise write an older next number back.
+        """
+        if self.is_new():
+            return {}
+        
+        return {name: cint(next_number) for name, next_number in frappe.db.sql("""
+            SELECT name, next_number
+            FROM `tabEfaktur NSFP Range`
+            WHERE parent = %s AND parenttype = 'Efaktur Config'
+            FOR UPDATE
+        """, self.name)}
@@ -0,0 +1,381 @@
+from typing import Dict, Any, List, Tuple
+from collections import deque
+import atexit
+import os
+import socket
+import threading
+import frappe
+from frappe.utils import cint, now_datetime, add_to_date
+
+BlockKey = Tuple[str, str]  # (site, company)
+BlockEntry = Tuple[str, str, Any]  # (nomor faktur, lease name, lease expiry)
+
+# A block is used by its process until the lease expires
+LEASE_MINUTES = 60
+# Expired leases are reclaimed only after this, so transactions that took
+# a number just before the expiry have committed
+RECLAIM_GRACE_MINUTES = 30
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+class NomorFakturAllocator:
+    """
+    Hands out nomor faktur from per-process blocks reserved under a row lock.
+
+    Blocks are reserved with SELECT ... FOR UPDATE on the company's NSFP
+    ranges, so concurrent workers never receive the same number. The
+    unused part of a block stays with the transaction that reserved it
+    and joins the process block, shared by the worker threads and kept
+    across requests, only once that transaction commits. Numbers taken
+    from the process block in a transaction that rolls back are put back.
+
+    The unused part of every block is recorded as an Efaktur Number Lease
+    in the transaction that reserves it. A process stops using a block
+    once its lease expires, and reclaim_expired_leases issues the numbers
+    of expired leases that no Efaktur Document uses again, so the blocks
+    of workers that died are not lost.
+    """
+
+    _blocks: Dict[BlockKey, deque] = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def allocate(cls, company: str, count: int = 1, block_size: int = 0) -> List[str]:
+        """
+        Take nomor faktur from the held blocks, reserving a new block when needed.
+
+        Args:
+            company: Company name
+            count: Number of faktur numbers wanted
+            block_size: Block size override, defaults to Efaktur Config.block_size
+
+        Returns:
+            List[str]: Allocated numbers, fewer than count if all ranges run out
+        """
+        key = (frappe.local.site, company)
+        now = now_datetime()
+        journal = cls._get_journal()
+        pending = journal["pending"].setdefault(key, deque())
+        numbers = [pending.popleft()[0] for _ in range(min(count, len(pending)))]
+
+        taken = []
+        with cls._lock:
+            block = cls._blocks.setdefault(key, deque())
+            while block and len(numbers) + len(taken) < count:
+                entry = block.popleft()
+                # Numbers of an expired lease are left to reclaim_expired_leases
+                if entry[2] > now:
+                    taken.append(entry)
+        journal["taken"].append((key, taken))
+        numbers.extend(nomor_faktur for nomor_faktur, _lease, _expires_at in taken)
+
+        if len(numbers) < count:
+            # The row lock is taken outside cls._lock, other threads may hold it
+            wanted = count - len(numbers)
+            size = max(cint(block_size) or cls.get_block_size(company), wanted)
+            reserved = cls.reserve_block(company, size)
+            numbers.extend(reserved[:wanted])
+
+            unused = reserved[wanted:]
+            if unused:
+                expires_at = add_to_date(now, minutes=LEASE_MINUTES)
+                lease = cls.lease(company, unused, expires_at)
+                pending.extend((nomor_faktur, lease, expires_at) for nomor_faktur in unused)
+
+        return numbers
+
+    @classmethod
+    def reserve_block(cls, company: str, count: int) -> List[str]:
+        """
+        Reserve numbers in the database, bypassing the process block.
+
+        Released numbers are reused first, then the active NSFP ranges
+        are consumed in order, rolling over to the next range when one
+        runs out. The rows stay locked until the transaction ends.
+
+        Args:
+            company: Company name
+            count: Number of faktur numbers wanted
+
+        Returns:
+            List[str]: Reserved numbers, fewer than count if all ranges run out
+        """
+        if count <= 0:
+            return []
+
+        numbers = cls._reserve_unused(company, count)
+
+        if len(numbers) < count:
+            ranges = frappe.db.sql("""
+                SELECT r.name, r.prefix, r.range_end, r.next_number
+                FROM `tabEfaktur NSFP Range` r
+                JOIN `tabEfaktur Config` c ON c.name = r.parent
+                WHERE r.parenttype = 'Efaktur Config'
+                AND c.company = %s
+                AND c.is_active = 1
+                AND r.is_active = 1
+                AND r.next_number <= r.range_end
+                ORDER BY r.idx
+                FOR UPDATE
+            """, company, as_dict=1)
+
+            for nsfp_range in ranges:
+                remaining = count - len(numbers)
+                if remaining <= 0:
+                    break
+
+                next_number = cint(nsfp_range.next_number)
+                take = min(remaining, cint(nsfp_range.range_end) - next_number + 1)
+                numbers.extend(
+                    format_nomor_faktur(nsfp_range.prefix, number)
+                    for number in range(next_number, next_number + take)
+                )
+                frappe.db.sql("""
+                    UPDATE `tabEfaktur NSFP Range`
+                    SET next_number = %s
+                    WHERE name = %s
+                """, (next_number + take, nsfp_range.name))
+
+        return numbers
+
+    @classmethod
+    def release(cls, company: str, numbers: List[str], reason: str) -> None:
+        """Record numbers that were reserved but not used, so they are issued again"""
+        for nomor_faktur in numbers:
+            frappe.get_doc({
+                "doctype": "Efaktur Unused Number",
+                "company": company,
+                "nomor_faktur": nomor_faktur,
+                "reason": reason
+            }).db_insert()
+
+    @staticmethod
+    def lease(company: str, numbers: List[str], expires_at: Any) -> str:
+        """Record the unused part of a block held by this process, returns the lease name"""
+        lease = frappe.get_doc({
+            "doctype": "Efaktur Number Lease",
+            "company": company,
+            "worker": WORKER_ID,
+            "expires_at": expires_at,
+            "numbers": "\n".join(numbers)
+        })
+        lease.db_insert()
+        return lease.name
+
+    @classmethod
+    def release_process_blocks(cls, reason: str = "Worker exit") -> None:
+        """
+        Release the numbers held for the current site in the caller's transaction.
+
+        Covers the process block and the blocks reserved by the current
+        transaction, and drops their leases. Numbers of expired leases are
+        left to reclaim_expired_leases. Numbers are put back when the
+        release fails.
+        """
+        site = frappe.local.site
+        now = now_datetime()
+        with cls._lock:
+            held = [
+                (key, [entry for entry in block if entry[2] > now])
+                for key, block in cls._blocks.items()
+                if key[0] == site and block
+            ]
+            for key, _entries in held:
+                cls._blocks[key].clear()
+
+        try:
+            for (_site, company), entries in held:
+                cls._release_entries(company, entries, reason)
+        except Exception:
+            with cls._lock:
+                for key, entries in held:
+                    cls._blocks.setdefault(key, deque()).extendleft(reversed(entries))
+            raise
+
+        cls.release_pending(reason)
+
+    @classmethod
+    def release_pending(cls, reason: str) -> None:
+        """Release the unused numbers of the blocks reserved by the current transaction"""
+        journal = getattr(frappe.local, "nomor_faktur_journal", None)
+        if not journal:
+            return
+
+        for (_site, company), entries in journal["pending"].items():
+            cls._release_entries(company, list(entries), reason)
+            entries.clear()
+
+    @classmethod
+    def has_pending(cls) -> bool:
+        """Check whether the current transaction holds unused numbers of blocks it reserved"""
+        journal = getattr(frappe.local, "nomor_faktur_journal", None)
+        return bool(journal and any(journal["pending"].values()))
+
+    @classmethod
+    def clear(cls) -> None:
+        """Forget every held number without releasing it, used by tests"""
+        with cls._lock:
+            cls._blocks.clear()
+        frappe.local.nomor_faktur_journal = None
+
+    @staticmethod
+    def get_block_size(company: str) -> int:
+        return max(cint(frappe.db.get_value(
+            "Efaktur Config", {"company": company, "is_active": 1}, "block_size"
+        )), 1)
+
+    @classmethod
+    def _release_entries(cls, company: str, entries: List[BlockEntry], reason: str) -> None:
+        """Record block entries as unused and drop the leases they belong to"""
+        if not entries:
+            return
+
+        cls.release(company, [nomor_faktur for nomor_faktur, _lease, _expires_at in entries], reason)
+        frappe.db.sql("""
+            DELETE FROM `tabEfaktur Number Lease`
+            WHERE name IN %s
+        """, (tuple({lease for _nomor_faktur, lease, _expires_at in entries}),))
+
+    @staticmethod
+    def _reserve_unused(company: str, count: int) -> List[str]:
+        unused = frappe.db.sql("""
+            SELECT name, nomor_faktur
+            FROM `tabEfaktur Unused Number`
+            WHERE company = %s
+            ORDER BY nomor_faktur
+            LIMIT %s
+            FOR UPDATE
+        """, (company, count), as_dict=1)
+
+        if unused:
+            frappe.db.sql("""
+                DELETE FROM `tabEfaktur Unused Number`
+                WHERE name IN %s
+            """, (tuple(row.name for row in unused),))
+
+        return [row.nomor_faktur for row in unused]
+
+    @classmethod
+    def _get_journal(cls) -> Dict[str, Any]:
+        """
+        Block changes of the current transaction: entries taken from the
+        process block, and the unused entries of blocks reserved in it
+        """
+        journal = getattr(frappe.local, "nomor_faktur_journal", None)
+        if journal is None:
+            journal = frappe.local.nomor_faktur_journal = {"taken": [], "pending": {}}
+            frappe.db.after_commit.add(cls._commit_journal)
+            frappe.db.after_rollback.add(cls._undo_journal)
+        return journal
+
+    @classmethod
+    def _commit_journal(cls) -> None:
+        """Hand the unused entries of committed reservations to the process block"""
+        journal = getattr(frappe.local, "nomor_faktur_journal", None)
+        frappe.local.nomor_faktur_journal = None
+        if not journal:
+            return
+
+        with cls._lock:
+            for key, entries in journal["pending"].items():
+                if entries:
+                    cls._blocks.setdefault(key, deque()).extend(entries)
+
+    @classmethod
+    def _undo_journal(cls) -> None:
+        """Put back entries taken from the process block, reservations and leases are rolled back"""
+        journal = getattr(frappe.local, "nomor_faktur_journal", None)
+        frappe.local.nomor_faktur_journal = None
+        if not journal:
+            return
+
+        with cls._lock:
+            for key, entries in reversed(journal["taken"]):
+                if entries:
+                    cls._blocks.setdefault(key, deque()).extendleft(reversed(entries))
+
+def format_nomor_faktur(prefix: str, number: int) -> str:
+    """Format faktur number according to DJP standard (with dots and dash)"""
+    digits = str(number).zfill(8)
+    return f"{prefix}.{digits[:3]}.{digits[3:6]}.{digits[6:]}"
+
+def allocate_nomor_faktur(company: str) -> str:
+    """Allocate a single nomor faktur, or None when all ranges are used up"""
+    numbers = NomorFakturAllocator.allocate(company)
+    return numbers[0] if numbers else None
+
+def release_held_blocks() -> None:
+    """
+    after_request and after_job hook: record the unused numbers of blocks
+    reserved by a transaction that is still open as unused.
+
+    Committed blocks stay with the process for the next requests, their
+    leases cover a worker that dies.
+    """
+    if not getattr(frappe.local, "site", None) or not NomorFakturAllocator.has_pending():
+        return
+
+    try:
+        NomorFakturAllocator.release_pending("Request ended")
+        frappe.db.commit()
+    except Exception:
+        frappe.db.rollback()
+        frappe.log_error(message=frappe.get_traceback(), title="Nomor Faktur Release Error")
+
+def reclaim_expired_leases() -> int:
+    """
+    Scheduler job: issue the numbers of expired leases again.
+
+    Numbers used by an Efaktur Document or already recorded as unused
+    are skipped, the rest are recorded as Efaktur Unused Number.
+
+    Returns:
+        int: Number of leases reclaimed
+    """
+    leases = frappe.db.sql("""
+        SELECT name, company, numbers
+        FROM `tabEfaktur Number Lease`
+        WHERE expires_at < %s
+        ORDER BY expires_at
+        FOR UPDATE
+    """, add_to_date(now_datetime(), minutes=-RECLAIM_GRACE_MINUTES), as_dict=1)
+
+    for lease in leases:
+        numbers = [nomor_faktur for nomor_faktur in (lease.numbers or "").split("\n") if nomor_faktur]
+        if numbers:
+            used = set(frappe.get_all(
+                "Efaktur Document",
+                filters={"company": lease.company, "nomor_faktur": ["in", numbers]},
+                pluck="nomor_faktur"
+            ))
+            used.update(frappe.get_all(
+                "Efaktur Unused Number",
+                filters={"company": lease.company, "nomor_faktur": ["in", numbers]},
+                pluck="nomor_faktur"
+            ))
+            NomorFakturAllocator.release(
+                lease.company,
+                [nomor_faktur for nomor_faktur in numbers if nomor_faktur not in used],
+                "Lease expired"
+            )
+        frappe.db.delete("Efaktur Number Lease", {"name": lease.name})
+
+    return len(leases)
+
+def release_blocks_on_exit() -> None:
+    """Record numbers still held by this process as unused when it exits, e.g. bench console"""
+    with NomorFakturAllocator._lock:
+        blocks = [key for key, block in NomorFakturAllocator._blocks.items() if block]
+    for site in {site for site, _company in blocks}:
+        try:
+            frappe.init(site=site)
+            frappe.connect()
+            NomorFakturAllocator.release_process_blocks()
+            frappe.db.commit()
+        except Exception:
+            # Nothing can be reported reliably while the interpreter shuts down
+            pass
+        finally:
+            frappe.destroy()
+
+atexit.register(release_blocks_on_exit)
@@ -0,0 +1,29 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from pajak_indonesia.efaktur.allocation import allocate, calculate_efaktur_amounts, to_rupiah
+
+class TestEfakturAllocation(FrappeTestCase):
+    def test_shares_add_up_to_total(self):
+        """Largest remainders go to the earliest lines on ties"""
+        self.assertEqual(allocate(100, [1, 1, 1]), [34, 33, 33])
+        self.assertEqual(allocate(-100, [1, 1, 1]), [-33, -33, -34])
+        self.assertEqual(allocate(10, [0, 0]), [5, 5])
+        self.assertEqual(allocate(11, [333.33, 666.67]), [4, 7])
+
+    def test_round_half_away_from_zero(self):
+        self.assertEqual(to_rupiah(2.5), 3)
+        self.assertEqual(to_rupiah(-2.5), -3)
+        self.assertEqual(to_rupiah(None), 0)
+
+    def test_line_ppn_reconciles_with_total(self):
+        """PPN of many small lines adds up to 11% of the document DPP"""
+        items = [
+            frappe._dict({"harga_satuan": 1234.5, "jumlah_barang": 3, "diskon": 0, "tarif_ppnbm": 0})
+            for _i in range(5000)
+        ]
+        totals = calculate_efaktur_amounts(items)
+
+        self.assertEqual(totals["jumlah_dpp"], 5000 * 3704)
+        self.assertEqual(totals["jumlah_ppn"], to_rupiah(5000 * 3704 * 0.11))
+        self.assertEqual(sum(item.ppn for item in items), totals["jumlah_ppn"])
+        self.assertEqual(totals["jumlah_ppnbm"], 0)
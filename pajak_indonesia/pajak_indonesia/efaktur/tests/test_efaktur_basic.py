@@ -2,6 +2,9 @@ import unittest
 import frappe
 from frappe.utils import today, add_days
 from frappe.tests.utils import FrappeTestCase
+from pajak_indonesia.efaktur.utils import make_efaktur_document, build_efaktur_document
+from pajak_indonesia.efaktur.nomor_faktur import NomorFakturAllocator
+from pajak_indonesia.tax_accounts import TaxAccountResolver
 
 class TestEfakturBasic(FrappeTestCase):
     @classmethod
@@ -93,7 +96,81 @@ class TestEfakturBasic(FrappeTestCase):
                                  filters={"reference_name": si.name})
         self.assertTrue(len(efaktur) > 0)
 
-def create_test_sales_invoice():
+    def test_make_efaktur_document(self):
+        """Test e-Faktur creation for a Sales Invoice with PPN"""
+        ppn_account = create_ppn_output_account()
+        create_test_efaktur_config()
+        
+        si = create_test_sales_invoice(taxes=[{
+            "charge_type": "On Net Total",
+            "account_head": ppn_account,
+            "description": "PPN Keluaran",
+            "rate": 11
+        }])
+        efaktur = make_efaktur_document(si)
+        
+        self.assertTrue(efaktur)
+        self.assertEqual(efaktur.reference_name, si.name)
+        self.assertEqual(efaktur.npwp, "02.345.678.9-234.000")
+        self.assertEqual(efaktur.nomor_faktur, "010.000-24.000.000.01")
+        self.assertEqual(efaktur.jumlah_ppn, 110000)
+        self.assertEqual(frappe.db.get_value("Sales Invoice", si.name, "has_generated_efaktur"), 1)
+
+    def test_invoice_ppn_is_kept(self):
+        """Documents built from an invoice keep its PPN instead of recomputing 11%"""
+        ppn_account = create_ppn_output_account()
+        si = create_test_sales_invoice(taxes=[{
+            "charge_type": "On Net Total",
+            "account_head": ppn_account,
+            "description": "PPN Keluaran",
+            "rate": 12
+        }])
+        
+        efaktur = build_efaktur_document(
+            si, si.items, 120000, "010.000-24.000.000.09", "02.345.678.9-234.000", "Jakarta"
+        )
+        efaktur.insert()
+        
+        self.assertEqual(efaktur.jumlah_dpp, 1000000)
+        self.assertEqual(efaktur.jumlah_ppn, 120000)
+        self.assertEqual(efaktur.items[0].ppn, 120000)
+
+def create_ppn_output_account():
+    """PPN output account of the test company, resolved by the account name"""
+    abbr = frappe.get_cached_value("Company", "_Test Company IDN", "abbr")
+    name = f"PPN Output - {abbr}"
+    if not frappe.db.exists("Account", name):
+        frappe.get_doc({
+            "doctype": "Account",
+            "account_name": "PPN Output",
+            "parent_account": frappe.db.get_value(
+                "Account", {"company": "_Test Company IDN", "is_group": 1, "root_type": "Liability"}, "name"
+            ),
+            "company": "_Test Company IDN",
+            "account_type": "Tax",
+            "root_type": "Liability"
+        }).insert()
+    TaxAccountResolver.invalidate("_Test Company IDN")
+    return name
+
+def create_test_efaktur_config():
+    """Efaktur Config of the test company with one small NSFP range"""
+    NomorFakturAllocator.clear()
+    frappe.db.delete("Efaktur Unused Number", {"company": "_Test Company IDN"})
+    if frappe.db.exists("Efaktur Config", "_Test Company IDN"):
+        frappe.delete_doc("Efaktur Config", "_Test Company IDN", force=True)
+    
+    frappe.get_doc({
+        "doctype": "Efaktur Config",
+        "company": "_Test Company IDN",
+        "is_active": 1,
+        "block_size": 1,
+        "ranges": [
+            {"prefix": "010.000-24", "range_start": 1, "range_end": 10, "is_active": 1}
+        ]
+    }).insert()
+
+def create_test_sales_invoice(taxes=None):
     """Helper function to create test Sales Invoice"""
     return frappe.get_doc({
         "doctype": "Sales Invoice",
@@ -106,5 +183,6 @@ def create_test_sales_invoice():
                 "qty": 1,
                 "rate": 1000000
             }
-        ]
+        ],
+        "taxes": taxes or []
     }).insert()
\ No newline at end of file
@@ -0,0 +1,96 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from frappe.utils import add_to_date, now_datetime
+from pajak_indonesia.efaktur.nomor_faktur import NomorFakturAllocator, reclaim_expired_leases
+
+TEST_COMPANY = "_Test Company IDN"
+
+class TestNomorFaktur(FrappeTestCase):
+    def setUp(self):
+        """Set up an Efaktur Config with two small NSFP ranges"""
+        NomorFakturAllocator.clear()
+        frappe.db.delete("Efaktur Unused Number", {"company": TEST_COMPANY})
+        frappe.db.delete("Efaktur Number Lease", {"company": TEST_COMPANY})
+        if frappe.db.exists("Efaktur Config", TEST_COMPANY):
+            frappe.delete_doc("Efaktur Config", TEST_COMPANY, force=True)
+
+        frappe.get_doc({
+            "doctype": "Efaktur Config",
+            "company": TEST_COMPANY,
+            "is_active": 1,
+            "block_size": 2,
+            "ranges": [
+                {"prefix": "010.000-24", "range_start": 1, "range_end": 3, "is_active": 1},
+                {"prefix": "010.000-24", "range_start": 101, "range_end": 102, "is_active": 1}
+            ]
+        }).insert()
+
+    def tearDown(self):
+        NomorFakturAllocator.clear()
+
+    def test_rollover_to_next_range(self):
+        """Numbers continue in the next range and stop when all ranges are used"""
+        numbers = NomorFakturAllocator.allocate(TEST_COMPANY, count=6)
+        self.assertEqual(numbers, [
+            "010.000-24.000.000.01",
+            "010.000-24.000.000.02",
+            "010.000-24.000.000.03",
+            "010.000-24.000.001.01",
+            "010.000-24.000.001.02"
+        ])
+
+    def test_released_numbers_are_reused(self):
+        """Numbers left in a process block are issued again after release"""
+        first = NomorFakturAllocator.allocate(TEST_COMPANY)
+        NomorFakturAllocator.release_process_blocks("Test")
+        NomorFakturAllocator.clear()
+
+        second = NomorFakturAllocator.allocate(TEST_COMPANY)
+        self.assertNotEqual(first, second)
+        self.assertEqual(second, ["010.000-24.000.000.02"])
+
+    def test_block_joins_process_after_commit(self):
+        """The rest of a block is shared with other threads only once its reservation commits"""
+        NomorFakturAllocator.allocate(TEST_COMPANY)
+        key = (frappe.local.site, TEST_COMPANY)
+        self.assertFalse(NomorFakturAllocator._blocks.get(key))
+        self.assertTrue(NomorFakturAllocator.has_pending())
+
+        NomorFakturAllocator._commit_journal()
+        self.assertEqual(
+            [nomor_faktur for nomor_faktur, _lease, _expires_at in NomorFakturAllocator._blocks[key]],
+            ["010.000-24.000.000.02"]
+        )
+        self.assertFalse(NomorFakturAllocator.has_pending())
+
+    def test_block_is_leased(self):
+        """The unused part of a block is recorded as a lease of the worker"""
+        NomorFakturAllocator.allocate(TEST_COMPANY)
+        leases = frappe.get_all("Efaktur Number Lease", filters={"company": TEST_COMPANY}, pluck="numbers")
+        self.assertEqual(leases, ["010.000-24.000.000.02"])
+
+        NomorFakturAllocator.release_pending("Test")
+        self.assertFalse(frappe.db.exists("Efaktur Number Lease", {"company": TEST_COMPANY}))
+        self.assertTrue(frappe.db.exists("Efaktur Unused Number", {"nomor_faktur": "010.000-24.000.000.02"}))
+
+    def test_expired_lease_is_reclaimed(self):
+        """Numbers of a worker that died are issued again once its lease expires"""
+        NomorFakturAllocator.allocate(TEST_COMPANY, block_size=3)
+        frappe.db.set_value(
+            "Efaktur Number Lease", {"company": TEST_COMPANY},
+            "expires_at", add_to_date(now_datetime(), hours=-2)
+        )
+        NomorFakturAllocator.clear()
+
+        self.assertEqual(reclaim_expired_leases(), 1)
+        self.assertEqual(
+            NomorFakturAllocator.allocate(TEST_COMPANY, count=2),
+            ["010.000-24.000.000.02", "010.000-24.000.000.03"]
+        )
+
+    def test_stale_config_cannot_move_next_number_back(self):
+        """Saving a config opened before numbers were issued is rejected"""
+        config = frappe.get_doc("Efaktur Config", TEST_COMPANY)
+        NomorFakturAllocator.allocate(TEST_COMPANY)
+
+        self.assertRaises(frappe.ValidationError, config.save)
@@ -1,9 +1,20 @@
-from typing import Optional
+from typing import Optional, List, Any
 import frappe
 from frappe import _
 from frappe.model.document import Document
 from frappe.utils import getdate, nowdate, flt, get_datetime
+from pajak_indonesia.tax_accounts import get_ppn_account
+from pajak_indonesia.outbox import is_outbox_enabled, record_event
+from pajak_indonesia.efaktur.allocation import allocate, to_rupiah
+from pajak_indonesia.party_profile import get_party_profile
+from pajak_indonesia.efaktur.nomor_faktur import (
+    NomorFakturAllocator,
+    allocate_nomor_faktur,
+    format_nomor_faktur
+)
+from pajak_indonesia.profiling import profiled
 
+@profiled
 def create_document(doc: Document, method: Optional[str] = None) -> Optional[Document]:
     """
     Create Efaktur document from Sales Invoice on submission.
@@ -26,8 +37,50 @@ def create_document(doc: Document, method: Optional[str] = None) -> Optional[Doc
     if not doc.doctype == "Sales Invoice" or doc.docstatus != 1:
         return None
         
-    # Skip if e-Faktur already exists
-    if doc.get("has_generated_efaktur"):
+    # Leave imported invoices to the bulk e-Faktur job when configured
+    if frappe.flags.in_import and frappe.conf.get("defer_efaktur_on_import"):
+        return None
+    
+    # Create the e-Faktur in a background worker when the outbox is enabled
+    if is_outbox_enabled():
+        record_event("Create E-Faktur", doc)
+        return None
+    
+    try:
+        efaktur = make_efaktur_document(doc)
+        
+    except Exception as e:
+        frappe.log_error(
+            message=f"Failed to create E-Faktur document for {doc.name}: {str(e)}",
+            title="E-Faktur Creation Error"
+        )
+        frappe.msgprint(_("Failed to create E-Faktur document: {0}").format(str(e)))
+        return None
+    
+    if efaktur:
+        frappe.msgprint(_("E-Faktur document {0} has been created").format(
+            frappe.bold(efaktur.name)))
+    
+    return efaktur
+
+def make_efaktur_document(doc: Document) -> Optional[Document]:
+    """
+    Create the Efaktur Document of a submitted Sales Invoice.
+    
+    Runs inside the caller's transaction and raises on failure, so it can
+    be used both from the submit hook and from the tax event outbox.
+    
+    Args:
+        doc: The submitted Sales Invoice document
+    
+    Returns:
+        Optional[Document]: The created Efaktur Document or None if not applicable
+    """
+    # Skip if e-Faktur already exists; the invoice row stays locked until
+    # the e-Faktur is committed, so concurrent callers wait and see the flag
+    if doc.get("has_generated_efaktur") or frappe.db.get_value(
+        "Sales Invoice", doc.name, "has_generated_efaktur", for_update=True
+    ):
         frappe.msgprint(_("E-Faktur already generated for this invoice"))
         return None
     
@@ -50,128 +103,94 @@ def create_document(doc: Document, method: Optional[str] = None) -> Optional[Doc
         frappe.msgprint(_("No PPN tax found in invoice. Skipping e-Faktur generation."))
         return None
     
-    try:
-        # Get next available nomor faktur
-        nomor_faktur = get_next_nomor_faktur(doc.company)
-        if not nomor_faktur:
-            frappe.msgprint(_("No available faktur number. Please update Efaktur Config."))
-            return None
-        
-        # Extract fiscal period
-        posting_date = getdate(doc.posting_date)
-        masa_pajak = posting_date.strftime("%m")
-        tahun_pajak = posting_date.strftime("%Y")
-        
-        # Get customer details
-        customer_doc = frappe.get_doc("Customer", doc.customer)
-        npwp = customer_doc.get("tax_id") or "000000000000000"
-        
-        # Create Efaktur Document
-        efaktur = frappe.new_doc("Efaktur Document")
-        efaktur.update({
-            "kode_jenis_transaksi": "01",  # Default to standard sale
-            "fg_pengganti": "0",           # Default to not replacement
-            "nomor_faktur": nomor_faktur,
-            "masa_pajak": masa_pajak,
-            "tahun_pajak": tahun_pajak,
-            "tanggal_faktur": doc.posting_date,
-            "npwp": npwp,
-            "nama": doc.customer_name,
-            "alamat_lengkap": doc.address_display or customer_doc.get("address") or "Indonesia",
-            "referensi": doc.name,
-            "fg_uang_muka": "0"            # Default to not advance payment
-        })
-        
-        # Set DPP and PPN details
-        base_grand_total = doc.base_grand_total - ppn_amount
-        
-        # Add invoice items
-        for item in doc.items:
-            # Calculate item's contribution to total
-            item_ratio = flt(item.base_amount) / flt(doc.base_net_total) if doc.base_net_total else 0
-            
-            # Calculate item's share of DPP and PPN
-            item_dpp = flt(base_grand_total) * item_ratio
-            item_ppn = flt(ppn_amount) * item_ratio
-            
-            efaktur.append("items", {
-                "nama_barang": item.item_name or item.item_code,
-                "harga_satuan": item.base_rate,
-                "jumlah_barang": item.qty,
-                "harga_total": item.base_amount,
-                "dpp": item_dpp,
-                "ppn": item_ppn
-            })
-        
-        # Set document links
-        efaktur.reference_doctype = doc.doctype
-        efaktur.reference_name = doc.name
-        
-        # Save and submit document
-        efaktur.insert()
-        
-        # Update original invoice
-        frappe.db.set_value("Sales Invoice", doc.name, "has_generated_efaktur", 1)
-        frappe.db.commit()
-        
-        frappe.msgprint(_("E-Faktur document {0} has been created").format(
-            frappe.bold(efaktur.name)))
-        
-        return efaktur
-        
-    except Exception as e:
-        frappe.log_error(
-            message=f"Failed to create E-Faktur document for {doc.name}: {str(e)}",
-            title="E-Faktur Creation Error"
-        )
-        frappe.msgprint(_("Failed to create E-Faktur document: {0}").format(str(e)))
-        return None
+    # Get next available nomor faktur
+    nomor_faktur = get_next_nomor_faktur(doc.company)
+    if not nomor_faktur:
+        frappe.throw(_("No available faktur number. Please update Efaktur Config."))
+    
+    # Get customer details
+    customer = get_party_profile("Customer", doc.customer)
+    npwp = customer.npwp or "000000000000000"
+    alamat = doc.address_display or customer.address or "Indonesia"
+    
+    efaktur = build_efaktur_document(doc, doc.items, ppn_amount, nomor_faktur, npwp, alamat)
+    efaktur.insert()
+    
+    # Update original invoice; committed together with the submit
+    frappe.db.set_value("Sales Invoice", doc.name, "has_generated_efaktur", 1)
+    
+    return efaktur
 
-def get_ppn_account(company: str) -> Optional[str]:
+def build_efaktur_document(invoice: Any, items: List[Any], ppn_amount: float,
+                           nomor_faktur: str, npwp: str, alamat: str) -> Document:
     """
-    Get PPN Output account for company.
+    Build an unsaved Efaktur Document for a Sales Invoice.
     
     Args:
-        company: Company name
+        invoice: Sales Invoice document or row with company, posting_date,
+            customer_name, base_grand_total and base_net_total
+        items: Sales Invoice Item documents or rows of the invoice
+        ppn_amount: PPN tax amount of the invoice
+        nomor_faktur: Faktur number to assign
+        npwp: Customer NPWP
+        alamat: Customer address
         
     Returns:
-        Optional[str]: Account head for PPN Output or None if not found
+        Document: New Efaktur Document, not yet inserted
     """
-    # First try to get from Tax Category
-    ppn_account = frappe.db.get_value(
-        "Tax Category Account",
-        {"parent": "PPN", "company": company},
-        "account"
-    )
-    
-    # If not found, try to get from Account with 'ppn_out' in account_name or account_number
-    if not ppn_account:
-        ppn_accounts = frappe.get_list(
-            "Account",
-            filters={
-                "company": company,
-                "account_type": "Tax",
-                "is_group": 0
-            },
-            or_filters={
-                "account_name": ["like", "%ppn%out%"],
-                "account_name": ["like", "%ppn%output%"],
-                "account_name": ["like", "%vat%out%"],
-                "account_name": ["like", "%pajak%keluar%"],
-                "name": ["like", "%ppn%out%"]
-            },
-            fields=["name"],
-            limit=1
-        )
-        
-        if ppn_accounts:
-            ppn_account = ppn_accounts[0].name
+    # Extract fiscal period
+    posting_date = getdate(invoice.posting_date)
+    masa_pajak = posting_date.strftime("%m")
+    tahun_pajak = posting_date.strftime("%Y")
+    
+    # Create Efaktur Document
+    efaktur = frappe.new_doc("Efaktur Document")
+    efaktur.update({
+        "company": invoice.company,
+        "kode_jenis_transaksi": "01",  # Default to standard sale
+        "fg_pengganti": "0",           # Default to not replacement
+        "nomor_faktur": nomor_faktur,
+        "masa_pajak": masa_pajak,
+        "tahun_pajak": tahun_pajak,
+        "tanggal_faktur": invoice.posting_date,
+        "npwp": npwp,
+        "nama": invoice.customer_name,
+        "alamat_lengkap": alamat,
+        "referensi": invoice.name,
+        "fg_uang_muka": "0"            # Default to not advance payment
+    })
+    
+    # Split DPP and PPN over the items in whole rupiah; the shares add up to the totals
+    weights = [item.base_amount for item in items]
+    jumlah_ppn = to_rupiah(ppn_amount)
+    jumlah_dpp = to_rupiah(flt(invoice.base_grand_total) - flt(ppn_amount))
+    
+    for item, item_dpp, item_ppn in zip(items, allocate(jumlah_dpp, weights), allocate(jumlah_ppn, weights)):
+        efaktur.append("items", {
+            "nama_barang": item.item_name or item.item_code,
+            "harga_satuan": item.base_rate,
+            "jumlah_barang": item.qty,
+            "harga_total": item.base_amount,
+            "dpp": item_dpp,
+            "ppn": item_ppn,
+            "ppnbm": 0
+        })
+    
+    efaktur.jumlah_dpp = jumlah_dpp
+    efaktur.jumlah_ppn = jumlah_ppn
     
-    return ppn_account
+    # Set document links
+    efaktur.reference_doctype = "Sales Invoice"
+    efaktur.reference_name = invoice.name
+    
+    return efaktur
 
 def get_next_nomor_faktur(company: str) -> Optional[str]:
     """
-    Get next available faktur number from Efaktur Config.
+    Get next available faktur number from the company's NSFP ranges.
+    
+    Numbers come from a block held by the current worker process, so
+    the ranges are only locked when a new block has to be reserved.
     
     Args:
         company: Company name
@@ -179,35 +198,20 @@ def get_next_nomor_faktur(company: str) -> Optional[str]:
     Returns:
         Optional[str]: Next available faktur number or None if not available
     """
-    # Get config for the company
-    config = frappe.get_all(
-        "Efaktur Config",
-        filters={"company": company, "is_active": 1},
-        fields=["name", "current_prefix", "current_start", "current_end", "next_number"],
-        limit=1
-    )
-    
-    if not config:
-        return None
-    
-    config = config[0]
+    return allocate_nomor_faktur(company)
+
+def reserve_nomor_faktur_block(company: str, count: int) -> List[str]:
+    """
+    Reserve a block of faktur numbers directly from Efaktur Config.
     
-    # Check if numbers are still available
-    if int(config.next_number) > int(config.current_end):
-        return None
+    The NSFP range rows are locked for the rest of the transaction, so
+    concurrent callers never receive the same numbers.
     
-    # Format faktur number according to DJP standard (with dots and dash)
-    prefix = config.current_prefix
-    next_number = config.next_number.zfill(8)
-    nomor_faktur = f"{prefix}.{next_number[:3]}.{next_number[3:6]}.{next_number[6:]}"
-    
-    # Update next number
-    next_number_int = int(config.next_number) + 1
-    frappe.db.set_value(
-        "Efaktur Config",
-        config.name,
-        "next_number",
-        str(next_number_int).zfill(8)
-    )
-    
-    return nomor_faktur
\ No newline at end of file
+    Args:
+        company: Company name
+        count: Number of faktur numbers wanted
+        
+    Returns:
+        List[str]: Reserved faktur numbers, fewer than count if the ranges run out
+    """
+    return NomorFakturAllocator.reserve_block(company, count)
\ No newline at end of file
@@ -0,0 +1,100 @@
+from typing import Optional, Dict, Any, List
+import json
+import frappe
+
+class BulkJobProgress:
+    """Tracks progress and per-document failures of a chunked background job"""
+
+    CACHE_TIMEOUT = 86400  # 1 day
+    MAX_FAILURES_RETURNED = 500
+
+    def __init__(self, job_type: str, batch_id: Optional[str] = None):
+        self.job_type = job_type
+        self.batch_id = batch_id or frappe.generate_hash(length=12)
+
+    @property
+    def counters_key(self) -> str:
+        return frappe.cache().make_key(f"pajak_bulk_job::{self.job_type}::{self.batch_id}")
+
+    @property
+    def failures_key(self) -> str:
+        return frappe.cache().make_key(f"pajak_bulk_job_failures::{self.job_type}::{self.batch_id}")
+
+    def start(self, total: int, chunks: int) -> None:
+        """Initialize counters before the chunk jobs are enqueued"""
+        pipe = frappe.cache().pipeline()
+        pipe.delete(self.counters_key, self.failures_key)
+        for field, value in {
+            "total": total,
+            "chunks": chunks,
+            "chunks_done": 0,
+            "processed": 0,
+            "succeeded": 0,
+            "failed": 0
+        }.items():
+            pipe.hset(self.counters_key, field, value)
+        pipe.expire(self.counters_key, self.CACHE_TIMEOUT)
+        pipe.execute()
+
+    def record_chunk(self, succeeded: int, failures: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Add the outcome of one chunk and publish the new progress.
+
+        Args:
+            succeeded: Number of documents processed successfully
+            failures: One dict per failed document, e.g. {"name": ..., "error": ...}
+
+        Returns:
+            dict: Progress after this chunk
+        """
+        pipe = frappe.cache().pipeline()
+        pipe.hincrby(self.counters_key, "processed", succeeded + len(failures))
+        pipe.hincrby(self.counters_key, "succeeded", succeeded)
+        pipe.hincrby(self.counters_key, "failed", len(failures))
+        pipe.hincrby(self.counters_key, "chunks_done", 1)
+        if failures:
+            pipe.rpush(self.failures_key, *[json.dumps(f, default=str) for f in failures])
+            pipe.expire(self.failures_key, self.CACHE_TIMEOUT)
+        pipe.execute()
+
+        status = self.get_status(include_failures=False)
+        frappe.publish_realtime(
+            "pajak_bulk_job_progress",
+            status,
+            user=frappe.session.user
+        )
+        return status
+
+    def get_status(self, include_failures: bool = True) -> Dict[str, Any]:
+        """Get counters and, optionally, the recorded failures"""
+        # Raw pipeline commands: counters are plain integers, not pickled values
+        pipe = frappe.cache().pipeline()
+        pipe.hgetall(self.counters_key)
+        pipe.lrange(self.failures_key, 0, self.MAX_FAILURES_RETURNED - 1)
+        raw_counters, raw_failures = pipe.execute()
+        counters = {frappe.safe_decode(k): int(v) for k, v in (raw_counters or {}).items()}
+
+        status = {
+            "job_type": self.job_type,
+            "batch_id": self.batch_id,
+            "total": counters.get("total", 0),
+            "processed": counters.get("processed", 0),
+            "succeeded": counters.get("succeeded", 0),
+            "failed": counters.get("failed", 0),
+            "chunks": counters.get("chunks", 0),
+            "chunks_done": counters.get("chunks_done", 0)
+        }
+        status["progress"] = (
+            round(status["processed"] * 100.0 / status["total"], 2) if status["total"] else 100.0
+        )
+        status["completed"] = status["chunks_done"] >= status["chunks"]
+
+        if include_failures:
+            status["failures"] = [json.loads(frappe.safe_decode(f)) for f in raw_failures or []]
+
+        return status
+
+def chunk_list(items: List[Any], chunk_size: int) -> List[List[Any]]:
+    """Split a list into consecutive chunks of at most chunk_size items"""
+    chunk_size = max(int(chunk_size or 1), 1)
+    return [items[i:i + chunk_size] for i in range(0, len(items), chunk_size)]
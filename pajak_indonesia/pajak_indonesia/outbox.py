@@ -0,0 +1,246 @@
+from typing import Optional, Dict, Any, List, Tuple
+import frappe
+from frappe.model.document import Document
+from frappe.utils import now_datetime, add_to_date
+from pajak_indonesia.profiling import profiled
+
+OUTBOX_DOCTYPE = "Tax Event Outbox"
+BATCH_SIZE = 100
+MAX_BATCHES_PER_RUN = 4
+MAX_ATTEMPTS = 5
+STALE_AFTER_MINUTES = 30
+
+# Event type -> handler called with the reference document
+EVENT_HANDLERS = {
+    "Create E-Faktur": "pajak_indonesia.efaktur.utils.make_efaktur_document",
+    "Create E-Bupot": "pajak_indonesia.ebupot.utils.make_ebupot_documents",
+    "Link E-Bupot Payment": "pajak_indonesia.ebupot.utils.link_submitted_payment"
+}
+
+def is_outbox_enabled() -> bool:
+    """
+    Whether document hooks record tax events instead of running them inline.
+
+    Enabled per site with `bench --site <site> set-config pajak_tax_event_outbox 1`.
+    """
+    return bool(frappe.conf.get("pajak_tax_event_outbox"))
+
+def record_event(event_type: str, doc: Document) -> Optional[str]:
+    """
+    Record a tax event for a document in the current transaction.
+
+    The event is only written when the transaction commits together with
+    the submitted document, and a second event for the same document and
+    type is ignored.
+
+    Args:
+        event_type: One of EVENT_HANDLERS
+        doc: Document the event is about
+
+    Returns:
+        str: Idempotency key of the new event, None if it was already recorded
+    """
+    key = f"{event_type}::{doc.doctype}::{doc.name}"
+    if frappe.db.exists(OUTBOX_DOCTYPE, key):
+        return None
+
+    try:
+        frappe.get_doc({
+            "doctype": OUTBOX_DOCTYPE,
+            "idempotency_key": key,
+            "event_type": event_type,
+            "reference_doctype": doc.doctype,
+            "reference_name": doc.name,
+            "company": doc.get("company"),
+            "status": "Pending",
+            "next_attempt_at": now_datetime()
+        }).insert(ignore_permissions=True)
+    except frappe.DuplicateEntryError:
+        return None
+
+    return key
+
+def enqueue_outbox_batches() -> int:
+    """
+    Scheduler job: claim due events and hand them to workers in batches.
+
+    Returns:
+        int: Number of batches enqueued
+    """
+    release_stale_events()
+
+    batches = 0
+    for _batch in range(MAX_BATCHES_PER_RUN):
+        claim_token, names = claim_events(BATCH_SIZE)
+        if not names:
+            break
+
+        frappe.enqueue(
+            "pajak_indonesia.outbox.process_events",
+            queue="short",
+            timeout=1800,
+            enqueue_after_commit=True,
+            names=names,
+            claim_token=claim_token
+        )
+        batches += 1
+
+    frappe.db.commit()
+    return batches
+
+def claim_events(limit: int) -> Tuple[str, List[str]]:
+    """Mark up to limit due events as Processing and return the claim token and their names"""
+    token = frappe.generate_hash(length=12)
+    now = now_datetime()
+
+    # A single UPDATE claims the rows, so concurrent schedulers never share events
+    frappe.db.sql("""
+        UPDATE `tabTax Event Outbox`
+        SET status = 'Processing', claim_token = %(token)s, modified = %(now)s
+        WHERE status IN ('Pending', 'Failed')
+        AND next_attempt_at <= %(now)s
+        ORDER BY next_attempt_at, creation
+        LIMIT %(limit)s
+    """, {"token": token, "now": now, "limit": limit})
+
+    return token, frappe.db.sql_list("""
+        SELECT name FROM `tabTax Event Outbox`
+        WHERE claim_token = %(token)s AND status = 'Processing'
+        ORDER BY next_attempt_at, creation
+    """, {"token": token})
+
+def release_stale_events() -> None:
+    """
+    Return events of workers that died while processing them to the queue.
+
+    A dead worker counts as a failed attempt, so an event that keeps
+    killing its worker (out of memory, timeout) ends up as Dead.
+    """
+    # attempts is assigned last, the other columns read its old value
+    frappe.db.sql("""
+        UPDATE `tabTax Event Outbox`
+        SET status = IF(IFNULL(attempts, 0) + 1 >= %(max_attempts)s, 'Dead', 'Failed'),
+            next_attempt_at = DATE_ADD(%(now)s, INTERVAL POW(2, IFNULL(attempts, 0) + 1) MINUTE),
+            claim_token = NULL,
+            last_error = %(error)s,
+            attempts = IFNULL(attempts, 0) + 1
+        WHERE status = 'Processing'
+        AND modified < %(stale_before)s
+    """, {
+        "max_attempts": MAX_ATTEMPTS,
+        "now": now_datetime(),
+        "error": "Worker stopped while processing the event",
+        "stale_before": add_to_date(now_datetime(), minutes=-STALE_AFTER_MINUTES)
+    })
+
+def process_events(names: List[str], claim_token: Optional[str] = None) -> None:
+    """Worker job: run a batch of claimed events, one transaction per event"""
+    for name in names:
+        process_event(name, claim_token)
+        frappe.db.commit()
+
+def process_event(name: str, claim_token: Optional[str] = None) -> None:
+    """
+    Run one claimed event and record the outcome.
+
+    Failed events are retried with exponential backoff and end up as Dead
+    after MAX_ATTEMPTS, where they stay until they are requeued.
+    """
+    event = start_event(name, claim_token)
+    if not event:
+        return
+
+    try:
+        doc = frappe.get_doc(event.reference_doctype, event.reference_name)
+        frappe.get_attr(EVENT_HANDLERS[event.event_type])(doc)
+    except Exception:
+        error = frappe.get_traceback()
+        frappe.db.rollback()
+
+        attempts = (event.attempts or 0) + 1
+        frappe.db.set_value(OUTBOX_DOCTYPE, name, {
+            "status": "Dead" if attempts >= MAX_ATTEMPTS else "Failed",
+            "attempts": attempts,
+            "next_attempt_at": add_to_date(now_datetime(), minutes=2 ** attempts),
+            "claim_token": None,
+            "last_error": error
+        })
+        return
+
+    frappe.db.set_value(OUTBOX_DOCTYPE, name, {
+        "status": "Done",
+        "attempts": (event.attempts or 0) + 1,
+        "processed_at": now_datetime(),
+        "claim_token": None,
+        "last_error": None
+    })
+
+def start_event(name: str, claim_token: Optional[str]) -> Optional[Dict[str, Any]]:
+    """
+    Confirm the claim of an event before its handler runs.
+
+    A job can wait in the queue past STALE_AFTER_MINUTES, after which its
+    events are released and may be claimed again by another job. Only the
+    job holding the current claim token runs the event. The stale timer
+    restarts here and is committed at once, so the release measures the
+    time spent running rather than waiting in the queue.
+
+    Returns:
+        dict: The event, None if the job no longer holds its claim
+    """
+    frappe.db.sql("""
+        UPDATE `tabTax Event Outbox`
+        SET modified = %(now)s
+        WHERE name = %(name)s AND claim_token = %(token)s AND status = 'Processing'
+    """, {"name": name, "token": claim_token, "now": now_datetime()})
+
+    event = frappe.db.sql("""
+        SELECT name, event_type, reference_doctype, reference_name, attempts
+        FROM `tabTax Event Outbox`
+        WHERE name = %(name)s AND claim_token = %(token)s AND status = 'Processing'
+    """, {"name": name, "token": claim_token}, as_dict=1)
+    frappe.db.commit()
+
+    return event[0] if event else None
+
+@frappe.whitelist()
+@profiled
+def requeue_events(names: Optional[Any] = None) -> int:
+    """
+    Put dead events back in the queue.
+
+    Args:
+        names: Optional list (or JSON list) of events, defaults to all dead events
+
+    Returns:
+        int: Number of events requeued
+    """
+    frappe.only_for(["System Manager", "Accounts Manager", "Tax Manager"])
+
+    if isinstance(names, str):
+        names = frappe.parse_json(names)
+
+    filters = {"status": "Dead"}
+    if names:
+        filters["name"] = ["in", names]
+
+    dead = frappe.get_all(OUTBOX_DOCTYPE, filters=filters, pluck="name")
+    for name in dead:
+        frappe.db.set_value(OUTBOX_DOCTYPE, name, {
+            "status": "Pending",
+            "attempts": 0,
+            "next_attempt_at": now_datetime()
+        })
+
+    return len(dead)
+
+@frappe.whitelist()
+@profiled
+def get_outbox_status() -> Dict[str, Any]:
+    """Count events by status"""
+    rows = frappe.get_all(
+        OUTBOX_DOCTYPE,
+        fields=["status", "count(name) as count"],
+        group_by="status"
+    )
+    return {row.status: row.count for row in rows}
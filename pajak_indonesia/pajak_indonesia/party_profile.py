@@ -0,0 +1,246 @@
+from typing import Optional, Dict, Any, List, Iterable
+import json
+import frappe
+from frappe.model.document import Document
+from frappe.contacts.doctype.address.address import get_address_display
+from pajak_indonesia.profiling import profiled
+
+PARTY_TYPES = ("Customer", "Supplier")
+
+PARTY_NAME_FIELDS = {
+    "Customer": "customer_name",
+    "Supplier": "supplier_name"
+}
+
+PRIMARY_ADDRESS_FIELDS = {
+    "Customer": "customer_primary_address",
+    "Supplier": "supplier_primary_address"
+}
+
+class PartyProfileCache:
+    """
+    Caches the tax profile of customers and suppliers: NPWP, name,
+    formatted address and country.
+
+    Profiles of one party type live in one Redis hash as JSON, so a batch
+    of invoices reads all its parties in one round trip, and misses are
+    loaded with one query per table. Profiles are also kept for the
+    request in frappe.local. Customer, Supplier and Address hooks drop
+    the affected profiles once the transaction commits.
+    """
+
+    CACHE_TIMEOUT = 86400  # 1 day
+
+    @staticmethod
+    def cache_key(party_type: str) -> str:
+        return frappe.cache().make_key(f"pajak_party_profiles::{party_type}")
+
+    @classmethod
+    def get_profiles(cls, party_type: str, names: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the tax profiles of many parties of one type.
+
+        Args:
+            party_type: Customer or Supplier
+            names: Party names
+
+        Returns:
+            dict: {name: {"npwp", "party_name", "address", "country"}},
+                parties that do not exist are left out
+        """
+        local_profiles = getattr(frappe.local, "pajak_party_profiles", None)
+        if local_profiles is None:
+            local_profiles = frappe.local.pajak_party_profiles = {}
+        local_profiles = local_profiles.setdefault(party_type, {})
+
+        names = list(dict.fromkeys(name for name in names if name))
+        profiles = {name: local_profiles[name] for name in names if name in local_profiles}
+        missing = [name for name in names if name not in profiles]
+
+        if missing:
+            # Raw pipeline: profiles are JSON shared by all workers, not pickled values
+            pipe = frappe.cache().pipeline()
+            pipe.hmget(cls.cache_key(party_type), missing)
+            for name, raw in zip(missing, pipe.execute()[0]):
+                if raw is not None:
+                    profiles[name] = json.loads(frappe.safe_decode(raw))
+
+            missing = [name for name in missing if name not in profiles]
+            if missing:
+                loaded = load_profiles(party_type, missing)
+                cls.store(party_type, loaded)
+                profiles.update(loaded)
+
+            local_profiles.update({name: profiles[name] for name in names if name in profiles})
+
+        return profiles
+
+    @classmethod
+    def get_profile(cls, party_type: str, name: str) -> Dict[str, Any]:
+        """Get the tax profile of one party, empty for unknown parties"""
+        return cls.get_profiles(party_type, [name]).get(name) or frappe._dict()
+
+    @classmethod
+    def store(cls, party_type: str, profiles: Dict[str, Dict[str, Any]]) -> None:
+        if not profiles:
+            return
+        pipe = frappe.cache().pipeline()
+        pipe.hset(cls.cache_key(party_type), mapping={
+            name: json.dumps(profile, default=str) for name, profile in profiles.items()
+        })
+        pipe.expire(cls.cache_key(party_type), cls.CACHE_TIMEOUT)
+        pipe.execute()
+
+    @classmethod
+    def invalidate(cls, party_type: str, names: Iterable[str]) -> None:
+        """Drop the profiles of some parties now and again once the transaction commits"""
+        names = set(names)
+        if not names:
+            return
+
+        local_profiles = (getattr(frappe.local, "pajak_party_profiles", None) or {}).get(party_type) or {}
+        for name in names:
+            local_profiles.pop(name, None)
+
+        pending = getattr(frappe.local, "pajak_party_invalidations", None)
+        if pending is None:
+            pending = frappe.local.pajak_party_invalidations = {}
+
+        if not pending:
+            frappe.db.after_commit.add(cls.flush_invalidations)
+            frappe.db.after_rollback.add(pending.clear)
+        pending.setdefault(party_type, set()).update(names)
+        # Dropped before the commit as well, so this request does not read the old profile
+        cls.delete(party_type, names)
+
+    @classmethod
+    def flush_invalidations(cls) -> None:
+        # A concurrent request may have cached the old profile before the commit
+        pending = getattr(frappe.local, "pajak_party_invalidations", None)
+        if not pending:
+            return
+        for party_type, names in pending.items():
+            cls.delete(party_type, names)
+        pending.clear()
+
+    @classmethod
+    def delete(cls, party_type: str, names: Iterable[str]) -> None:
+        pipe = frappe.cache().pipeline()
+        pipe.hdel(cls.cache_key(party_type), *names)
+        pipe.execute()
+
+    @classmethod
+    def warm(cls, party_type: str, chunk_size: int = 1000) -> int:
+        """
+        Load the profiles of every enabled party of a type into Redis,
+        e.g. before a bulk import:
+
+            bench --site <site> execute pajak_indonesia.party_profile.PartyProfileCache.warm \
+                --args "['Customer']"
+
+        Returns:
+            int: Number of profiles stored
+        """
+        names = frappe.get_all(party_type, filters={"disabled": 0}, pluck="name", order_by="name asc")
+        stored = 0
+        for start in range(0, len(names), chunk_size):
+            profiles = load_profiles(party_type, names[start:start + chunk_size])
+            cls.store(party_type, profiles)
+            stored += len(profiles)
+        return stored
+
+    @classmethod
+    def clear(cls) -> None:
+        """Drop every cached profile"""
+        frappe.cache().delete(*[cls.cache_key(party_type) for party_type in PARTY_TYPES])
+        frappe.local.pajak_party_profiles = {}
+
+def load_profiles(party_type: str, names: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Build the tax profiles of parties from the database, one query per table"""
+    meta = frappe.get_meta(party_type)
+    name_field = PARTY_NAME_FIELDS[party_type]
+    primary_field = PRIMARY_ADDRESS_FIELDS[party_type]
+    fields = ["name", "tax_id", name_field]
+    fields += [field for field in (primary_field, "country") if meta.has_field(field)]
+
+    parties = frappe.get_all(party_type, filters={"name": ["in", names]}, fields=fields)
+    if not parties:
+        return {}
+
+    links = frappe.get_all(
+        "Dynamic Link",
+        filters={
+            "link_doctype": party_type,
+            "link_name": ["in", [party.name for party in parties]],
+            "parenttype": "Address"
+        },
+        fields=["link_name", "parent"],
+        order_by="creation asc"
+    )
+    address_names = {link.parent for link in links}
+    address_names.update(party.get(primary_field) for party in parties if party.get(primary_field))
+    addresses = {
+        address.name: address
+        for address in frappe.get_all("Address", filters={"name": ["in", list(address_names)]}, fields=["*"])
+    } if address_names else {}
+
+    linked = {}
+    for link in links:
+        address = addresses.get(link.parent)
+        if address and not address.get("disabled"):
+            linked.setdefault(link.link_name, []).append(address)
+
+    profiles = {}
+    for party in parties:
+        address = addresses.get(party.get(primary_field)) or get_preferred_address(linked.get(party.name) or [])
+        profiles[party.name] = frappe._dict({
+            "npwp": party.tax_id or None,
+            "party_name": party.get(name_field) or party.name,
+            "address": get_address_display(address) if address else None,
+            "country": party.get("country") or (address.country if address else None)
+        })
+    return profiles
+
+def get_preferred_address(addresses: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """First primary address, else the first linked one"""
+    for address in addresses:
+        if address.get("is_primary_address"):
+            return address
+    return addresses[0] if addresses else None
+
+def get_party_profiles(party_type: str, names: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """Get the cached tax profiles of many customers or suppliers"""
+    return {
+        name: frappe._dict(profile)
+        for name, profile in PartyProfileCache.get_profiles(party_type, names).items()
+    }
+
+def get_party_profile(party_type: str, name: str) -> Dict[str, Any]:
+    """Get the cached tax profile of a customer or supplier"""
+    return frappe._dict(PartyProfileCache.get_profile(party_type, name))
+
+@profiled
+def invalidate_party_profile(doc: Document, method: Optional[str] = None, *args) -> None:
+    """Customer, Supplier and Address hook: drop the cached profiles of the affected parties"""
+    if doc.doctype in PARTY_TYPES:
+        names = {doc.name}
+        # after_rename is called with the old name, the new name and the merge flag
+        if method == "after_rename" and args:
+            names.add(args[0])
+        PartyProfileCache.invalidate(doc.doctype, names)
+        return
+
+    if doc.doctype == "Address":
+        linked = {}
+        for link in doc.get("links") or []:
+            if link.link_doctype in PARTY_TYPES and link.link_name:
+                linked.setdefault(link.link_doctype, set()).add(link.link_name)
+
+        # Links removed by this save are only in the previous version
+        before = doc.get_doc_before_save()
+        for link in (before.get("links") if before else None) or []:
+            if link.link_doctype in PARTY_TYPES and link.link_name:
+                linked.setdefault(link.link_doctype, set()).add(link.link_name)
+
+        for party_type, names in linked.items():
+            PartyProfileCache.invalidate(party_type, names)
@@ -0,0 +1,7 @@
+import frappe
+from pajak_indonesia.spt.running_totals import rebuild_running_totals
+
+def execute():
+    """Build the SPT running totals from already submitted source documents"""
+    frappe.reload_doc("spt", "doctype", "spt_running_total")
+    rebuild_running_totals()
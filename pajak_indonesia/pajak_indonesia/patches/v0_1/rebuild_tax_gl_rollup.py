@@ -0,0 +1,7 @@
+import frappe
+from pajak_indonesia.pelaporan.rollup import rebuild_rollup
+
+def execute():
+    """Populate the monthly GL tax rollup from existing GL Entries"""
+    frappe.reload_doc("pelaporan", "doctype", "tax_gl_rollup")
+    rebuild_rollup()
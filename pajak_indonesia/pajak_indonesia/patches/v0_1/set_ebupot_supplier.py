@@ -0,0 +1,12 @@
+import frappe
+
+def execute():
+    """Set the supplier of existing E-Bupot documents from their Purchase Invoice"""
+    frappe.reload_doc("ebupot", "doctype", "ebupot_document")
+    frappe.db.sql("""
+        UPDATE `tabEbupot Document` ebupot
+        INNER JOIN `tabPurchase Invoice` pi
+            ON ebupot.reference_doctype = 'Purchase Invoice' AND ebupot.reference_name = pi.name
+        SET ebupot.supplier = pi.supplier
+        WHERE IFNULL(ebupot.supplier, '') = ''
+    """)
@@ -0,0 +1,100 @@
+from typing import List, Tuple
+import frappe
+from frappe.utils import flt, cint
+from pajak_indonesia.pelaporan.rollup import get_annual_rollup
+
+# Matrix columns, in display order
+TAX_COLUMNS = ("PPN_OUT", "PPN_IN", "PPH_21", "PPH_23", "PPH_26")
+
+class AnnualTaxMatrix:
+    """Dense 12 x N matrix of monthly tax amounts for one company and year"""
+
+    def __init__(self, company: str, year: int):
+        self.company = company
+        self.year = cint(year)
+        self.from_date = f"{self.year}-01-01"
+        self.to_date = f"{self.year}-12-31"
+        self._index = {tax_type: i for i, tax_type in enumerate(TAX_COLUMNS)}
+        self.rows = [[0.0] * len(TAX_COLUMNS) for _ in range(12)]
+
+    def load(self) -> "AnnualTaxMatrix":
+        """Fill the matrix with one grouped query per source"""
+        self._load_gl_entries()
+        self._load_ebupot_documents()
+        self._load_salary_slips()
+        return self
+
+    def column(self, tax_type: str) -> List[float]:
+        """Get the 12 monthly values for a tax type"""
+        i = self._index[tax_type]
+        return [row[i] for row in self.rows]
+
+    def total(self, tax_type: str) -> float:
+        """Get the year-to-date total for a tax type"""
+        return sum(self.column(tax_type))
+
+    def _add(self, month: int, tax_type: str, amount: float) -> None:
+        if 1 <= cint(month) <= 12 and tax_type in self._index:
+            self.rows[cint(month) - 1][self._index[tax_type]] += flt(amount)
+
+    def _load_gl_entries(self) -> None:
+        """PPN Out (credit) and PPN In (debit) from the monthly GL tax rollup"""
+        for row in get_annual_rollup(self.company, self.year, ["PPN_OUT", "PPN_IN"]):
+            amount = row.credit if row.tax_type == "PPN_OUT" else row.debit
+            self._add(row.masa_pajak, row.tax_type, amount)
+
+    def _load_ebupot_documents(self) -> None:
+        """PPh 23 and PPh 26 from submitted E-Bupot documents"""
+        documents = frappe.db.sql("""
+            SELECT
+                MONTH(tandatangan_date) as month,
+                jenis_pajak,
+                SUM(pph_dipotong) as amount
+            FROM `tabEbupot Document`
+            WHERE company = %s
+            AND tandatangan_date BETWEEN %s AND %s
+            AND jenis_pajak IN ('23', '26')
+            AND docstatus = 1
+            GROUP BY MONTH(tandatangan_date), jenis_pajak
+        """, (self.company, self.from_date, self.to_date), as_dict=1)
+
+        for doc in documents:
+            self._add(doc.month, f"PPH_{doc.jenis_pajak}", doc.amount)
+
+    def _load_salary_slips(self) -> None:
+        """PPh 21 from submitted Salary Slips"""
+        slips = frappe.db.sql("""
+            SELECT
+                MONTH(posting_date) as month,
+                SUM(total_tax_deducted) as amount
+            FROM `tabSalary Slip`
+            WHERE company = %s
+            AND posting_date BETWEEN %s AND %s
+            AND docstatus = 1
+            GROUP BY MONTH(posting_date)
+        """, (self.company, self.from_date, self.to_date), as_dict=1)
+
+        for slip in slips:
+            self._add(slip.month, "PPH_21", slip.amount)
+
+def get_annual_tax_matrix(company: str, year: int) -> AnnualTaxMatrix:
+    """
+    Get the annual tax matrix, loaded at most once per request.
+
+    Args:
+        company: Company name
+        year: Year for data
+
+    Returns:
+        AnnualTaxMatrix: Loaded matrix shared by all dashboard charts and cards
+    """
+    if not hasattr(frappe.local, "pajak_tax_matrix"):
+        frappe.local.pajak_tax_matrix = {}
+
+    key: Tuple[str, int] = (company, cint(year))
+    matrix = frappe.local.pajak_tax_matrix.get(key)
+    if matrix is None:
+        matrix = AnnualTaxMatrix(company, year).load()
+        frappe.local.pajak_tax_matrix[key] = matrix
+
+    return matrix
@@ -0,0 +1,182 @@
+from typing import Optional, Dict, Any, List, Tuple, Callable
+import time
+import frappe
+from frappe.utils import flt, cint
+from pajak_indonesia.pelaporan.rollup import update_rollup
+from pajak_indonesia.pelaporan.report_cache import ReportingCache
+from pajak_indonesia.pelaporan.utils import get_gl_tag_rules
+
+DEFAULT_CHUNK_SIZE = 5000
+DEFAULT_ROWS_PER_SECOND = 20000
+DONE = "__done__"
+
+class GLTagBackfill:
+    """
+    Tags historical GL Entries of a company with tax_type and tax source.
+
+    Walks `tabGL Entry` in primary-key order in chunks. Every chunk is
+    tagged with one set-based UPDATE and committed together with its
+    rollup deltas and a checkpoint (the last GL Entry name). An
+    interrupted run resumes after the checkpoint. Only untagged rows are
+    touched, so running it again is harmless. The run sleeps between
+    chunks to stay under the target rows per second on a live database.
+    """
+
+    def __init__(self, company: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                 rows_per_second: int = DEFAULT_ROWS_PER_SECOND):
+        self.company = company
+        self.chunk_size = cint(chunk_size) or DEFAULT_CHUNK_SIZE
+        self.rows_per_second = cint(rows_per_second)
+        self.rules = get_gl_tag_rules(company)
+
+    @property
+    def checkpoint_key(self) -> str:
+        return f"pajak_gl_tag_backfill::{self.company}"
+
+    def get_checkpoint(self) -> str:
+        return frappe.db.get_global(self.checkpoint_key) or ""
+
+    def set_checkpoint(self, value: str) -> None:
+        frappe.db.set_global(self.checkpoint_key, value)
+
+    def reset(self) -> None:
+        """Start the next run from the first GL Entry"""
+        self.set_checkpoint("")
+        frappe.db.commit()
+
+    def run(self, progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Tag GL Entries from the checkpoint to the end of the table.
+
+        Args:
+            progress: Optional callback receiving the running totals after each chunk
+
+        Returns:
+            dict: company, scanned, tagged, chunks and done
+        """
+        stats = {"company": self.company, "scanned": 0, "tagged": 0, "chunks": 0, "done": False}
+        after = self.get_checkpoint()
+
+        if after == DONE or not self.rules:
+            stats["done"] = True
+            return stats
+
+        started = time.monotonic()
+        while True:
+            names = frappe.db.sql_list("""
+                SELECT name FROM `tabGL Entry`
+                WHERE company = %(company)s AND name > %(after)s
+                ORDER BY name
+                LIMIT %(limit)s
+            """, {"company": self.company, "after": after, "limit": self.chunk_size})
+
+            if not names:
+                self.set_checkpoint(DONE)
+                frappe.db.commit()
+                stats["done"] = True
+                break
+
+            stats["tagged"] += self.tag_chunk(after, names[-1])
+            stats["scanned"] += len(names)
+            stats["chunks"] += 1
+            after = names[-1]
+
+            self.set_checkpoint(after)
+            frappe.db.commit()
+
+            if progress:
+                progress(stats)
+            self.throttle(stats["scanned"], started)
+
+        return stats
+
+    def tag_chunk(self, after: str, upto: str) -> int:
+        """Tag the untagged rows of one primary-key range, returns the number tagged"""
+        case_sql, match_sql, values = self.get_rule_sql()
+        values.update({"company": self.company, "after": after, "upto": upto})
+        range_sql = f"""
+            company = %(company)s
+            AND name > %(after)s AND name <= %(upto)s
+            AND IFNULL(tax_type, '') = ''
+            AND ({match_sql})
+        """
+
+        # Rows counted by the rollup have to be added before they are tagged
+        deltas = frappe.db.sql(f"""
+            SELECT
+                MIN(posting_date) as posting_date,
+                {case_sql} as tax_type,
+                SUM(debit) as debit,
+                SUM(credit) as credit,
+                COUNT(*) as entry_count
+            FROM `tabGL Entry`
+            WHERE {range_sql}
+            AND is_cancelled = 0
+            GROUP BY DATE_FORMAT(posting_date, '%%Y%%m'), {case_sql}
+        """, values, as_dict=1)
+
+        frappe.db.sql(f"""
+            UPDATE `tabGL Entry`
+            SET tax_type = {case_sql},
+                tax_source_type = IF(IFNULL(voucher_no, '') = '', tax_source_type, voucher_type),
+                tax_source = IF(IFNULL(voucher_no, '') = '', tax_source, voucher_no)
+            WHERE {range_sql}
+        """, values)
+        tagged = cint(frappe.db._cursor.rowcount)
+
+        for delta in deltas:
+            update_rollup(self.company, delta.posting_date, delta.tax_type,
+                          flt(delta.debit), flt(delta.credit), cint(delta.entry_count))
+
+        return tagged
+
+    def get_rule_sql(self) -> Tuple[str, str, Dict[str, Any]]:
+        """CASE expression and match condition of the tagging rules"""
+        cases = []
+        matches = []
+        values = {}
+        for i, (account, side, tax_type) in enumerate(self.rules):
+            condition = f"(account = %(account_{i})s AND {side} > 0)"
+            values[f"account_{i}"] = account
+            values[f"tax_type_{i}"] = tax_type
+            cases.append(f"WHEN {condition} THEN %(tax_type_{i})s")
+            matches.append(condition)
+
+        return f"CASE {' '.join(cases)} END", " OR ".join(matches), values
+
+    def throttle(self, scanned: int, started: float) -> None:
+        """Sleep until the scanned rows are within the target rate"""
+        if self.rows_per_second <= 0:
+            return
+        ahead = scanned / self.rows_per_second - (time.monotonic() - started)
+        if ahead > 0:
+            time.sleep(ahead)
+
+def backfill_gl_tax_tags(company: Optional[str] = None, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                         rows_per_second: int = DEFAULT_ROWS_PER_SECOND, reset: bool = False,
+                         progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> List[Dict[str, Any]]:
+    """
+    Backfill GL tax tags of one company or of all companies.
+
+    Args:
+        company: Optional company, defaults to every company
+        chunk_size: GL Entries per chunk and transaction
+        rows_per_second: Scan rate limit, 0 for no limit
+        reset: Start over instead of resuming from the checkpoint
+        progress: Optional callback receiving the running totals after each chunk
+
+    Returns:
+        list: Result of GLTagBackfill.run per company
+    """
+    companies = [company] if company else frappe.get_all("Company", pluck="name", order_by="name")
+    results = []
+    for name in companies:
+        backfill = GLTagBackfill(name, chunk_size, rows_per_second)
+        if reset:
+            backfill.reset()
+        result = backfill.run(progress)
+        if result["tagged"]:
+            # Cached period totals were computed without the newly tagged rows
+            ReportingCache.clear(name)
+        results.append(result)
+    return results
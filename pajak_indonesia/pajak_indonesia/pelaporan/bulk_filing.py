@@ -0,0 +1,280 @@
+from typing import Optional, Dict, Any, List, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import json
+import math
+import multiprocessing
+import frappe
+from frappe import _
+from frappe.utils import cint
+from pajak_indonesia.jobs import BulkJobProgress, chunk_list
+from pajak_indonesia.tax_accounts import TaxAccountResolver
+from pajak_indonesia.pelaporan.page.pelaporan_pajak.pelaporan_pajak import (
+    TaxDataHandler, make_tax_filing
+)
+from pajak_indonesia.profiling import profiled
+
+BULK_JOB_TYPE = "bulk_tax_filing"
+DEFAULT_WORKERS = 4
+MAX_WORKERS = 16
+MAX_COMBINATIONS = 10000
+
+def parse_list(value: Any) -> List[Any]:
+    """Accept a list, a JSON list or a single value"""
+    if isinstance(value, str):
+        return frappe.parse_json(value) if value.lstrip().startswith("[") else [value]
+    return list(value or [])
+
+def parse_periods(periods: Any) -> List[Tuple[str, str]]:
+    """
+    Normalize periods to (tahun, masa_pajak) tuples.
+
+    Args:
+        periods: "YYYY-MM" strings, [tahun, masa] pairs or
+            {"tahun": ..., "masa_pajak": ...} dicts, or a JSON list of them
+
+    Returns:
+        list: Distinct (tahun, masa_pajak) tuples in the given order
+    """
+    parsed = []
+    for period in parse_list(periods):
+        if isinstance(period, str):
+            tahun, _sep, masa = period.partition("-")
+        elif isinstance(period, dict):
+            tahun, masa = period.get("tahun"), period.get("masa_pajak")
+        else:
+            tahun, masa = period
+
+        tahun, masa = str(tahun or "").strip(), str(masa or "").strip().zfill(2)
+        if not (len(tahun) == 4 and tahun.isdigit() and masa.isdigit() and 1 <= int(masa) <= 12):
+            frappe.throw(_("Invalid tax period {0}, expected YYYY-MM").format(period))
+
+        if (tahun, masa) not in parsed:
+            parsed.append((tahun, masa))
+
+    return parsed
+
+def build_filing_matrix(companies: List[str], periods: Any, pajak_types: List[str]) -> List[Dict[str, str]]:
+    """
+    Expand companies × periods × tax types into filing combinations.
+
+    Combinations are ordered by company so that a chunk of consecutive
+    combinations touches as few companies as possible.
+
+    Returns:
+        list: {"company", "tahun", "masa_pajak", "pajak_type"} per combination
+    """
+    companies = sorted(set(companies or []))
+    pajak_types = list(dict.fromkeys(pajak_types or []))
+    periods = parse_periods(periods)
+
+    if not (companies and periods and pajak_types):
+        frappe.throw(_("Select at least one company, tax period and tax type"))
+
+    unsupported = [pajak_type for pajak_type in pajak_types if not TaxDataHandler.get_handler(pajak_type)]
+    if unsupported:
+        frappe.throw(_("Unsupported tax type {0}").format(", ".join(unsupported)))
+
+    missing = set(companies) - set(frappe.get_all("Company", filters={"name": ["in", companies]}, pluck="name"))
+    if missing:
+        frappe.throw(_("Company {0} not found").format(", ".join(sorted(missing))))
+
+    combinations = [
+        {"company": company, "tahun": tahun, "masa_pajak": masa_pajak, "pajak_type": pajak_type}
+        for company in companies
+        for tahun, masa_pajak in periods
+        for pajak_type in pajak_types
+    ]
+    if len(combinations) > MAX_COMBINATIONS:
+        frappe.throw(_("{0} filings requested, at most {1} can be generated in one call").format(
+            len(combinations), MAX_COMBINATIONS
+        ))
+
+    return combinations
+
+def prefetch_account_maps(companies: List[str]) -> None:
+    """Resolve the tax accounts of every company once, shared with the workers through Redis"""
+    for company in dict.fromkeys(companies):
+        TaxAccountResolver.get_account_map(company)
+
+def split_for_workers(combinations: List[Dict[str, str]], workers: int) -> List[List[Dict[str, str]]]:
+    """Split combinations into at most `workers` consecutive chunks"""
+    workers = min(max(cint(workers) or DEFAULT_WORKERS, 1), MAX_WORKERS)
+    return chunk_list(combinations, math.ceil(len(combinations) / workers))
+
+def generate_filing(combination: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Generate the filing of one combination in its own transaction.
+
+    Idempotent: a period that already has a filing is reported as "exists".
+    """
+    try:
+        result = make_tax_filing(
+            combination["tahun"], combination["masa_pajak"],
+            combination["pajak_type"], combination["company"]
+        )
+        frappe.db.commit()
+    except Exception as e:
+        frappe.db.rollback()
+        frappe.log_error(
+            message=frappe.get_traceback(),
+            title=f"Bulk Tax Filing Error: {combination['company']} {combination['pajak_type']}"
+        )
+        result = {"status": "error", "message": str(e)}
+
+    return dict(combination, **result)
+
+def run_filing_chunk(combinations: List[Dict[str, str]], batch_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Worker job: generate the filings of one chunk and record the outcome.
+
+    Returns:
+        list: Result of generate_filing per combination
+    """
+    prefetch_account_maps([combination["company"] for combination in combinations])
+    results = [generate_filing(combination) for combination in combinations]
+
+    if batch_id:
+        progress = BulkJobProgress(BULK_JOB_TYPE, batch_id)
+        store_results(progress, results)
+        failures = [result for result in results if result["status"] == "error"]
+        progress.record_chunk(len(results) - len(failures), failures)
+
+    return results
+
+def results_key(progress: BulkJobProgress) -> str:
+    return frappe.cache().make_key(f"pajak_bulk_filing_results::{progress.batch_id}")
+
+def store_results(progress: BulkJobProgress, results: List[Dict[str, Any]]) -> None:
+    # Raw list like the progress failures, so chunks append without a read-modify-write
+    pipe = frappe.cache().pipeline()
+    pipe.rpush(results_key(progress), *[json.dumps(result, default=str) for result in results])
+    pipe.expire(results_key(progress), BulkJobProgress.CACHE_TIMEOUT)
+    pipe.execute()
+
+def consolidate_results(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Summarize combination results.
+
+    Returns:
+        dict: Count per status ("success", "exists", "error") and the
+            results, with errors listed first
+    """
+    counts = {"success": 0, "exists": 0, "error": 0}
+    for result in results:
+        counts[result["status"]] = counts.get(result["status"], 0) + 1
+
+    order = {"error": 0, "success": 1, "exists": 2}
+    return {
+        "total": len(results),
+        "created": counts["success"],
+        "existing": counts["exists"],
+        "failed": counts["error"],
+        "results": sorted(results, key=lambda result: (
+            order.get(result["status"], 0), result["company"], result["tahun"],
+            result["masa_pajak"], result["pajak_type"]
+        ))
+    }
+
+@frappe.whitelist()
+@profiled
+def generate_tax_filings(companies, periods, pajak_types, max_workers=DEFAULT_WORKERS):
+    """
+    Generate filings for every combination of companies, periods and tax types.
+
+    The combinations are split into at most max_workers background jobs,
+    which bounds how many run concurrently. Progress is published with
+    the pajak_bulk_job_progress event and the consolidated report is
+    available from get_bulk_filing_report.
+
+    Args:
+        companies: List (or JSON list) of companies
+        periods: List (or JSON list) of "YYYY-MM" periods
+        pajak_types: List (or JSON list) of tax types
+        max_workers: Maximum number of concurrent jobs
+
+    Returns:
+        dict: batch_id, number of combinations and jobs
+    """
+    frappe.has_permission("Tax Filing Summary", "create", throw=True)
+
+    companies, pajak_types = parse_list(companies), parse_list(pajak_types)
+    combinations = build_filing_matrix(companies, periods, pajak_types)
+    prefetch_account_maps(companies)
+
+    chunks = split_for_workers(combinations, max_workers)
+    progress = BulkJobProgress(BULK_JOB_TYPE)
+    progress.start(len(combinations), len(chunks))
+
+    for chunk in chunks:
+        frappe.enqueue(
+            "pajak_indonesia.pelaporan.bulk_filing.run_filing_chunk",
+            queue="long",
+            timeout=14400,
+            combinations=chunk,
+            batch_id=progress.batch_id
+        )
+
+    return {
+        "status": "queued",
+        "batch_id": progress.batch_id,
+        "combinations": len(combinations),
+        "jobs": len(chunks)
+    }
+
+@frappe.whitelist()
+@profiled
+def get_bulk_filing_report(batch_id):
+    """
+    Progress and consolidated results of a generate_tax_filings batch.
+
+    Returns:
+        dict: Progress counters plus the consolidated results so far
+    """
+    frappe.has_permission("Tax Filing Summary", "read", throw=True)
+
+    progress = BulkJobProgress(BULK_JOB_TYPE, batch_id)
+    status = progress.get_status(include_failures=False)
+    pipe = frappe.cache().pipeline()
+    pipe.lrange(results_key(progress), 0, -1)
+    raw = pipe.execute()[0] or []
+    report = consolidate_results([json.loads(frappe.safe_decode(result)) for result in raw])
+    # "total" of the progress counts all combinations, not only the finished ones
+    report.pop("total")
+    status.update(report)
+    return status
+
+def run_locally(site: str, combinations: List[Dict[str, str]],
+                workers: int = DEFAULT_WORKERS) -> Dict[str, Any]:
+    """
+    Generate filings in a local process pool, used by the bench command.
+
+    Every process opens its own site connection. Processes are spawned
+    rather than forked so that none of them inherits the caller's
+    database connection.
+
+    Args:
+        site: Site name
+        combinations: Result of build_filing_matrix
+        workers: Maximum number of concurrent processes
+
+    Returns:
+        dict: Consolidated results
+    """
+    chunks = split_for_workers(combinations, workers)
+    results = []
+    with ProcessPoolExecutor(
+        max_workers=len(chunks),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=connect_worker,
+        initargs=(site, frappe.local.sites_path)
+    ) as executor:
+        for chunk_results in executor.map(run_filing_chunk, chunks):
+            results.extend(chunk_results)
+
+    return consolidate_results(results)
+
+def connect_worker(site: str, sites_path: str) -> None:
+    """Process pool initializer: connect to the site as Administrator"""
+    frappe.init(site=site, sites_path=sites_path)
+    frappe.connect()
+    frappe.set_user("Administrator")
@@ -11,6 +11,7 @@ pajak_indonesia.dashboard.Dashboard = class DashboardPajak {
         };
         
         this.make();
+        this.setup_export_listeners();
     }
     
     make() {
@@ -106,7 +107,7 @@ pajak_indonesia.dashboard.Dashboard = class DashboardPajak {
             },
             callback: (r) => {
                 if (r.message) {
-                    this.download_csv(r.message.csv_data, r.message.filename);
+                    this.track_export(r.message.export_id, __('Export E-Faktur'));
                 }
             }
         });
@@ -127,6 +128,16 @@ pajak_indonesia.dashboard.Dashboard = class DashboardPajak {
                     ],
                     default: '23'
                 },
+                {
+                    fieldtype: 'Select',
+                    fieldname: 'format',
+                    label: __('Format'),
+                    options: [
+                        { value: 'csv', label: __('CSV') },
+                        { value: 'coretax', label: __('Coretax XML (BPPU/BPNR)') }
+                    ],
+                    default: 'csv'
+                },
                 {
                     fieldtype: 'Select',
                     fieldname: 'month',
@@ -157,14 +168,16 @@ pajak_indonesia.dashboard.Dashboard = class DashboardPajak {
                     month: values.month
                 };
                 
+                const method = values.format === 'coretax' ? 'make_coretax_ebupot' : 'make_csv_ebupot';
+                
                 frappe.call({
-                    method: 'pajak_indonesia.pelaporan.dashboard.dashboard_pajak.dashboard_pajak.make_csv_ebupot',
+                    method: 'pajak_indonesia.pelaporan.dashboard.dashboard_pajak.dashboard_pajak.' + method,
                     args: {
                         filters: export_filters
                     },
                     callback: (r) => {
                         if (r.message) {
-                            this.download_csv(r.message.csv_data, r.message.filename);
+                            this.track_export(r.message.export_id, __('Export E-Bupot'));
                             dialog.hide();
                         }
                     }
@@ -175,18 +188,49 @@ pajak_indonesia.dashboard.Dashboard = class DashboardPajak {
         dialog.show();
     }
     
-    download_csv(csv_data, filename) {
-        const blob = new Blob([csv_data], { type: 'text/csv;charset=utf-8;' });
-        const link = document.createElement('a');
-        const url = URL.createObjectURL(blob);
+    setup_export_listeners() {
+        // Exports run in the background; follow them through realtime events
+        this.exports = {};
         
-        link.setAttribute('href', url);
-        link.setAttribute('download', filename);
-        link.style.visibility = 'hidden';
+        frappe.realtime.on('pajak_bulk_job_progress', (data) => {
+            const title = this.exports[data.batch_id];
+            if (data.job_type === 'export' && title) {
+                frappe.show_progress(title, data.processed, data.total || 1, __('Exporting documents'));
+            }
+        });
         
-        document.body.appendChild(link);
-        link.click();
-        document.body.removeChild(link);
+        frappe.realtime.on('pajak_export_ready', (data) => {
+            if (!this.exports[data.export_id]) {
+                return;
+            }
+            
+            delete this.exports[data.export_id];
+            frappe.hide_progress();
+            
+            if (data.error) {
+                frappe.msgprint(__('Export failed: {0}', [data.error]));
+                return;
+            }
+            
+            window.open(data.file_url);
+        });
+    }
+    
+    track_export(export_id, title) {
+        this.exports[export_id] = title;
+        frappe.show_alert({ message: __('Export started'), indicator: 'blue' });
+        
+        // Small exports can finish before this response arrives
+        frappe.call({
+            method: 'pajak_indonesia.pelaporan.export.get_export_status',
+            args: { export_id: export_id },
+            callback: (r) => {
+                if (r.message && r.message.file_url && this.exports[export_id]) {
+                    delete this.exports[export_id];
+                    window.open(r.message.file_url);
+                }
+            }
+        });
     }
 };
 
@@ -1,10 +1,12 @@
 import frappe
 from frappe import _
-import json
-import csv
-import io
-from frappe.utils import getdate, flt, add_months, formatdate
+from frappe.utils import getdate, flt, formatdate
+from pajak_indonesia.pelaporan.aggregation import get_annual_tax_matrix
+from pajak_indonesia.pelaporan.rollup import get_tax_gl_totals
+from pajak_indonesia.pelaporan.export import enqueue_export
+from pajak_indonesia.profiling import profiled
 
+@profiled
 def get_dashboard_data(filters=None):
     """
     Get data for the Pajak Indonesia dashboard
@@ -43,25 +45,10 @@ def get_ppn_comparison_chart(company, year):
     Returns:
         dict: Chart configuration
     """
-    # Get monthly PPN data
-    months = []
-    ppn_out_data = []
-    ppn_in_data = []
-    
-    for month in range(1, 13):
-        # Format month for display
-        month_str = formatdate(f"{year}-{month:02d}-01", "MMM")
-        months.append(month_str)
-        
-        # Get PPN Out for the month
-        from_date = f"{year}-{month:02d}-01"
-        to_date = add_months(getdate(from_date), 1)
-        
-        ppn_out = get_ppn_amount(company, from_date, to_date, "out")
-        ppn_in = get_ppn_amount(company, from_date, to_date, "in")
-        
-        ppn_out_data.append(ppn_out)
-        ppn_in_data.append(ppn_in)
+    matrix = get_annual_tax_matrix(company, year)
+    months = get_month_labels(year)
+    ppn_out_data = matrix.column("PPN_OUT")
+    ppn_in_data = matrix.column("PPN_IN")
     
     return {
         "name": "ppn_comparison_chart",
@@ -159,34 +146,16 @@ def get_monthly_tax_chart(company, year):
     Returns:
         dict: Chart configuration
     """
-    # Get monthly tax data for various tax types
-    months = []
-    ppn_data = []
-    pph21_data = []
-    pph23_data = []
+    matrix = get_annual_tax_matrix(company, year)
+    months = get_month_labels(year)
     
-    for month in range(1, 13):
-        # Format month for display
-        month_str = formatdate(f"{year}-{month:02d}-01", "MMM")
-        months.append(month_str)
-        
-        # Get tax amounts for each type
-        from_date = f"{year}-{month:02d}-01"
-        to_date = add_months(getdate(from_date), 1)
-        
-        # PPN (Out - In)
-        ppn_out = get_ppn_amount(company, from_date, to_date, "out")
-        ppn_in = get_ppn_amount(company, from_date, to_date, "in")
-        ppn_net = ppn_out - ppn_in
-        ppn_data.append(ppn_net)
-        
-        # PPh 21
-        pph21 = get_pph_amount(company, from_date, to_date, "21")
-        pph21_data.append(pph21)
-        
-        # PPh 23
-        pph23 = get_pph_amount(company, from_date, to_date, "23")
-        pph23_data.append(pph23)
+    # PPN (Out - In)
+    ppn_data = [
+        ppn_out - ppn_in
+        for ppn_out, ppn_in in zip(matrix.column("PPN_OUT"), matrix.column("PPN_IN"))
+    ]
+    pph21_data = matrix.column("PPH_21")
+    pph23_data = matrix.column("PPH_23")
     
     return {
         "name": "monthly_tax_chart",
@@ -225,18 +194,12 @@ def get_number_cards(company, year):
     Returns:
         list: Number card configurations
     """
-    # Get current month
-    current_month = getdate().month
-    from_date = f"{year}-01-01"
-    to_date = f"{year}-12-31"
-    
     # Get YTD tax amounts
-    ppn_out_ytd = get_ppn_amount(company, from_date, to_date, "out")
-    ppn_in_ytd = get_ppn_amount(company, from_date, to_date, "in")
-    ppn_net_ytd = ppn_out_ytd - ppn_in_ytd
+    matrix = get_annual_tax_matrix(company, year)
+    ppn_net_ytd = matrix.total("PPN_OUT") - matrix.total("PPN_IN")
     
-    pph21_ytd = get_pph_amount(company, from_date, to_date, "21")
-    pph23_ytd = get_pph_amount(company, from_date, to_date, "23")
+    pph21_ytd = matrix.total("PPH_21")
+    pph23_ytd = matrix.total("PPH_23")
     
     # Count documents
     efaktur_count = frappe.db.count("Efaktur Document", {
@@ -287,6 +250,18 @@ def get_number_cards(company, year):
         }
     ]
 
+def get_month_labels(year):
+    """
+    Get short month names used as chart labels
+    
+    Args:
+        year: Year for data
+        
+    Returns:
+        list: Twelve month labels
+    """
+    return [formatdate(f"{year}-{month:02d}-01", "MMM") for month in range(1, 13)]
+
 def get_shortcuts():
     """
     Get shortcuts for the dashboard
@@ -338,165 +313,57 @@ def get_export_functions():
             "label": _("Export E-Bupot"),
             "function": "pajak_indonesia.pelaporan.dashboard.dashboard_pajak.dashboard_pajak.make_csv_ebupot",
             "icon": "download"
+        },
+        {
+            "label": _("Export E-Bupot (Coretax XML)"),
+            "function": "pajak_indonesia.pelaporan.dashboard.dashboard_pajak.dashboard_pajak.make_coretax_ebupot",
+            "icon": "download"
         }
     ]
 
 @frappe.whitelist()
-def make_csv_efaktur(filters=None):
+@profiled
+def make_csv_efaktur(filters=None, compress=0):
     """
-    Generate CSV export of E-Faktur data
+    Start a CSV export of E-Faktur data in the DJP import format
     
     Args:
         filters: Filter parameters
+        compress: Write a gzipped file
         
     Returns:
-        str: CSV file content as string
+        dict: export_id; the file_url is published with the pajak_export_ready event
     """
-    if not filters:
-        filters = {}
-    
-    # Parse filters if provided as string
-    if isinstance(filters, str):
-        filters = json.loads(filters)
-    
-    company = filters.get('company') or frappe.defaults.get_user_default('Company')
-    year = filters.get('year') or getdate().year
-    month = filters.get('month')
-    
-    # Build query filters
-    query_filters = {
-        "company": company,
-        "tahun_pajak": str(year),
-        "docstatus": 1
-    }
-    
-    if month:
-        query_filters["masa_pajak"] = month
-    
-    # Get E-Faktur documents
-    efaktur_docs = frappe.get_all(
-        "Efaktur Document",
-        filters=query_filters,
-        fields=[
-            "name", "kode_jenis_transaksi", "nomor_faktur", 
-            "masa_pajak", "tahun_pajak", "tanggal_faktur",
-            "npwp", "nama", "jumlah_dpp", "jumlah_ppn"
-        ]
-    )
-    
-    # Create CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow([
-        "Kode Jenis Transaksi", "Nomor Faktur", "Masa Pajak",
-        "Tahun Pajak", "Tanggal Faktur", "NPWP", "Nama",
-        "Jumlah DPP", "Jumlah PPN", "Referensi"
-    ])
-    
-    # Write data rows
-    for doc in efaktur_docs:
-        writer.writerow([
-            doc.kode_jenis_transaksi,
-            doc.nomor_faktur,
-            doc.masa_pajak,
-            doc.tahun_pajak,
-            formatdate(doc.tanggal_faktur, "dd-MM-yyyy"),
-            doc.npwp,
-            doc.nama,
-            flt(doc.jumlah_dpp, 2),
-            flt(doc.jumlah_ppn, 2),
-            doc.name
-        ])
-    
-    # Return the CSV content
-    csv_content = output.getvalue()
-    output.close()
-    
-    return {
-        "csv_data": csv_content,
-        "filename": f"efaktur_{company}_{year}{month or ''}.csv"
-    }
+    return enqueue_export("efaktur", filters, compress)
 
 @frappe.whitelist()
-def make_csv_ebupot(filters=None):
+@profiled
+def make_csv_ebupot(filters=None, compress=0):
     """
-    Generate CSV export of E-Bupot data
+    Start a CSV export of E-Bupot data
     
     Args:
         filters: Filter parameters
+        compress: Write a gzipped file
         
     Returns:
-        str: CSV file content as string
+        dict: export_id; the file_url is published with the pajak_export_ready event
     """
-    if not filters:
-        filters = {}
-    
-    # Parse filters if provided as string
-    if isinstance(filters, str):
-        filters = json.loads(filters)
-    
-    company = filters.get('company') or frappe.defaults.get_user_default('Company')
-    year = filters.get('year') or getdate().year
-    month = filters.get('month')
-    tax_type = filters.get('tax_type') or "23"
-    
-    # Build query filters
-    query_filters = {
-        "company": company,
-        "tahun_pajak": str(year),
-        "jenis_pajak": tax_type,
-        "docstatus": 1
-    }
-    
-    if month:
-        query_filters["masa_pajak"] = month
-    
-    # Get E-Bupot documents
-    ebupot_docs = frappe.get_all(
-        "Ebupot Document",
-        filters=query_filters,
-        fields=[
-            "name", "jenis_pajak", "masa_pajak", "tahun_pajak",
-            "npwp_terpotong", "nama_terpotong", "penghasilan_bruto", 
-            "tarif", "pph_dipotong"
-        ]
-    )
-    
-    # Create CSV
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Write header
-    writer.writerow([
-        "Jenis Pajak", "Masa Pajak", "Tahun Pajak",
-        "NPWP Terpotong", "Nama Terpotong", "Penghasilan Bruto",
-        "Tarif", "PPh Dipotong", "Referensi"
-    ])
-    
-    # Write data rows
-    for doc in ebupot_docs:
-        writer.writerow([
-            doc.jenis_pajak,
-            doc.masa_pajak,
-            doc.tahun_pajak,
-            doc.npwp_terpotong,
-            doc.nama_terpotong,
-            flt(doc.penghasilan_bruto, 2),
-            flt(doc.tarif, 2),
-            flt(doc.pph_dipotong, 2),
-            doc.name
-        ])
-    
-    # Return the CSV content
-    csv_content = output.getvalue()
-    output.close()
+    return enqueue_export("ebupot", filters, compress)
+
+@frappe.whitelist()
+@profiled
+def make_coretax_ebupot(filters=None):
+    """
+    Start an export of E-Bupot data in the Coretax BPPU/BPNR XML import layout
     
-    return {
-        "csv_data": csv_content,
-        "filename": f"ebupot_{tax_type}_{company}_{year}{month or ''}.csv"
-    }
+    Args:
+        filters: Filter parameters, tax_type 23 exports BPPU and 26 BPNR
+        
+    Returns:
+        dict: export_id; the file_url is published with the pajak_export_ready event
+    """
+    return enqueue_export("ebupot_coretax", filters)
 
 def get_ppn_amount(company, from_date, to_date, ppn_type):
     """
@@ -513,25 +380,13 @@ def get_ppn_amount(company, from_date, to_date, ppn_type):
     """
     tax_type = "PPN_OUT" if ppn_type == "out" else "PPN_IN"
     
-    # Get from GL Entries
-    gl_entries = frappe.db.sql("""
-        SELECT 
-            SUM(credit) as credit,
-            SUM(debit) as debit
-        FROM `tabGL Entry`
-        WHERE company = %s
-        AND posting_date BETWEEN %s AND %s
-        AND tax_type = %s
-        AND is_cancelled = 0
-    """, (company, from_date, to_date, tax_type), as_dict=1)
-    
-    if gl_entries and gl_entries[0]:
-        if ppn_type == "out":
-            return flt(gl_entries[0].credit)
-        else:
-            return flt(gl_entries[0].debit)
+    # Get from the monthly GL tax rollup
+    totals = get_tax_gl_totals(company, tax_type, from_date, to_date)
     
-    return 0
+    if ppn_type == "out":
+        return totals["credit"]
+    else:
+        return totals["debit"]
 
 def get_pph_amount(company, from_date, to_date, pph_type):
     """
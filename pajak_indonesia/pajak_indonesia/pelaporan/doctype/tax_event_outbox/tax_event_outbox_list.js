@@ -0,0 +1,38 @@
+frappe.listview_settings['Tax Event Outbox'] = {
+    add_fields: ['status', 'attempts'],
+    
+    get_indicator(doc) {
+        const colors = {
+            'Pending': 'blue',
+            'Processing': 'orange',
+            'Done': 'green',
+            'Failed': 'yellow',
+            'Dead': 'red'
+        };
+        return [__(doc.status), colors[doc.status], 'status,=,' + doc.status];
+    },
+    
+    onload(listview) {
+        // Dead letters: events that failed on every attempt
+        listview.page.add_inner_button(__('Show Dead Events'), () => {
+            listview.filter_area.clear().then(() => {
+                listview.filter_area.add([['Tax Event Outbox', 'status', '=', 'Dead']]);
+            });
+        });
+        
+        listview.page.add_inner_button(__('Requeue Dead Events'), () => {
+            const selected = listview.get_checked_items(true);
+            frappe.call({
+                method: 'pajak_indonesia.outbox.requeue_events',
+                args: { names: selected.length ? selected : null },
+                callback: (r) => {
+                    frappe.show_alert({
+                        message: __('{0} events requeued', [r.message || 0]),
+                        indicator: 'green'
+                    });
+                    listview.refresh();
+                }
+            });
+        });
+    }
+};
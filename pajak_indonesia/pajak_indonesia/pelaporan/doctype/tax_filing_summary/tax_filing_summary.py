@@ -1,10 +1,33 @@
 import frappe
 from frappe import _
 from frappe.model.document import Document
-from frappe.utils import flt, getdate, nowdate
+from frappe.utils import flt, getdate, nowdate, now
 from frappe.model.mapper import get_mapped_doc
+from pajak_indonesia.jobs import chunk_list
+from pajak_indonesia.tax_accounts import get_ppn_account, get_pph_account
+from pajak_indonesia.profiling import profiled
+
+# Source documents are read and updated in batches of this many names
+SOURCE_BATCH_SIZE = 5000
+
+SOURCE_AMOUNT_FIELDS = {
+    "Efaktur Document": "jumlah_ppn",
+    "Ebupot Document": "pph_dipotong",
+    "Salary Slip": "total_tax_deducted"
+}
+
+# Source DocTypes of this app whose filing status is tracked; ERPNext and
+# HRMS documents keep their own status workflow and are never written
+FILING_STATUS_DOCTYPES = ("Efaktur Document", "Ebupot Document", "SPT Summary")
+
+SPT_SUMMARY_PPH_FIELDS = {
+    "PPh 21": "jumlah_pph_21",
+    "PPh 23": "jumlah_pph_23",
+    "PPh 26": "jumlah_pph_26"
+}
 
 @frappe.whitelist()
+@profiled
 def generate_adjustment_entry(tax_filing_id):
     """
     Generate Tax Adjustment Entry for Tax Filing Summary with Lebih Bayar.
@@ -194,6 +217,7 @@ def get_tax_type_code(jenis_pelaporan):
     return tax_type_map.get(jenis_pelaporan, "PPN")
 
 @frappe.whitelist()
+@profiled
 def generate_payment_entry(tax_filing_id):
     """
     Generate Payment Entry for Tax Filing Summary.
@@ -436,80 +460,9 @@ def get_tax_office_supplier(company):
         # If creation fails, return a default name
         return "Direktorat Jenderal Pajak"
 
-# ... implement tax account retrieval functions ...
 def get_ppn_output_account(company):
     """Get PPN Output account for company."""
-    # First try to get from Tax Category
-    ppn_account = frappe.db.get_value(
-        "Tax Category Account",
-        {"parent": "PPN", "company": company, "account_type": "Output"},
-        "account"
-    )
-    
-    # If not found, try to get from Account with PPN Output patterns
-    if not ppn_account:
-        ppn_accounts = frappe.get_list(
-            "Account",
-            filters={
-                "company": company,
-                "account_type": ["in", ["Tax", "Liability"]],
-                "is_group": 0
-            },
-            or_filters={
-                "account_name": ["like", "%ppn%out%"],
-                "account_name": ["like", "%ppn%output%"],
-                "account_name": ["like", "%vat%out%"],
-                "account_name": ["like", "%pajak%keluar%"]
-            },
-            fields=["name"],
-            limit=1
-        )
-        
-        if ppn_accounts:
-            ppn_account = ppn_accounts[0].name
-    
-    return ppn_account
-
-def get_pph_account(company, pph_type):
-    """Get PPh account for company by type."""
-    # First try to get from Tax Category
-    tax_category = f"PPh {pph_type}"
-    pph_account = frappe.db.get_value(
-        "Tax Category Account",
-        {"parent": tax_category, "company": company},
-        "account"
-    )
-    
-    # If not found, try to get from Account with matching pattern
-    if not pph_account:
-        pattern = pph_type.replace("(", "\\(").replace(")", "\\)")
-        search_patterns = [
-            f"%pph%{pattern}%",
-            f"%withholding%{pattern}%",
-            f"%pajak%{pattern}%"
-        ]
-        
-        or_filters = {}
-        for i, pattern in enumerate(search_patterns):
-            or_filters[f"account_name{i}"] = ["like", pattern]
-            or_filters[f"name{i}"] = ["like", pattern]
-        
-        pph_accounts = frappe.get_list(
-            "Account",
-            filters={
-                "company": company,
-                "account_type": ["in", ["Tax", "Liability", "Payable"]],
-                "is_group": 0
-            },
-            or_filters=or_filters,
-            fields=["name"],
-            limit=1
-        )
-        
-        if pph_accounts:
-            pph_account = pph_accounts[0].name
-    
-    return pph_account
+    return get_ppn_account(company, "Output")
 
 class TaxFilingSummary(Document):
     def validate(self):
@@ -525,37 +478,61 @@ class TaxFilingSummary(Document):
     
     def validate_documents(self):
         """Validate source and payment documents"""
-        if not self.source_documents:
+        # Generated filings insert their source documents in bulk after the parent
+        if not self.source_documents and not self.flags.bulk_source_documents:
             frappe.throw("At least one source document is required")
             
-        if self.status_spt == "Kurang Bayar" and not self.payment_documents:
+        # Payment is made after the draft filing, so it is only required on submit
+        if self.docstatus == 1 and self.status_spt == "Kurang Bayar" and not self.payment_documents:
             frappe.throw("Payment documents are required for Kurang Bayar status")
     
     def update_document_details(self):
-        """Update status and amount from source documents"""
-        for doc in self.source_documents:
-            if doc.document_type and doc.document_name:
-                source = frappe.get_doc(doc.document_type, doc.document_name)
+        """Update status and amount from source documents, one query per document type"""
+        for document_type, rows in self.get_source_rows_by_type().items():
+            amount_field = self.get_source_amount_field(document_type)
+            has_status = frappe.get_meta(document_type).has_field("status")
+            
+            fields = ["name"] + (["status"] if has_status else [])
+            if document_type == "SPT Summary" and "PPN" in self.jenis_pelaporan:
+                fields += ["jumlah_ppn_penjualan", "jumlah_ppn_pembelian"]
+            if amount_field:
+                fields.append(amount_field)
+            
+            sources = {}
+            for names in chunk_list(list({row.document_name for row in rows}), SOURCE_BATCH_SIZE):
+                for source in frappe.get_all(document_type, filters={"name": ["in", names]}, fields=fields):
+                    sources[source.name] = source
+            
+            for doc in rows:
+                source = sources.get(doc.document_name)
+                if not source:
+                    frappe.throw(_("{0} {1} not found").format(doc.document_type, doc.document_name))
                 
                 # Update status
-                doc.status = source.status if hasattr(source, 'status') else 'No Status'
+                doc.status = source.status if has_status else 'No Status'
                 
                 # Update amount based on document type
-                if doc.document_type == "SPT Summary":
-                    if "PPN" in self.jenis_pelaporan:
-                        doc.amount = source.jumlah_ppn_penjualan - source.jumlah_ppn_pembelian
-                    elif "PPh 21" in self.jenis_pelaporan:
-                        doc.amount = source.jumlah_pph_21
-                    elif "PPh 23" in self.jenis_pelaporan:
-                        doc.amount = source.jumlah_pph_23
-                    elif "PPh 26" in self.jenis_pelaporan:
-                        doc.amount = source.jumlah_pph_26
-                elif doc.document_type == "Efaktur Document":
-                    doc.amount = source.jumlah_ppn
-                elif doc.document_type == "Ebupot Document":
-                    doc.amount = source.pph_dipotong
-                elif doc.document_type == "Salary Slip":
-                    doc.amount = source.total_tax_deducted
+                if document_type == "SPT Summary" and "PPN" in self.jenis_pelaporan:
+                    doc.amount = flt(source.jumlah_ppn_penjualan) - flt(source.jumlah_ppn_pembelian)
+                elif amount_field:
+                    doc.amount = source.get(amount_field)
+    
+    def get_source_rows_by_type(self):
+        """Group source document rows that have a document type and name"""
+        rows_by_type = {}
+        for doc in self.source_documents:
+            if doc.document_type and doc.document_name:
+                rows_by_type.setdefault(doc.document_type, []).append(doc)
+        return rows_by_type
+    
+    def get_source_amount_field(self, document_type):
+        """Field holding the tax amount of a source document type"""
+        if document_type == "SPT Summary":
+            for pph_type, fieldname in SPT_SUMMARY_PPH_FIELDS.items():
+                if pph_type in self.jenis_pelaporan:
+                    return fieldname
+            return None
+        return SOURCE_AMOUNT_FIELDS.get(document_type)
     
     def validate_attachments(self):
         """Validate required attachments"""
@@ -572,20 +549,48 @@ class TaxFilingSummary(Document):
     
     def on_submit(self):
         """Update source documents on submission"""
-        for doc in self.source_documents:
-            if doc.document_type and doc.document_name:
-                frappe.db.set_value(doc.document_type, doc.document_name, {
-                    "status": "Filed",
-                    "filing_reference": self.name,
-                    "filing_date": self.tanggal_pelaporan
-                })
+        self.update_source_documents({
+            "status": "Filed",
+            "filing_reference": self.name,
+            "filing_date": self.tanggal_pelaporan
+        })
     
     def on_cancel(self):
         """Revert source documents on cancellation"""
-        for doc in self.source_documents:
-            if doc.document_type and doc.document_name:
-                frappe.db.set_value(doc.document_type, doc.document_name, {
-                    "status": "Submitted",
-                    "filing_reference": None,
-                    "filing_date": None
-                })
\ No newline at end of file
+        self.update_source_documents({
+            "status": "Submitted",
+            "filing_reference": None,
+            "filing_date": None
+        })
+    
+    def update_source_documents(self, values):
+        """
+        Write values to all source documents with one UPDATE per document type
+        
+        Only the app's own DocTypes are written, columns the source
+        DocType does not have are skipped.
+        
+        Args:
+            values (dict): Column values to set
+        """
+        for document_type, rows in self.get_source_rows_by_type().items():
+            if document_type not in FILING_STATUS_DOCTYPES:
+                continue
+            
+            columns = {
+                column: value for column, value in values.items()
+                if frappe.db.has_column(document_type, column)
+            }
+            if not columns:
+                continue
+            
+            columns["modified"] = now()
+            columns["modified_by"] = frappe.session.user
+            assignments = ", ".join(f"`{column}` = %({column})s" for column in columns)
+            
+            for names in chunk_list(list({row.document_name for row in rows}), SOURCE_BATCH_SIZE):
+                frappe.db.sql(f"""
+                    UPDATE `tab{document_type}`
+                    SET {assignments}
+                    WHERE name IN %(names)s
+                """, dict(columns, names=tuple(names)))
@@ -0,0 +1,583 @@
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+from abc import ABC, abstractmethod
+from collections import defaultdict
+import csv
+import gzip
+import io
+import os
+import re
+import zipfile
+from xml.sax.saxutils import escape
+import frappe
+from frappe import _
+from frappe.utils import cint, flt, getdate, formatdate
+from pajak_indonesia.jobs import BulkJobProgress
+from pajak_indonesia.profiling import profiled
+
+EXPORT_READY_EVENT = "pajak_export_ready"
+
+# DJP e-Faktur import layout: three header rows, then FK rows each followed by their OF rows
+EFAKTUR_FK_HEADER = [
+    "FK", "KD_JENIS_TRANSAKSI", "FG_PENGGANTI", "NOMOR_FAKTUR", "MASA_PAJAK", "TAHUN_PAJAK",
+    "TANGGAL_FAKTUR", "NPWP", "NAMA", "ALAMAT_LENGKAP", "JUMLAH_DPP", "JUMLAH_PPN",
+    "JUMLAH_PPNBM", "ID_KETERANGAN_TAMBAHAN", "FG_UANG_MUKA", "UANG_MUKA_DPP",
+    "UANG_MUKA_PPN", "UANG_MUKA_PPNBM", "REFERENSI", "KODE_DOKUMEN_PENDUKUNG"
+]
+EFAKTUR_LT_HEADER = [
+    "LT", "NPWP", "NAMA", "JALAN", "BLOK", "NOMOR", "RT", "RW", "KECAMATAN", "KELURAHAN",
+    "KABUPATEN", "PROPINSI", "KODE_POS", "NOMOR_TELEPON"
+]
+EFAKTUR_OF_HEADER = [
+    "OF", "KODE_OBJEK", "NAMA", "HARGA_SATUAN", "JUMLAH_BARANG", "HARGA_TOTAL", "DISKON",
+    "DPP", "PPN", "TARIF_PPNBM", "PPNBM"
+]
+
+# Coretax e-Bupot import layout: one element per tax object, in the template's element order
+CORETAX_BPPU_ELEMENTS = [
+    "TaxPeriodMonth", "TaxPeriodYear", "CounterpartOpt", "CounterpartPassport", "CounterpartTin",
+    "StatusTaxExemption", "TaxCertificate", "TaxObjectCode", "Gross", "Rate", "Document",
+    "DocumentNumber", "DocumentDate", "IDPlaceOfBusinessActivity", "GovTreasurerOpt",
+    "SP2DNumber", "WithholdingDate"
+]
+CORETAX_BPNR_ELEMENTS = [
+    "TaxPeriodMonth", "TaxPeriodYear", "CounterpartTin", "CounterpartName", "CounterpartAddress",
+    "CounterpartCountry", "TaxCertificate", "TaxObjectCode", "Gross", "Rate", "Document",
+    "DocumentNumber", "DocumentDate", "IDPlaceOfBusinessActivity", "WithholdingDate"
+]
+# Tax object elements per import file, DJP rejects larger files. A bukti potong
+# with several items has one element per item and may span two files
+CORETAX_ROWS_PER_FILE = 1000
+
+# Options of the masa_pajak select fields
+MASA_PAJAK = [f"{month:02d}" for month in range(1, 13)]
+
+class StreamingCSVExporter(ABC):
+    """
+    Writes a CSV export page by page into a private File.
+
+    Documents are read with keyset pagination on name, month by month for
+    a yearly export, so every page is a bounded index range scan and only
+    one page is held in memory. Rows go straight to disk, optionally
+    gzipped, and progress is published per page through BulkJobProgress.
+    """
+
+    doctype = None
+    file_prefix = "export"
+    PAGE_SIZE = 1000
+    CACHE_TIMEOUT = 86400  # 1 day
+
+    def __init__(self, filters: Dict[str, Any], compress: bool = False, export_id: Optional[str] = None):
+        self.filters = filters
+        self.compress = cint(compress)
+        self.progress = BulkJobProgress("export", export_id)
+
+    @property
+    def export_id(self) -> str:
+        return self.progress.batch_id
+
+    @abstractmethod
+    def get_filters(self) -> Dict[str, Any]:
+        """Document filters of the export"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_fields(self) -> List[str]:
+        """Document fields read per page"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_header_rows(self) -> List[List[Any]]:
+        """Rows written before the first page"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_page_rows(self, docs: List[Dict[str, Any]]) -> Iterator[List[Any]]:
+        """Turn one page of documents into CSV rows"""
+        raise NotImplementedError
+
+    def get_file_label(self) -> str:
+        """Readable part of the file name"""
+        return self.file_prefix
+
+    def get_filename(self) -> str:
+        return f"{frappe.scrub(self.get_file_label())}-{self.export_id}.csv" + (".gz" if self.compress else "")
+
+    def get_partitions(self) -> List[Dict[str, Any]]:
+        """
+        Split the export filters into the ranges that are paged one by one.
+
+        A yearly export is read month by month: with masa_pajak fixed, the
+        period index returns the rows of a page already ordered by name,
+        instead of sorting the whole year again for every page.
+        """
+        filters = self.get_filters()
+        if "tahun_pajak" not in filters or "masa_pajak" in filters:
+            return [filters]
+        return [dict(filters, masa_pajak=masa_pajak) for masa_pajak in MASA_PAJAK]
+
+    def iter_pages(self) -> Iterator[List[Dict[str, Any]]]:
+        """Yield pages of documents ordered by name, continuing after the last name seen"""
+        fields = self.get_fields()
+
+        for filters in self.get_partitions():
+            last_name = None
+            while True:
+                page_filters = dict(filters)
+                if last_name:
+                    page_filters["name"] = [">", last_name]
+
+                docs = frappe.get_all(
+                    self.doctype,
+                    filters=page_filters,
+                    fields=fields,
+                    order_by="name asc",
+                    limit_page_length=self.PAGE_SIZE
+                )
+                if docs:
+                    yield docs
+
+                if len(docs) < self.PAGE_SIZE:
+                    break
+                last_name = docs[-1].name
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Write the export and attach it as a private File.
+
+        Returns:
+            dict: export_id, file_url and number of exported documents
+        """
+        # One page per PAGE_SIZE documents of every partition
+        counts = [frappe.db.count(self.doctype, filters) for filters in self.get_partitions()]
+        total = sum(counts)
+        pages = sum((count + self.PAGE_SIZE - 1) // self.PAGE_SIZE for count in counts)
+        self.progress.start(total, max(pages, 1))
+
+        files, exported = self.write_files()
+
+        if not total:
+            self.progress.record_chunk(0, [])
+
+        filename, path = files[0] if len(files) == 1 else self.bundle(files)
+        file_doc = frappe.get_doc({
+            "doctype": "File",
+            "file_name": filename,
+            "file_url": f"/private/files/{filename}",
+            "is_private": 1,
+            "file_size": os.path.getsize(path)
+        }).insert(ignore_permissions=True)
+
+        result = {
+            "export_id": self.export_id,
+            "file_url": file_doc.file_url,
+            "filename": filename,
+            "exported": exported,
+            "files": len(files)
+        }
+        frappe.cache().set_value(self._result_key(self.export_id), result, expires_in_sec=self.CACHE_TIMEOUT)
+        frappe.publish_realtime(EXPORT_READY_EVENT, result, user=frappe.session.user)
+
+        return result
+
+    def write_files(self) -> Tuple[List[Tuple[str, str]], int]:
+        """
+        Write the export to disk page by page.
+
+        Returns:
+            tuple: (filename, path) per written file, number of exported documents
+        """
+        filename = self.get_filename()
+        path = frappe.get_site_path("private", "files", filename)
+        exported = 0
+
+        with self._open(path) as output:
+            writer = csv.writer(output)
+            writer.writerows(self.get_header_rows())
+
+            for docs in self.iter_pages():
+                writer.writerows(self.get_page_rows(docs))
+                exported += len(docs)
+                self.progress.record_chunk(len(docs), [])
+
+        return [(filename, path)], exported
+
+    def bundle(self, files: List[Tuple[str, str]]) -> Tuple[str, str]:
+        """Zip the parts of a split export into one file and remove the parts"""
+        filename = f"{frappe.scrub(self.get_file_label())}-{self.export_id}.zip"
+        path = frappe.get_site_path("private", "files", filename)
+        with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            for part_filename, part_path in files:
+                archive.write(part_path, arcname=part_filename)
+        for _part_filename, part_path in files:
+            os.remove(part_path)
+        return filename, path
+
+    def _open(self, path: str):
+        if self.compress:
+            return io.TextIOWrapper(gzip.open(path, "wb"), encoding="utf-8", newline="")
+        return open(path, "w", encoding="utf-8", newline="")
+
+    @staticmethod
+    def _result_key(export_id: str) -> str:
+        return f"pajak_export_result::{export_id}"
+
+class EfakturCSVExporter(StreamingCSVExporter):
+    """Efaktur Document export in the DJP e-Faktur import format"""
+
+    doctype = "Efaktur Document"
+    file_prefix = "efaktur"
+
+    def get_filters(self) -> Dict[str, Any]:
+        filters = {
+            "company": self.filters.get("company"),
+            "tahun_pajak": str(self.filters.get("year")),
+            "docstatus": 1
+        }
+        if self.filters.get("month"):
+            filters["masa_pajak"] = self.filters.get("month")
+        return filters
+
+    def get_fields(self) -> List[str]:
+        return [
+            "name", "kode_jenis_transaksi", "fg_pengganti", "nomor_faktur", "masa_pajak",
+            "tahun_pajak", "tanggal_faktur", "npwp", "nama", "alamat_lengkap", "jumlah_dpp",
+            "jumlah_ppn", "jumlah_ppnbm", "id_keterangan_tambahan", "fg_uang_muka",
+            "uang_muka_dpp", "uang_muka_ppn", "uang_muka_ppnbm", "referensi"
+        ]
+
+    def get_file_label(self) -> str:
+        return f"efaktur_{self.filters.get('company')}_{self.filters.get('year')}{self.filters.get('month') or ''}"
+
+    def get_header_rows(self) -> List[List[Any]]:
+        return [EFAKTUR_FK_HEADER, EFAKTUR_LT_HEADER, EFAKTUR_OF_HEADER]
+
+    def get_page_rows(self, docs: List[Dict[str, Any]]) -> Iterator[List[Any]]:
+        items = defaultdict(list)
+        for item in frappe.get_all(
+            "Efaktur Document Item",
+            filters={"parent": ["in", [doc.name for doc in docs]], "parenttype": self.doctype},
+            fields=["parent", "nama_barang", "harga_satuan", "jumlah_barang", "harga_total",
+                    "diskon", "dpp", "ppn", "tarif_ppnbm", "ppnbm"],
+            order_by="parent asc, idx asc"
+        ):
+            items[item.parent].append(item)
+
+        for doc in docs:
+            yield [
+                "FK",
+                doc.kode_jenis_transaksi or "01",
+                doc.fg_pengganti or "0",
+                djp_digits(doc.nomor_faktur)[-13:],
+                cint(doc.masa_pajak),
+                doc.tahun_pajak,
+                formatdate(doc.tanggal_faktur, "dd/MM/yyyy") if doc.tanggal_faktur else "",
+                djp_digits(doc.npwp) or "000000000000000",
+                doc.nama,
+                doc.alamat_lengkap,
+                cint(flt(doc.jumlah_dpp)),
+                cint(flt(doc.jumlah_ppn)),
+                cint(flt(doc.jumlah_ppnbm)),
+                doc.id_keterangan_tambahan or "",
+                doc.fg_uang_muka or "0",
+                cint(flt(doc.uang_muka_dpp)),
+                cint(flt(doc.uang_muka_ppn)),
+                cint(flt(doc.uang_muka_ppnbm)),
+                doc.referensi or doc.name,
+                ""
+            ]
+
+            # Lawan transaksi of the faktur, the address is not split into its parts
+            yield ["LT", djp_digits(doc.npwp) or "000000000000000", doc.nama, doc.alamat_lengkap] + [""] * 10
+
+            for item in items[doc.name]:
+                yield [
+                    "OF",
+                    "",
+                    item.nama_barang,
+                    flt(item.harga_satuan, 2),
+                    flt(item.jumlah_barang, 2),
+                    flt(item.harga_total, 2),
+                    flt(item.diskon, 2),
+                    flt(item.dpp, 2),
+                    flt(item.ppn, 2),
+                    flt(item.tarif_ppnbm, 2),
+                    flt(item.ppnbm, 2)
+                ]
+
+class EbupotCSVExporter(StreamingCSVExporter):
+    """Ebupot Document export, one row per bukti potong"""
+
+    doctype = "Ebupot Document"
+    file_prefix = "ebupot"
+
+    def get_filters(self) -> Dict[str, Any]:
+        filters = {
+            "company": self.filters.get("company"),
+            "tahun_pajak": str(self.filters.get("year")),
+            "jenis_pajak": self.filters.get("tax_type") or "23",
+            "docstatus": 1
+        }
+        if self.filters.get("month"):
+            filters["masa_pajak"] = self.filters.get("month")
+        return filters
+
+    def get_fields(self) -> List[str]:
+        return [
+            "name", "jenis_pajak", "masa_pajak", "tahun_pajak", "npwp_terpotong",
+            "nama_terpotong", "penghasilan_bruto", "tarif", "pph_dipotong"
+        ]
+
+    def get_file_label(self) -> str:
+        return (f"ebupot_{self.filters.get('tax_type') or '23'}_{self.filters.get('company')}_"
+                f"{self.filters.get('year')}{self.filters.get('month') or ''}")
+
+    def get_header_rows(self) -> List[List[Any]]:
+        return [[
+            "Jenis Pajak", "Masa Pajak", "Tahun Pajak",
+            "NPWP Terpotong", "Nama Terpotong", "Penghasilan Bruto",
+            "Tarif", "PPh Dipotong", "Referensi"
+        ]]
+
+    def get_page_rows(self, docs: List[Dict[str, Any]]) -> Iterator[List[Any]]:
+        for doc in docs:
+            yield [
+                doc.jenis_pajak,
+                doc.masa_pajak,
+                doc.tahun_pajak,
+                doc.npwp_terpotong,
+                doc.nama_terpotong,
+                flt(doc.penghasilan_bruto, 2),
+                flt(doc.tarif, 2),
+                flt(doc.pph_dipotong, 2),
+                doc.name
+            ]
+
+class CoretaxEbupotExporter(EbupotCSVExporter):
+    """
+    Ebupot Document export in the Coretax BPPU (PPh 23) or BPNR (PPh 26)
+    XML import layout.
+
+    Every E-Bupot item becomes its own element with its kode objek pajak.
+    Elements are written page by page, and a new part file starts every
+    rows_per_file elements. A split export is delivered as one zip.
+    """
+
+    file_prefix = "coretax"
+
+    def __init__(self, filters: Dict[str, Any], compress: bool = False, export_id: Optional[str] = None):
+        super().__init__(filters, compress, export_id)
+        self.is_bpnr = (self.filters.get("tax_type") or "23") == "26"
+        self.rows_per_file = cint(self.filters.get("rows_per_file")) or CORETAX_ROWS_PER_FILE
+        self.company_tin = coretax_tin(frappe.db.get_value("Company", self.filters.get("company"), "tax_id"))
+
+    def get_fields(self) -> List[str]:
+        return [
+            "name", "jenis_pajak", "masa_pajak", "tahun_pajak", "tandatangan_date", "npwp_terpotong",
+            "nama_terpotong", "alamat_terpotong", "supplier", "tin", "negara_domisili", "no_fasilitas",
+            "penghasilan_bruto", "tarif", "reference_doctype", "reference_name"
+        ]
+
+    def get_file_label(self) -> str:
+        return (f"{'bpnr' if self.is_bpnr else 'bppu'}_{self.filters.get('company')}_"
+                f"{self.filters.get('year')}{self.filters.get('month') or ''}")
+
+    def get_part_filename(self, part: int) -> str:
+        return f"{frappe.scrub(self.get_file_label())}-{self.export_id}-{part:03d}.xml"
+
+    def write_files(self) -> Tuple[List[Tuple[str, str]], int]:
+        files = []
+        exported = 0
+        output = None
+        rows_in_file = 0
+
+        try:
+            for docs in self.iter_pages():
+                for record in self.get_page_rows(docs):
+                    if output is None or rows_in_file >= self.rows_per_file:
+                        if output:
+                            self.close_part(output)
+                        output = self.open_part(files)
+                        rows_in_file = 0
+                    output.write(self.xml_record(record))
+                    rows_in_file += 1
+                exported += len(docs)
+                self.progress.record_chunk(len(docs), [])
+
+            if output is None:
+                output = self.open_part(files)
+        finally:
+            if output:
+                self.close_part(output)
+
+        if len(files) == 1:
+            # A single part keeps the plain export file name
+            filename = f"{frappe.scrub(self.get_file_label())}-{self.export_id}.xml"
+            path = frappe.get_site_path("private", "files", filename)
+            os.replace(files[0][1], path)
+            files = [(filename, path)]
+
+        return files, exported
+
+    def open_part(self, files: List[Tuple[str, str]]):
+        filename = self.get_part_filename(len(files) + 1)
+        path = frappe.get_site_path("private", "files", filename)
+        files.append((filename, path))
+        output = open(path, "w", encoding="utf-8")
+        root = "BpnrBulk" if self.is_bpnr else "BpuBulk"
+        output.write('<?xml version="1.0" encoding="utf-8"?>\n')
+        output.write(f'<{root} xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance">\n')
+        output.write(f"  <TIN>{self.company_tin}</TIN>\n")
+        output.write(f"  <ListOf{'Bpnr' if self.is_bpnr else 'Bpu'}>\n")
+        return output
+
+    def close_part(self, output) -> None:
+        output.write(f"  </ListOf{'Bpnr' if self.is_bpnr else 'Bpu'}>\n")
+        output.write(f"</{'BpnrBulk' if self.is_bpnr else 'BpuBulk'}>\n")
+        output.close()
+
+    def xml_record(self, record: Dict[str, Any]) -> str:
+        element = "Bpnr" if self.is_bpnr else "Bpu"
+        elements = CORETAX_BPNR_ELEMENTS if self.is_bpnr else CORETAX_BPPU_ELEMENTS
+        body = "".join(
+            f"      <{name}>{escape(str(record.get(name) if record.get(name) is not None else ''))}</{name}>\n"
+            for name in elements
+        )
+        return f"    <{element}>\n{body}    </{element}>\n"
+
+    def get_page_rows(self, docs: List[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        """One record per E-Bupot item, keyed by Coretax element name"""
+        from pajak_indonesia.party_profile import get_party_profiles
+        from pajak_indonesia.ebupot.utils import get_default_object_code
+
+        items = defaultdict(list)
+        for item in frappe.get_all(
+            "Ebupot Document Item",
+            filters={"parent": ["in", [doc.name for doc in docs]], "parenttype": self.doctype},
+            fields=["parent", "kode_objek_pajak", "dasar_pengenaan_pajak", "tarif"],
+            order_by="parent asc, idx asc"
+        ):
+            items[item.parent].append(item)
+
+        suppliers = get_party_profiles("Supplier", {doc.supplier for doc in docs}) if self.is_bpnr else {}
+
+        for doc in docs:
+            withholding_date = getdate(doc.tandatangan_date).isoformat() if doc.tandatangan_date else ""
+            record = {
+                "TaxPeriodMonth": cint(doc.masa_pajak),
+                "TaxPeriodYear": doc.tahun_pajak,
+                "TaxCertificate": "SKB" if doc.no_fasilitas else "N/A",
+                "Document": "CommercialInvoice",
+                "DocumentNumber": doc.reference_name or doc.name,
+                "DocumentDate": withholding_date,
+                "IDPlaceOfBusinessActivity": self.company_tin + "000000",
+                "WithholdingDate": withholding_date
+            }
+            if self.is_bpnr:
+                supplier = suppliers.get(doc.supplier) or {}
+                record.update({
+                    "CounterpartTin": doc.tin or supplier.get("npwp") or "",
+                    "CounterpartName": doc.nama_terpotong,
+                    "CounterpartAddress": doc.alamat_terpotong or supplier.get("address") or "",
+                    "CounterpartCountry": doc.negara_domisili or supplier.get("country") or ""
+                })
+            else:
+                record.update({
+                    "CounterpartOpt": "Resident",
+                    "CounterpartPassport": "",
+                    "CounterpartTin": coretax_tin(doc.npwp_terpotong),
+                    "StatusTaxExemption": "",
+                    "GovTreasurerOpt": "N/A",
+                    "SP2DNumber": ""
+                })
+
+            # Documents without items are exported as one tax object
+            for item in items[doc.name] or [frappe._dict({
+                "kode_objek_pajak": get_default_object_code(doc.jenis_pajak),
+                "dasar_pengenaan_pajak": doc.penghasilan_bruto,
+                "tarif": doc.tarif
+            })]:
+                yield dict(
+                    record,
+                    TaxObjectCode=item.kode_objek_pajak,
+                    Gross=cint(flt(item.dasar_pengenaan_pajak)),
+                    Rate=flt(item.tarif, 2)
+                )
+
+EXPORTERS = {
+    "efaktur": EfakturCSVExporter,
+    "ebupot": EbupotCSVExporter,
+    "ebupot_coretax": CoretaxEbupotExporter
+}
+
+def djp_digits(value: Optional[str]) -> str:
+    """Strip dots and dashes from NPWP and faktur numbers"""
+    return re.sub(r"\D", "", value or "")
+
+def coretax_tin(npwp: Optional[str]) -> str:
+    """16 digit Coretax TIN, 15 digit NPWPs get a leading zero"""
+    digits = djp_digits(npwp) or "000000000000000"
+    return "0" + digits if len(digits) == 15 else digits
+
+def parse_export_filters(filters: Any) -> Dict[str, Any]:
+    """Parse dashboard filters and fill in the default company and year"""
+    if not filters:
+        filters = {}
+    if isinstance(filters, str):
+        filters = frappe.parse_json(filters)
+
+    filters = frappe._dict(filters)
+    filters.company = filters.get("company") or frappe.defaults.get_user_default("Company")
+    filters.year = filters.get("year") or getdate().year
+    return filters
+
+def enqueue_export(export_type: str, filters: Any, compress: bool = False) -> Dict[str, Any]:
+    """
+    Start a streaming export in the background.
+
+    Args:
+        export_type: Key of EXPORTERS, e.g. efaktur
+        filters: Dashboard filters (dict or JSON)
+        compress: Write a gzipped file
+
+    Returns:
+        dict: export_id to poll with get_export_status
+    """
+    if export_type not in EXPORTERS:
+        frappe.throw(_("Unknown export type {0}").format(export_type))
+
+    export_id = frappe.generate_hash(length=12)
+    frappe.enqueue(
+        "pajak_indonesia.pelaporan.export.run_export",
+        queue="long",
+        timeout=3600,
+        export_type=export_type,
+        filters=parse_export_filters(filters),
+        compress=cint(compress),
+        export_id=export_id
+    )
+
+    return {"export_id": export_id}
+
+def run_export(export_type: str, filters: Dict[str, Any], compress: bool, export_id: str) -> Dict[str, Any]:
+    """Background job entry point of enqueue_export"""
+    try:
+        return EXPORTERS[export_type](frappe._dict(filters), compress, export_id).run()
+    except Exception as e:
+        frappe.log_error(
+            message=f"{export_type} export {export_id} failed: {str(e)}",
+            title="Tax Export Error"
+        )
+        frappe.publish_realtime(
+            EXPORT_READY_EVENT,
+            {"export_id": export_id, "error": str(e)},
+            user=frappe.session.user
+        )
+        raise
+
+@frappe.whitelist()
+@profiled
+def get_export_status(export_id: str) -> Dict[str, Any]:
+    """Get progress of an export and, once finished, its file_url"""
+    status = BulkJobProgress("export", export_id).get_status(include_failures=False)
+    status.update(frappe.cache().get_value(StreamingCSVExporter._result_key(export_id)) or {})
+    return status
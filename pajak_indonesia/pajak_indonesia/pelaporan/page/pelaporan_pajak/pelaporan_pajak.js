@@ -22,6 +22,14 @@ pajak_indonesia.PelaporanPajak = class PelaporanPajak {
         this.wrapper = $(page.body);
         this.filters = {};
         
+        // Server-side listing state; documents are fetched one page at a time
+        this.page_length = 50;
+        this.listing = {
+            sort_by: 'posting_date',
+            sort_order: 'desc',
+            search: ''
+        };
+        
         // Set the page as a property of the wrapper for later access
         page.parent.pelaporan_pajak = this;
         
@@ -33,6 +41,7 @@ pajak_indonesia.PelaporanPajak = class PelaporanPajak {
         this.setup_filters();
         this.setup_summary_section();
         this.setup_details_section();
+        this.setup_filing_listeners();
         
         // Initial data load
         this.refresh();
@@ -152,9 +161,42 @@ pajak_indonesia.PelaporanPajak = class PelaporanPajak {
                 <div class="section-header">
                     <h5>${__('Documents')}</h5>
                 </div>
+                <div class="details-toolbar row">
+                    <div class="col-md-6">
+                        <input type="text" class="form-control input-sm details-search"
+                            placeholder="${__('Search document or party')}">
+                    </div>
+                    <div class="col-md-6">
+                        <select class="form-control input-sm details-sort">
+                            <option value="posting_date:desc">${__('Newest first')}</option>
+                            <option value="posting_date:asc">${__('Oldest first')}</option>
+                            <option value="tax_amount:desc">${__('Largest tax amount')}</option>
+                            <option value="party:asc">${__('Party')}</option>
+                            <option value="docname:asc">${__('Document ID')}</option>
+                        </select>
+                    </div>
+                </div>
                 <div class="details-table"></div>
+                <div class="details-footer text-center">
+                    <span class="details-count text-muted"></span>
+                    <button class="btn btn-xs btn-default details-load-more hidden">${__('Load More')}</button>
+                </div>
             </div>
         `).appendTo(this.wrapper);
+        
+        this.details_section.find('.details-search').on('input', frappe.utils.debounce((e) => {
+            this.listing.search = $(e.target).val();
+            this.refresh_documents();
+        }, 300));
+        
+        this.details_section.find('.details-sort').on('change', (e) => {
+            const [sort_by, sort_order] = $(e.target).val().split(':');
+            this.listing.sort_by = sort_by;
+            this.listing.sort_order = sort_order;
+            this.refresh_documents();
+        });
+        
+        this.details_section.find('.details-load-more').on('click', () => this.load_more());
     }
     
     refresh() {
@@ -174,11 +216,11 @@ pajak_indonesia.PelaporanPajak = class PelaporanPajak {
         // Show loading state
         this.show_loading();
         
-        // Fetch data
-        this.fetch_data()
+        // Fetch summary and the first page of documents
+        this.fetch_data(0)
             .then(data => {
                 this.render_summary_cards(data.summary);
-                this.render_details_table(data.documents);
+                this.render_details_table(data);
                 this.update_action_buttons(data);
             })
             .catch(err => {
@@ -186,6 +228,25 @@ pajak_indonesia.PelaporanPajak = class PelaporanPajak {
             });
     }
     
+    refresh_documents() {
+        // Search or sort changed: reload the first page only
+        this.fetch_data(0)
+            .then(data => this.render_details_table(data))
+            .catch(err => this.show_error(err));
+    }
+    
+    load_more() {
+        const start = this.documents.length;
+        
+        this.fetch_data(start)
+            .then(data => {
+                this.documents = this.documents.concat(data.documents || []);
+                this.datatable.appendRows(data.documents || []);
+                this.update_details_footer(data.totals);
+            })
+            .catch(err => this.show_error(err));
+    }
+    
     show_loading() {
         this.summary_section.find('.summary-cards .row').html(`
             <div class="col-md-12 text-center">
@@ -229,11 +290,16 @@ pajak_indonesia.PelaporanPajak = class PelaporanPajak {
         });
     }
     
-    fetch_data() {
+    fetch_data(start) {
         return new Promise((resolve, reject) => {
             frappe.call({
                 method: 'pajak_indonesia.pelaporan.page.pelaporan_pajak.pelaporan_pajak.get_tax_reporting_data',
-                args: this.filters,
+                args: {
+                    ...this.filters,
+                    ...this.listing,
+                    start: start,
+                    page_length: this.page_length
+                },
                 callback: function(r) {
                     if (r.exc) {
                         reject(r.exc);
@@ -325,8 +391,19 @@ pajak_indonesia.PelaporanPajak = class PelaporanPajak {
         this.summary_section.find('.summary-cards .row').html(cards_html);
     }
     
-    render_details_table(documents) {
-        if (!documents || documents.length === 0) {
+    render_details_table(data) {
+        const documents = data.documents || [];
+        this.documents = documents;
+        
+        // Create datatable
+        if (this.datatable) {
+            this.datatable.destroy();
+            this.datatable = null;
+        }
+        
+        this.update_details_footer(data.totals);
+        
+        if (documents.length === 0) {
             this.details_section.find('.details-table').html(`
                 <div class="text-center text-muted padding-lg">
                     ${__('No documents found for the selected filters')}
@@ -335,11 +412,6 @@ pajak_indonesia.PelaporanPajak = class PelaporanPajak {
             return;
         }
         
-        // Create datatable
-        if (this.datatable) {
-            this.datatable.destroy();
-        }
-        
         const container = this.details_section.find('.details-table');
         container.empty();
         
@@ -351,7 +423,8 @@ pajak_indonesia.PelaporanPajak = class PelaporanPajak {
             columns: columns,
             data: documents,
             layout: 'fixed',
-            inlineFilters: true,
+            // Filtering and sorting happen on the server, over all pages
+            inlineFilters: false,
             dynamicRowHeight: true,
             checkboxColumn: true,
             cellHeight: 40
@@ -366,6 +439,16 @@ pajak_indonesia.PelaporanPajak = class PelaporanPajak {
         });
     }
     
+    update_details_footer(totals) {
+        const total = (totals && totals.document_count) || 0;
+        const loaded = (this.documents || []).length;
+        
+        this.details_section.find('.details-count').text(
+            total ? __('Showing {0} of {1} documents', [loaded, total]) : ''
+        );
+        this.details_section.find('.details-load-more').toggleClass('hidden', loaded >= total);
+    }
+    
     get_columns_for_tax_type() {
         // Base columns that are common to all tax types
         const base_columns = [
@@ -516,16 +599,46 @@ pajak_indonesia.PelaporanPajak = class PelaporanPajak {
         }
     }
     
+    setup_filing_listeners() {
+        // Tax filings are generated in the background; follow them through realtime events
+        this.filing_jobs = {};
+        this.finished_filing_jobs = {};
+        
+        frappe.realtime.on('pajak_bulk_job_progress', (data) => {
+            if (data.job_type === 'tax_filing' && this.filing_jobs[data.batch_id]) {
+                frappe.show_progress(__('Generating Tax Filing'), data.processed, data.total || 1,
+                    __('Adding source documents'));
+            }
+        });
+        
+        frappe.realtime.on('pajak_tax_filing_ready', (data) => {
+            if (this.filing_jobs[data.job_id]) {
+                this.on_tax_filing_ready(data);
+            } else {
+                // Small periods can finish before the enqueue response arrives
+                this.finished_filing_jobs[data.job_id] = data;
+            }
+        });
+    }
+    
     generate_tax_filing() {
         frappe.call({
             method: 'pajak_indonesia.pelaporan.page.pelaporan_pajak.pelaporan_pajak.generate_tax_filing',
             args: this.filters,
+            freeze: true,
             callback: (r) => {
-                if (r.message && r.message.filing_id) {
+                if (r.message && r.message.status === 'queued') {
+                    const job_id = r.message.job_id;
+                    this.filing_jobs[job_id] = true;
                     frappe.show_alert({
-                        message: __('Tax Filing generated successfully'),
-                        indicator: 'green'
+                        message: __('Tax Filing generation started'),
+                        indicator: 'blue'
                     });
+                    
+                    if (this.finished_filing_jobs[job_id]) {
+                        this.on_tax_filing_ready(this.finished_filing_jobs[job_id]);
+                    }
+                } else if (r.message && r.message.filing_id) {
                     frappe.set_route('Form', 'Tax Filing Summary', r.message.filing_id);
                 } else {
                     frappe.msgprint({
@@ -538,6 +651,26 @@ pajak_indonesia.PelaporanPajak = class PelaporanPajak {
         });
     }
     
+    on_tax_filing_ready(data) {
+        delete this.filing_jobs[data.job_id];
+        delete this.finished_filing_jobs[data.job_id];
+        frappe.hide_progress();
+        
+        if (data.filing_id) {
+            frappe.show_alert({
+                message: __('Tax Filing generated successfully'),
+                indicator: 'green'
+            });
+            frappe.set_route('Form', 'Tax Filing Summary', data.filing_id);
+        } else {
+            frappe.msgprint({
+                title: __('Error'),
+                indicator: 'red',
+                message: __('Failed to generate Tax Filing: {0}', [data.message || ''])
+            });
+        }
+    }
+    
     generate_payment(filing_id) {
         frappe.call({
             method: 'pajak_indonesia.pelaporan.doctype.tax_filing_summary.tax_filing_summary.generate_payment_entry',
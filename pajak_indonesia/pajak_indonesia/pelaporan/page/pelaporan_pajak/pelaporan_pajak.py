@@ -1,10 +1,48 @@
 import frappe
 from frappe import _
 from frappe.utils import getdate, flt, now, add_months
-from frappe.utils import getdate, flt, add_months, get_last_day, format_date
+from frappe.utils import getdate, flt, cint, add_months, get_last_day, format_date
+from pajak_indonesia.jobs import BulkJobProgress
+from pajak_indonesia.pelaporan.rollup import get_tax_gl_totals
+from pajak_indonesia.pelaporan.report_cache import ReportingCache
+from pajak_indonesia.profiling import profiled
+
+DEFAULT_PAGE_LENGTH = 50
+TAX_FILING_READY_EVENT = "pajak_tax_filing_ready"
+SORTABLE_COLUMNS = ("posting_date", "docname", "doctype", "status", "party", "base_amount", "tax_amount")
 
 @frappe.whitelist()
-def get_tax_reporting_data(tahun, masa_pajak, pajak_type, company):
+@profiled
+def get_tax_reporting_data(tahun, masa_pajak, pajak_type, company, start=0, page_length=None,
+                           sort_by=None, sort_order=None, search=None, document_type=None):
+    """
+    Get tax reporting data for the specified filters, cached per tax period
+    
+    Results are served from the reporting cache, which submits and cancels
+    of documents in the period invalidate. Arguments are those of
+    compute_tax_reporting_data.
+    
+    Returns:
+        dict: Data containing summary, one page of documents and listing totals
+    """
+    if not all([tahun, masa_pajak, pajak_type, company]):
+        frappe.throw(_("All filter parameters are required"))
+    
+    params = {
+        "start": cint(start),
+        "page_length": page_length,
+        "sort_by": sort_by,
+        "sort_order": sort_order,
+        "search": search,
+        "document_type": document_type
+    }
+    return ReportingCache.get_or_compute(
+        company, tahun, masa_pajak, pajak_type, params,
+        lambda: compute_tax_reporting_data(tahun, masa_pajak, pajak_type, company, **params)
+    )
+
+def compute_tax_reporting_data(tahun, masa_pajak, pajak_type, company, start=0, page_length=None,
+                               sort_by=None, sort_order=None, search=None, document_type=None):
     """
     Get tax reporting data for the specified filters
     
@@ -13,9 +51,15 @@ def get_tax_reporting_data(tahun, masa_pajak, pajak_type, company):
         masa_pajak (str): Tax month (01-12)
         pajak_type (str): Tax type (PPN, PPh 21, etc.)
         company (str): Company name
+        start (int): Offset of the first document returned
+        page_length (int): Documents per page, 0 for all documents
+        sort_by (str): Listing column to sort on
+        sort_order (str): asc or desc
+        search (str): Filter on document name or party
+        document_type (str): Only list documents of this DocType
         
     Returns:
-        dict: Data containing summary and documents
+        dict: Data containing summary, one page of documents and listing totals
     """
     try:
         # Input validation
@@ -28,8 +72,10 @@ def get_tax_reporting_data(tahun, masa_pajak, pajak_type, company):
                 "status": _("Belum Lapor"),
                 "tax_balance": 0
             },
-            "documents": []
+            "documents": [],
+            "totals": {"document_count": 0, "base_amount": 0, "tax_amount": 0}
         }
+        page = DocumentPage(start, page_length, sort_by, sort_order, search, document_type)
         
         # Get period dates
         from_date, to_date = get_period_dates(tahun, masa_pajak)
@@ -45,7 +91,7 @@ def get_tax_reporting_data(tahun, masa_pajak, pajak_type, company):
         # Get documents and compute summary based on tax type
         tax_handler = TaxDataHandler.get_handler(pajak_type)
         if tax_handler:
-            data = tax_handler.get_data(from_date, to_date, company, data)
+            data = tax_handler.get_data(from_date, to_date, company, data, page)
         
         return data
     
@@ -93,7 +139,7 @@ def get_existing_filing(tahun, masa_pajak, pajak_type, company):
             "jenis_pelaporan": filing_type,
             "masa_pajak": masa_pajak,
             "tahun_pajak": tahun,
-            "docstatus": 1
+            "docstatus": ["<", 2]
         },
         fields=["name", "status_spt", "payment_entry", "adjustment_entry"],
         limit=1
@@ -102,74 +148,236 @@ def get_existing_filing(tahun, masa_pajak, pajak_type, company):
     return filings[0] if filings else None
 
 @frappe.whitelist()
+@profiled
 def generate_tax_filing(tahun, masa_pajak, pajak_type, company):
     """
-    Create a new Tax Filing Summary
+    Start creating a new Tax Filing Summary in the background
+    
+    Args:
+        tahun (str): Year
+        masa_pajak (str): Month
+        pajak_type (str): Tax type
+        company (str): Company name
+        
+    Returns:
+        dict: Result with filing_id if it already exists, else the job_id;
+            the outcome is published with the pajak_tax_filing_ready event
+    """
+    # Check if filing already exists
+    existing = get_existing_filing(tahun, masa_pajak, pajak_type, company)
+    if existing:
+        return {"status": "exists", "filing_id": existing.name}
+    
+    if not TaxDataHandler.get_handler(pajak_type):
+        frappe.throw(_("Unsupported tax type {0}").format(pajak_type))
+    
+    job_id = frappe.generate_hash(length=12)
+    frappe.enqueue(
+        "pajak_indonesia.pelaporan.page.pelaporan_pajak.pelaporan_pajak.create_tax_filing",
+        queue="long",
+        timeout=3600,
+        # job_id is a frappe.enqueue argument, it would not reach the job
+        filing_job_id=job_id,
+        tahun=tahun,
+        masa_pajak=masa_pajak,
+        pajak_type=pajak_type,
+        company=company
+    )
+    
+    return {"status": "queued", "job_id": job_id}
+
+def create_tax_filing(tahun, masa_pajak, pajak_type, company, filing_job_id=None):
+    """
+    Create a draft Tax Filing Summary with all documents of the period
     
     Args:
         tahun (str): Year
         masa_pajak (str): Month
         pajak_type (str): Tax type
         company (str): Company name
+        filing_job_id (str): Progress channel of the background job
         
     Returns:
         dict: Result with filing_id
     """
+    progress = BulkJobProgress("tax_filing", filing_job_id)
+    
     try:
-        # Check if filing already exists
-        existing = get_existing_filing(tahun, masa_pajak, pajak_type, company)
-        if existing:
-            return {"status": "exists", "filing_id": existing.name}
-        
-        # Get tax data
-        data = get_tax_reporting_data(tahun, masa_pajak, pajak_type, company)
-        
-        # Create new Tax Filing Summary
-        filing = frappe.new_doc("Tax Filing Summary")
-        filing.company = company
-        filing.posting_date = getdate()
-        filing.jenis_pelaporan = f"SPT Masa {pajak_type}"
-        filing.masa_pajak = masa_pajak
-        filing.tahun_pajak = tahun
-        
-        # Set status based on tax balance
-        tax_balance = data["summary"].get("tax_balance", 0)
-        if tax_balance > 0:
-            filing.status_spt = "Kurang Bayar"
-        elif tax_balance < 0:
-            filing.status_spt = "Lebih Bayar"
-        else:
-            filing.status_spt = "Nihil"
-        
-        # Add source documents
-        for doc in data["documents"]:
-            filing.append("source_documents", {
-                "document_type": doc["doctype"],
-                "document_name": doc["docname"],
-                "status": doc["status"],
-                "amount": doc["tax_amount"]
-            })
-        
-        # Save and submit
-        filing.insert()
-        filing.submit()
-        
+        result = make_tax_filing(tahun, masa_pajak, pajak_type, company, progress)
         frappe.db.commit()
-        
-        return {
-            "status": "success",
-            "filing_id": filing.name
-        }
-        
+        if result["status"] == "success":
+            progress.record_chunk(result["document_count"], [])
+    
     except Exception as e:
         frappe.db.rollback()
         frappe.log_error(frappe.get_traceback(), f"Tax Filing Generation Error: {str(e)}")
-        return {
+        result = {
             "status": "error",
             "message": str(e)
         }
+    
+    result["job_id"] = filing_job_id
+    frappe.publish_realtime(TAX_FILING_READY_EVENT, result, user=frappe.session.user)
+    return result
+
+def make_tax_filing(tahun, masa_pajak, pajak_type, company, progress=None):
+    """
+    Insert a draft Tax Filing Summary unless the period already has one
+    
+    Totals are computed in SQL and the source document rows are written
+    with a single INSERT ... SELECT from the listing query, so nothing is
+    materialized per document in Python. The caller commits.
+    
+    Args:
+        tahun (str): Year
+        masa_pajak (str): Month
+        pajak_type (str): Tax type
+        company (str): Company name
+        progress (BulkJobProgress): Optional progress started with the document count
+        
+    Returns:
+        dict: Result with status "exists" or "success", filing_id and document_count
+    """
+    existing = get_existing_filing(tahun, masa_pajak, pajak_type, company)
+    if existing:
+        return {"status": "exists", "filing_id": existing.name, "document_count": 0}
+    
+    handler = TaxDataHandler.get_handler(pajak_type)
+    if not handler:
+        frappe.throw(_("Unsupported tax type {0}").format(pajak_type))
+    
+    from_date, to_date = get_period_dates(tahun, masa_pajak)
+    source_query, values = handler.get_listing(from_date, to_date, company)
+    
+    totals = DocumentPage.get_totals(source_query, values)
+    if progress:
+        progress.start(totals.document_count, 1)
+    summary = handler.get_summary(from_date, to_date, company, totals)
+    
+    # Create new Tax Filing Summary
+    filing = frappe.new_doc("Tax Filing Summary")
+    filing.company = company
+    filing.posting_date = getdate()
+    filing.jenis_pelaporan = f"SPT Masa {pajak_type}"
+    filing.masa_pajak = masa_pajak
+    filing.tahun_pajak = tahun
+    
+    # Set status based on tax balance
+    tax_balance = summary.get("tax_balance", 0)
+    if tax_balance > 0:
+        filing.status_spt = "Kurang Bayar"
+    elif tax_balance < 0:
+        filing.status_spt = "Lebih Bayar"
+    else:
+        filing.status_spt = "Nihil"
+    
+    # Source documents are added below in bulk
+    filing.flags.bulk_source_documents = True
+    filing.insert()
+    insert_source_documents(filing.name, source_query, values)
+    
+    return {
+        "status": "success",
+        "filing_id": filing.name,
+        "document_count": totals.document_count
+    }
+
+def insert_source_documents(filing_name, source_query, values):
+    """
+    Write every document of a listing query as Tax Filing Source Document rows
+    
+    Args:
+        filing_name (str): Parent Tax Filing Summary
+        source_query (str): Listing query of a TaxDataHandler
+        values (dict): Query parameters
+    """
+    timestamp = now()
+    frappe.db.sql(f"""
+        INSERT INTO `tabTax Filing Source Document`
+            (name, creation, modified, owner, modified_by, docstatus,
+             parent, parentfield, parenttype, idx,
+             document_type, document_name, status, amount)
+        SELECT
+            CONCAT(%(parent)s, '-', ranked.idx), %(timestamp)s, %(timestamp)s, %(user)s, %(user)s, 0,
+            %(parent)s, 'source_documents', 'Tax Filing Summary', ranked.idx,
+            ranked.doctype, ranked.docname, ranked.status, ranked.tax_amount
+        FROM (
+            SELECT docs.*, ROW_NUMBER() OVER (ORDER BY docs.doctype, docs.docname) as idx
+            FROM ({source_query}) docs
+        ) ranked
+    """, dict(values, parent=filing_name, timestamp=timestamp, user=frappe.session.user))
 
 # Tax Data Handler base class and implementations
+class DocumentPage:
+    """Server-side pagination, sorting and filtering of a document listing"""
+    
+    def __init__(self, start=0, page_length=None, sort_by=None, sort_order=None,
+                 search=None, document_type=None):
+        self.start = max(cint(start), 0)
+        # page_length 0 returns every document, e.g. when generating a filing
+        self.page_length = DEFAULT_PAGE_LENGTH if page_length is None else max(cint(page_length), 0)
+        self.sort_by = sort_by if sort_by in SORTABLE_COLUMNS else "posting_date"
+        self.sort_order = "asc" if (sort_order or "").lower() == "asc" else "desc"
+        self.search = search
+        self.document_type = document_type
+    
+    def fetch(self, source_query, values):
+        """
+        Get one page of a listing query plus totals over all its matching rows
+        
+        Args:
+            source_query (str): Query selecting docname, doctype, posting_date,
+                status, base_amount, tax_amount and party
+            values (dict): Query parameters
+            
+        Returns:
+            tuple: (documents, totals)
+        """
+        values = dict(values)
+        conditions = []
+        
+        if self.search:
+            conditions.append("(docs.docname LIKE %(search)s OR docs.party LIKE %(search)s)")
+            values["search"] = f"%{self.search}%"
+        if self.document_type:
+            conditions.append("docs.doctype = %(document_type)s")
+            values["document_type"] = self.document_type
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        limit = f"LIMIT {self.start}, {self.page_length}" if self.page_length else ""
+        
+        documents = frappe.db.sql(f"""
+            SELECT docs.*
+            FROM ({source_query}) docs
+            {where}
+            ORDER BY docs.`{self.sort_by}` {self.sort_order}, docs.docname {self.sort_order}
+            {limit}
+        """, values, as_dict=1)
+        
+        return documents, self.get_totals(source_query, values, where)
+    
+    @property
+    def has_filters(self):
+        return bool(self.search or self.document_type)
+    
+    @staticmethod
+    def get_totals(source_query, values, where=""):
+        """Get document count and amount sums of a listing query"""
+        totals = frappe.db.sql(f"""
+            SELECT
+                COUNT(*) as document_count,
+                SUM(docs.base_amount) as base_amount,
+                SUM(docs.tax_amount) as tax_amount
+            FROM ({source_query}) docs
+            {where}
+        """, values, as_dict=1)[0]
+        
+        return frappe._dict({
+            "document_count": cint(totals.document_count),
+            "base_amount": flt(totals.base_amount),
+            "tax_amount": flt(totals.tax_amount)
+        })
+
 class TaxDataHandler:
     @staticmethod
     def get_handler(tax_type):
@@ -182,28 +390,67 @@ class TaxDataHandler:
         }
         return handlers.get(tax_type)
     
-    def get_data(self, from_date, to_date, company, data):
-        """Abstract method to be implemented by subclasses"""
+    def get_data(self, from_date, to_date, company, data, page):
+        """Add the period summary and one page of documents to data"""
+        source_query, values = self.get_listing(from_date, to_date, company)
+        documents, totals = page.fetch(source_query, values)
+        
+        data["documents"] = documents
+        data["totals"] = totals
+        data["start"] = page.start
+        data["page_length"] = page.page_length
+        
+        # The summary always covers the whole period, not the filtered listing
+        if page.has_filters:
+            totals = DocumentPage.get_totals(source_query, values)
+        data["summary"].update(self.get_summary(from_date, to_date, company, totals))
+        
+        return data
+    
+    def get_listing(self, from_date, to_date, company):
+        """
+        Listing query of the documents for the period
+        
+        Returns:
+            tuple: (query selecting docname, doctype, posting_date, status,
+                base_amount, tax_amount and party; query parameters)
+        """
         raise NotImplementedError
+    
+    def get_summary(self, from_date, to_date, company, totals):
+        """Summary values of the period, given the listing totals"""
+        return {
+            "income_amount": totals.base_amount,
+            "tax_amount": totals.tax_amount,
+            "tax_balance": totals.tax_amount,
+            "document_count": totals.document_count
+        }
 
 class PPNDataHandler(TaxDataHandler):
-    def get_data(self, from_date, to_date, company, data):
+    def get_summary(self, from_date, to_date, company, totals):
         """Get PPN data for the specified period"""
-        # Get PPN Output data
+        # Get PPN Output and Input data
         ppn_out_amount = self.get_ppn_out_amount(from_date, to_date, company)
-        data["summary"]["ppn_out"] = ppn_out_amount
-        
-        # Get PPN Input data
         ppn_in_amount = self.get_ppn_in_amount(from_date, to_date, company)
-        data["summary"]["ppn_in"] = ppn_in_amount
-        
-        # Calculate tax balance (Kurang/Lebih Bayar)
-        data["summary"]["tax_balance"] = ppn_out_amount - ppn_in_amount
         
-        # Get documents
-        data["documents"] = self.get_ppn_documents(from_date, to_date, company)
-        
-        return data
+        return {
+            "ppn_out": ppn_out_amount,
+            "ppn_in": ppn_in_amount,
+            # Calculate tax balance (Kurang/Lebih Bayar)
+            "tax_balance": ppn_out_amount - ppn_in_amount
+        }
+    
+    def get_listing(self, from_date, to_date, company):
+        return self.get_ppn_documents_query(), {
+            "company": company,
+            "from_date": from_date,
+            "to_date": to_date,
+            "ppn_pattern": "%PPN%",
+            "output_pattern": "%Output%",
+            "keluaran_pattern": "%Keluaran%",
+            "input_pattern": "%Input%",
+            "masukan_pattern": "%Masukan%"
+        }
     
     def get_ppn_out_amount(self, from_date, to_date, company):
         """Get total PPN Output amount for the period"""
@@ -258,53 +505,38 @@ class PPNDataHandler(TaxDataHandler):
         return ppn_amount
     
     def get_tax_gl_sum(self, tax_type, from_date, to_date, company):
-        """Get sum of tax amounts from GL entries"""
-        gl_entries = frappe.db.sql("""
-            SELECT 
-                SUM(credit) as credit,
-                SUM(debit) as debit
-            FROM `tabGL Entry`
-            WHERE posting_date BETWEEN %s AND %s
-            AND company = %s
-            AND tax_type = %s
-            AND is_cancelled = 0
-        """, (from_date, to_date, company, tax_type), as_dict=1)
+        """Get sum of tax amounts from the monthly GL tax rollup"""
+        totals = get_tax_gl_totals(company, tax_type, from_date, to_date)
         
-        if not gl_entries or not gl_entries[0]:
-            return 0
-            
         if tax_type == "PPN_OUT":
-            return flt(gl_entries[0].credit)
+            return totals["credit"]
         else:
-            return flt(gl_entries[0].debit)
+            return totals["debit"]
     
-    def get_ppn_documents(self, from_date, to_date, company):
-        """Get PPN-related documents for the period"""
-        documents = []
-        
-        # Get E-Faktur documents
-        efaktur_docs = frappe.get_all(
-            "Efaktur Document",
-            filters={
-                "company": company,
-                "tanggal_faktur": ["between", [from_date, to_date]],
-                "docstatus": 1
-            },
-            fields=[
-                "name as docname", 
-                "'Efaktur Document' as doctype",
-                "tanggal_faktur as posting_date",
-                "status",
-                "jumlah_dpp as base_amount",
-                "jumlah_ppn as tax_amount",
-                "nama as party"
-            ]
-        )
-        documents.extend(efaktur_docs)
-        
-        # Get Sales Invoices with PPN
-        sales_invoices = frappe.db.sql("""
-            SELECT 
+    def get_ppn_documents_query(self):
+        """
+        Listing query of PPN-related documents for the period
+        
+        Sales Invoices already covered by an e-Faktur are dropped with an
+        anti-join on the e-Faktur reference instead of comparing names in Python.
+        """
+        return """
+            SELECT
+                ef.name as docname,
+                'Efaktur Document' as doctype,
+                ef.tanggal_faktur as posting_date,
+                ef.status,
+                ef.jumlah_dpp as base_amount,
+                ef.jumlah_ppn as tax_amount,
+                ef.nama as party
+            FROM `tabEfaktur Document` ef
+            WHERE ef.company = %(company)s
+            AND ef.tanggal_faktur BETWEEN %(from_date)s AND %(to_date)s
+            AND ef.docstatus = 1
+            
+            UNION ALL
+            
+            SELECT
                 si.name as docname,
                 'Sales Invoice' as doctype,
                 si.posting_date,
@@ -313,32 +545,27 @@ class PPNDataHandler(TaxDataHandler):
                 SUM(tax.tax_amount) as tax_amount,
                 si.customer as party
             FROM `tabSales Invoice` si
-            JOIN `tabSales Taxes and Charges` tax ON tax.parent = si.name
-            WHERE si.posting_date BETWEEN %s AND %s
-            AND si.company = %s
+            JOIN `tabSales Taxes and Charges` tax
+                ON tax.parent = si.name AND tax.parenttype = 'Sales Invoice'
+            WHERE si.posting_date BETWEEN %(from_date)s AND %(to_date)s
+            AND si.company = %(company)s
             AND si.docstatus = 1
             AND (
-                tax.account_head LIKE %s OR
-                tax.account_head LIKE %s OR
-                tax.account_head LIKE %s
+                tax.account_head LIKE %(ppn_pattern)s OR
+                tax.account_head LIKE %(output_pattern)s OR
+                tax.account_head LIKE %(keluaran_pattern)s
+            )
+            AND NOT EXISTS (
+                SELECT 1
+                FROM `tabEfaktur Document` ref
+                WHERE ref.reference_doctype = 'Sales Invoice'
+                AND ref.reference_name = si.name
             )
             GROUP BY si.name
-        """, (from_date, to_date, company, '%PPN%', '%Output%', '%Keluaran%'), as_dict=1)
-        
-        # Only add sales invoices not already covered by e-faktur
-        efaktur_refs = [d.get('reference_name') for d in frappe.get_all(
-            "Efaktur Document", 
-            filters={"reference_doctype": "Sales Invoice"},
-            fields=["reference_name"]
-        )]
-        
-        for si in sales_invoices:
-            if si.docname not in efaktur_refs:
-                documents.append(si)
-        
-        # Get Purchase Invoices with PPN
-        purchase_invoices = frappe.db.sql("""
-            SELECT 
+            
+            UNION ALL
+            
+            SELECT
                 pi.name as docname,
                 'Purchase Invoice' as doctype,
                 pi.posting_date,
@@ -347,122 +574,66 @@ class PPNDataHandler(TaxDataHandler):
                 SUM(tax.tax_amount) as tax_amount,
                 pi.supplier as party
             FROM `tabPurchase Invoice` pi
-            JOIN `tabPurchase Taxes and Charges` tax ON tax.parent = pi.name
-            WHERE pi.posting_date BETWEEN %s AND %s
-            AND pi.company = %s
+            JOIN `tabPurchase Taxes and Charges` tax
+                ON tax.parent = pi.name AND tax.parenttype = 'Purchase Invoice'
+            WHERE pi.posting_date BETWEEN %(from_date)s AND %(to_date)s
+            AND pi.company = %(company)s
             AND pi.docstatus = 1
             AND (
-                tax.account_head LIKE %s OR
-                tax.account_head LIKE %s OR
-                tax.account_head LIKE %s
+                tax.account_head LIKE %(ppn_pattern)s OR
+                tax.account_head LIKE %(input_pattern)s OR
+                tax.account_head LIKE %(masukan_pattern)s
             )
             GROUP BY pi.name
-        """, (from_date, to_date, company, '%PPN%', '%Input%', '%Masukan%'), as_dict=1)
-        documents.extend(purchase_invoices)
-        
-        return documents
+        """
 
 class PPh21DataHandler(TaxDataHandler):
-    def get_data(self, from_date, to_date, company, data):
-        """Get PPh 21 data for the specified period"""
-        # Get Salary Slips with PPh 21
-        salary_slips = frappe.get_all(
-            "Salary Slip",
-            filters={
-                "company": company,
-                "posting_date": ["between", [from_date, to_date]],
-                "docstatus": 1,
-                "total_tax_deducted": [">", 0]
-            },
-            fields=[
-                "name as docname", 
-                "'Salary Slip' as doctype",
-                "posting_date",
-                "status",
-                "gross_pay as base_amount",
-                "total_tax_deducted as tax_amount",
-                "employee_name as party"
-            ]
-        )
-        
-        # Compute summary
-        total_income = sum(flt(slip.base_amount) for slip in salary_slips)
-        total_tax = sum(flt(slip.tax_amount) for slip in salary_slips)
-        
-        data["summary"]["income_amount"] = total_income
-        data["summary"]["tax_amount"] = total_tax
-        data["summary"]["tax_balance"] = total_tax  # For PPh 21, balance is just the tax amount
-        data["summary"]["document_count"] = len(salary_slips)
-        data["documents"] = salary_slips
-        
-        return data
+    def get_listing(self, from_date, to_date, company):
+        """Salary Slips with PPh 21 for the specified period"""
+        return """
+            SELECT
+                name as docname,
+                'Salary Slip' as doctype,
+                posting_date,
+                status,
+                gross_pay as base_amount,
+                total_tax_deducted as tax_amount,
+                employee_name as party
+            FROM `tabSalary Slip`
+            WHERE company = %(company)s
+            AND posting_date BETWEEN %(from_date)s AND %(to_date)s
+            AND docstatus = 1
+            AND total_tax_deducted > 0
+        """, {"company": company, "from_date": from_date, "to_date": to_date}
 
-class PPh23DataHandler(TaxDataHandler):
-    def get_data(self, from_date, to_date, company, data):
-        """Get PPh 23 data for the specified period"""
-        # Get E-Bupot documents for PPh 23
-        ebupot_docs = frappe.get_all(
-            "Ebupot Document",
-            filters={
-                "company": company,
-                "jenis_pajak": "23",
-                "tandatangan_date": ["between", [from_date, to_date]],
-                "docstatus": 1
-            },
-            fields=[
-                "name as docname", 
-                "'Ebupot Document' as doctype",
-                "tandatangan_date as posting_date",
-                "status",
-                "penghasilan_bruto as base_amount",
-                "pph_dipotong as tax_amount",
-                "nama_terpotong as party"
-            ]
-        )
-        
-        # Compute summary
-        total_income = sum(flt(doc.base_amount) for doc in ebupot_docs)
-        total_tax = sum(flt(doc.tax_amount) for doc in ebupot_docs)
-        
-        data["summary"]["income_amount"] = total_income
-        data["summary"]["tax_amount"] = total_tax
-        data["summary"]["tax_balance"] = total_tax
-        data["summary"]["document_count"] = len(ebupot_docs)
-        data["documents"] = ebupot_docs
-        
-        return data
+class EbupotDataHandler(TaxDataHandler):
+    jenis_pajak = None
+    
+    def get_listing(self, from_date, to_date, company):
+        """E-Bupot documents of the handler's jenis pajak for the specified period"""
+        return """
+            SELECT
+                name as docname,
+                'Ebupot Document' as doctype,
+                tandatangan_date as posting_date,
+                status,
+                penghasilan_bruto as base_amount,
+                pph_dipotong as tax_amount,
+                nama_terpotong as party
+            FROM `tabEbupot Document`
+            WHERE company = %(company)s
+            AND jenis_pajak = %(jenis_pajak)s
+            AND tandatangan_date BETWEEN %(from_date)s AND %(to_date)s
+            AND docstatus = 1
+        """, {
+            "company": company,
+            "jenis_pajak": self.jenis_pajak,
+            "from_date": from_date,
+            "to_date": to_date
+        }
 
-class PPh26DataHandler(TaxDataHandler):
-    def get_data(self, from_date, to_date, company, data):
-        """Get PPh 26 data for the specified period"""
-        # Get E-Bupot documents for PPh 26
-        ebupot_docs = frappe.get_all(
-            "Ebupot Document",
-            filters={
-                "company": company,
-                "jenis_pajak": "26",
-                "tandatangan_date": ["between", [from_date, to_date]],
-                "docstatus": 1
-            },
-            fields=[
-                "name as docname", 
-                "'Ebupot Document' as doctype",
-                "tandatangan_date as posting_date",
-                "status",
-                "penghasilan_bruto as base_amount",
-                "pph_dipotong as tax_amount",
-                "nama_terpotong as party"
-            ]
-        )
-        
-        # Compute summary
-        total_income = sum(flt(doc.base_amount) for doc in ebupot_docs)
-        total_tax = sum(flt(doc.tax_amount) for doc in ebupot_docs)
-        
-        data["summary"]["income_amount"] = total_income
-        data["summary"]["tax_amount"] = total_tax
-        data["summary"]["tax_balance"] = total_tax
-        data["summary"]["document_count"] = len(ebupot_docs)
-        data["documents"] = ebupot_docs
-        
-        return data
+class PPh23DataHandler(EbupotDataHandler):
+    jenis_pajak = "23"
+
+class PPh26DataHandler(EbupotDataHandler):
+    jenis_pajak = "26"
@@ -0,0 +1,415 @@
+from typing import Optional, Dict, Any, List, Tuple, Iterable, Set
+import frappe
+from frappe import _
+from frappe.utils import flt, cint, getdate, get_last_day, now
+from pajak_indonesia.tax_accounts import get_ppn_account
+from pajak_indonesia.profiling import profiled
+
+ReconciliationKey = Tuple[str, str, str, str]  # (company, tahun_pajak, masa_pajak, tax_type)
+
+TAX_TYPES = ("PPN", "PPh 21", "PPh 23", "PPh 26")
+
+# GL tax tag, tagged side and sign per reconciled tax type
+GL_TAX_TYPES = {
+    "PPN_OUT": ("PPN", "credit", 1),
+    "PPN_IN": ("PPN", "debit", -1),
+    "PPH_21": ("PPh 21", "credit", 1),
+    "PPH_23": ("PPh 23", "credit", 1),
+    "PPH_26": ("PPh 26", "credit", 1)
+}
+
+FILING_TAX_TYPES = {f"SPT Masa {tax_type}": tax_type for tax_type in TAX_TYPES}
+
+# Source rows of a PPN filing, input tax is reported as a positive amount
+PPN_FILING_SIGNS = {
+    "Efaktur Document": 1,
+    "Sales Invoice": 1,
+    "SPT Summary": 1,  # already net of input tax
+    "Purchase Invoice": -1
+}
+
+# Rounding differences up to this many rupiah are not a mismatch
+TOLERANCE = 1
+WATERMARK_KEY = "pajak_tax_reconciliation_watermark"
+
+# Source tables whose changes dirty a period, with the columns giving the period
+CHANGE_SOURCES = (
+    ("Tax GL Rollup", "tahun_pajak", "masa_pajak"),
+    ("Efaktur Document", "tahun_pajak", "masa_pajak"),
+    ("Ebupot Document", "tahun_pajak", "masa_pajak"),
+    ("Purchase Invoice", "DATE_FORMAT(posting_date, '%%Y')", "DATE_FORMAT(posting_date, '%%m')"),
+    ("Salary Slip", "DATE_FORMAT(posting_date, '%%Y')", "DATE_FORMAT(posting_date, '%%m')"),
+    ("Tax Filing Summary", "tahun_pajak", "masa_pajak")
+)
+
+def get_result_name(company: str, tahun_pajak: str, masa_pajak: str, tax_type: str) -> str:
+    """Reconciliation result name, matching the DocType autoname format"""
+    return f"{tax_type}-{tahun_pajak}-{masa_pajak}-{company}"
+
+def get_status(gl_amount: float, document_amount: float, filing_amount: float, has_filing: bool) -> str:
+    """Matched, Mismatch, or Not Filed when GL and documents agree but nothing is filed yet"""
+    if abs(gl_amount - document_amount) > TOLERANCE:
+        return "Mismatch"
+    if not has_filing:
+        return "Not Filed"
+    if abs(filing_amount - document_amount) > TOLERANCE:
+        return "Mismatch"
+    return "Matched"
+
+class PeriodScope:
+    """
+    Periods of one company to reconcile.
+
+    Every side is read with grouped queries over the range spanning the
+    periods, rows of periods outside the scope are dropped in memory.
+    """
+
+    def __init__(self, company: str, periods: Optional[Iterable[Tuple[str, str]]] = None):
+        self.company = company
+        self.periods = set(periods) if periods is not None else None
+
+    @property
+    def is_full(self) -> bool:
+        return self.periods is None
+
+    def includes(self, tahun_pajak: str, masa_pajak: str) -> bool:
+        return self.is_full or (tahun_pajak, masa_pajak) in self.periods
+
+    def get_values(self) -> Dict[str, Any]:
+        values = {"company": self.company}
+        if self.periods:
+            first, last = min(self.periods), max(self.periods)
+            from_date = getdate(f"{first[0]}-{first[1]}-01")
+            values.update({
+                "from_period": "".join(first),
+                "to_period": "".join(last),
+                "from_date": from_date,
+                "to_date": get_last_day(getdate(f"{last[0]}-{last[1]}-01"))
+            })
+        return values
+
+    def period_condition(self, tahun_field: str = "tahun_pajak", masa_field: str = "masa_pajak") -> str:
+        if self.is_full:
+            return ""
+        return f"AND CONCAT({tahun_field}, {masa_field}) BETWEEN %(from_period)s AND %(to_period)s"
+
+    def date_condition(self, date_field: str = "posting_date") -> str:
+        if self.is_full:
+            return ""
+        return f"AND {date_field} BETWEEN %(from_date)s AND %(to_date)s"
+
+class TaxReconciliation:
+    """
+    Reconciles GL, tax documents and filings per company, period and tax type.
+
+    Each side is one grouped query per source table, so the cost does not
+    depend on the number of periods. The sides are joined in memory on
+    (company, tahun_pajak, masa_pajak, tax_type) and every key is written
+    to Tax Reconciliation Result with one upsert. Amounts are net tax:
+    output minus input tax for PPN, withheld tax for PPh.
+    """
+
+    def __init__(self, scope: PeriodScope):
+        self.scope = scope
+        self.values = scope.get_values()
+        self.periods = set()
+
+    def run(self) -> Dict[str, int]:
+        """
+        Reconcile the periods of the scope and write their results, does not commit.
+
+        Returns:
+            dict: Number of results per status
+        """
+        # An empty scope has no periods to read
+        if self.scope.periods is not None and not self.scope.periods:
+            return {}
+
+        gl = self.get_gl_amounts()
+        documents = self.get_document_amounts()
+        filings = self.get_filing_amounts()
+
+        # Results of keys no side has anymore are reset to zero
+        keys = set(gl) | set(documents) | set(filings) | self.get_existing_keys()
+        self.periods = {(key[1], key[2]) for key in keys}
+
+        timestamp = now()
+        counts = {}
+        rows = []
+        for key in sorted(keys):
+            gl_amount = flt(gl.get(key), 2)
+            document_amount = flt(documents.get(key), 2)
+            filing_amount = flt(filings.get(key), 2)
+            status = get_status(gl_amount, document_amount, filing_amount, key in filings)
+            counts[status] = counts.get(status, 0) + 1
+            rows.append((
+                get_result_name(*key), timestamp, timestamp, *key, status, cint(key in filings), timestamp,
+                gl_amount, document_amount, filing_amount,
+                gl_amount - document_amount, filing_amount - document_amount
+            ))
+
+        write_results(rows)
+        return counts
+
+    def add(self, amounts: Dict[ReconciliationKey, float], tahun_pajak: str, masa_pajak: str,
+            tax_type: str, amount: float) -> None:
+        if tahun_pajak and masa_pajak and self.scope.includes(tahun_pajak, masa_pajak):
+            key = (self.scope.company, tahun_pajak, masa_pajak, tax_type)
+            amounts[key] = amounts.get(key, 0) + flt(amount)
+
+    def get_gl_amounts(self) -> Dict[ReconciliationKey, float]:
+        """Net tax per period from the monthly GL tax rollup"""
+        amounts = {}
+        for row in frappe.db.sql(f"""
+            SELECT tahun_pajak, masa_pajak, tax_type, SUM(debit) as debit, SUM(credit) as credit
+            FROM `tabTax GL Rollup`
+            WHERE company = %(company)s
+            AND tax_type IN %(tax_types)s
+            {self.scope.period_condition()}
+            GROUP BY tahun_pajak, masa_pajak, tax_type
+        """, dict(self.values, tax_types=tuple(GL_TAX_TYPES)), as_dict=1):
+            tax_type, side, sign = GL_TAX_TYPES[row.tax_type]
+            self.add(amounts, row.tahun_pajak, row.masa_pajak, tax_type, sign * flt(row[side]))
+        return amounts
+
+    def get_document_amounts(self) -> Dict[ReconciliationKey, float]:
+        """Net tax per period from submitted e-Faktur, E-Bupot, Purchase Invoices and Salary Slips"""
+        amounts = {}
+
+        for row in frappe.db.sql(f"""
+            SELECT tahun_pajak, masa_pajak, SUM(jumlah_ppn) as tax_amount
+            FROM `tabEfaktur Document`
+            WHERE company = %(company)s AND docstatus = 1
+            {self.scope.period_condition()}
+            GROUP BY tahun_pajak, masa_pajak
+        """, self.values, as_dict=1):
+            self.add(amounts, row.tahun_pajak, row.masa_pajak, "PPN", row.tax_amount)
+
+        ppn_input_account = get_ppn_account(self.scope.company, "Input")
+        if ppn_input_account:
+            for row in frappe.db.sql(f"""
+                SELECT DATE_FORMAT(pi.posting_date, '%%Y') as tahun_pajak,
+                    DATE_FORMAT(pi.posting_date, '%%m') as masa_pajak,
+                    SUM(IF(tax.add_deduct_tax = 'Deduct', -1, 1) * tax.base_tax_amount) as tax_amount
+                FROM `tabPurchase Invoice` pi
+                INNER JOIN `tabPurchase Taxes and Charges` tax
+                    ON tax.parent = pi.name AND tax.parenttype = 'Purchase Invoice'
+                WHERE pi.company = %(company)s AND pi.docstatus = 1
+                AND tax.account_head = %(ppn_input_account)s
+                {self.scope.date_condition("pi.posting_date")}
+                GROUP BY DATE_FORMAT(pi.posting_date, '%%Y%%m')
+            """, dict(self.values, ppn_input_account=ppn_input_account), as_dict=1):
+                self.add(amounts, row.tahun_pajak, row.masa_pajak, "PPN", -flt(row.tax_amount))
+
+        for row in frappe.db.sql(f"""
+            SELECT tahun_pajak, masa_pajak, jenis_pajak, SUM(pph_dipotong) as tax_amount
+            FROM `tabEbupot Document`
+            WHERE company = %(company)s AND docstatus = 1
+            AND jenis_pajak IN ('23', '26')
+            {self.scope.period_condition()}
+            GROUP BY tahun_pajak, masa_pajak, jenis_pajak
+        """, self.values, as_dict=1):
+            self.add(amounts, row.tahun_pajak, row.masa_pajak, f"PPh {row.jenis_pajak}", row.tax_amount)
+
+        # Salary Slip belongs to HRMS, which is optional
+        if frappe.db.table_exists("Salary Slip"):
+            for row in frappe.db.sql(f"""
+                SELECT DATE_FORMAT(posting_date, '%%Y') as tahun_pajak,
+                    DATE_FORMAT(posting_date, '%%m') as masa_pajak,
+                    SUM(total_tax_deducted) as tax_amount
+                FROM `tabSalary Slip`
+                WHERE company = %(company)s AND docstatus = 1
+                AND total_tax_deducted != 0
+                {self.scope.date_condition()}
+                GROUP BY DATE_FORMAT(posting_date, '%%Y%%m')
+            """, self.values, as_dict=1):
+                self.add(amounts, row.tahun_pajak, row.masa_pajak, "PPh 21", row.tax_amount)
+
+        return amounts
+
+    def get_filing_amounts(self) -> Dict[ReconciliationKey, float]:
+        """
+        Net tax per period from the source rows of draft and submitted filings.
+
+        Every filed key is present, also when its filing has no amounts.
+        """
+        amounts = {}
+        for row in frappe.db.sql(f"""
+            SELECT f.tahun_pajak, f.masa_pajak, f.jenis_pelaporan, src.document_type,
+                SUM(src.amount) as amount
+            FROM `tabTax Filing Summary` f
+            LEFT JOIN `tabTax Filing Source Document` src
+                ON src.parent = f.name AND src.parenttype = 'Tax Filing Summary'
+                AND src.parentfield = 'source_documents'
+            WHERE f.company = %(company)s AND f.docstatus < 2
+            AND f.jenis_pelaporan IN %(jenis_pelaporan)s
+            {self.scope.period_condition("f.tahun_pajak", "f.masa_pajak")}
+            GROUP BY f.tahun_pajak, f.masa_pajak, f.jenis_pelaporan, src.document_type
+        """, dict(self.values, jenis_pelaporan=tuple(FILING_TAX_TYPES)), as_dict=1):
+            tax_type = FILING_TAX_TYPES[row.jenis_pelaporan]
+            # Payment and other non-tax rows of a PPN filing do not count
+            sign = PPN_FILING_SIGNS.get(row.document_type, 0) if tax_type == "PPN" else 1
+            self.add(amounts, row.tahun_pajak, row.masa_pajak, tax_type, sign * flt(row.amount))
+        return amounts
+
+    def get_existing_keys(self) -> Set[ReconciliationKey]:
+        return {
+            key for key in frappe.db.sql(f"""
+                SELECT company, tahun_pajak, masa_pajak, tax_type
+                FROM `tabTax Reconciliation Result`
+                WHERE company = %(company)s
+                {self.scope.period_condition()}
+            """, self.values)
+            if self.scope.includes(key[1], key[2])
+        }
+
+def write_results(rows: List[Tuple[Any, ...]]) -> None:
+    """Upsert reconciliation results, keeping the creation of existing ones"""
+    if not rows:
+        return
+    frappe.db.sql("""
+        INSERT INTO `tabTax Reconciliation Result`
+            (name, creation, modified, owner, modified_by, docstatus,
+             company, tahun_pajak, masa_pajak, tax_type, status, has_filing, last_reconciled,
+             gl_amount, document_amount, filing_amount, gl_difference, filing_difference)
+        VALUES {values}
+        ON DUPLICATE KEY UPDATE
+            status = VALUES(status),
+            has_filing = VALUES(has_filing),
+            last_reconciled = VALUES(last_reconciled),
+            gl_amount = VALUES(gl_amount),
+            document_amount = VALUES(document_amount),
+            filing_amount = VALUES(filing_amount),
+            gl_difference = VALUES(gl_difference),
+            filing_difference = VALUES(filing_difference),
+            modified = VALUES(modified)
+    """.format(values=", ".join(
+        ["(%s, %s, %s, 'Administrator', 'Administrator', 0, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"]
+        * len(rows)
+    )), [value for row in rows for value in row])
+
+def get_changed_periods(since: str) -> Dict[str, Set[Tuple[str, str]]]:
+    """
+    Periods with source rows modified after a timestamp.
+
+    Cancellation and GL postings update `modified` of the document or of
+    the rollup row, so both dirty their period.
+
+    Returns:
+        dict: {company: {(tahun_pajak, masa_pajak)}}
+    """
+    changed = {}
+    for doctype, tahun_sql, masa_sql in CHANGE_SOURCES:
+        if not frappe.db.table_exists(doctype):
+            continue
+        for company, tahun_pajak, masa_pajak in frappe.db.sql(f"""
+            SELECT DISTINCT company, {tahun_sql}, {masa_sql}
+            FROM `tab{doctype}`
+            WHERE modified > %(since)s
+        """, {"since": since}):
+            if company and tahun_pajak and masa_pajak:
+                changed.setdefault(company, set()).add((tahun_pajak, masa_pajak))
+    return changed
+
+def reconcile_company(company: str, periods: Optional[Iterable[Tuple[str, str]]] = None) -> Dict[str, int]:
+    """
+    Reconcile some or all periods of a company, does not commit.
+
+    Args:
+        company: Company name
+        periods: Optional (tahun_pajak, masa_pajak) tuples, all periods otherwise
+
+    Returns:
+        dict: Number of results per status
+    """
+    return TaxReconciliation(PeriodScope(company, periods)).run()
+
+@profiled
+def reconcile_all(full: bool = False) -> Dict[str, Any]:
+    """
+    Reconcile every company, one transaction per company.
+
+    Incremental by default: only periods with source rows modified since
+    the previous successful run are reconciled. The watermark is the
+    start of the run, so changes made while it runs are seen by the next
+    one, and it is not advanced when a company fails. A full run also
+    drops results of deleted draft filings.
+
+    Args:
+        full: Reconcile all periods of every company
+
+    Returns:
+        dict: companies and periods reconciled, results per status, failed companies
+    """
+    started = now()
+    watermark = None if full else frappe.db.get_global(WATERMARK_KEY)
+
+    if watermark:
+        scopes = [PeriodScope(company, periods) for company, periods in sorted(get_changed_periods(watermark).items())]
+    else:
+        scopes = [PeriodScope(company) for company in frappe.get_all("Company", pluck="name", order_by="name asc")]
+
+    summary = {"companies": 0, "periods": 0, "results": {}, "failed": []}
+    for scope in scopes:
+        try:
+            reconciliation = TaxReconciliation(scope)
+            counts = reconciliation.run()
+            frappe.db.commit()
+        except Exception:
+            frappe.db.rollback()
+            frappe.log_error(message=frappe.get_traceback(), title=f"Tax Reconciliation Error: {scope.company}")
+            summary["failed"].append(scope.company)
+            continue
+
+        summary["companies"] += 1
+        summary["periods"] += len(reconciliation.periods)
+        for status, count in counts.items():
+            summary["results"][status] = summary["results"].get(status, 0) + count
+
+    if not summary["failed"]:
+        frappe.db.set_global(WATERMARK_KEY, started)
+        frappe.db.commit()
+
+    return summary
+
+def run_nightly_reconciliation() -> Dict[str, Any]:
+    """Scheduler: reconcile the periods changed since the previous run"""
+    return reconcile_all()
+
+def run_full_reconciliation() -> Dict[str, Any]:
+    """Scheduler: reconcile every period"""
+    return reconcile_all(full=True)
+
+@frappe.whitelist()
+@profiled
+def reconcile_tax_periods(company: str, from_period: str, to_period: Optional[str] = None) -> Dict[str, int]:
+    """
+    Reconcile a range of periods of a company now.
+
+    Args:
+        company: Company name
+        from_period: First period as "YYYY-MM"
+        to_period: Optional last period as "YYYY-MM", from_period otherwise
+
+    Returns:
+        dict: Number of results per status
+    """
+    frappe.only_for(["System Manager", "Accounts Manager", "Tax Manager"])
+
+    periods = []
+    for period in (from_period, to_period or from_period):
+        tahun, _sep, masa = str(period or "").partition("-")
+        if not (len(tahun) == 4 and tahun.isdigit() and masa.isdigit() and 1 <= int(masa) <= 12):
+            frappe.throw(_("Invalid tax period {0}, expected YYYY-MM").format(period))
+        periods.append((int(tahun), int(masa)))
+
+    (year, month), last = periods
+    if (year, month) > last:
+        frappe.throw(_("Tax period {0} is before {1}").format(to_period, from_period))
+
+    scope = []
+    while (year, month) <= last:
+        scope.append((str(year), f"{month:02d}"))
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+
+    return reconcile_company(company, scope)
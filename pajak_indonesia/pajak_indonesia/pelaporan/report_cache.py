@@ -0,0 +1,137 @@
+from typing import Optional, Dict, Any, Callable
+import json
+import frappe
+from frappe.model.document import Document
+from frappe.utils import getdate, cint
+from pajak_indonesia.profiling import profiled
+
+# Date that places a document in a tax period, by DocType
+PERIOD_DATE_FIELDS = {
+    "Efaktur Document": "tanggal_faktur",
+    "Ebupot Document": "tandatangan_date",
+    "Sales Invoice": "posting_date",
+    "Purchase Invoice": "posting_date",
+    "Salary Slip": "posting_date",
+    "GL Entry": "posting_date"
+}
+
+class ReportingCache:
+    """
+    Caches get_tax_reporting_data results per tax period in Redis.
+
+    All results of a (company, tahun, masa) period live in one Redis hash,
+    one field per tax type and page request, so a document change drops
+    exactly the period it falls in. Invalidation runs after the
+    transaction commits and once per period, however many rows of a
+    voucher are posted.
+    """
+
+    CACHE_TIMEOUT = 21600  # 6 hours
+    STATS_KEY = "pajak_reporting_cache_stats"
+
+    @staticmethod
+    def period_key(company: str, tahun: str, masa: str) -> str:
+        return f"pajak_reporting::{company}::{tahun}::{masa}"
+
+    @staticmethod
+    def result_field(pajak_type: str, params: Dict[str, Any]) -> str:
+        return f"{pajak_type}::{json.dumps(params, sort_keys=True, default=str)}"
+
+    @classmethod
+    def get_or_compute(cls, company: str, tahun: str, masa: str, pajak_type: str,
+                       params: Dict[str, Any], compute: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Get a cached result of the period, computing and storing it on a miss.
+
+        Args:
+            company: Company name
+            tahun: Tax year
+            masa: Tax month (01-12)
+            pajak_type: Tax type
+            params: Page request (start, page length, sort, search, ...)
+            compute: Builds the result on a miss
+
+        Returns:
+            dict: Cached or freshly computed result
+        """
+        key = cls.period_key(company, tahun, masa)
+        field = cls.result_field(pajak_type, params)
+
+        result = frappe.cache().hget(key, field)
+        if result is not None:
+            cls.count("hits")
+            return result
+
+        cls.count("misses")
+        result = compute()
+        if not (result.get("summary") or {}).get("error"):
+            frappe.cache().hset(key, field, result)
+            frappe.cache().expire(frappe.cache().make_key(key), cls.CACHE_TIMEOUT)
+        return result
+
+    @classmethod
+    def invalidate_period(cls, company: str, tahun: str, masa: str) -> None:
+        """Drop the cached results of a period once the transaction commits"""
+        pending = getattr(frappe.local, "pajak_reporting_invalidations", None)
+        if pending is None:
+            pending = frappe.local.pajak_reporting_invalidations = set()
+
+        if not pending:
+            frappe.db.after_commit.add(cls.flush_invalidations)
+            frappe.db.after_rollback.add(pending.clear)
+        pending.add(cls.period_key(company, tahun, masa))
+
+    @classmethod
+    def flush_invalidations(cls) -> None:
+        pending = getattr(frappe.local, "pajak_reporting_invalidations", None)
+        if not pending:
+            return
+        for key in pending:
+            frappe.cache().delete_value(key)
+        cls.count("invalidations", len(pending))
+        pending.clear()
+
+    @classmethod
+    def clear(cls, company: Optional[str] = None) -> None:
+        """Drop the cached results of every period of a company, or of all companies"""
+        frappe.cache().delete_keys(f"pajak_reporting::{company}::" if company else "pajak_reporting::")
+
+    @classmethod
+    def count(cls, counter: str, amount: int = 1) -> None:
+        # Raw HINCRBY: counters are plain integers shared by all workers
+        frappe.cache().hincrby(frappe.cache().make_key(cls.STATS_KEY), counter, amount)
+
+    @classmethod
+    def get_stats(cls) -> Dict[str, Any]:
+        # Raw pipeline read: RedisWrapper.hgetall would prefix the key again and unpickle
+        pipe = frappe.cache().pipeline()
+        pipe.hgetall(frappe.cache().make_key(cls.STATS_KEY))
+        raw = pipe.execute()[0] or {}
+        stats = {counter: 0 for counter in ("hits", "misses", "invalidations")}
+        stats.update({frappe.safe_decode(k): cint(v) for k, v in raw.items()})
+
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0
+        return stats
+
+@profiled
+def invalidate_document_period(doc: Document, method: Optional[str] = None) -> None:
+    """Submit/cancel hook: drop the cached reporting data of the document's period"""
+    company = doc.get("company")
+    if not company:
+        return
+
+    if doc.get("tahun_pajak") and doc.get("masa_pajak"):
+        ReportingCache.invalidate_period(company, doc.tahun_pajak, doc.masa_pajak)
+        return
+
+    date = doc.get(PERIOD_DATE_FIELDS.get(doc.doctype, "posting_date"))
+    if date:
+        date = getdate(date)
+        ReportingCache.invalidate_period(company, date.strftime("%Y"), date.strftime("%m"))
+
+@frappe.whitelist()
+@profiled
+def get_reporting_cache_stats() -> Dict[str, Any]:
+    """Hit, miss and invalidation counters of the reporting cache"""
+    return ReportingCache.get_stats()
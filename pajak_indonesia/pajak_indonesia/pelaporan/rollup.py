@@ -0,0 +1,217 @@
+from typing import Optional, Dict, Any, List, Tuple
+import frappe
+from frappe.utils import flt, cint, getdate, get_last_day, now
+from pajak_indonesia.pelaporan.report_cache import ReportingCache
+
+RollupKey = Tuple[str, str, str, str]  # (company, tahun_pajak, masa_pajak, tax_type)
+
+def get_rollup_name(company: str, tahun_pajak: str, masa_pajak: str, tax_type: str) -> str:
+    """Rollup row name, matching the DocType autoname format"""
+    return f"{tax_type}-{tahun_pajak}-{masa_pajak}-{company}"
+
+def update_rollup(company: str, posting_date: Any, tax_type: str,
+                  debit: float, credit: float, entry_count: int) -> None:
+    """
+    Apply a delta to the monthly rollup row of a tax type.
+
+    Args:
+        company: Company name
+        posting_date: Posting date of the GL Entry, determines the period
+        tax_type: GL tax tag, e.g. PPN_OUT
+        debit: Debit delta (negative when decrementing)
+        credit: Credit delta (negative when decrementing)
+        entry_count: Entry count delta (+1 or -1)
+    """
+    posting_date = getdate(posting_date)
+    tahun_pajak = posting_date.strftime("%Y")
+    masa_pajak = posting_date.strftime("%m")
+    timestamp = now()
+
+    frappe.db.sql("""
+        INSERT INTO `tabTax GL Rollup`
+            (name, creation, modified, owner, modified_by, docstatus,
+             company, tahun_pajak, masa_pajak, tax_type, debit, credit, entry_count)
+        VALUES (%s, %s, %s, 'Administrator', 'Administrator', 0,
+                %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            debit = debit + VALUES(debit),
+            credit = credit + VALUES(credit),
+            entry_count = entry_count + VALUES(entry_count),
+            modified = VALUES(modified)
+    """, (
+        get_rollup_name(company, tahun_pajak, masa_pajak, tax_type), timestamp, timestamp,
+        company, tahun_pajak, masa_pajak, tax_type, flt(debit), flt(credit), cint(entry_count)
+    ))
+
+def is_whole_month_range(from_date: Any, to_date: Any) -> bool:
+    """Check whether a date range covers whole calendar months only"""
+    from_date = getdate(from_date)
+    to_date = getdate(to_date)
+    return from_date.day == 1 and to_date == get_last_day(to_date) and from_date <= to_date
+
+def get_tax_gl_totals(company: str, tax_type: str, from_date: Any, to_date: Any) -> Dict[str, float]:
+    """
+    Get debit and credit totals of tagged GL Entries for a date range.
+
+    Whole-month ranges are answered from the rollup table; any other
+    range falls back to scanning GL Entry.
+
+    Args:
+        company: Company name
+        tax_type: GL tax tag, e.g. PPN_OUT
+        from_date: Start date
+        to_date: End date
+
+    Returns:
+        dict: {"debit": float, "credit": float}
+    """
+    if is_whole_month_range(from_date, to_date):
+        totals = frappe.db.sql("""
+            SELECT SUM(debit) as debit, SUM(credit) as credit
+            FROM `tabTax GL Rollup`
+            WHERE company = %s
+            AND tax_type = %s
+            AND CONCAT(tahun_pajak, masa_pajak) BETWEEN %s AND %s
+        """, (company, tax_type, getdate(from_date).strftime("%Y%m"),
+              getdate(to_date).strftime("%Y%m")), as_dict=1)
+    else:
+        totals = frappe.db.sql("""
+            SELECT SUM(debit) as debit, SUM(credit) as credit
+            FROM `tabGL Entry`
+            WHERE company = %s
+            AND tax_type = %s
+            AND posting_date BETWEEN %s AND %s
+            AND is_cancelled = 0
+        """, (company, tax_type, from_date, to_date), as_dict=1)
+
+    row = totals[0] if totals else {}
+    return {"debit": flt(row.get("debit")), "credit": flt(row.get("credit"))}
+
+def get_annual_rollup(company: str, tahun_pajak: Any, tax_types: List[str]) -> List[Dict[str, Any]]:
+    """Get the rollup rows of one company and year for the given tax types"""
+    return frappe.db.sql("""
+        SELECT masa_pajak, tax_type, debit, credit, entry_count
+        FROM `tabTax GL Rollup`
+        WHERE company = %s
+        AND tahun_pajak = %s
+        AND tax_type IN %s
+    """, (company, str(tahun_pajak), tuple(tax_types)), as_dict=1)
+
+def compute_rollup_from_gl(company: Optional[str] = None) -> Dict[RollupKey, Dict[str, float]]:
+    """Recompute rollup values from scratch with one grouped GL Entry scan"""
+    conditions = ""
+    values = []
+    if company:
+        conditions = "AND company = %s"
+        values.append(company)
+
+    rows = frappe.db.sql(f"""
+        SELECT
+            company,
+            DATE_FORMAT(posting_date, '%%Y') as tahun_pajak,
+            DATE_FORMAT(posting_date, '%%m') as masa_pajak,
+            tax_type,
+            SUM(debit) as debit,
+            SUM(credit) as credit,
+            COUNT(*) as entry_count
+        FROM `tabGL Entry`
+        WHERE IFNULL(tax_type, '') != ''
+        AND is_cancelled = 0
+        {conditions}
+        GROUP BY company, DATE_FORMAT(posting_date, '%%Y%%m'), tax_type
+    """, values, as_dict=1)
+
+    return {
+        (row.company, row.tahun_pajak, row.masa_pajak, row.tax_type): {
+            "debit": flt(row.debit),
+            "credit": flt(row.credit),
+            "entry_count": cint(row.entry_count)
+        }
+        for row in rows
+    }
+
+def get_live_rollup(company: Optional[str] = None) -> Dict[RollupKey, Dict[str, float]]:
+    """Read the current rollup table"""
+    filters = {"company": company} if company else {}
+    rows = frappe.get_all(
+        "Tax GL Rollup",
+        filters=filters,
+        fields=["company", "tahun_pajak", "masa_pajak", "tax_type", "debit", "credit", "entry_count"]
+    )
+    return {
+        (row.company, row.tahun_pajak, row.masa_pajak, row.tax_type): {
+            "debit": flt(row.debit),
+            "credit": flt(row.credit),
+            "entry_count": cint(row.entry_count)
+        }
+        for row in rows
+    }
+
+def verify_rollup(company: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Diff the live rollup table against a fresh recomputation from GL Entry.
+
+    Args:
+        company: Optional company to restrict the check to
+
+    Returns:
+        list: One dict per drifted (company, period, tax_type) key
+    """
+    expected = compute_rollup_from_gl(company)
+    live = get_live_rollup(company)
+    empty = {"debit": 0.0, "credit": 0.0, "entry_count": 0}
+
+    differences = []
+    for key in sorted(set(expected) | set(live)):
+        want = expected.get(key, empty)
+        have = live.get(key, empty)
+        if (abs(want["debit"] - have["debit"]) >= 0.01
+                or abs(want["credit"] - have["credit"]) >= 0.01
+                or want["entry_count"] != have["entry_count"]):
+            differences.append({
+                "company": key[0],
+                "tahun_pajak": key[1],
+                "masa_pajak": key[2],
+                "tax_type": key[3],
+                "expected": want,
+                "actual": have
+            })
+
+    return differences
+
+def rebuild_rollup(company: Optional[str] = None) -> int:
+    """
+    Recompute the rollup table from GL Entry and replace its contents.
+
+    Args:
+        company: Optional company to restrict the rebuild to
+
+    Returns:
+        int: Number of rollup rows written
+    """
+    expected = compute_rollup_from_gl(company)
+
+    if company:
+        frappe.db.sql("DELETE FROM `tabTax GL Rollup` WHERE company = %s", company)
+    else:
+        frappe.db.sql("DELETE FROM `tabTax GL Rollup`")
+
+    timestamp = now()
+    values = [
+        (
+            get_rollup_name(*key), timestamp, timestamp, "Administrator", "Administrator", 0,
+            key[0], key[1], key[2], key[3], totals["debit"], totals["credit"], totals["entry_count"]
+        )
+        for key, totals in expected.items()
+    ]
+
+    if values:
+        frappe.db.bulk_insert(
+            "Tax GL Rollup",
+            fields=["name", "creation", "modified", "owner", "modified_by", "docstatus",
+                    "company", "tahun_pajak", "masa_pajak", "tax_type", "debit", "credit", "entry_count"],
+            values=values
+        )
+
+    ReportingCache.clear(company)
+    return len(values)
@@ -0,0 +1,29 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from pajak_indonesia.pelaporan.bulk_filing import consolidate_results, parse_periods, split_for_workers
+
+class TestBulkFiling(FrappeTestCase):
+    def test_parse_periods(self):
+        self.assertEqual(
+            parse_periods(["2024-1", ["2024", "02"], {"tahun": 2024, "masa_pajak": 3}, "2024-01"]),
+            [("2024", "01"), ("2024", "02"), ("2024", "03")]
+        )
+        self.assertEqual(parse_periods('["2024-12"]'), [("2024", "12")])
+        self.assertRaises(frappe.ValidationError, parse_periods, ["2024-13"])
+
+    def test_split_is_bounded_by_workers(self):
+        combinations = [{"company": f"C{i}"} for i in range(10)]
+        chunks = split_for_workers(combinations, 4)
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual(sum(chunks, []), combinations)
+        self.assertEqual(len(split_for_workers(combinations[:2], 4)), 2)
+
+    def test_consolidated_report_lists_errors_first(self):
+        base = {"company": "C", "tahun": "2024", "masa_pajak": "01"}
+        report = consolidate_results([
+            dict(base, pajak_type="PPN", status="exists", filing_id="TFS-1"),
+            dict(base, pajak_type="PPh 21", status="success", filing_id="TFS-2"),
+            dict(base, pajak_type="PPh 23", status="error", message="boom")
+        ])
+        self.assertEqual((report["created"], report["existing"], report["failed"]), (1, 1, 1))
+        self.assertEqual([r["status"] for r in report["results"]], ["error", "success", "exists"])
@@ -0,0 +1,170 @@
+import os
+import xml.etree.ElementTree as ET
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from pajak_indonesia.pelaporan.export import CoretaxEbupotExporter, coretax_tin
+
+class PagedExporter(CoretaxEbupotExporter):
+    """Coretax exporter over fixed pages, one record per document"""
+
+    def __init__(self, filters, pages):
+        super().__init__(filters)
+        self.pages = pages
+
+    def iter_pages(self):
+        yield from self.pages
+
+    def get_page_rows(self, docs):
+        for doc in docs:
+            yield {"TaxPeriodMonth": 1, "TaxPeriodYear": "2024", "CounterpartTin": doc.name,
+                   "TaxObjectCode": "24-104-01", "Gross": 1000000, "Rate": 2}
+
+class SeededExporter(CoretaxEbupotExporter):
+    """Coretax exporter over seeded documents, rows built by the real mapping"""
+
+    def __init__(self, filters, names):
+        super().__init__(filters)
+        self.names = names
+
+    def iter_pages(self):
+        yield frappe.get_all(
+            self.doctype, filters={"name": ["in", self.names]}, fields=self.get_fields(), order_by="name asc"
+        )
+
+class TestCoretaxExport(FrappeTestCase):
+    def setUp(self):
+        self.company = frappe.db.get_value("Company", {}, "name")
+        self.files = []
+
+    def tearDown(self):
+        for _filename, path in self.files:
+            if os.path.exists(path):
+                os.remove(path)
+
+    def export(self, rows_per_file, count):
+        docs = [frappe._dict({"name": f"BP{i:04d}"}) for i in range(count)]
+        exporter = PagedExporter(
+            frappe._dict({"company": self.company, "year": 2024, "tax_type": "23", "rows_per_file": rows_per_file}),
+            [docs[:3], docs[3:]]
+        )
+        self.files, exported = exporter.write_files()
+        self.assertEqual(exported, count)
+        return [ET.parse(path).getroot() for _filename, path in self.files]
+
+    def test_split_at_row_limit(self):
+        roots = self.export(rows_per_file=2, count=5)
+        self.assertEqual([len(root.find("ListOfBpu")) for root in roots], [2, 2, 1])
+        self.assertEqual(roots[2].find("ListOfBpu/Bpu/CounterpartTin").text, "BP0004")
+        self.assertTrue(all(filename.endswith(f"-00{i}.xml") for i, (filename, _path) in enumerate(self.files, 1)))
+
+    def test_single_file_keeps_export_name(self):
+        roots = self.export(rows_per_file=10, count=5)
+        self.assertEqual(len(roots), 1)
+        self.assertEqual(roots[0].tag, "BpuBulk")
+        self.assertFalse(self.files[0][0].endswith("-001.xml"))
+
+    def export_seeded(self, tax_type, names, rows_per_file=10):
+        exporter = SeededExporter(
+            frappe._dict({"company": self.company, "year": 2024, "tax_type": tax_type, "rows_per_file": rows_per_file}),
+            names
+        )
+        self.files, exported = exporter.write_files()
+        self.assertEqual(exported, len(names))
+        return [ET.parse(path).getroot() for _filename, path in self.files]
+
+    def test_bppu_element_per_item(self):
+        """Every item is a tax object, a document without items is exported from its header"""
+        names = [
+            insert_ebupot("_Test Coretax BP-1", "23", items=[
+                {"kode_objek_pajak": "24-104-01", "dasar_pengenaan_pajak": 1000000, "tarif": 2},
+                {"kode_objek_pajak": "24-104-14", "dasar_pengenaan_pajak": 500000, "tarif": 2}
+            ]),
+            insert_ebupot("_Test Coretax BP-2", "23", penghasilan_bruto=300000, tarif=2)
+        ]
+        roots = self.export_seeded("23", names)
+
+        self.assertEqual(len(roots), 1)
+        elements = roots[0].findall("ListOfBpu/Bpu")
+        self.assertEqual([e.find("TaxObjectCode").text for e in elements], ["24-104-01", "24-104-14", "23-100-01"])
+        self.assertEqual([e.find("Gross").text for e in elements], ["1000000", "500000", "300000"])
+        self.assertEqual([e.find("DocumentNumber").text for e in elements], [names[0], names[0], names[1]])
+        self.assertEqual(elements[0].find("CounterpartTin").text, "0012345678901234")
+
+    def test_split_counts_elements(self):
+        """The row limit counts item elements, not documents"""
+        names = [
+            insert_ebupot("_Test Coretax BP-1", "23", items=[
+                {"kode_objek_pajak": "24-104-01", "dasar_pengenaan_pajak": 1000000, "tarif": 2},
+                {"kode_objek_pajak": "24-104-14", "dasar_pengenaan_pajak": 500000, "tarif": 2}
+            ]),
+            insert_ebupot("_Test Coretax BP-2", "23", penghasilan_bruto=300000, tarif=2)
+        ]
+        roots = self.export_seeded("23", names, rows_per_file=2)
+        self.assertEqual([len(root.find("ListOfBpu")) for root in roots], [2, 1])
+        self.assertEqual(roots[1].find("ListOfBpu/Bpu/DocumentNumber").text, names[1])
+
+    def test_bpnr_supplier_profile_fallback(self):
+        """BPNR counterpart fields missing on the document come from the supplier profile"""
+        supplier = create_foreign_supplier()
+        names = [insert_ebupot("_Test Coretax BPNR-1", "26", supplier=supplier, penghasilan_bruto=2000000, tarif=20)]
+        roots = self.export_seeded("26", names)
+
+        element = roots[0].find("ListOfBpnr/Bpnr")
+        self.assertEqual(roots[0].tag, "BpnrBulk")
+        self.assertEqual(element.find("CounterpartTin").text, "SG-T12345678")
+        self.assertEqual(element.find("CounterpartCountry").text, "Singapore")
+        self.assertIn("1 Raffles Place", element.find("CounterpartAddress").text)
+        self.assertEqual(element.find("TaxObjectCode").text, "26-100-01")
+
+    def test_coretax_tin(self):
+        self.assertEqual(coretax_tin("01.234.567.8-901.234"), "0012345678901234")
+        self.assertEqual(coretax_tin("3171234567890001"), "3171234567890001")
+        self.assertEqual(coretax_tin(None), "0000000000000000")
+
+def insert_ebupot(name, jenis_pajak, items=None, supplier=None, penghasilan_bruto=0, tarif=0):
+    """Insert a submitted Ebupot Document with its items, without running its validations"""
+    company = frappe.db.get_value("Company", {}, "name")
+    doc = frappe.get_doc({
+        "doctype": "Ebupot Document",
+        "name": name,
+        "company": company,
+        "jenis_pajak": jenis_pajak,
+        "masa_pajak": "01",
+        "tahun_pajak": "2024",
+        "tandatangan_date": "2024-01-15",
+        "npwp_terpotong": "01.234.567.8-901.234",
+        "nama_terpotong": "_Test Terpotong",
+        "alamat_terpotong": None if supplier else "Jakarta",
+        "supplier": supplier,
+        "penghasilan_bruto": penghasilan_bruto,
+        "tarif": tarif,
+        "items": items or []
+    })
+    doc.docstatus = 1
+    doc.db_insert()
+    for item in doc.items:
+        item.docstatus = 1
+        item.db_insert()
+    return doc.name
+
+def create_foreign_supplier():
+    """Supplier whose NPWP, address and country are only on its master data"""
+    name = "_Test Coretax Foreign Supplier"
+    if not frappe.db.exists("Supplier", name):
+        frappe.get_doc({
+            "doctype": "Supplier",
+            "supplier_name": name,
+            "tax_id": "SG-T12345678",
+            "country": "Singapore"
+        }).insert()
+        frappe.get_doc({
+            "doctype": "Address",
+            "address_title": name,
+            "address_type": "Billing",
+            "address_line1": "1 Raffles Place",
+            "city": "Singapore",
+            "country": "Singapore",
+            "is_primary_address": 1,
+            "links": [{"link_doctype": "Supplier", "link_name": name}]
+        }).insert()
+    return name
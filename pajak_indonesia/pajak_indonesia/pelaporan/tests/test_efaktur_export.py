@@ -0,0 +1,26 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from pajak_indonesia.pelaporan.export import EFAKTUR_LT_HEADER, EfakturCSVExporter
+
+class TestEfakturExport(FrappeTestCase):
+    def test_yearly_export_is_paged_per_month(self):
+        exporter = EfakturCSVExporter(frappe._dict({"company": "_Test Company IDN", "year": 2024}))
+        partitions = exporter.get_partitions()
+        self.assertEqual([filters["masa_pajak"] for filters in partitions][::11], ["01", "12"])
+        self.assertEqual(len(partitions), 12)
+
+        exporter = EfakturCSVExporter(frappe._dict({"company": "_Test Company IDN", "year": 2024, "month": "03"}))
+        self.assertEqual(exporter.get_partitions(), [exporter.get_filters()])
+
+    def test_lt_row_follows_fk_row(self):
+        doc = frappe._dict({
+            "name": "_Test Efaktur Export", "nomor_faktur": "010.000-24.000.000.01", "masa_pajak": "03",
+            "tahun_pajak": "2024", "npwp": "02.345.678.9-234.000", "nama": "_Test Customer IDN",
+            "alamat_lengkap": "Jl. Sudirman 1, Jakarta", "jumlah_dpp": 1000000, "jumlah_ppn": 110000
+        })
+        exporter = EfakturCSVExporter(frappe._dict({"company": "_Test Company IDN", "year": 2024}))
+        fk, lt = list(exporter.get_page_rows([doc]))
+
+        self.assertEqual(fk[0], "FK")
+        self.assertEqual(len(lt), len(EFAKTUR_LT_HEADER))
+        self.assertEqual(lt[:4], ["LT", "023456789234000", "_Test Customer IDN", "Jl. Sudirman 1, Jakarta"])
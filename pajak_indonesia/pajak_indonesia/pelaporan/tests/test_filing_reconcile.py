@@ -1,7 +1,18 @@
 import unittest
 import frappe
-from frappe.utils import today, add_days, add_months
+from frappe.utils import today, add_days, add_months, flt, now
 from frappe.tests.utils import FrappeTestCase
+from pajak_indonesia.pelaporan.rollup import update_rollup
+from pajak_indonesia.pelaporan.reconciliation import (
+    TaxReconciliation, PeriodScope, reconcile_company, get_changed_periods, get_result_name
+)
+
+TEST_COMPANY = "_Test Company IDN"
+
+# A period no other test posts to
+RECON_TAHUN = "2019"
+RECON_MASA = "03"
+RECON_EFAKTUR = "_Test Recon Efaktur"
 
 class TestTaxFilingReconciliation(FrappeTestCase):
     @classmethod
@@ -80,9 +91,59 @@ class TestTaxFilingReconciliation(FrappeTestCase):
         ])
         filing.save()
         
-        # Test reconciliation
-        # TODO: Implement reconciliation testing
-        pass
+        # Test reconciliation on a period seeded with known amounts
+        seed_period_documents(efaktur_ppn=110000, gl_ppn_out=110000)
+        filing = create_test_filing(RECON_MASA, RECON_TAHUN, [
+            {"document_type": "Efaktur Document", "document_name": RECON_EFAKTUR}
+        ])
+        self.assertEqual(flt(filing.source_documents[0].amount), 110000)
+        
+        counts = reconcile_company(TEST_COMPANY, [(RECON_TAHUN, RECON_MASA)])
+        self.assertEqual(counts, {"Matched": 1})
+        
+        result = get_result("PPN")
+        self.assertEqual(result.status, "Matched")
+        self.assertTrue(result.has_filing)
+        self.assertEqual(flt(result.gl_amount), 110000)
+        self.assertEqual(flt(result.document_amount), 110000)
+        self.assertEqual(flt(result.filing_amount), 110000)
+        self.assertEqual(flt(result.gl_difference), 0)
+        self.assertEqual(flt(result.filing_difference), 0)
+    
+    def test_reconciliation_discrepancies(self):
+        """GL differing from the documents is a mismatch, a period without filing is not filed"""
+        seed_period_documents(efaktur_ppn=110000, gl_ppn_out=115000, ebupot_pph_23=20000, gl_pph_23=20000)
+        
+        counts = reconcile_company(TEST_COMPANY, [(RECON_TAHUN, RECON_MASA)])
+        self.assertEqual(counts, {"Mismatch": 1, "Not Filed": 1})
+        
+        ppn = get_result("PPN")
+        self.assertEqual(ppn.status, "Mismatch")
+        self.assertEqual(flt(ppn.gl_amount), 115000)
+        self.assertEqual(flt(ppn.document_amount), 110000)
+        self.assertEqual(flt(ppn.gl_difference), 5000)
+        self.assertFalse(ppn.has_filing)
+        
+        pph_23 = get_result("PPh 23")
+        self.assertEqual(pph_23.status, "Not Filed")
+        self.assertEqual(flt(pph_23.gl_amount), 20000)
+        self.assertEqual(flt(pph_23.document_amount), 20000)
+    
+    def test_incremental_reconciliation(self):
+        """Only periods with rows modified after the watermark are reconciled again"""
+        before = now()
+        seed_period_documents(efaktur_ppn=110000, gl_ppn_out=110000)
+        
+        changed = get_changed_periods(before)
+        self.assertIn((RECON_TAHUN, RECON_MASA), changed.get(TEST_COMPANY, set()))
+        
+        reconciliation = TaxReconciliation(PeriodScope(TEST_COMPANY, changed[TEST_COMPANY]))
+        reconciliation.run()
+        self.assertIn((RECON_TAHUN, RECON_MASA), reconciliation.periods)
+        self.assertEqual(get_result("PPN").status, "Not Filed")
+        
+        # Nothing changed after the run, so the period is not picked up again
+        self.assertNotIn((RECON_TAHUN, RECON_MASA), get_changed_periods(now()).get(TEST_COMPANY, set()))
     
     def create_test_documents(self):
         """Create test documents for filing"""
@@ -106,14 +167,59 @@ class TestTaxFilingReconciliation(FrappeTestCase):
             "tahun_pajak": "2024"
         }).insert()
 
-def create_test_filing():
+def create_test_filing(masa_pajak="01", tahun_pajak="2024", source_documents=None):
     """Helper function to create test Tax Filing Summary"""
     return frappe.get_doc({
         "doctype": "Tax Filing Summary",
-        "company": "_Test Company IDN",
+        "company": TEST_COMPANY,
         "posting_date": today(),
         "jenis_pelaporan": "SPT Masa PPN",
-        "masa_pajak": "01",
-        "tahun_pajak": "2024",
-        "status_spt": "Nihil"
-    }).insert()
\ No newline at end of file
+        "masa_pajak": masa_pajak,
+        "tahun_pajak": tahun_pajak,
+        "status_spt": "Nihil",
+        "source_documents": source_documents or []
+    }).insert()
+
+def seed_period_documents(efaktur_ppn=0, gl_ppn_out=0, ebupot_pph_23=0, gl_pph_23=0):
+    """Submitted tax documents and GL rollup rows of the reconciliation test period"""
+    posting_date = f"{RECON_TAHUN}-{RECON_MASA}-15"
+    if efaktur_ppn:
+        insert_submitted({
+            "doctype": "Efaktur Document",
+            "name": RECON_EFAKTUR,
+            "company": TEST_COMPANY,
+            "kode_jenis_transaksi": "01",
+            "tanggal_faktur": posting_date,
+            "masa_pajak": RECON_MASA,
+            "tahun_pajak": RECON_TAHUN,
+            "jumlah_dpp": efaktur_ppn * 100 / 11,
+            "jumlah_ppn": efaktur_ppn
+        })
+    if ebupot_pph_23:
+        insert_submitted({
+            "doctype": "Ebupot Document",
+            "name": "_Test Recon Ebupot",
+            "company": TEST_COMPANY,
+            "jenis_pajak": "23",
+            "tandatangan_date": posting_date,
+            "masa_pajak": RECON_MASA,
+            "tahun_pajak": RECON_TAHUN,
+            "penghasilan_bruto": ebupot_pph_23 * 50,
+            "pph_dipotong": ebupot_pph_23
+        })
+    if gl_ppn_out:
+        update_rollup(TEST_COMPANY, posting_date, "PPN_OUT", 0, gl_ppn_out, 1)
+    if gl_pph_23:
+        update_rollup(TEST_COMPANY, posting_date, "PPH_23", 0, gl_pph_23, 1)
+
+def insert_submitted(values):
+    """Insert a submitted document without running its validations"""
+    doc = frappe.get_doc(values)
+    doc.docstatus = 1
+    doc.db_insert()
+    return doc
+
+def get_result(tax_type):
+    return frappe.get_doc(
+        "Tax Reconciliation Result", get_result_name(TEST_COMPANY, RECON_TAHUN, RECON_MASA, tax_type)
+    )
@@ -0,0 +1,50 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from pajak_indonesia.pelaporan.utils import GLEntryTaxTagger, update_rollup_for_reversal
+
+COMPANY = "_Test Rollup Company"
+VOUCHER = "_Test Rollup Voucher"
+
+class TestGLRollupReversal(FrappeTestCase):
+    def tearDown(self):
+        frappe.db.rollback()
+
+    def test_reversal_is_booked_in_original_period(self):
+        """A reversal posted in a later month decrements the original's month"""
+        insert_gl_entry("_Test Rollup GL 1", "2024-01-31", credit=110000, tax_type="PPN_OUT")
+        reversal = insert_gl_entry("_Test Rollup GL 2", "2024-03-05", debit=110000, tax_type="PPN_OUT")
+
+        tagger = GLEntryTaxTagger(COMPANY)
+        update_rollup_for_reversal(reversal, tagger)
+
+        self.assertEqual(list(tagger.pending_rollup), [("2024-01", "PPN_OUT")])
+        self.assertEqual(tagger.pending_rollup[("2024-01", "PPN_OUT")][1:], [0.0, -110000.0, -1])
+        tagger.discard_rollup()
+
+    def test_untagged_original_is_not_decremented(self):
+        """Entries that were never tagged were never counted in the rollup"""
+        insert_gl_entry("_Test Rollup GL 3", "2024-01-31", credit=110000)
+        reversal = insert_gl_entry("_Test Rollup GL 4", "2024-01-31", debit=110000)
+
+        tagger = GLEntryTaxTagger(COMPANY)
+        update_rollup_for_reversal(reversal, tagger)
+
+        self.assertEqual(tagger.pending_rollup, {})
+
+def insert_gl_entry(name, posting_date, debit=0, credit=0, tax_type=None):
+    """Insert a cancelled GL Entry row of the test voucher without running its hooks"""
+    doc = frappe.get_doc({
+        "doctype": "GL Entry",
+        "name": name,
+        "company": COMPANY,
+        "posting_date": posting_date,
+        "account": "_Test PPN Output",
+        "voucher_type": "Sales Invoice",
+        "voucher_no": VOUCHER,
+        "debit": debit,
+        "credit": credit,
+        "is_cancelled": 1,
+        "tax_type": tax_type
+    })
+    doc.db_insert()
+    return doc
@@ -1,37 +1,64 @@
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 import frappe
 from frappe.model.document import Document
 from frappe.model.naming import make_autoname
-from frappe.utils import flt, cint
+from frappe.utils import flt, cint, getdate
 from frappe import _
+from pajak_indonesia.pelaporan.rollup import update_rollup
+from pajak_indonesia.tax_accounts import get_ppn_account, get_pph_account
+from pajak_indonesia.profiling import profiled
+
+# GL tax_type of withholding tax accounts, by PPh type
+PPH_GL_TAX_TYPES = {
+    "21": "PPH_21",
+    "23": "PPH_23",
+    "26": "PPH_26",
+    "4(2)": "PPH_4_2"
+}
 
 class GLEntryTaxTagger:
-    """Handles tax-related tagging of GL Entries"""
+    """
+    Handles tax-related tagging of GL Entries.
+    
+    One tagger per company is kept on frappe.local, so the PPN accounts are
+    resolved once and every GL row of a voucher is tagged by the same
+    instance. Rollup deltas of the transaction are summed per period and
+    tax type and written once, just before the transaction commits.
+    """
     
     def __init__(self, company: str):
         self.company = company
-        self._ppn_out_account = None
-        self._ppn_in_account = None
-    
-    @property
-    def ppn_out_account(self) -> Optional[str]:
-        """Get cached or fetch PPN Output account"""
-        if self._ppn_out_account is None:
-            self._ppn_out_account = get_ppn_output_account(self.company)
-        return self._ppn_out_account
-    
-    @property
-    def ppn_in_account(self) -> Optional[str]:
-        """Get cached or fetch PPN Input account"""
-        if self._ppn_in_account is None:
-            self._ppn_in_account = get_ppn_input_account(self.company)
-        return self._ppn_in_account
+        self.rules = {}
+        for account, side, tax_type in get_gl_tag_rules(company):
+            self.rules.setdefault(account, []).append((side, tax_type))
+        self.pending_rollup = {}
+    
+    @classmethod
+    def for_company(cls, company: str) -> "GLEntryTaxTagger":
+        """Get the tagger of a company for the current request"""
+        taggers = getattr(frappe.local, "pajak_gl_taggers", None)
+        if taggers is None:
+            taggers = frappe.local.pajak_gl_taggers = {}
+        
+        tagger = taggers.get(company)
+        if tagger is None:
+            tagger = taggers[company] = cls(company)
+        return tagger
+    
+    @staticmethod
+    def invalidate(company: Optional[str] = None) -> None:
+        """Drop cached taggers after tax accounts change, keeping unflushed rollup deltas"""
+        taggers = getattr(frappe.local, "pajak_gl_taggers", None) or {}
+        for name in ([company] if company else list(taggers)):
+            tagger = taggers.get(name)
+            if tagger and not tagger.pending_rollup:
+                del taggers[name]
     
     def tag_gl_entry(self, gl_entry: Dict[str, Any], source_doc: Optional[Document] = None) -> None:
         """Tag GL Entry with tax information based on account"""
         try:
             # Skip if no valid accounts found
-            if not (self.ppn_out_account or self.ppn_in_account):
+            if not self.rules:
                 return
             
             tax_type = self._determine_tax_type(gl_entry)
@@ -45,150 +72,185 @@ class GLEntryTaxTagger:
             if source_doc and hasattr(source_doc, 'doctype') and hasattr(source_doc, 'name'):
                 gl_entry['tax_source_type'] = source_doc.doctype
                 gl_entry['tax_source'] = source_doc.name
-            
-            if frappe.conf.get('developer_mode'):
-                frappe.logger().debug(f"Tagged GL Entry with {tax_type}")
                 
         except Exception as e:
             self._log_error("GL Entry tagging failed", e)
     
+    def tag_gl_doc(self, doc: Document) -> Optional[str]:
+        """Tag a GL Entry document in place before it is inserted"""
+        if doc.get("tax_type"):
+            return doc.tax_type
+        if not self.rules:
+            return None
+        
+        tax_type = self._determine_tax_type(doc)
+        if tax_type:
+            doc.tax_type = tax_type
+            if doc.voucher_type and doc.voucher_no:
+                doc.tax_source_type = doc.voucher_type
+                doc.tax_source = doc.voucher_no
+        return tax_type
+    
     def _determine_tax_type(self, gl_entry: Dict[str, Any]) -> Optional[str]:
         """Determine tax type based on account and entry type"""
-        account = gl_entry.get('account')
-        credit = flt(gl_entry.get('credit', 0))
-        debit = flt(gl_entry.get('debit', 0))
-        
-        if account == self.ppn_out_account and credit > 0:
-            return "PPN_OUT"
-        elif account == self.ppn_in_account and debit > 0:
-            return "PPN_IN"
+        for side, tax_type in self.rules.get(gl_entry.get('account'), ()):
+            if flt(gl_entry.get(side, 0)) > 0:
+                return tax_type
         
         return None
     
+    def add_to_rollup(self, posting_date: Any, tax_type: str,
+                      debit: float, credit: float, entry_count: int) -> None:
+        """Queue a rollup delta, written once before the transaction commits"""
+        if not self.pending_rollup:
+            frappe.db.before_commit.add(self.flush_rollup)
+            frappe.db.after_rollback.add(self.discard_rollup)
+        
+        key = (getdate(posting_date).strftime("%Y-%m"), tax_type)
+        delta = self.pending_rollup.setdefault(key, [getdate(posting_date), 0.0, 0.0, 0])
+        delta[1] += flt(debit)
+        delta[2] += flt(credit)
+        delta[3] += entry_count
+    
+    def flush_rollup(self) -> None:
+        """Write the queued rollup deltas, one upsert per period and tax type"""
+        pending, self.pending_rollup = self.pending_rollup, {}
+        for (_period, tax_type), (posting_date, debit, credit, entry_count) in pending.items():
+            update_rollup(self.company, posting_date, tax_type, debit, credit, entry_count)
+    
+    def discard_rollup(self) -> None:
+        self.pending_rollup = {}
+    
     def _log_error(self, message: str, exception: Exception) -> None:
         """Log error with context"""
         error_msg = f"{message} for company {self.company}: {str(exception)}"
         frappe.log_error(message=error_msg, title="Tax Tagging Error")
 
-def tag_ppn_out_gl(gl_entry: Dict[str, Any], doc: Document) -> None:
-    """Tag PPN Output GL entries during creation"""
-    if not gl_entry or not doc:
+@profiled
+def tag_ppn_out_gl(doc: Document, method: Optional[str] = None) -> None:
+    """Tag PPN GL entries before they are inserted"""
+    if not doc or doc.doctype != "GL Entry" or not doc.company:
         return
     
-    company = gl_entry.get('company') or getattr(doc, 'company', None)
-    if not company:
-        return
-    
-    tagger = GLEntryTaxTagger(company)
-    tagger.tag_gl_entry(gl_entry, doc)
+    try:
+        GLEntryTaxTagger.for_company(doc.company).tag_gl_doc(doc)
+    except Exception as e:
+        frappe.log_error(
+            message=f"GL Entry tagging failed for company {doc.company}: {str(e)}",
+            title="Tax Tagging Error"
+        )
 
+@profiled
 def auto_tag_gl_entry(doc: Document, method: Optional[str] = None) -> None:
-    """Auto-tag GL Entry after creation"""
-    if not doc or doc.doctype != "GL Entry" or cint(doc.is_cancelled):
+    """Keep the monthly tax rollup in sync with tagged GL Entries"""
+    if not doc or doc.doctype != "GL Entry":
         return
     
     if not doc.company:
         return
     
-    tagger = GLEntryTaxTagger(doc.company)
-    tagger.tag_gl_entry(doc.as_dict(), None)
+    tagger = GLEntryTaxTagger.for_company(doc.company)
+    
+    if cint(doc.is_cancelled):
+        update_rollup_for_reversal(doc, tagger)
+        return
+    
+    # Rows are tagged in before_insert; this only covers rows inserted without it
+    tax_type = doc.get("tax_type")
+    if not tax_type:
+        tax_type = tagger.tag_gl_doc(doc)
+        if tax_type:
+            doc.db_set({
+                "tax_type": tax_type,
+                "tax_source_type": doc.get("tax_source_type"),
+                "tax_source": doc.get("tax_source")
+            }, update_modified=False)
+    
+    if tax_type:
+        tagger.add_to_rollup(doc.posting_date, tax_type, flt(doc.debit), flt(doc.credit), 1)
 
+def update_rollup_for_reversal(doc: Document, tagger: GLEntryTaxTagger) -> None:
+    """Decrement the rollup for the entry cancelled by a reversing GL Entry"""
+    original = get_reversed_gl_entry(doc)
+    if not original:
+        # Untagged entries were never counted in the rollup
+        return
+    
+    # Booked in the original's period, which is where the recompute drops it from
+    tagger.add_to_rollup(original.posting_date, original.tax_type,
+                         -flt(original.debit), -flt(original.credit), -1)
+
+def get_reversed_gl_entry(doc: Document) -> Optional[Dict[str, Any]]:
+    """
+    Find the tagged entry a reversing GL Entry cancels.
+    
+    The original is marked cancelled before its reversal is inserted, and
+    the reversal swaps its debit and credit. The posting date of the
+    reversal may be a later period than the original's.
+    
+    Returns:
+        dict: tax_type, posting_date, debit and credit of the original, None if it was not tagged
+    """
+    originals = frappe.db.sql("""
+        SELECT tax_type, posting_date, debit, credit
+        FROM `tabGL Entry`
+        WHERE voucher_type = %(voucher_type)s
+        AND voucher_no = %(voucher_no)s
+        AND account = %(account)s
+        AND is_cancelled = 1
+        AND name != %(name)s
+        AND debit = %(debit)s
+        AND credit = %(credit)s
+        AND IFNULL(tax_type, '') != ''
+        ORDER BY creation, name
+        LIMIT 1
+    """, {
+        "voucher_type": doc.voucher_type,
+        "voucher_no": doc.voucher_no,
+        "account": doc.account,
+        "name": doc.name,
+        "debit": flt(doc.credit),
+        "credit": flt(doc.debit)
+    }, as_dict=1)
+    
+    return originals[0] if originals else None
+
+@profiled
 def gl_entry_naming_override(doc: Document, method: Optional[str] = None) -> None:
     """Override GL Entry naming"""
     doc.name = make_autoname('ACC-GLI-.YYYY.-.#####', '', doc)
 
-class TaxAccountFinder:
-    """Handles tax account lookup with caching"""
+def get_gl_tag_rules(company: str) -> List[Tuple[str, str, str]]:
+    """
+    Rules used to tag the GL Entries of a company, first match wins
     
-    CACHE_TIMEOUT = 3600  # 1 hour
+    Returns:
+        list: (account, "debit" or "credit", tax_type) per tagged account side
+    """
+    rules = []
+    ppn_out_account = get_ppn_output_account(company)
+    if ppn_out_account:
+        rules.append((ppn_out_account, "credit", "PPN_OUT"))
     
-    @classmethod
-    def get_ppn_account(cls, company: str, account_type: str) -> Optional[str]:
-        """Get PPN account with caching"""
-        cache_key = f"ppn_{account_type.lower()}_account_{company}"
-        
-        # Try cache first
-        account = frappe.cache().get_value(cache_key)
-        if account:
-            return account
-        
-        # Get from database
-        account = cls._find_ppn_account(company, account_type)
-        
-        # Cache if found
-        if account:
-            frappe.cache().set_value(cache_key, account, expires_in_sec=cls.CACHE_TIMEOUT)
-        
-        return account
+    ppn_in_account = get_ppn_input_account(company)
+    if ppn_in_account:
+        rules.append((ppn_in_account, "debit", "PPN_IN"))
     
-    @staticmethod
-    def _find_ppn_account(company: str, account_type: str) -> Optional[str]:
-        """Find PPN account from database"""
-        # Try tax category first
-        account = frappe.db.get_value(
-            "Tax Category Account",
-            {
-                "parent": "PPN",
-                "company": company,
-                "account_type": account_type
-            },
-            "account"
-        )
-        
-        if not account:
-            # Try account naming patterns
-            patterns = cls._get_account_patterns(account_type)
-            account = cls._find_account_by_patterns(company, patterns)
-        
-        return account
-    
-    @staticmethod
-    def _get_account_patterns(account_type: str) -> List[str]:
-        """Get account naming patterns based on type"""
-        if account_type.lower() == "output":
-            return [
-                "%ppn%out%",
-                "%ppn%output%",
-                "%vat%out%",
-                "%pajak%keluar%"
-            ]
-        else:  # Input
-            return [
-                "%ppn%in%",
-                "%ppn%input%",
-                "%vat%in%",
-                "%pajak%masukan%"
-            ]
+    # Withheld PPh is credited to the payable account
+    for pph_type, tax_type in PPH_GL_TAX_TYPES.items():
+        pph_account = get_pph_account(company, pph_type)
+        if pph_account:
+            rules.append((pph_account, "credit", tax_type))
     
-    @staticmethod
-    def _find_account_by_patterns(company: str, patterns: List[str]) -> Optional[str]:
-        """Find account matching patterns"""
-        or_filters = {}
-        for i, pattern in enumerate(patterns):
-            or_filters[f"account_name{i}"] = ["like", pattern]
-            or_filters[f"name{i}"] = ["like", pattern]
-        
-        accounts = frappe.get_list(
-            "Account",
-            filters={
-                "company": company,
-                "account_type": "Tax",
-                "is_group": 0
-            },
-            or_filters=or_filters,
-            fields=["name"],
-            limit=1
-        )
-        
-        return accounts[0].name if accounts else None
+    return rules
 
 def get_ppn_output_account(company: str) -> Optional[str]:
     """Get PPN Output account for company"""
-    return TaxAccountFinder.get_ppn_account(company, "Output")
+    return get_ppn_account(company, "Output")
 
 def get_ppn_input_account(company: str) -> Optional[str]:
     """Get PPN Input account for company"""
-    return TaxAccountFinder.get_ppn_account(company, "Input")
+    return get_ppn_account(company, "Input")
 
 def setup_custom_fields_for_gl_entry() -> None:
     """Setup custom fields for GL Entry tax tracking"""
@@ -0,0 +1,280 @@
+from typing import Optional, Dict, Any, List, Callable
+import functools
+import hmac
+import json
+import random
+import time
+import frappe
+
+RING_SIZE = 500
+MAX_QUERY_LENGTH = 500
+ENDPOINTS_KEY = "pajak_profile_endpoints"
+TOTALS_KEY = "pajak_profile_totals"
+TOTAL_FIELDS = ("calls", "errors", "wall_ms", "queries", "rows")
+
+def is_profiling_enabled() -> bool:
+    """
+    Whether profiled entry points record their calls.
+
+    Enabled per site with `bench --site <site> set-config pajak_profiling 1`;
+    `pajak_profiling_sample_rate` (0-1, default 1) records only a share
+    of the calls.
+    """
+    return bool(frappe.conf.get("pajak_profiling"))
+
+class ProfileFrame:
+    """Counters of one profiled call, filled by the frappe.db.sql wrapper"""
+
+    __slots__ = ("queries", "rows", "slowest_ms", "slowest_query")
+
+    def __init__(self):
+        self.queries = 0
+        self.rows = 0
+        self.slowest_ms = 0.0
+        self.slowest_query = None
+
+    def add(self, query: str, elapsed_ms: float, rows: int) -> None:
+        self.queries += 1
+        self.rows += rows
+        if elapsed_ms > self.slowest_ms:
+            self.slowest_ms = elapsed_ms
+            self.slowest_query = query
+
+def profiled(func: Callable) -> Callable:
+    """
+    Record wall time, query count, rows fetched and the slowest query of
+    every call of a whitelisted method or doc_event hook.
+
+    Goes below @frappe.whitelist(), so the whitelisted object is the
+    wrapper. When profiling is off a call costs one site config lookup.
+    """
+    endpoint = f"{func.__module__}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not is_profiling_enabled() or not should_sample():
+            return func(*args, **kwargs)
+
+        frame = ProfileFrame()
+        stack = push_frame(frame)
+        started = time.perf_counter()
+        failed = False
+        try:
+            return func(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            wall_ms = (time.perf_counter() - started) * 1000
+            pop_frame(stack, frame)
+            record_call(endpoint, frame, wall_ms, failed)
+
+    return wrapper
+
+def should_sample() -> bool:
+    rate = frappe.conf.get("pajak_profiling_sample_rate")
+    return rate is None or random.random() < float(rate)
+
+def push_frame(frame: ProfileFrame) -> List[ProfileFrame]:
+    """Start counting queries for a call, nested calls count into every open frame"""
+    stack = getattr(frappe.local, "pajak_profile_stack", None)
+    if stack is None:
+        stack = frappe.local.pajak_profile_stack = []
+
+    if not stack:
+        install_sql_wrapper()
+    stack.append(frame)
+    return stack
+
+def pop_frame(stack: List[ProfileFrame], frame: ProfileFrame) -> None:
+    if stack and stack[-1] is frame:
+        stack.pop()
+    if not stack:
+        remove_sql_wrapper()
+
+def install_sql_wrapper() -> None:
+    """Shadow frappe.db.sql on the connection instance for the outermost profiled call"""
+    db = frappe.db
+    if "sql" in db.__dict__:
+        return
+    sql = db.sql
+
+    def profiled_sql(query, *args, **kwargs):
+        started = time.perf_counter()
+        result = sql(query, *args, **kwargs)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        try:
+            rows = len(result)
+        except TypeError:
+            rows = 0
+        for frame in getattr(frappe.local, "pajak_profile_stack", None) or ():
+            frame.add(query, elapsed_ms, rows)
+        return result
+
+    profiled_sql.pajak_profiled = True
+    db.sql = profiled_sql
+
+def remove_sql_wrapper() -> None:
+    db = frappe.local.db
+    if db is not None and getattr(db.__dict__.get("sql"), "pajak_profiled", False):
+        del db.sql
+
+def record_call(endpoint: str, frame: ProfileFrame, wall_ms: float, failed: bool) -> None:
+    """Add a call to the endpoint's ring buffer and totals in one round trip"""
+    sample = {
+        "ts": round(time.time(), 3),
+        "wall_ms": round(wall_ms, 3),
+        "queries": frame.queries,
+        "rows": frame.rows,
+        "slowest_ms": round(frame.slowest_ms, 3),
+        "slowest_query": compact_query(frame.slowest_query),
+        "error": failed
+    }
+
+    try:
+        cache = frappe.cache()
+        ring_key = cache.make_key(f"pajak_profile::{endpoint}")
+        totals_key = cache.make_key(TOTALS_KEY)
+
+        # Raw commands: samples are JSON and totals plain numbers shared by all workers
+        pipe = cache.pipeline()
+        pipe.sadd(cache.make_key(ENDPOINTS_KEY), endpoint)
+        pipe.lpush(ring_key, json.dumps(sample))
+        pipe.ltrim(ring_key, 0, RING_SIZE - 1)
+        pipe.hincrby(totals_key, f"{endpoint}|calls", 1)
+        pipe.hincrby(totals_key, f"{endpoint}|errors", int(failed))
+        pipe.hincrbyfloat(totals_key, f"{endpoint}|wall_ms", sample["wall_ms"])
+        pipe.hincrby(totals_key, f"{endpoint}|queries", frame.queries)
+        pipe.hincrby(totals_key, f"{endpoint}|rows", frame.rows)
+        pipe.execute()
+    except Exception:
+        # Profiling must never break the call it measures
+        pass
+
+def compact_query(query: Optional[str]) -> Optional[str]:
+    if not query:
+        return None
+    query = " ".join(str(query).split())
+    return query[:MAX_QUERY_LENGTH]
+
+def percentile(values: List[float], percent: int) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(percent / 100.0 * (len(values) - 1))))]
+
+def read_raw(command: str, key: str, *args) -> Any:
+    """Run one read on an already prefixed key, RedisWrapper would prefix and unpickle it again"""
+    pipe = frappe.cache().pipeline()
+    getattr(pipe, command)(key, *args)
+    return pipe.execute()[0]
+
+def get_endpoints() -> List[str]:
+    endpoints = read_raw("smembers", frappe.cache().make_key(ENDPOINTS_KEY)) or []
+    return sorted(frappe.safe_decode(endpoint) for endpoint in endpoints)
+
+def get_totals() -> Dict[str, Dict[str, float]]:
+    """Totals since the last reset, by endpoint"""
+    totals = {}
+    for field, value in (read_raw("hgetall", frappe.cache().make_key(TOTALS_KEY)) or {}).items():
+        endpoint, _sep, counter = frappe.safe_decode(field).rpartition("|")
+        totals.setdefault(endpoint, dict.fromkeys(TOTAL_FIELDS, 0))[counter] = float(value)
+    return totals
+
+def get_samples(endpoint: str) -> List[Dict[str, Any]]:
+    """Most recent samples of an endpoint, newest first"""
+    raw = read_raw("lrange", frappe.cache().make_key(f"pajak_profile::{endpoint}"), 0, RING_SIZE - 1) or []
+    return [json.loads(frappe.safe_decode(sample)) for sample in raw]
+
+def summarize(samples: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Latency percentiles and query statistics of a ring buffer"""
+    wall = [s["wall_ms"] for s in samples]
+    queries = [s["queries"] for s in samples]
+    slowest = max(samples, key=lambda s: s["slowest_ms"], default=None)
+    return {
+        "samples": len(samples),
+        "p50_ms": round(percentile(wall, 50), 3),
+        "p95_ms": round(percentile(wall, 95), 3),
+        "max_ms": round(max(wall, default=0), 3),
+        "avg_queries": round(sum(queries) / len(queries), 2) if queries else 0,
+        "max_queries": max(queries, default=0),
+        "avg_rows": round(sum(s["rows"] for s in samples) / len(samples), 2) if samples else 0,
+        "slowest_query_ms": slowest["slowest_ms"] if slowest else 0,
+        "slowest_query": slowest["slowest_query"] if slowest else None
+    }
+
+@frappe.whitelist()
+def get_profile_stats(endpoint: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Profiling statistics of every profiled endpoint, or of one.
+
+    Returns:
+        dict: enabled flag, sample rate and per endpoint totals and ring buffer summary
+    """
+    frappe.only_for("System Manager")
+
+    totals = get_totals()
+    endpoints = [endpoint] if endpoint else get_endpoints()
+    return {
+        "enabled": is_profiling_enabled(),
+        "sample_rate": frappe.conf.get("pajak_profiling_sample_rate", 1),
+        "endpoints": {
+            name: dict(summarize(get_samples(name)), totals=totals.get(name, {}))
+            for name in endpoints
+        }
+    }
+
+@frappe.whitelist()
+def reset_profile_stats() -> None:
+    """Drop all samples and totals"""
+    frappe.only_for("System Manager")
+
+    cache = frappe.cache()
+    keys = [cache.make_key(f"pajak_profile::{endpoint}") for endpoint in get_endpoints()]
+    cache.delete(cache.make_key(ENDPOINTS_KEY), cache.make_key(TOTALS_KEY), *keys)
+
+def get_prometheus_text() -> str:
+    """Totals as counters and ring buffer latencies as a summary, in Prometheus text format"""
+    lines = []
+    totals = get_totals()
+
+    for counter, metric, help_text, scale in (
+        ("calls", "pajak_endpoint_calls_total", "Profiled calls", 1),
+        ("errors", "pajak_endpoint_errors_total", "Profiled calls that raised", 1),
+        ("wall_ms", "pajak_endpoint_seconds_total", "Wall time of profiled calls", 1000),
+        ("queries", "pajak_endpoint_queries_total", "SQL queries issued by profiled calls", 1),
+        ("rows", "pajak_endpoint_rows_total", "Rows fetched by profiled calls", 1)
+    ):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} counter")
+        for endpoint, values in sorted(totals.items()):
+            lines.append(f'{metric}{{endpoint="{endpoint}"}} {values[counter] / scale:g}')
+
+    lines.append("# HELP pajak_endpoint_latency_seconds Latency of recent profiled calls")
+    lines.append("# TYPE pajak_endpoint_latency_seconds summary")
+    for endpoint in get_endpoints():
+        wall = [s["wall_ms"] for s in get_samples(endpoint)]
+        for quantile in (50, 95, 99):
+            lines.append(
+                f'pajak_endpoint_latency_seconds{{endpoint="{endpoint}",quantile="{quantile / 100:g}"}} '
+                f'{percentile(wall, quantile) / 1000:g}'
+            )
+
+    return "\n".join(lines) + "\n"
+
+@frappe.whitelist(allow_guest=True)
+def get_prometheus_metrics():
+    """
+    Prometheus scrape endpoint.
+
+    Guests need `Authorization: Bearer <pajak_profiling_metrics_token>`
+    from site config, logged in users the System Manager role.
+    """
+    from werkzeug.wrappers import Response
+
+    token = frappe.conf.get("pajak_profiling_metrics_token")
+    auth = frappe.get_request_header("Authorization") or ""
+    if not (token and hmac.compare_digest(auth, f"Bearer {token}")):
+        frappe.only_for("System Manager")
+
+    return Response(get_prometheus_text(), mimetype="text/plain; version=0.0.4")
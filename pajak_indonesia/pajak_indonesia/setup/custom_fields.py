@@ -33,4 +33,7 @@ def update_standard_fields():
 
 def after_install():
     """Run after module installation"""
-    setup_custom_fields()
\ No newline at end of file
+    from pajak_indonesia.setup.indexes import ensure_indexes
+    
+    setup_custom_fields()
+    ensure_indexes()
\ No newline at end of file
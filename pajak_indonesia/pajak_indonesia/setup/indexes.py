@@ -0,0 +1,221 @@
+from typing import Optional, Dict, Any, List
+import frappe
+from frappe.utils import getdate
+
+# Composite indexes managed by the app: (doctype, index name, columns)
+TAX_INDEXES = [
+    ("Efaktur Document", "company_period_index", ["company", "tahun_pajak", "masa_pajak", "docstatus"]),
+    ("Efaktur Document", "company_tanggal_faktur_index", ["company", "tanggal_faktur"]),
+    ("Efaktur Document", "reference_index", ["reference_doctype", "reference_name"]),
+    # Used numbers of expired nomor faktur leases
+    ("Efaktur Document", "company_nomor_faktur_index", ["company", "nomor_faktur"]),
+    ("Ebupot Document", "company_period_index", ["company", "tahun_pajak", "masa_pajak", "docstatus"]),
+    ("Ebupot Document", "company_jenis_pajak_date_index", ["company", "jenis_pajak", "tandatangan_date"]),
+    ("Ebupot Document", "reference_index", ["reference_doctype", "reference_name"]),
+    # Payment linking candidates of a supplier
+    ("Ebupot Document", "supplier_date_index", ["supplier", "tandatangan_date"]),
+    ("Ebupot Document", "npwp_terpotong_date_index", ["npwp_terpotong", "tandatangan_date"]),
+    ("GL Entry", "company_tax_type_posting_date_index", ["company", "tax_type", "posting_date"]),
+    ("Tax Event Outbox", "status_next_attempt_index", ["status", "next_attempt_at"]),
+    ("Tax Event Outbox", "claim_token_index", ["claim_token"])
+]
+
+# Indexes the app created in earlier versions and no longer uses: (doctype, index name)
+RETIRED_INDEXES = [
+    # Replaced by supplier_date_index and npwp_terpotong_date_index
+    ("Ebupot Document", "period_nama_terpotong_index")
+]
+
+# Representative hot queries of the app, checked with EXPLAIN by get_index_report
+KNOWN_QUERIES = [
+    ("Efaktur by period", """
+        SELECT name FROM `tabEfaktur Document`
+        WHERE company = %(company)s AND tahun_pajak = %(tahun)s AND masa_pajak = %(masa)s AND docstatus = 1
+    """),
+    ("Efaktur by date range", """
+        SELECT name FROM `tabEfaktur Document`
+        WHERE company = %(company)s AND tanggal_faktur BETWEEN %(from_date)s AND %(to_date)s AND docstatus = 1
+    """),
+    ("Efaktur by reference", """
+        SELECT name FROM `tabEfaktur Document`
+        WHERE reference_doctype = 'Sales Invoice' AND reference_name = %(reference)s
+    """),
+    ("Ebupot by period", """
+        SELECT name FROM `tabEbupot Document`
+        WHERE company = %(company)s AND tahun_pajak = %(tahun)s AND masa_pajak = %(masa)s AND docstatus = 1
+    """),
+    ("Ebupot by jenis pajak and date", """
+        SELECT name FROM `tabEbupot Document`
+        WHERE company = %(company)s AND jenis_pajak = '23'
+        AND tandatangan_date BETWEEN %(from_date)s AND %(to_date)s AND docstatus = 1
+    """),
+    ("Ebupot by reference", """
+        SELECT name FROM `tabEbupot Document`
+        WHERE reference_doctype = 'Purchase Invoice' AND reference_name IN (%(reference)s)
+    """),
+    ("Ebupot by supplier and date", """
+        SELECT name FROM `tabEbupot Document`
+        WHERE supplier = %(party)s AND tandatangan_date BETWEEN %(from_date)s AND %(to_date)s
+        AND docstatus = 1 AND company = %(company)s
+    """),
+    ("Ebupot by NPWP and date", """
+        SELECT name FROM `tabEbupot Document`
+        WHERE npwp_terpotong = %(party)s AND tandatangan_date BETWEEN %(from_date)s AND %(to_date)s
+        AND docstatus = 1 AND company = %(company)s
+    """),
+    ("GL Entry by tax type", """
+        SELECT SUM(debit), SUM(credit) FROM `tabGL Entry`
+        WHERE company = %(company)s AND tax_type = 'PPN_OUT'
+        AND posting_date BETWEEN %(from_date)s AND %(to_date)s AND is_cancelled = 0
+    """)
+]
+
+def ensure_indexes() -> List[str]:
+    """
+    Create the managed composite indexes that are missing.
+
+    Runs after install and after every migrate, so doctype changes that
+    drop columns or indexes are repaired on the next migrate. Retired
+    indexes are dropped first.
+
+    Returns:
+        list: Names of the indexes that were created, as "doctype.index"
+    """
+    drop_retired_indexes()
+
+    created = []
+    for status in get_index_status():
+        if status["exists"] and status["columns_match"]:
+            continue
+        if not status["table_exists"] or not all(
+            frappe.db.has_column(status["doctype"], column) for column in status["columns"]
+        ):
+            # Columns come from doctype JSON or custom fields that are not synced yet
+            continue
+
+        table = f"tab{status['doctype']}"
+        if status["exists"]:
+            # Same name, different definition: rebuild it
+            frappe.db.sql_ddl(f"ALTER TABLE `{table}` DROP INDEX `{status['index_name']}`")
+
+        frappe.db.add_index(status["doctype"], status["columns"], status["index_name"])
+        created.append(f"{status['doctype']}.{status['index_name']}")
+
+    return created
+
+def drop_retired_indexes() -> List[str]:
+    """
+    Drop the indexes of RETIRED_INDEXES that still exist.
+
+    Returns:
+        list: Names of the indexes that were dropped, as "doctype.index"
+    """
+    dropped = []
+    for doctype, index_name in RETIRED_INDEXES:
+        if index_name not in (get_table_indexes(doctype) or {}):
+            continue
+
+        frappe.db.sql_ddl(f"ALTER TABLE `tab{doctype}` DROP INDEX `{index_name}`")
+        dropped.append(f"{doctype}.{index_name}")
+
+    return dropped
+
+def get_index_status() -> List[Dict[str, Any]]:
+    """Compare the managed indexes with the indexes that exist in the database"""
+    existing = {}
+    result = []
+
+    for doctype, index_name, columns in TAX_INDEXES:
+        if doctype not in existing:
+            existing[doctype] = get_table_indexes(doctype)
+
+        table_indexes = existing[doctype]
+        actual = (table_indexes or {}).get(index_name)
+        result.append({
+            "doctype": doctype,
+            "index_name": index_name,
+            "columns": columns,
+            "table_exists": table_indexes is not None,
+            "exists": actual is not None,
+            "columns_match": actual == columns
+        })
+
+    return result
+
+def get_table_indexes(doctype: str) -> Optional[Dict[str, List[str]]]:
+    """Get index name -> ordered column list of a doctype table, None if the table is missing"""
+    if not frappe.db.table_exists(doctype):
+        return None
+
+    indexes = {}
+    for row in frappe.db.sql(f"SHOW INDEX FROM `tab{doctype}`", as_dict=1):
+        indexes.setdefault(row.Key_name, []).append((row.Seq_in_index, row.Column_name))
+
+    return {name: [column for _seq, column in sorted(columns)] for name, columns in indexes.items()}
+
+def get_index_report(company: str = None) -> Dict[str, Any]:
+    """
+    EXPLAIN the app's known queries and report missing and unused indexes.
+
+    Args:
+        company: Company used as query parameter, defaults to the first company
+
+    Returns:
+        dict: {"missing": [...], "full_scans": [...], "unused": [...], "queries": [...]}
+    """
+    today = getdate()
+    values = {
+        "company": company or frappe.db.get_value("Company", {}, "name"),
+        "tahun": str(today.year),
+        "masa": today.strftime("%m"),
+        "from_date": today.replace(month=1, day=1),
+        "to_date": today,
+        "reference": "",
+        "party": ""
+    }
+
+    status = get_index_status()
+    used = set()
+    queries = []
+
+    for label, query in KNOWN_QUERIES:
+        try:
+            plan = frappe.db.sql(f"EXPLAIN {query}", values, as_dict=1)
+        except Exception as e:
+            queries.append({"query": label, "error": str(e), "plan": []})
+            continue
+
+        for row in plan:
+            if row.get("key"):
+                used.add((row.get("table"), row.get("key")))
+        queries.append({
+            "query": label,
+            "plan": [
+                {
+                    "table": row.get("table"),
+                    "type": row.get("type"),
+                    "key": row.get("key"),
+                    "rows": row.get("rows")
+                }
+                for row in plan
+            ]
+        })
+
+    return {
+        "missing": [s for s in status if s["table_exists"] and not (s["exists"] and s["columns_match"])],
+        "full_scans": [
+            q["query"] for q in queries
+            if q["plan"] and any(row["type"] == "ALL" or not row["key"] for row in q["plan"])
+        ],
+        "unused": [
+            s for s in status
+            if s["exists"] and (f"tab{s['doctype']}", s["index_name"]) not in used
+        ],
+        "queries": queries
+    }
+
+def after_migrate() -> None:
+    """Create missing managed indexes after bench migrate"""
+    created = ensure_indexes()
+    if created:
+        print(f"Created tax indexes: {', '.join(created)}")
@@ -0,0 +1,46 @@
+frappe.ui.form.on('SPT Summary', {
+    refresh: function(frm) {
+        // Compare the running totals with a recomputation from the source documents
+        if (!frm.is_new() && frm.doc.docstatus < 2) {
+            frm.add_custom_button(__('Verify Totals'), function() {
+                frm.call('verify_totals').then(r => {
+                    let drift = r.message || [];
+                    if (!drift.length) {
+                        frappe.show_alert({
+                            message: __('Running totals match the source documents'),
+                            indicator: 'green'
+                        });
+                        return;
+                    }
+
+                    let rows = drift.map(d => `<tr>
+                        <td>${d.source}</td>
+                        <td>${format_currency(d.actual.tax_amount)}</td>
+                        <td>${format_currency(d.expected.tax_amount)}</td>
+                        <td>${d.actual.document_count} / ${d.expected.document_count}</td>
+                    </tr>`).join('');
+
+                    frappe.confirm(
+                        `<p>${__('Running totals have drifted from the source documents:')}</p>
+                        <table class="table table-bordered">
+                            <tr>
+                                <th>${__('Source')}</th>
+                                <th>${__('Running Total')}</th>
+                                <th>${__('Recomputed')}</th>
+                                <th>${__('Documents')}</th>
+                            </tr>
+                            ${rows}
+                        </table>
+                        <p>${__('Correct the running totals?')}</p>
+                        ${frm.doc.docstatus === 1
+                            ? `<p>${__('The totals of this submitted SPT stay as filed. Amend it to report the corrected totals.')}</p>`
+                            : ''}`,
+                        function() {
+                            frm.call('verify_totals', {fix: 1}).then(() => frm.reload_doc());
+                        }
+                    );
+                });
+            });
+        }
+    }
+});
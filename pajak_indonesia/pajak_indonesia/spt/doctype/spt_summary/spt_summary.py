@@ -1,6 +1,8 @@
 import frappe
 from frappe.model.document import Document
-from frappe.utils import flt, getdate
+from frappe.utils import flt, cint
+from pajak_indonesia.spt.running_totals import SPT_SOURCES, get_running_totals, verify_running_totals
+from pajak_indonesia.profiling import profiled
 
 class SPTSummary(Document):
     def validate(self):
@@ -18,89 +20,52 @@ class SPTSummary(Document):
             frappe.throw("Format Tahun Pajak tidak valid")
     
     def calculate_summary(self):
-        """Calculate summary based on jenis_spt"""
+        """Calculate summary based on jenis_spt from the SPT running totals"""
+        sources = SPT_SOURCES.get(self.jenis_spt)
+        if not sources:
+            return
+
+        totals = get_running_totals(self.company, self.tahun_pajak, self.masa_pajak, sources)
         if self.jenis_spt == "PPN":
-            self.calculate_ppn_summary()
+            self.set_ppn_summary(totals)
         elif self.jenis_spt == "PPh 21":
-            self.calculate_pph21_summary()
+            self.jumlah_penghasilan_bruto_21 = flt(totals["PPh 21"]["base_amount"])
+            self.jumlah_pph_21 = flt(totals["PPh 21"]["tax_amount"])
         elif self.jenis_spt == "PPh 23":
-            self.calculate_pph23_summary()
+            self.jumlah_penghasilan_bruto_23 = flt(totals["PPh 23"]["base_amount"])
+            self.jumlah_pph_23 = flt(totals["PPh 23"]["tax_amount"])
         elif self.jenis_spt == "PPh 26":
-            self.calculate_pph26_summary()
-    
-    def calculate_ppn_summary(self):
-        """Calculate PPN summary from E-Faktur documents"""
-        filters = {
-            "docstatus": 1,
-            "masa_pajak": self.masa_pajak,
-            "tahun_pajak": self.tahun_pajak,
-            "company": self.company
-        }
-        
-        # Get sales invoices (penjualan)
-        penjualan = frappe.get_all("Efaktur Document",
-            filters=filters,
-            fields=["jumlah_dpp", "jumlah_ppn", "jumlah_ppnbm"]
-        )
-        
-        self.jumlah_dpp_penjualan = sum(p.jumlah_dpp for p in penjualan)
-        self.jumlah_ppn_penjualan = sum(p.jumlah_ppn for p in penjualan)
-        self.jumlah_ppnbm_penjualan = sum(p.jumlah_ppnbm for p in penjualan)
-        
-        # Get purchase invoices (pembelian)
-        # Logic for pembelian calculation...
+            self.jumlah_penghasilan_bruto_26 = flt(totals["PPh 26"]["base_amount"])
+            self.jumlah_pph_26 = flt(totals["PPh 26"]["tax_amount"])
     
-    def calculate_pph21_summary(self):
-        """Calculate PPh 21 summary from Salary Slips"""
-        filters = {
-            "docstatus": 1,
-            "posting_date": ["between", [
-                f"{self.tahun_pajak}-{self.masa_pajak}-01",
-                f"{self.tahun_pajak}-{self.masa_pajak}-31"
-            ]],
-            "company": self.company
-        }
+    def set_ppn_summary(self, totals):
+        """Set PPN penjualan from E-Faktur documents and pembelian from Purchase Invoices"""
+        penjualan = totals["PPN Keluaran"]
+        self.jumlah_dpp_penjualan = flt(penjualan["base_amount"])
+        self.jumlah_ppn_penjualan = flt(penjualan["tax_amount"])
+        self.jumlah_ppnbm_penjualan = flt(penjualan["ppnbm_amount"])
         
-        salary_slips = frappe.get_all("Salary Slip",
-            filters=filters,
-            fields=["gross_pay", "total_tax_deducted"]
-        )
-        
-        self.jumlah_penghasilan_bruto_21 = sum(ss.gross_pay for ss in salary_slips)
-        self.jumlah_pph_21 = sum(ss.total_tax_deducted for ss in salary_slips)
+        pembelian = totals["PPN Masukan"]
+        self.jumlah_dpp_pembelian = flt(pembelian["base_amount"])
+        self.jumlah_ppn_pembelian = flt(pembelian["tax_amount"])
     
-    def calculate_pph23_summary(self):
-        """Calculate PPh 23 summary from E-Bupot documents"""
-        filters = {
-            "docstatus": 1,
-            "jenis_pajak": "23",
-            "masa_pajak": self.masa_pajak,
-            "tahun_pajak": self.tahun_pajak,
-            "company": self.company
-        }
-        
-        bupot_23 = frappe.get_all("Ebupot Document",
-            filters=filters,
-            fields=["penghasilan_bruto", "pph_dipotong"]
+    @frappe.whitelist()
+    @profiled
+    def verify_totals(self, fix=0):
+        """
+        Recompute the period from the source documents and report drift
+        of the running totals. With fix, drifted totals are corrected and
+        a draft summary is recalculated. The reported totals of a submitted
+        SPT are left as filed, correcting them takes an amendment.
+        """
+        frappe.only_for(["System Manager", "Accounts Manager", "Tax Manager"])
+        sources = SPT_SOURCES.get(self.jenis_spt, ())
+        drift = verify_running_totals(
+            self.company, self.tahun_pajak, self.masa_pajak, sources, fix=cint(fix)
         )
         
-        self.jumlah_penghasilan_bruto_23 = sum(b.penghasilan_bruto for b in bupot_23)
-        self.jumlah_pph_23 = sum(b.pph_dipotong for b in bupot_23)
-    
-    def calculate_pph26_summary(self):
-        """Calculate PPh 26 summary from E-Bupot documents"""
-        filters = {
-            "docstatus": 1,
-            "jenis_pajak": "26",
-            "masa_pajak": self.masa_pajak,
-            "tahun_pajak": self.tahun_pajak,
-            "company": self.company
-        }
-        
-        bupot_26 = frappe.get_all("Ebupot Document",
-            filters=filters,
-            fields=["penghasilan_bruto", "pph_dipotong"]
-        )
+        if drift and cint(fix) and self.docstatus == 0:
+            self.calculate_summary()
+            self.db_update()
         
-        self.jumlah_penghasilan_bruto_26 = sum(b.penghasilan_bruto for b in bupot_26)
-        self.jumlah_pph_26 = sum(b.pph_dipotong for b in bupot_26)
\ No newline at end of file
+        return drift
@@ -0,0 +1,260 @@
+from typing import Optional, Dict, Any, List, Tuple
+import frappe
+from frappe.model.document import Document
+from frappe.utils import flt, cint, getdate, get_last_day, now
+from pajak_indonesia.tax_accounts import get_ppn_account
+from pajak_indonesia.profiling import profiled
+
+SOURCES = ("PPN Keluaran", "PPN Masukan", "PPh 21", "PPh 23", "PPh 26")
+
+# Running total sources that make up each SPT type
+SPT_SOURCES = {
+    "PPN": ("PPN Keluaran", "PPN Masukan"),
+    "PPh 21": ("PPh 21",),
+    "PPh 23": ("PPh 23",),
+    "PPh 26": ("PPh 26",)
+}
+
+AMOUNT_FIELDS = ("base_amount", "tax_amount", "ppnbm_amount", "document_count")
+
+def get_running_total_name(company: str, tahun_pajak: str, masa_pajak: str, source: str) -> str:
+    """Running total row name, matching the DocType autoname format"""
+    return f"{source}-{tahun_pajak}-{masa_pajak}-{company}"
+
+@profiled
+def update_running_totals(doc: Document, method: Optional[str] = None) -> None:
+    """Submit/cancel hook: apply a source document to the SPT running totals"""
+    sign = -1 if method == "on_cancel" else 1
+    for source, tahun_pajak, masa_pajak, amounts in get_document_amounts(doc):
+        apply_delta(doc.company, tahun_pajak, masa_pajak, source, {
+            field: sign * value for field, value in amounts.items()
+        })
+
+def get_document_amounts(doc: Document) -> List[Tuple[str, str, str, Dict[str, float]]]:
+    """
+    Get the SPT amounts a submitted source document contributes.
+
+    Returns:
+        list: (source, tahun_pajak, masa_pajak, amounts) per running total
+    """
+    if not doc.get("company"):
+        return []
+
+    if doc.doctype == "Efaktur Document":
+        return [("PPN Keluaran", doc.tahun_pajak, doc.masa_pajak, {
+            "base_amount": flt(doc.jumlah_dpp),
+            "tax_amount": flt(doc.jumlah_ppn),
+            "ppnbm_amount": flt(doc.jumlah_ppnbm),
+            "document_count": 1
+        })]
+
+    if doc.doctype == "Ebupot Document" and doc.jenis_pajak in ("23", "26"):
+        return [(f"PPh {doc.jenis_pajak}", doc.tahun_pajak, doc.masa_pajak, {
+            "base_amount": flt(doc.penghasilan_bruto),
+            "tax_amount": flt(doc.pph_dipotong),
+            "ppnbm_amount": 0,
+            "document_count": 1
+        })]
+
+    posting_date = getdate(doc.posting_date)
+    tahun_pajak, masa_pajak = posting_date.strftime("%Y"), posting_date.strftime("%m")
+
+    if doc.doctype == "Purchase Invoice":
+        ppn_account = get_ppn_account(doc.company, "Input")
+        ppn_taxes = [tax for tax in (doc.taxes or []) if ppn_account and tax.account_head == ppn_account]
+        if not ppn_taxes:
+            return []
+        return [("PPN Masukan", tahun_pajak, masa_pajak, {
+            "base_amount": flt(doc.base_net_total),
+            "tax_amount": sum(
+                flt(tax.base_tax_amount) * (-1 if tax.add_deduct_tax == "Deduct" else 1)
+                for tax in ppn_taxes
+            ),
+            "ppnbm_amount": 0,
+            "document_count": 1
+        })]
+
+    if doc.doctype == "Salary Slip" and flt(doc.get("total_tax_deducted")):
+        return [("PPh 21", tahun_pajak, masa_pajak, {
+            "base_amount": flt(doc.gross_pay),
+            "tax_amount": flt(doc.total_tax_deducted),
+            "ppnbm_amount": 0,
+            "document_count": 1
+        })]
+
+    return []
+
+def apply_delta(company: str, tahun_pajak: str, masa_pajak: str, source: str,
+                amounts: Dict[str, float]) -> None:
+    """Add amounts to a running total row, creating it when missing"""
+    timestamp = now()
+    frappe.db.sql("""
+        INSERT INTO `tabSPT Running Total`
+            (name, creation, modified, owner, modified_by, docstatus,
+             company, tahun_pajak, masa_pajak, source,
+             base_amount, tax_amount, ppnbm_amount, document_count)
+        VALUES (%s, %s, %s, 'Administrator', 'Administrator', 0,
+                %s, %s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            base_amount = base_amount + VALUES(base_amount),
+            tax_amount = tax_amount + VALUES(tax_amount),
+            ppnbm_amount = ppnbm_amount + VALUES(ppnbm_amount),
+            document_count = document_count + VALUES(document_count),
+            modified = VALUES(modified)
+    """, (
+        get_running_total_name(company, tahun_pajak, masa_pajak, source), timestamp, timestamp,
+        company, tahun_pajak, masa_pajak, source,
+        flt(amounts.get("base_amount")), flt(amounts.get("tax_amount")),
+        flt(amounts.get("ppnbm_amount")), cint(amounts.get("document_count"))
+    ))
+
+def get_running_totals(company: str, tahun_pajak: str, masa_pajak: str,
+                       sources: Tuple[str, ...] = SOURCES) -> Dict[str, Dict[str, float]]:
+    """Read the running totals of a period, zero for sources without documents"""
+    totals = {source: dict.fromkeys(AMOUNT_FIELDS, 0) for source in sources}
+    for row in frappe.get_all(
+        "SPT Running Total",
+        filters={
+            "name": ["in", [get_running_total_name(company, tahun_pajak, masa_pajak, s) for s in sources]]
+        },
+        fields=["source", *AMOUNT_FIELDS]
+    ):
+        totals[row.source] = {field: row[field] for field in AMOUNT_FIELDS}
+    return totals
+
+def compute_totals(company: str, tahun_pajak: str, masa_pajak: str,
+                   sources: Tuple[str, ...] = SOURCES) -> Dict[str, Dict[str, float]]:
+    """Recompute the totals of a period from the source documents"""
+    from_date = getdate(f"{tahun_pajak}-{masa_pajak}-01")
+    values = {
+        "company": company,
+        "tahun_pajak": tahun_pajak,
+        "masa_pajak": masa_pajak,
+        "from_date": from_date,
+        "to_date": get_last_day(from_date),
+        "ppn_input_account": get_ppn_account(company, "Input") or ""
+    }
+
+    totals = {}
+    for source in sources:
+        row = frappe.db.sql(get_source_query(source), values, as_dict=1)[0]
+        totals[source] = {
+            "base_amount": flt(row.base_amount),
+            "tax_amount": flt(row.tax_amount),
+            "ppnbm_amount": flt(row.ppnbm_amount),
+            "document_count": cint(row.document_count)
+        }
+    return totals
+
+def get_source_query(source: str) -> str:
+    """Aggregate query of a running total source for one period"""
+    if source == "PPN Keluaran":
+        return """
+            SELECT SUM(jumlah_dpp) as base_amount, SUM(jumlah_ppn) as tax_amount,
+                SUM(jumlah_ppnbm) as ppnbm_amount, COUNT(*) as document_count
+            FROM `tabEfaktur Document`
+            WHERE company = %(company)s AND tahun_pajak = %(tahun_pajak)s
+            AND masa_pajak = %(masa_pajak)s AND docstatus = 1
+        """
+
+    if source in ("PPh 23", "PPh 26"):
+        return f"""
+            SELECT SUM(penghasilan_bruto) as base_amount, SUM(pph_dipotong) as tax_amount,
+                0 as ppnbm_amount, COUNT(*) as document_count
+            FROM `tabEbupot Document`
+            WHERE company = %(company)s AND tahun_pajak = %(tahun_pajak)s
+            AND masa_pajak = %(masa_pajak)s AND docstatus = 1
+            AND jenis_pajak = '{source[-2:]}'
+        """
+
+    if source == "PPN Masukan":
+        return """
+            SELECT SUM(pi.base_net_total) as base_amount, SUM(ppn.tax_amount) as tax_amount,
+                0 as ppnbm_amount, COUNT(*) as document_count
+            FROM `tabPurchase Invoice` pi
+            INNER JOIN (
+                SELECT parent, SUM(IF(add_deduct_tax = 'Deduct', -1, 1) * base_tax_amount) as tax_amount
+                FROM `tabPurchase Taxes and Charges`
+                WHERE parenttype = 'Purchase Invoice' AND account_head = %(ppn_input_account)s
+                GROUP BY parent
+            ) ppn ON ppn.parent = pi.name
+            WHERE pi.company = %(company)s AND pi.docstatus = 1
+            AND pi.posting_date BETWEEN %(from_date)s AND %(to_date)s
+        """
+
+    return """
+        SELECT SUM(gross_pay) as base_amount, SUM(total_tax_deducted) as tax_amount,
+            0 as ppnbm_amount, COUNT(*) as document_count
+        FROM `tabSalary Slip`
+        WHERE company = %(company)s AND docstatus = 1
+        AND posting_date BETWEEN %(from_date)s AND %(to_date)s
+        AND total_tax_deducted != 0
+    """
+
+def verify_running_totals(company: str, tahun_pajak: str, masa_pajak: str,
+                          sources: Tuple[str, ...] = SOURCES, fix: bool = False) -> List[Dict[str, Any]]:
+    """
+    Diff the running totals of a period against a recomputation from scratch.
+
+    Args:
+        company: Company name
+        tahun_pajak: Tax year
+        masa_pajak: Tax month
+        sources: Running total sources to check
+        fix: Overwrite drifted running totals with the recomputed values
+
+    Returns:
+        list: One dict per drifted source with the expected and actual totals
+    """
+    expected = compute_totals(company, tahun_pajak, masa_pajak, sources)
+    actual = get_running_totals(company, tahun_pajak, masa_pajak, sources)
+
+    drift = []
+    for source in sources:
+        want, have = expected[source], actual[source]
+        if (any(abs(flt(want[f]) - flt(have[f])) >= 0.01 for f in ("base_amount", "tax_amount", "ppnbm_amount"))
+                or cint(want["document_count"]) != cint(have["document_count"])):
+            drift.append({"source": source, "expected": want, "actual": have})
+            if fix:
+                apply_delta(company, tahun_pajak, masa_pajak, source, {
+                    field: flt(want[field]) - flt(have[field]) for field in AMOUNT_FIELDS
+                })
+
+    return drift
+
+def rebuild_running_totals(company: Optional[str] = None) -> int:
+    """
+    Recompute every period's running totals from the source documents.
+
+    Args:
+        company: Optional company to restrict the rebuild to
+
+    Returns:
+        int: Number of periods rebuilt
+    """
+    periods = set()
+    for doctype, period_sql in (
+        ("Efaktur Document", "tahun_pajak, masa_pajak"),
+        ("Ebupot Document", "tahun_pajak, masa_pajak"),
+        ("Purchase Invoice", "DATE_FORMAT(posting_date, '%%Y'), DATE_FORMAT(posting_date, '%%m')"),
+        ("Salary Slip", "DATE_FORMAT(posting_date, '%%Y'), DATE_FORMAT(posting_date, '%%m')")
+    ):
+        if not frappe.db.table_exists(doctype):
+            continue
+        conditions = "AND company = %(company)s" if company else ""
+        periods.update(frappe.db.sql(f"""
+            SELECT DISTINCT company, {period_sql}
+            FROM `tab{doctype}`
+            WHERE docstatus = 1 {conditions}
+        """, {"company": company}))
+
+    if company:
+        frappe.db.delete("SPT Running Total", {"company": company})
+    else:
+        frappe.db.delete("SPT Running Total")
+
+    for period_company, tahun_pajak, masa_pajak in sorted(periods):
+        if tahun_pajak and masa_pajak:
+            verify_running_totals(period_company, tahun_pajak, masa_pajak, fix=True)
+
+    return len(periods)
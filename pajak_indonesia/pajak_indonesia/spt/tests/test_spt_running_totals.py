@@ -0,0 +1,58 @@
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from pajak_indonesia.spt.running_totals import (
+    apply_delta, get_document_amounts, get_running_totals, verify_running_totals
+)
+
+COMPANY = "_Test Running Total Company"
+
+class TestSPTRunningTotals(FrappeTestCase):
+    def tearDown(self):
+        frappe.db.rollback()
+
+    def test_submit_and_cancel_cancel_out(self):
+        doc = frappe._dict({
+            "doctype": "Ebupot Document", "company": COMPANY, "jenis_pajak": "23",
+            "tahun_pajak": "2099", "masa_pajak": "01",
+            "penghasilan_bruto": 1000000, "pph_dipotong": 20000
+        })
+        ((source, tahun, masa, amounts),) = get_document_amounts(doc)
+        self.assertEqual(source, "PPh 23")
+
+        apply_delta(COMPANY, tahun, masa, source, amounts)
+        apply_delta(COMPANY, tahun, masa, source, amounts)
+        totals = get_running_totals(COMPANY, tahun, masa, ("PPh 23",))["PPh 23"]
+        self.assertEqual(totals["tax_amount"], 40000)
+        self.assertEqual(totals["document_count"], 2)
+
+        apply_delta(COMPANY, tahun, masa, source, {field: -value for field, value in amounts.items()})
+        totals = get_running_totals(COMPANY, tahun, masa, ("PPh 23",))["PPh 23"]
+        self.assertEqual(totals["base_amount"], 1000000)
+        self.assertEqual(totals["document_count"], 1)
+
+    def test_verify_flags_and_fixes_drift(self):
+        """Totals without source documents are drift and are zeroed by fix"""
+        apply_delta(COMPANY, "2099", "02", "PPh 26", {"base_amount": 500, "tax_amount": 100, "document_count": 1})
+
+        drift = verify_running_totals(COMPANY, "2099", "02", ("PPh 26",))
+        self.assertEqual([d["source"] for d in drift], ["PPh 26"])
+        self.assertEqual(drift[0]["expected"]["tax_amount"], 0)
+
+        verify_running_totals(COMPANY, "2099", "02", ("PPh 26",), fix=True)
+        self.assertEqual(verify_running_totals(COMPANY, "2099", "02", ("PPh 26",)), [])
+
+    def test_fix_keeps_submitted_spt_totals(self):
+        """Fixing drift of a filed period corrects the running totals, not the SPT"""
+        apply_delta(COMPANY, "2099", "03", "PPh 26", {"base_amount": 500, "tax_amount": 100, "document_count": 1})
+        spt = frappe.get_doc({
+            "doctype": "SPT Summary", "name": "_Test SPT Drift", "company": COMPANY,
+            "jenis_spt": "PPh 26", "tahun_pajak": "2099", "masa_pajak": "03",
+            "jumlah_penghasilan_bruto_26": 500, "jumlah_pph_26": 100
+        })
+        spt.docstatus = 1
+        spt.db_insert()
+
+        drift = spt.verify_totals(fix=1)
+        self.assertEqual([d["source"] for d in drift], ["PPh 26"])
+        self.assertEqual(verify_running_totals(COMPANY, "2099", "03", ("PPh 26",)), [])
+        self.assertEqual(frappe.db.get_value("SPT Summary", spt.name, "jumlah_pph_26"), 100)
@@ -0,0 +1,188 @@
+from typing import Optional, Dict, Any, List
+import re
+import frappe
+from frappe.model.document import Document
+from pajak_indonesia.profiling import profiled
+
+PPH_TYPES = ("21", "23", "26", "4(2)")
+
+PPN_ACCOUNT_PATTERNS = {
+    "Output": ["%ppn%out%", "%ppn%output%", "%vat%out%", "%pajak%keluar%"],
+    "Input": ["%ppn%in%", "%ppn%input%", "%vat%in%", "%pajak%masukan%"]
+}
+
+PPH_KEYWORDS = ("pph", "withholding", "pajak penghasilan")
+PPH_NAME_TYPES = ("23", "26", "21", "pasal 23", "pasal 26", "pasal 21")
+
+class TaxAccountResolver:
+    """
+    Resolves the PPN and PPh accounts of a company from one cached account map.
+
+    The map is built with a single query over Tax Category Account and
+    the company's candidate accounts, then kept for the request in
+    frappe.local and shared between workers through Redis. Accounts
+    that could not be resolved are stored as None, so misses are cached
+    as well. Account and Tax Category hooks invalidate the map.
+    """
+
+    CACHE_TIMEOUT = 3600  # 1 hour
+
+    @staticmethod
+    def cache_key(company: str) -> str:
+        return f"pajak_tax_accounts::{company}"
+
+    @classmethod
+    def get_account_map(cls, company: str) -> Dict[str, Any]:
+        """
+        Get the resolved tax accounts of a company.
+
+        Args:
+            company: Company name
+
+        Returns:
+            dict: {"ppn_output", "ppn_input", "pph": {type: account}, "pph_accounts": set}
+        """
+        local_maps = getattr(frappe.local, "pajak_tax_accounts", None)
+        if local_maps is None:
+            local_maps = frappe.local.pajak_tax_accounts = {}
+
+        account_map = local_maps.get(company)
+        if account_map is None:
+            account_map = frappe.cache().get_value(cls.cache_key(company))
+            if account_map is None:
+                account_map = cls.load_account_map(company)
+                frappe.cache().set_value(
+                    cls.cache_key(company), account_map, expires_in_sec=cls.CACHE_TIMEOUT
+                )
+            local_maps[company] = account_map
+
+        return account_map
+
+    @classmethod
+    def load_account_map(cls, company: str) -> Dict[str, Any]:
+        """Build the account map of a company from the database"""
+        rows = frappe.db.sql("""
+            SELECT 'category' as source, tca.parent as category, tca.account_type,
+                tca.account as name, '' as account_name
+            FROM `tabTax Category Account` tca
+            WHERE tca.company = %(company)s
+            AND (tca.parent = 'PPN' OR tca.parent LIKE 'PPh %%')
+            UNION ALL
+            SELECT 'account' as source, '' as category, acc.account_type,
+                acc.name, acc.account_name
+            FROM `tabAccount` acc
+            WHERE acc.company = %(company)s
+            AND acc.is_group = 0
+            AND (
+                acc.account_type IN ('Tax', 'Liability', 'Payable')
+                OR acc.account_name LIKE '%%pph%%'
+                OR acc.account_name LIKE '%%withholding%%'
+                OR acc.account_name LIKE '%%pajak penghasilan%%'
+            )
+            ORDER BY source desc, name
+        """, {"company": company}, as_dict=1)
+
+        categories = [row for row in rows if row.source == "category"]
+        accounts = [row for row in rows if row.source == "account"]
+
+        account_map = {
+            "ppn_output": cls._resolve_ppn(categories, accounts, "Output"),
+            "ppn_input": cls._resolve_ppn(categories, accounts, "Input"),
+            "pph": {pph_type: cls._resolve_pph(categories, accounts, pph_type) for pph_type in PPH_TYPES}
+        }
+
+        pph_accounts = {account_map["pph"][pph_type] for pph_type in ("21", "23", "26")} - {None}
+        pph_accounts.update(row.name for row in accounts if is_pph_account_name(row.account_name))
+        account_map["pph_accounts"] = pph_accounts
+
+        return account_map
+
+    @classmethod
+    def invalidate(cls, company: Optional[str] = None) -> None:
+        """Drop the cached map of one company, or of all companies"""
+        if company:
+            frappe.cache().delete_value(cls.cache_key(company))
+        else:
+            frappe.cache().delete_keys("pajak_tax_accounts::")
+
+        local_maps = getattr(frappe.local, "pajak_tax_accounts", None)
+        if local_maps:
+            if company:
+                local_maps.pop(company, None)
+            else:
+                local_maps.clear()
+
+    @staticmethod
+    def _resolve_ppn(categories: List[Dict], accounts: List[Dict], account_type: str) -> Optional[str]:
+        # Tax Category rows without an account type count for both directions
+        for wanted in (account_type, None):
+            for row in categories:
+                if row.category == "PPN" and (row.account_type or None) == wanted:
+                    return row.name
+
+        patterns = PPN_ACCOUNT_PATTERNS[account_type]
+        for row in accounts:
+            if row.account_type == "Tax" and _matches_any(patterns, row.account_name, row.name):
+                return row.name
+
+        return None
+
+    @staticmethod
+    def _resolve_pph(categories: List[Dict], accounts: List[Dict], pph_type: str) -> Optional[str]:
+        for row in categories:
+            if row.category == f"PPh {pph_type}":
+                return row.name
+
+        patterns = [f"%pph%{pph_type}%", f"%withholding%{pph_type}%", f"%pajak%{pph_type}%"]
+        for row in accounts:
+            if (row.account_type in ("Tax", "Liability", "Payable")
+                    and _matches_any(patterns, row.account_name, row.name)):
+                return row.name
+
+        return None
+
+def _matches_any(patterns: List[str], *values: str) -> bool:
+    """Case-insensitive SQL LIKE matching of any value against any pattern"""
+    for pattern in patterns:
+        regex = _like_regex(pattern)
+        if any(value and regex.fullmatch(value) for value in values):
+            return True
+    return False
+
+_LIKE_REGEX_CACHE: Dict[str, Any] = {}
+
+def _like_regex(pattern: str):
+    regex = _LIKE_REGEX_CACHE.get(pattern)
+    if regex is None:
+        regex = re.compile(".*".join(re.escape(part) for part in pattern.split("%")), re.IGNORECASE | re.DOTALL)
+        _LIKE_REGEX_CACHE[pattern] = regex
+    return regex
+
+def is_pph_account_name(account_name: Optional[str]) -> bool:
+    """Check whether an account name looks like a PPh 21/23/26 account"""
+    lower_name = (account_name or "").lower()
+    return (any(keyword in lower_name for keyword in PPH_KEYWORDS)
+            and any(pph_type in lower_name for pph_type in PPH_NAME_TYPES))
+
+def get_ppn_account(company: str, account_type: str = "Output") -> Optional[str]:
+    """Get PPN Output or Input account for company"""
+    return TaxAccountResolver.get_account_map(company)["ppn_" + account_type.lower()]
+
+def get_pph_account(company: str, pph_type: str) -> Optional[str]:
+    """Get PPh account for company by type, e.g. 23 or 4(2)"""
+    return TaxAccountResolver.get_account_map(company)["pph"].get(pph_type)
+
+def is_pph_account(account: str, company: str) -> bool:
+    """Check whether an account is a PPh 21/23/26 account of the company"""
+    return account in TaxAccountResolver.get_account_map(company)["pph_accounts"]
+
+@profiled
+def invalidate_tax_account_cache(doc: Document, method: Optional[str] = None, *args) -> None:
+    """Account and Tax Category hook: drop cached tax account maps, GL taggers and PPh classifiers"""
+    from pajak_indonesia.pelaporan.utils import GLEntryTaxTagger
+    from pajak_indonesia.ebupot.classifier import PPhTaxClassifier
+
+    company = doc.get("company") if doc.doctype == "Account" else None
+    TaxAccountResolver.invalidate(company)
+    GLEntryTaxTagger.invalidate(company)
+    PPhTaxClassifier.invalidate(company)